@@ -0,0 +1,328 @@
+#!/usr/bin/env python3
+"""
+Multi-Level Cache Hierarchy Model (L1/L2/L3)
+
+Chains SetAssociativeLRU levels so that each level only sees the traffic the
+level above could not serve. The inclusion policy decides what that traffic is:
+
+- NINE (non-inclusive, non-exclusive): the miss stream of level i is the
+  access stream of level i+1; evictions are silent.
+- Inclusive: as NINE, and every block evicted from level i+1 is also
+  invalidated in levels 0..i (back-invalidation), so upper levels always
+  hold a subset of the lower ones.
+- Exclusive: a block lives in at most one level. A miss in level i probes
+  level i+1 and moves the block up on a hit; the victim of level i is
+  written into level i+1.
+
+All levels share one block size. Each level dict follows the configuration
+style of model_validation:
+    {'name': 'L1', 'C': 32*1024, 'b': 64, 'assoc': 8, 'latency': 4}
+with latency (hit time in cycles) optional.
+"""
+
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+from cache_simulator import OP_ACCESS, OP_INVALIDATE, SetAssociativeLRU, gemm_trace
+
+POLICIES = ('nine', 'inclusive', 'exclusive')
+
+# Hit latency in cycles for levels that do not specify one
+DEFAULT_LATENCIES = (4, 12, 40, 80)
+DEFAULT_MEMORY_LATENCY = 200
+
+# Fixed-point rounds an inclusive chunk may take before it is split in half
+INCLUSIVE_MAX_ROUNDS = 4
+
+
+class CacheHierarchy:
+    """
+    Multi-level cache hierarchy with a shared inclusion policy
+    """
+
+    def __init__(self, levels: List[Dict], policy: str = 'nine',
+                 memory_latency: int = DEFAULT_MEMORY_LATENCY):
+        """
+        Initialize the hierarchy
+
+        Args:
+            levels: Level configurations from closest to the core outwards,
+                    each with 'C' (bytes), 'b' (bytes), 'assoc' and optional
+                    'name' and 'latency' (cycles)
+            policy: 'nine', 'inclusive' or 'exclusive'
+            memory_latency: Cycles for an access served by memory
+        """
+        if policy not in POLICIES:
+            raise ValueError(f"Unknown policy {policy!r}, expected one of {POLICIES}")
+        if not levels:
+            raise ValueError("At least one cache level is required")
+        block_sizes = {level['b'] for level in levels}
+        if len(block_sizes) != 1:
+            raise ValueError("All levels must share one block size")
+
+        self.policy = policy
+        self.b = levels[0]['b']
+        self.memory_latency = memory_latency
+        self.levels = []
+        for index, level in enumerate(levels):
+            num_sets = (level['C'] // level['b']) // level['assoc']
+            assert num_sets * level['assoc'] * level['b'] == level['C'], \
+                f"Cache parameters inconsistent for level {index}"
+            self.levels.append({
+                'name': level.get('name', f'L{index + 1}'),
+                'C': level['C'],
+                'S': num_sets,
+                'assoc': level['assoc'],
+                'latency': level.get('latency', DEFAULT_LATENCIES[min(index, len(DEFAULT_LATENCIES) - 1)]),
+                'cache': SetAssociativeLRU(num_sets, level['assoc'])
+            })
+        self.reset_stats()
+
+    def reset_stats(self):
+        """Zero the per-level counters (cache contents are kept)"""
+        for level in self.levels:
+            level['accesses'] = 0
+            level['hits'] = 0
+            level['victims_in'] = 0
+            level['back_invalidations'] = 0
+        self.memory_accesses = 0
+        self.total_accesses = 0
+
+    def access(self, blocks: np.ndarray):
+        """
+        Stream a chunk of block accesses through the hierarchy
+
+        Args:
+            blocks: Block numbers (address // block_size) in trace order
+        """
+        blocks = np.asarray(blocks, dtype=np.int64)
+        self.total_accesses += blocks.size
+        if self.policy == 'nine':
+            self._commit(self._run_filtered(blocks, None))
+        elif self.policy == 'exclusive':
+            self._commit(self._run_exclusive(blocks))
+        else:
+            self._access_inclusive(blocks)
+
+    def simulate_matrix_multiplication(self, M: int, K: int, N: int, element_size: int = 8,
+                                       loop_order: str = 'ijk',
+                                       tiles: Optional[Tuple[int, int, int]] = None) -> Dict:
+        """
+        Stream the C = A×B trace through the hierarchy
+
+        Args:
+            M, K, N: Matrix dimensions
+            element_size: Size of each element in bytes
+            loop_order: Loop nest order (tile and point loops when tiled)
+            tiles: Optional (tile_M, tile_K, tile_N) for the tiled loop nest
+
+        Returns:
+            report() for this run
+        """
+        self.reset_stats()
+        for addresses, _ in gemm_trace(M, K, N, element_size, loop_order, tiles=tiles):
+            self.access(addresses // self.b)
+        return self.report()
+
+    def report(self) -> Dict:
+        """
+        Per-level hit/miss counts, AMAT and bandwidth
+
+        AMAT is built from the bottom up, AMAT_i = latency_i +
+        local_miss_rate_i * AMAT_(i+1), with memory at the end. Bandwidth is
+        the traffic crossing the link below each level divided by the
+        run time of a latency-bound core, total_accesses * AMAT_L1 cycles.
+        """
+        levels = []
+        for index, level in enumerate(self.levels):
+            misses = level['accesses'] - level['hits']
+            levels.append({
+                'name': level['name'],
+                'cache_size_bytes': level['C'],
+                'associativity': level['assoc'],
+                'latency_cycles': level['latency'],
+                'accesses': level['accesses'],
+                'hits': level['hits'],
+                'misses': misses,
+                'local_miss_rate': misses / level['accesses'] if level['accesses'] else 0.0,
+                'global_miss_rate': misses / self.total_accesses if self.total_accesses else 0.0,
+                'back_invalidations': level['back_invalidations'],
+                # Blocks supplied from below on a miss, and blocks pushed down
+                # to the next level (exclusive victims)
+                'fill_bytes': misses * self.b,
+                'victim_bytes': (self.levels[index + 1]['victims_in'] * self.b
+                                 if index + 1 < len(self.levels) else 0)
+            })
+
+        amat = float(self.memory_latency)
+        for level in reversed(levels):
+            amat = level['latency_cycles'] + level['local_miss_rate'] * amat
+            level['amat_cycles'] = amat
+
+        total_cycles = self.total_accesses * amat
+        for level in levels:
+            traffic = level['fill_bytes'] + level['victim_bytes']
+            level['bandwidth_bytes_per_cycle'] = traffic / total_cycles if total_cycles else 0.0
+
+        return {
+            'policy': self.policy,
+            'block_size': self.b,
+            'total_accesses': self.total_accesses,
+            'memory_accesses': self.memory_accesses,
+            'memory_bytes': self.memory_accesses * self.b,
+            'amat_cycles': amat,
+            'levels': levels
+        }
+
+    def _run_filtered(self, blocks: np.ndarray,
+                      invalidations: Optional[List[Tuple[np.ndarray, np.ndarray]]]) -> Dict:
+        """
+        NINE/inclusive pass: each level's misses become the next level's accesses
+
+        Like the other policy passes it returns the chunk's counters without
+        committing them, so inclusive rounds can be replayed.
+
+        Args:
+            blocks: Chunk of block accesses
+            invalidations: Per level, (times, blocks) of back-invalidations to
+                           apply, or None for NINE
+
+        Returns:
+            Chunk counters, plus per-level evictions (times, blocks) when
+            invalidations are tracked
+        """
+        times = 2 * np.arange(blocks.size, dtype=np.int64)
+        stats = {'levels': [], 'evictions': []}
+
+        for index, level in enumerate(self.levels):
+            cache = level['cache']
+            if invalidations is None:
+                hits = cache.access(blocks)
+                stats['levels'].append({'accesses': blocks.size, 'hits': int(hits.sum()),
+                                        'victims_in': 0, 'back_invalidations': 0})
+            else:
+                # Back-invalidations triggered by access t land at 2t + 1,
+                # after that access has been served at every level
+                inv_times, inv_blocks = invalidations[index]
+                all_times = np.concatenate((times, inv_times))
+                order = np.argsort(all_times, kind='stable')
+                ops = np.concatenate((np.full(blocks.size, OP_ACCESS, dtype=np.int8),
+                                      np.full(inv_blocks.size, OP_INVALIDATE, dtype=np.int8)))[order]
+                result_hits, victims = cache.process(np.concatenate((blocks, inv_blocks))[order], ops)
+                is_access = ops == OP_ACCESS
+                hits = result_hits[is_access]
+                victims = victims[is_access]
+                stats['levels'].append({'accesses': blocks.size, 'hits': int(hits.sum()),
+                                        'victims_in': 0,
+                                        'back_invalidations': int(result_hits[~is_access].sum())})
+                evicted = victims >= 0
+                stats['evictions'].append((times[evicted] + 1, victims[evicted]))
+
+            missed = ~hits
+            blocks = blocks[missed]
+            times = times[missed]
+
+        stats['memory_accesses'] = int(blocks.size)
+        return stats
+
+    def _access_inclusive(self, blocks: np.ndarray):
+        """
+        Inclusive pass with exact back-invalidation
+
+        Back-invalidations change upper-level misses, which change lower-level
+        evictions. The chunk is replayed from a snapshot until the set of
+        back-invalidations is a fixed point; chunks that do not settle within
+        INCLUSIVE_MAX_ROUNDS are split in half.
+        """
+        state = [level['cache'].snapshot() for level in self.levels]
+        empty = (np.empty(0, dtype=np.int64), np.empty(0, dtype=np.int64))
+        invalidations = [empty] * len(self.levels)
+
+        for _ in range(INCLUSIVE_MAX_ROUNDS):
+            stats = self._run_filtered(blocks, invalidations)
+            # An eviction at level i invalidates the block in every level above
+            proposed = []
+            for index in range(len(self.levels)):
+                below = stats['evictions'][index + 1:]
+                if below:
+                    times = np.concatenate([times for times, _ in below])
+                    evicted = np.concatenate([evicted for _, evicted in below])
+                    order = np.lexsort((evicted, times))
+                    proposed.append((times[order], evicted[order]))
+                else:
+                    proposed.append(empty)
+
+            if all(np.array_equal(p[0], c[0]) and np.array_equal(p[1], c[1])
+                   for p, c in zip(proposed, invalidations)):
+                self._commit(stats)
+                return
+
+            for level, saved in zip(self.levels, state):
+                level['cache'].restore(saved)
+            invalidations = proposed
+
+        half = blocks.size // 2
+        if half == 0:
+            raise RuntimeError("Inclusive back-invalidation did not converge")
+        self._access_inclusive(blocks[:half])
+        self._access_inclusive(blocks[half:])
+
+    def _run_exclusive(self, blocks: np.ndarray) -> Dict:
+        """
+        Exclusive pass: misses probe the next level, victims move down
+
+        Every miss of level 0 is an event carrying the missed block and the
+        block level 0 evicted for it. At each lower level the event probes
+        for the block (OP_INVALIDATE: a hit hands it up to level 0) and then
+        inserts the victim; what the level could not supply and what it
+        evicted travel on to the next level.
+        """
+        stats = {'levels': []}
+
+        # Level 0 sees every access and always fills
+        hits, victims = self.levels[0]['cache'].process(
+            blocks, np.full(blocks.size, OP_ACCESS, dtype=np.int8))
+        stats['levels'].append({'accesses': blocks.size, 'hits': int(hits.sum()),
+                                'victims_in': 0, 'back_invalidations': 0})
+        missed = ~hits
+        probes = blocks[missed]
+        pushed = victims[missed]
+
+        for level in self.levels[1:]:
+            count = probes.size
+            stream = np.empty(2 * count, dtype=np.int64)
+            stream[0::2] = probes
+            stream[1::2] = pushed
+            ops = np.empty(2 * count, dtype=np.int8)
+            ops[0::2] = OP_INVALIDATE
+            ops[1::2] = OP_ACCESS
+            keep = stream >= 0
+            result_hits, result_victims = level['cache'].process(stream[keep], ops[keep])
+
+            all_hits = np.zeros(2 * count, dtype=bool)
+            all_hits[keep] = result_hits
+            all_victims = np.full(2 * count, -1, dtype=np.int64)
+            all_victims[keep] = result_victims
+
+            probed = probes >= 0
+            probe_hits = all_hits[0::2] & probed
+            stats['levels'].append({'accesses': int(probed.sum()), 'hits': int(probe_hits.sum()),
+                                    'victims_in': int((pushed >= 0).sum()),
+                                    'back_invalidations': 0})
+
+            probes = np.where(probed & ~probe_hits, probes, -1)
+            pushed = all_victims[1::2]
+            live = (probes >= 0) | (pushed >= 0)
+            probes = probes[live]
+            pushed = pushed[live]
+
+        stats['memory_accesses'] = int((probes >= 0).sum())
+        return stats
+
+    def _commit(self, stats: Dict):
+        """Add a chunk's counters to the running totals"""
+        for level, counters in zip(self.levels, stats['levels']):
+            for key in ('accesses', 'hits', 'victims_in', 'back_invalidations'):
+                level[key] += counters[key]
+        self.memory_accesses += stats['memory_accesses']
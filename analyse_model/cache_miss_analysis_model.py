@@ -18,11 +18,41 @@ C = A × B, where:
 """
 
 import math
-from typing import Dict, List, Tuple
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+import cache_simulator
+import trace_format
+from parallel_simulator import simulate_matrix_multiplication_sharded
+from replacement import REPLACEMENT_POLICIES
+from reuse_distance import ReuseDistanceHistogram, reuse_distance_histogram
+from sampling import DEFAULT_CONFIDENCE, set_sampled_analysis, shards_analysis
+from loop_nest import KERNELS, parse_loop_nest, simulate_loop_nest
+from memo import DEFAULT_MEMO, AnalysisMemo, memoized
+from padding import PaddingAdvisor
+from shared_cache import DEFAULT_THREAD_COUNTS, shared_tile_sweep, simulate_shared_gemm
+from tiling import TiledGEMMModel
+from traffic import analytical_traffic, gemm_flops, roofline_time, simulate_gemm_traffic
+
+# Columns of analyze_batch, named after the miss_analysis keys
+BATCH_DTYPE = np.dtype([
+    ('M', np.int64), ('K', np.int64), ('N', np.int64),
+    ('compulsory_misses', np.int64),
+    ('capacity_misses', np.int64),
+    ('conflict_misses', np.int64),
+    ('total_misses', np.int64),
+    ('total_accesses', np.int64),
+    ('overall_miss_rate', np.float64),
+    ('working_set_ratio', np.float64)
+])
+
+# Shapes × sets evaluated per step of the batched conflict histogram
+BATCH_HISTOGRAM_ELEMENTS = 1 << 22
 
 class CacheMissModel:
     def __init__(self, cache_size: int, num_sets: int, block_size: int, 
-                 associativity: int = 4):
+                 associativity: int = 4, memo: Optional[AnalysisMemo] = None):
         """
         Initialize cache parameters
         
@@ -31,6 +61,8 @@ class CacheMissModel:
             num_sets: Number of cache sets
             block_size: Block size in bytes
             associativity: Set associativity (default 4)
+            memo: Result memo for the public analyses (default: the memo
+                  shared by all models, memo.DEFAULT_MEMO)
         """
         self.C = cache_size
         self.S = num_sets
@@ -46,9 +78,23 @@ class CacheMissModel:
         # Validate parameters
         assert self.total_blocks == num_sets * associativity, \
             "Cache parameters inconsistent"
+        
+        # Tiled miss models, created on first use (they memoize footprints)
+        self._tiled_model = None
+        self._fully_associative_model = None
+        self._padding_advisor = None
+        
+        self.memo = memo if memo is not None else DEFAULT_MEMO
     
+    def memo_identity(self) -> Tuple[int, int, int, int]:
+        """Parameters that, with the call arguments, determine every analysis"""
+        return (self.C, self.S, self.b, self.assoc)
+    
+    @memoized
     def analyze_matrix_multiplication(self, M: int, K: int, N: int, 
-                                    element_size: int = 8) -> Dict:
+                                    element_size: int = 8,
+                                    loop_order: Optional[str] = None,
+                                    register_reuse: bool = True) -> Dict:
         """
         Analyze cache miss rates for matrix multiplication C = A×B
         
@@ -57,6 +103,11 @@ class CacheMissModel:
             K: Columns in A, rows in B
             N: Columns in B and C
             element_size: Size of each element in bytes (default 8 for double)
+            loop_order: Loop nest order from outermost to innermost (e.g. 'ikj').
+                        None keeps the order-independent estimate; an order
+                        uses the per-set footprint model of that loop nest
+            register_reuse: With a loop order, keep the operand invariant in
+                            the innermost loop in a register
             
         Returns:
             Dictionary with miss rate analysis
@@ -95,6 +146,11 @@ class CacheMissModel:
             'miss_analysis': {}
         }
         
+        if loop_order is not None:
+            results['miss_analysis'] = self._analyze_loop_order(M, K, N, element_size,
+                                                                loop_order, register_reuse)
+            return results
+        
         # Analyze each type of miss
         results['miss_analysis']['capacity_misses'] = self._analyze_capacity_misses(M, K, N, element_size)
         results['miss_analysis']['conflict_misses'] = self._analyze_conflict_misses(M, K, N, element_size)
@@ -105,6 +161,92 @@ class CacheMissModel:
         
         return results
     
+    def analyze_batch(self, shapes: np.ndarray, element_size: int = 8) -> np.ndarray:
+        """
+        Analyze many (possibly rectangular) GEMM shapes in one vectorized call
+        
+        Evaluates the same compulsory, capacity and conflict estimates as
+        analyze_matrix_multiplication (without a loop order) for every row.
+        
+        Args:
+            shapes: Integer array of shape (n, 3) with one (M, K, N) per row
+            element_size: Size of each element in bytes (default 8 for double)
+            
+        Returns:
+            Structured array of length n with dtype BATCH_DTYPE
+        """
+        shapes = np.asarray(shapes, dtype=np.int64).reshape(-1, 3)
+        M, K, N = shapes[:, 0], shapes[:, 1], shapes[:, 2]
+        
+        results = np.zeros(shapes.shape[0], dtype=BATCH_DTYPE)
+        results['M'], results['K'], results['N'] = M, K, N
+        
+        # Compulsory: every block of every matrix once
+        A_blocks = (M * K * element_size + self.b - 1) // self.b
+        B_blocks = (K * N * element_size + self.b - 1) // self.b
+        C_blocks = (M * N * element_size + self.b - 1) // self.b
+        total_matrix_blocks = A_blocks + B_blocks + C_blocks
+        results['compulsory_misses'] = total_matrix_blocks
+        
+        # Capacity: same rule as _analyze_capacity_misses
+        overflowing = ((total_matrix_blocks > self.total_blocks) &
+                       (M * N * K * 3 * element_size > self.C))
+        results['capacity_misses'] = np.where(
+            overflowing,
+            np.maximum(total_matrix_blocks - self.total_blocks, 0) * np.minimum(np.minimum(M, N), K),
+            0)
+        
+        results['conflict_misses'] = self._batch_conflict_misses(M, K, N, element_size)
+        
+        results['total_misses'] = (results['compulsory_misses'] + results['capacity_misses'] +
+                                   results['conflict_misses'])
+        results['total_accesses'] = M * K * N * 3
+        with np.errstate(divide='ignore', invalid='ignore'):
+            results['overall_miss_rate'] = np.where(results['total_accesses'] > 0,
+                                                    results['total_misses'] / results['total_accesses'],
+                                                    0.0)
+        results['working_set_ratio'] = (M * K + K * N + M * N) * element_size / self.C
+        return results
+    
+    def _batch_conflict_misses(self, M: np.ndarray, K: np.ndarray, N: np.ndarray,
+                               element_size: int) -> np.ndarray:
+        """
+        _analyze_conflict_misses for arrays of shapes
+        
+        The closed-form per-set byte counts of _range_set_histogram are
+        broadcast over (shapes, sets), a bounded number of shapes at a time.
+        """
+        conflict_misses = np.zeros(M.size, dtype=np.int64)
+        if self.b % element_size != 0:
+            # Elements straddle blocks; use the per-block path shape by shape
+            for row in range(M.size):
+                conflict_misses[row] = self._analyze_conflict_misses(
+                    int(M[row]), int(K[row]), int(N[row]), element_size)
+            return conflict_misses
+        
+        sweep = self.S * self.b
+        set_offsets = np.arange(self.S, dtype=np.int64)[None, :] * self.b
+        
+        def elements_per_set(start: np.ndarray, num_elements: np.ndarray) -> np.ndarray:
+            end = start + num_elements * element_size
+            below_end = (end // sweep) * self.b + np.clip(end % sweep - set_offsets, 0, self.b)
+            below_start = (start // sweep) * self.b + np.clip(start % sweep - set_offsets, 0, self.b)
+            return (below_end - below_start) // element_size
+        
+        step = max(1, BATCH_HISTOGRAM_ELEMENTS // self.S)
+        for first in range(0, M.size, step):
+            m = M[first:first + step, None]
+            k = K[first:first + step, None]
+            n = N[first:first + step, None]
+            # Contiguous allocation as in _set_access_histogram
+            B_start = m * k * element_size
+            C_start = B_start + k * n * element_size
+            set_access_counts = n * elements_per_set(np.zeros_like(m), m * k)
+            set_access_counts += m * elements_per_set(B_start, k * n)
+            set_access_counts += k * elements_per_set(C_start, m * n)
+            conflict_misses[first:first + step] = np.maximum(set_access_counts - self.assoc, 0).sum(axis=1)
+        return conflict_misses
+    
     def _analyze_capacity_misses(self, M: int, K: int, N: int, element_size: int) -> int:
         """
         Analyze capacity misses for matrix multiplication
@@ -160,7 +302,22 @@ class CacheMissModel:
         """
         Analyze conflict misses due to set associativity
         
-        Conflict misses occur when multiple memory blocks map to the same set
+        Conflict misses occur when multiple memory blocks map to the same set.
+        The per-set access counts of the triple loop are computed in closed
+        form by _set_access_histogram, so the cost no longer grows with M*K*N.
+        """
+        set_access_counts = self._set_access_histogram(M, K, N, element_size)
+        
+        # Each access beyond associativity causes a conflict miss
+        # This is a simplified model
+        return int(np.maximum(set_access_counts - self.assoc, 0).sum())
+    
+    def _analyze_conflict_misses_reference(self, M: int, K: int, N: int, element_size: int) -> int:
+        """
+        Reference triple-loop walk for _analyze_conflict_misses
+        
+        Kept to check the vectorized histogram on small sizes; it performs
+        3*M*N*K address computations in pure Python.
         """
         # Calculate memory addresses for matrices
         # Assuming matrices are allocated contiguously
@@ -206,6 +363,73 @@ class CacheMissModel:
         
         return int(conflict_misses)
     
+    def _set_access_histogram(self, M: int, K: int, N: int, element_size: int) -> np.ndarray:
+        """
+        Count accesses to each cache set made by the triple loop
+        
+        The loop touches every A[i][k] N times, every B[k][j] M times and
+        every C[i][j] K times, so the histogram is the weighted sum of the
+        element-to-set histograms of the three contiguous matrices.
+        
+        Returns:
+            int64 array of length S with the access count of each set
+        """
+        # Assuming matrices are allocated contiguously
+        A_start = 0
+        B_start = A_start + M * K * element_size
+        C_start = B_start + K * N * element_size
+        
+        set_access_counts = N * self._range_set_histogram(A_start, M * K, element_size)
+        set_access_counts += M * self._range_set_histogram(B_start, K * N, element_size)
+        set_access_counts += K * self._range_set_histogram(C_start, M * N, element_size)
+        return set_access_counts
+    
+    def _range_set_histogram(self, start: int, num_elements: int, element_size: int) -> np.ndarray:
+        """
+        Count the elements of a contiguous array that map to each cache set
+        
+        Args:
+            start: Byte address of the first element
+            num_elements: Number of elements in the array
+            element_size: Size of each element in bytes
+            
+        Returns:
+            int64 array of length S; entry s counts elements whose address
+            falls in a block with set index s
+        """
+        end = start + num_elements * element_size
+        
+        if self.b % element_size == 0 and start % element_size == 0:
+            # Block boundaries never split an element, so the element count of
+            # a set is its share of the byte range divided by the element size.
+            # Bytes of [0, x) in set s: one block per full sweep over all sets
+            # plus the overlap of the partial sweep with block s.
+            sweep = self.S * self.b
+            set_offsets = np.arange(self.S, dtype=np.int64) * self.b
+            
+            def bytes_below(x: int) -> np.ndarray:
+                return (x // sweep) * self.b + np.clip(x % sweep - set_offsets, 0, self.b)
+            
+            return (bytes_below(end) - bytes_below(start)) // element_size
+        
+        # General case: count element start addresses per block, then fold the
+        # blocks onto the sets
+        counts = np.zeros(self.S, dtype=np.int64)
+        if num_elements == 0:
+            return counts
+        first_block = start // self.b
+        last_block = (end - 1) // self.b
+        block_bases = np.arange(first_block, last_block + 2, dtype=np.int64) * self.b
+        # Index of the first element starting at or after each block boundary
+        first_element = np.clip(-((start - block_bases) // element_size), 0, num_elements)
+        per_block = np.diff(first_element)
+        
+        offset = first_block % self.S
+        padded = np.zeros(-(-(offset + per_block.size) // self.S) * self.S, dtype=np.int64)
+        padded[offset:offset + per_block.size] = per_block
+        counts += padded.reshape(-1, self.S).sum(axis=0)
+        return counts
+    
     def _analyze_compulsory_misses(self, M: int, K: int, N: int, element_size: int) -> int:
         """
         Analyze compulsory (cold) misses
@@ -228,20 +452,465 @@ class CacheMissModel:
                 miss_analysis['capacity_misses'] + 
                 miss_analysis['conflict_misses'])
     
-    def _calculate_total_accesses(self, M: int, K: int, N: int) -> int:
+    def _calculate_total_accesses(self, M: int, K: int, N: int,
+                                  loop_order: Optional[str] = None,
+                                  register_reuse: bool = False) -> int:
         """Calculate total memory accesses in matrix multiplication"""
         # Each inner loop iteration does 3 accesses:
         # - Read A[i][k]
         # - Read B[k][j]
         # - Read/Write C[i][j]
-        return M * K * N * 3
+        if loop_order is None or not register_reuse:
+            return M * K * N * 3
+        # The operand invariant in the innermost loop is accessed once per
+        # execution of that loop
+        return sum(self._operand_accesses(M, K, N, loop_order, register_reuse))
+    
+    def _operand_accesses(self, M: int, K: int, N: int, loop_order: str,
+                          register_reuse: bool) -> List[int]:
+        """Accesses to A, B and C for a loop order"""
+        accesses = [M * K * N] * 3
+        if register_reuse:
+            inner_extent = {'i': M, 'j': N, 'k': K}[loop_order[-1]]
+            accesses[cache_simulator.invariant_operand(loop_order)] = M * K * N // inner_extent
+        return accesses
+    
+    def _analyze_loop_order(self, M: int, K: int, N: int, element_size: int,
+                            loop_order: str, register_reuse: bool) -> Dict:
+        """
+        Loop-order aware miss breakdown
+        
+        The untiled loop nest is the tiled nest with one tile per matrix, so
+        the tiled footprint model applies directly. Running it for this cache
+        and for a fully associative cache of the same size splits the misses
+        the usual way: compulsory, capacity (fully associative minus
+        compulsory) and conflict (set-associative minus fully associative).
+        Where the set mapping beats fully associative LRU, capacity is capped
+        at the set-associative misses, conflict is zero and the difference is
+        reported as the set-mapping gain.
+        """
+        if self._tiled_model is None:
+            self._tiled_model = TiledGEMMModel(self.C, self.S, self.b, self.assoc)
+        if self._fully_associative_model is None:
+            self._fully_associative_model = TiledGEMMModel(self.C, 1, self.b, self.total_blocks)
+        
+        set_associative = self._tiled_model.analyze(M, K, N, M, K, N, element_size,
+                                                    point_order=loop_order)
+        fully_associative = self._fully_associative_model.analyze(M, K, N, M, K, N, element_size,
+                                                                  point_order=loop_order)
+        accesses = self._operand_accesses(M, K, N, loop_order, register_reuse)
+        
+        per_matrix = {}
+        compulsory = capacity = conflict = set_mapping_gain = 0
+        for matrix_id, name in enumerate(cache_simulator.MATRIX_NAMES):
+            matrix_compulsory = set_associative['per_matrix'][name]['compulsory_misses']
+            fully_misses = min(fully_associative['per_matrix'][name]['misses'], accesses[matrix_id])
+            set_misses = min(set_associative['per_matrix'][name]['misses'], accesses[matrix_id])
+            per_matrix[name] = {
+                'accesses': accesses[matrix_id],
+                'misses': max(set_misses, matrix_compulsory),
+                'miss_rate': max(set_misses, matrix_compulsory) / accesses[matrix_id]
+            }
+            # Set-associative LRU can beat fully associative LRU on cyclic
+            # patterns, so capacity is capped by the set-associative misses
+            capped = max(min(fully_misses, set_misses), matrix_compulsory)
+            compulsory += matrix_compulsory
+            capacity += capped - matrix_compulsory
+            conflict += max(set_misses - capped, 0)
+            set_mapping_gain += max(fully_misses - capped, 0)
+        
+        total_misses = compulsory + capacity + conflict
+        total_accesses = sum(accesses)
+        return {
+            'loop_order': loop_order,
+            'register_operand': (cache_simulator.MATRIX_NAMES[cache_simulator.invariant_operand(loop_order)]
+                                 if register_reuse else None),
+            'compulsory_misses': compulsory,
+            'capacity_misses': capacity,
+            'conflict_misses': conflict,
+            'set_mapping_gain': set_mapping_gain,
+            'total_misses': total_misses,
+            'total_accesses': total_accesses,
+            'overall_miss_rate': total_misses / total_accesses,
+            'per_matrix': per_matrix
+        }
+    
+    @memoized
+    def compare_loop_orders(self, M: int, K: int, N: int, element_size: int = 8,
+                            register_reuse: bool = True) -> List[Dict]:
+        """
+        Rank the six loop orders by predicted misses for this cache
+        
+        Args:
+            M, K, N: Matrix dimensions
+            element_size: Size of each element in bytes (default 8 for double)
+            register_reuse: Keep the innermost-loop invariant operand in a register
+            
+        Returns:
+            One miss breakdown per loop order, fewest misses first, with its rank
+        """
+        ranking = [self._analyze_loop_order(M, K, N, element_size, loop_order, register_reuse)
+                   for loop_order in cache_simulator.LOOP_ORDERS]
+        ranking.sort(key=lambda analysis: (analysis['total_misses'], analysis['total_accesses']))
+        for rank, analysis in enumerate(ranking, start=1):
+            analysis['rank'] = rank
+        return ranking
+    
+    @memoized
+    def simulate_matrix_multiplication(self, M: int, K: int, N: int,
+                                       element_size: int = 8,
+                                       loop_order: str = 'ijk',
+                                       tiles: Optional[Tuple[int, int, int]] = None,
+                                       register_reuse: bool = False,
+                                       workers: Optional[int] = 1,
+                                       policy: str = 'lru',
+                                       prefetcher: Optional[str] = None) -> Dict:
+        """
+        Simulate matrix multiplication C = A×B through this cache
+        
+        Unlike analyze_matrix_multiplication, which estimates misses, this
+        streams the exact address trace through a set-associative cache
+        (LRU unless another replacement policy is given) and reports the
+        resulting hit/miss counts.
+        
+        Args:
+            M: Rows in A and C
+            K: Columns in A, rows in B
+            N: Columns in B and C
+            element_size: Size of each element in bytes (default 8 for double)
+            loop_order: Loop nest order from outermost to innermost (e.g. 'ikj');
+                        with tiles, the order of the tile and the point loops
+            tiles: Optional (tile_M, tile_K, tile_N) to simulate the tiled loop nest
+            register_reuse: Keep the innermost-loop invariant operand in a register
+            workers: Processes to shard the cache sets over (1 simulates
+                     in-process, None uses one per CPU); sharded runs add
+                     per-set counters to the result
+            policy: Replacement policy (replacement.REPLACEMENT_POLICIES)
+            prefetcher: Optional prefetcher model (prefetch.PREFETCHERS); its
+                        coverage, accuracy and traffic are reported apart from
+                        the demand misses. Prefetching is simulated in-process.
+            
+        Returns:
+            Dictionary with exact hit/miss counts, overall and per matrix
+        """
+        if prefetcher is not None and workers != 1:
+            raise ValueError("Prefetching is simulated in-process; use workers=1")
+        if workers == 1:
+            simulation = cache_simulator.simulate_matrix_multiplication(
+                self.S, self.b, self.assoc, M, K, N, element_size, loop_order, tiles=tiles,
+                register_reuse=register_reuse, policy=policy, prefetcher=prefetcher)
+        else:
+            simulation = simulate_matrix_multiplication_sharded(
+                self.S, self.b, self.assoc, M, K, N, element_size, loop_order, tiles=tiles,
+                register_reuse=register_reuse, workers=workers, policy=policy)
+        
+        return {
+            'cache_params': {
+                'cache_size_bytes': self.C,
+                'num_sets': self.S,
+                'block_size': self.b,
+                'associativity': self.assoc,
+                'total_blocks': self.total_blocks
+            },
+            'matrix_params': {
+                'M': M, 'K': K, 'N': N,
+                'element_size': element_size
+            },
+            'simulation': simulation
+        }
+    
+    def simulate_trace(self, path: str, include_instructions: bool = False,
+                       policy: str = 'lru') -> Dict:
+        """
+        Stream an external binary address trace through this cache
+        
+        Not memoized: the result depends on the file's contents, not its name.
+        
+        Args:
+            path: Trace written by trace_format (e.g. by convert_lackey)
+            include_instructions: Also simulate instruction fetches (unified cache)
+            policy: Replacement policy (replacement.REPLACEMENT_POLICIES)
+            
+        Returns:
+            Dictionary with exact hit/miss counts, overall and per operation
+        """
+        return {
+            'cache_params': {
+                'cache_size_bytes': self.C,
+                'num_sets': self.S,
+                'block_size': self.b,
+                'associativity': self.assoc,
+                'total_blocks': self.total_blocks
+            },
+            'simulation': trace_format.simulate_trace(path, self.S, self.b, self.assoc,
+                                                      include_instructions, policy)
+        }
+    
+    @memoized
+    def compare_replacement_policies(self, M: int, K: int, N: int, element_size: int = 8,
+                                     loop_order: str = 'ikj',
+                                     tile_candidates: Optional[List[Tuple[int, int, int]]] = None,
+                                     policies: Optional[List[str]] = None,
+                                     register_reuse: bool = False,
+                                     prefetcher: Optional[str] = None) -> Dict:
+        """
+        Simulate tilings under each replacement policy and pick each policy's best tile
+        
+        Args:
+            M, K, N: Matrix dimensions
+            element_size: Size of each element in bytes (default 8 for double)
+            loop_order: Order of the tile and point loops
+            tile_candidates: (tile_M, tile_K, tile_N) tilings to simulate
+                             (default: square tiles of 8 to 64, and untiled)
+            policies: Replacement policies (default: all of REPLACEMENT_POLICIES)
+            register_reuse: Keep the innermost-loop invariant operand in a register
+            prefetcher: Optional prefetcher model; tiles are then ranked by
+                        the demand misses prefetching leaves
+            
+        Returns:
+            {policy: {'misses': [misses per candidate], 'best_tile': tile,
+            'best_misses': misses}} plus the candidates under 'tile_candidates'
+            (None stands for the untiled loop nest)
+        """
+        if tile_candidates is None:
+            tile_candidates = [None] + [(size, size, size) for size in (8, 16, 32, 64)
+                                        if size < max(M, K, N)]
+        comparison = {'tile_candidates': list(tile_candidates)}
+        for policy in policies or REPLACEMENT_POLICIES:
+            misses = [cache_simulator.simulate_matrix_multiplication(
+                          self.S, self.b, self.assoc, M, K, N, element_size, loop_order,
+                          tiles=tiles, register_reuse=register_reuse, policy=policy,
+                          prefetcher=prefetcher)['misses']
+                      for tiles in tile_candidates]
+            best = int(np.argmin(misses))
+            comparison[policy] = {
+                'misses': misses,
+                'best_tile': tile_candidates[best],
+                'best_misses': misses[best]
+            }
+        return comparison
     
+    @memoized
+    def analyze_loop_nest(self, source: str, sizes: Optional[Dict[str, int]] = None,
+                          element_size: int = 8, policy: str = 'lru') -> Dict:
+        """
+        Compulsory, capacity and conflict misses of any affine loop-nest kernel
+        
+        Args:
+            source: Kernel source (loop_nest.py describes the language) or
+                    the name of one of loop_nest.KERNELS
+            sizes: Values of the kernel's size parameters, e.g. {'L': 512, 'D': 64}
+            element_size: Size of each element in bytes (default 8 for double)
+            policy: Replacement policy (replacement.REPLACEMENT_POLICIES)
+            
+        Returns:
+            Dictionary with the cache parameters and the simulated misses,
+            split into the three Cs, overall and per array
+        """
+        name = source if source in KERNELS else 'kernel'
+        nest = parse_loop_nest(KERNELS.get(source, source), element_size, name, **(sizes or {}))
+        return {
+            'cache_params': {
+                'cache_size_bytes': self.C,
+                'num_sets': self.S,
+                'block_size': self.b,
+                'associativity': self.assoc,
+                'total_blocks': self.total_blocks
+            },
+            'sizes': dict(sizes or {}),
+            'simulation': simulate_loop_nest(nest, self.S, self.b, self.assoc, policy)
+        }
+    
+    @memoized
+    def simulate_shared_cache(self, M: int, K: int, N: int, threads: int,
+                              partition: str = 'i', element_size: int = 8,
+                              loop_order: str = 'ijk',
+                              tiles: Optional[Tuple[int, int, int]] = None,
+                              register_reuse: bool = False, policy: str = 'lru',
+                              quantum: int = 1) -> Dict:
+        """
+        Simulate threads multiplying slices of C = A×B through this cache as a shared cache
+        
+        Args:
+            M, K, N: Matrix dimensions
+            threads: Number of threads
+            partition: Loop split across the threads, 'i' (rows) or 'j' (columns)
+            element_size: Size of each element in bytes (default 8 for double)
+            loop_order: Loop nest order of every thread (of the tile and
+                        point loops with tiles)
+            tiles: Optional (tile_M, tile_K, tile_N) of every thread's loop nest
+            register_reuse: Keep the innermost-loop invariant operand in a register
+            policy: Replacement policy (replacement.REPLACEMENT_POLICIES)
+            quantum: Consecutive accesses a thread issues per turn
+            
+        Returns:
+            Dictionary with the cache parameters and the aggregate,
+            per-thread, isolated and interference misses
+        """
+        return {
+            'cache_params': {
+                'cache_size_bytes': self.C,
+                'num_sets': self.S,
+                'block_size': self.b,
+                'associativity': self.assoc,
+                'total_blocks': self.total_blocks
+            },
+            'matrix_params': {
+                'M': M, 'K': K, 'N': N,
+                'element_size': element_size
+            },
+            'simulation': simulate_shared_gemm(self.S, self.b, self.assoc, M, K, N, threads,
+                                               partition, element_size, loop_order, tiles,
+                                               register_reuse, policy, quantum)
+        }
+    
+    @memoized
+    def shared_tile_sweep(self, M: int, K: int, N: int,
+                          thread_counts: Tuple[int, ...] = DEFAULT_THREAD_COUNTS,
+                          tile_candidates: Optional[List[Tuple[int, int, int]]] = None,
+                          partition: str = 'i', element_size: int = 8,
+                          loop_order: str = 'ijk', policy: str = 'lru') -> Dict:
+        """
+        Best tile for each number of threads sharing this cache
+        
+        Args:
+            M, K, N: Matrix dimensions
+            thread_counts: Thread counts to sweep (default 1 to 64)
+            tile_candidates: (tile_M, tile_K, tile_N) tilings to simulate, None
+                             for the untiled nest (default: square tiles of 8
+                             to 64, and untiled)
+            partition: Loop split across the threads, 'i' or 'j'
+            element_size: Size of each element in bytes (default 8 for double)
+            loop_order: Order of the tile and point loops
+            policy: Replacement policy (replacement.REPLACEMENT_POLICIES)
+            
+        Returns:
+            shared_cache.shared_tile_sweep result: per thread count, the
+            misses of every candidate, the best tiles (ties toward a tiled
+            candidate) and the fair-share analytical choice
+        """
+        return shared_tile_sweep(self.S, self.b, self.assoc, M, K, N, thread_counts,
+                                 tile_candidates, partition, element_size, loop_order, policy)
+    
+    @memoized
+    def advise_padding(self, M: int, K: int, N: int, element_size: int = 8,
+                       loop_order: str = 'ijk',
+                       tiles: Optional[Tuple[int, int, int]] = None,
+                       padding_candidates: Optional[List[int]] = None,
+                       offset_candidates: Optional[List[int]] = None) -> Dict:
+        """
+        Search the row padding and base offsets of A, B and C that minimize misses
+        
+        The packed layout assumed elsewhere in this model makes power-of-two
+        shapes alias onto a few sets. padding.PaddingAdvisor scores padded
+        layouts with the per-set footprint histograms of the tiled model.
+        
+        Args:
+            M, K, N: Matrix dimensions
+            element_size: Size of each element in bytes (default 8 for double)
+            loop_order: Loop nest order (of the tile and point loops with tiles)
+            tiles: Optional (tile_M, tile_K, tile_N); None for the untiled nest
+            padding_candidates: Row paddings in elements to try
+            offset_candidates: Base offsets in bytes to try for B and C
+            
+        Returns:
+            Dictionary with the packed baseline, the best layout (padding,
+            offsets and cache_simulator.matrix_layout), the conflict misses
+            removed and the predicted speedup
+        """
+        if self._padding_advisor is None:
+            self._padding_advisor = PaddingAdvisor(self.C, self.S, self.b, self.assoc)
+        return self._padding_advisor.advise(M, K, N, element_size, loop_order, tiles,
+                                            padding_candidates, offset_candidates)
+    
+    @memoized
+    def analyze_traffic(self, M: int, K: int, N: int, element_size: int = 8,
+                        loop_order: Optional[str] = None, register_reuse: bool = True,
+                        bandwidth: Optional[float] = None,
+                        peak_flops: Optional[float] = None) -> Dict:
+        """
+        Estimate the memory traffic below this cache and a roofline run time
+        
+        The misses of analyze_matrix_multiplication become block reads, and
+        the C blocks they fill become write-backs, since the accumulation
+        dirties every one of them (write-back, write-allocate cache).
+        
+        Args:
+            M, K, N: Matrix dimensions
+            element_size: Size of each element in bytes (default 8 for double)
+            loop_order: Optional loop order, as for analyze_matrix_multiplication
+            register_reuse: With a loop order, keep the innermost-loop
+                            invariant operand in a register
+            bandwidth: Memory bandwidth in bytes per second (None: no time bound)
+            peak_flops: Compute peak in FLOP/s (None ignores compute)
+            
+        Returns:
+            Dictionary with the miss analysis, the traffic in bytes and the
+            roofline prediction (traffic.roofline_time)
+        """
+        miss_analysis = self.analyze_matrix_multiplication(
+            M, K, N, element_size, loop_order, register_reuse)['miss_analysis']
+        traffic = analytical_traffic(miss_analysis, self.b, element_size, M, N)
+        return {
+            'miss_analysis': miss_analysis,
+            'traffic': traffic,
+            'roofline': roofline_time(gemm_flops(M, K, N), {'memory': traffic['total_bytes']},
+                                      {'memory': bandwidth}, peak_flops)
+        }
+    
+    @memoized
+    def simulate_traffic(self, M: int, K: int, N: int, element_size: int = 8,
+                         loop_order: str = 'ijk',
+                         tiles: Optional[Tuple[int, int, int]] = None,
+                         register_reuse: bool = False,
+                         policy: str = 'lru',
+                         write_policy: str = 'write_allocate',
+                         c_update: str = 'modify',
+                         bandwidth: Optional[float] = None,
+                         peak_flops: Optional[float] = None) -> Dict:
+        """
+        Simulate the traffic between this write-back cache and memory
+        
+        Args:
+            M, K, N: Matrix dimensions
+            element_size: Size of each element in bytes (default 8 for double)
+            loop_order: Loop nest order (of the tile and point loops with tiles)
+            tiles: Optional (tile_M, tile_K, tile_N) to simulate the tiled loop nest
+            register_reuse: Keep the innermost-loop invariant operand in a register
+            policy: Replacement policy (replacement.REPLACEMENT_POLICIES)
+            write_policy: 'write_allocate' or 'no_write_allocate'
+            c_update: 'modify' (C is read, then written) or 'store' (only written)
+            bandwidth: Memory bandwidth in bytes per second (None: no time bound)
+            peak_flops: Compute peak in FLOP/s (None ignores compute)
+            
+        Returns:
+            traffic.simulate_gemm_traffic result for this cache, with its
+            memory link under 'traffic' and a 'roofline' prediction
+        """
+        level = {'name': 'cache', 'C': self.C, 'b': self.b, 'assoc': self.assoc}
+        simulation = simulate_gemm_traffic([level], M, K, N, element_size, loop_order, tiles,
+                                           register_reuse, policy, write_policy, c_update)
+        traffic = simulation['links'][0]
+        simulation['traffic'] = traffic
+        simulation['roofline'] = roofline_time(simulation['flops'],
+                                               {'memory': traffic['total_bytes']},
+                                               {'memory': bandwidth}, peak_flops)
+        return simulation
+    
+    @memoized
     def generate_reuse_distance_model(self, M: int, K: int, N: int, 
-                                    element_size: int = 8) -> Dict:
+                                    element_size: int = 8,
+                                    stack_distances: bool = False) -> Dict:
         """
         Generate a reuse distance-based analytical model
         
         This model uses stack distance analysis for LRU caches
+        
+        Args:
+            M, K, N: Matrix dimensions
+            element_size: Size of each element in bytes (default 8 for double)
+            stack_distances: Also walk the trace once and add the measured
+                             per-set LRU stack-distance statistics
         """
         elements_per_block = self.b // element_size
         
@@ -254,8 +923,101 @@ class CacheMissModel:
             }
         }
         
+        if stack_distances:
+            histogram = self.reuse_distance_histogram(M, K, N, element_size)
+            lru_misses = histogram.lru_misses(self.assoc)
+            model['stack_distance'] = {
+                'total_accesses': histogram.total_accesses,
+                'cold_misses': histogram.cold_misses,
+                'lru_misses': lru_misses,
+                'lru_miss_rate': lru_misses / histogram.total_accesses,
+                'median_distance': histogram.percentile(50),
+                'p90_distance': histogram.percentile(90),
+                'histogram': histogram
+            }
+        
         return model
     
+    @memoized
+    def reuse_distance_histogram(self, M: int, K: int, N: int, element_size: int = 8,
+                                 loop_order: str = 'ijk',
+                                 per_set: bool = True) -> ReuseDistanceHistogram:
+        """
+        Measure the LRU stack-distance histogram of the multiplication trace
+        
+        One trace walk answers every cache size of the same shape:
+        - per_set=True: distances within this cache's S sets, exact LRU misses
+          for any associativity via histogram.lru_misses(assoc)
+        - per_set=False: fully associative distances, exact compulsory and
+          capacity misses for every cache size, and set-associative estimates
+          via histogram.miss_rate(cache_size, assoc)
+        
+        Args:
+            M, K, N: Matrix dimensions
+            element_size: Size of each element in bytes (default 8 for double)
+            loop_order: Loop nest order from outermost to innermost
+            per_set: Measure distances per set (True) or fully associative (False)
+        """
+        trace = cache_simulator.matrix_multiplication_trace(M, K, N, element_size, loop_order)
+        return reuse_distance_histogram((addresses // self.b for addresses, _ in trace),
+                                        num_sets=self.S if per_set else 1,
+                                        block_size=self.b)
+    
+    @memoized
+    def analyze_sampled(self, M: int, K: int, N: int, element_size: int = 8,
+                        loop_order: str = 'ijk', register_reuse: bool = False,
+                        sample_sets: int = 32, method: str = 'stratified', seed: int = 0,
+                        confidence: float = DEFAULT_CONFIDENCE) -> Dict:
+        """
+        Approximate LRU miss rate from an exact simulation of a sample of sets
+        
+        Only the accesses that map to the sampled sets are generated, so the
+        cost is about sample_sets / S of a full simulation.
+        
+        Args:
+            M, K, N: Matrix dimensions
+            element_size: Size of each element in bytes (default 8 for double)
+            loop_order: Loop nest order from outermost to innermost
+            register_reuse: Keep the innermost-loop invariant operand in a register
+            sample_sets: Number of sets to simulate
+            method: 'stratified' (a few sets from every range) or 'random'
+            seed: Seed of the set selection
+            confidence: Two-sided confidence level of the interval
+            
+        Returns:
+            Dictionary with the estimated miss rate and misses, the confidence
+            interval and the sampling rate
+        """
+        return set_sampled_analysis(self.S, self.b, self.assoc, M, K, N, element_size,
+                                    loop_order, register_reuse, sample_sets, method, seed,
+                                    confidence)
+    
+    @memoized
+    def shards_miss_rate_curve(self, M: int, K: int, N: int, element_size: int = 8,
+                               loop_order: str = 'ijk', register_reuse: bool = False,
+                               sampling_rate: float = 0.01,
+                               cache_sizes: Optional[List[int]] = None, seed: int = 0,
+                               confidence: float = DEFAULT_CONFIDENCE) -> Dict:
+        """
+        SHARDS miss-ratio curve from a hash-selected fraction of the blocks
+        
+        Args:
+            M, K, N: Matrix dimensions
+            element_size: Size of each element in bytes (default 8 for double)
+            loop_order: Loop nest order from outermost to innermost
+            register_reuse: Keep the innermost-loop invariant operand in a register
+            sampling_rate: Fraction of blocks sampled
+            cache_sizes: Cache sizes in bytes for the curve (default 4KB-16MB)
+            seed: Salt of the block hash
+            confidence: Two-sided confidence level of the interval
+            
+        Returns:
+            Dictionary with this cache's estimated miss rate and interval, and
+            fully associative and set-associative miss rates per cache size
+        """
+        return shards_analysis(self.S, self.b, self.assoc, M, K, N, element_size, loop_order,
+                               register_reuse, sampling_rate, cache_sizes, seed, confidence)
+    
     def _analyze_A_reuse(self, M: int, K: int, N: int, elements_per_block: int) -> Dict:
         """Analyze reuse pattern for matrix A"""
         # Each element of A is reused N times (once for each column of B)
@@ -301,12 +1063,39 @@ class CacheMissModel:
             'temporal_reuse': K
         }
     
+    @memoized
+    def analyze_tiled_matrix_multiplication(self, M: int, K: int, N: int,
+                                            tile_M: int, tile_K: int, tile_N: int,
+                                            element_size: int = 8,
+                                            tile_order: str = 'ijk',
+                                            point_order: str = 'ijk') -> Dict:
+        """
+        Predict cache misses of the tiled (blocked) multiplication
+        
+        Args:
+            M, K, N: Matrix dimensions
+            tile_M, tile_K, tile_N: Tile extent along i, k and j
+            element_size: Size of each element in bytes (default 8 for double)
+            tile_order: Order of the tile loops from outermost to innermost
+            point_order: Order of the loops inside a tile
+            
+        Returns:
+            Dictionary with predicted misses per matrix and overall
+        """
+        if self._tiled_model is None:
+            self._tiled_model = TiledGEMMModel(self.C, self.S, self.b, self.assoc)
+        return self._tiled_model.analyze(M, K, N, tile_M, tile_K, tile_N, element_size,
+                                         tile_order, point_order)
+    
+    @memoized
     def calculate_optimal_tile_sizes(self, M: int, K: int, N: int, 
                                    element_size: int = 8) -> Dict:
         """
         Calculate optimal tile sizes to minimize cache misses
         
-        Uses cache capacity and associativity to determine blocking factors
+        Uses cache capacity and associativity to determine blocking factors.
+        This is a quick capacity heuristic; tiling.TileAutoTuner searches tile
+        sizes against the tiled miss model of every cache level.
         """
         # Available cache for three matrices
         cache_per_matrix = self.C // 3
@@ -0,0 +1,428 @@
+#!/usr/bin/env python3
+"""
+Trace-Driven Set-Associative LRU Cache Simulator
+
+Streams the exact address trace of C = A × B through a set-associative LRU
+cache and counts hits and misses per matrix. It is the ground truth used to
+calibrate the analytical formulas in cache_miss_analysis_model.py.
+
+Cache state is held in (S × assoc) NumPy arrays (block tags and last-use
+stamps, replacement.py). Sets are independent under LRU, so each trace chunk
+is grouped by set and the sets are stepped in lockstep: step r applies the
+r-th access of every set at once with array operations. The other
+replacement policies of replacement.py can be simulated in place of LRU.
+
+Memory layout matches the analytical model:
+- Matrix A: base + (i*K + k)*E
+- Matrix B: base + M*K*E + (k*N + j)*E
+- Matrix C: base + (M*K + K*N)*E + (i*N + j)*E
+The plain and tiled traces also accept a padded layout (matrix_layout):
+leading dimensions longer than the rows and gaps between the matrices.
+"""
+
+from typing import Callable, Dict, Iterator, Optional, Tuple
+
+import numpy as np
+
+# The LRU cache and its operations are re-exported for existing callers
+from replacement import OP_ACCESS, OP_INVALIDATE, OP_PREFETCH, SetAssociativeLRU, make_cache
+from prefetch import make_prefetcher, merge_requests, prefetch_summary
+
+# Matrix ids used to tag every access in a trace
+MATRIX_A = 0
+MATRIX_B = 1
+MATRIX_C = 2
+MATRIX_NAMES = ('A', 'B', 'C')
+
+# Loop orders name the loops from outermost to innermost
+LOOP_ORDERS = ('ijk', 'ikj', 'jik', 'jki', 'kij', 'kji')
+
+# Loop iterations generated per trace chunk (three accesses each)
+DEFAULT_CHUNK_ITERATIONS = 1 << 20
+
+# Operand that does not depend on the innermost loop index, keyed by that index
+INVARIANT_OPERANDS = {'i': MATRIX_B, 'j': MATRIX_A, 'k': MATRIX_C}
+
+
+def invariant_operand(loop_order: str) -> int:
+    """Matrix id of the operand the innermost loop of loop_order can keep in a register"""
+    return INVARIANT_OPERANDS[loop_order[-1]]
+
+
+def matrix_layout(M: int, K: int, N: int, element_size: int = 8,
+                  padding: Tuple[int, int, int] = (0, 0, 0),
+                  offsets: Tuple[int, int, int] = (0, 0, 0)) -> Tuple[Tuple[int, int], ...]:
+    """
+    Base address and leading dimension of A, B and C
+
+    The matrices are row-major and allocated one after the other. Padding
+    lengthens each leading dimension (the elements between two rows), and
+    each matrix starts offsets bytes after the end of the previous one (A
+    after address 0). No padding and no offsets give the packed layout of
+    the module docstring.
+
+    Args:
+        M, K, N: Matrix dimensions
+        element_size: Size of each element in bytes
+        padding: Extra elements per row of A, B and C
+        offsets: Bytes skipped before A, B and C
+
+    Returns:
+        ((base, leading_dim) of A, of B, of C)
+    """
+    layout = []
+    end = 0
+    for rows, cols, pad, offset in zip((M, K, M), (K, N, N), padding, offsets):
+        base = end + offset
+        leading_dim = cols + pad
+        layout.append((base, leading_dim))
+        end = base + rows * leading_dim * element_size
+    return tuple(layout)
+
+
+def matrix_multiplication_trace(M: int, K: int, N: int, element_size: int = 8,
+                                loop_order: str = 'ijk',
+                                chunk_iterations: int = DEFAULT_CHUNK_ITERATIONS,
+                                register_reuse: bool = False,
+                                layout: Optional[Tuple[Tuple[int, int], ...]] = None
+                                ) -> Iterator[Tuple[np.ndarray, np.ndarray]]:
+    """
+    Generate the address trace of C = A × B in chunks
+
+    Each loop iteration accesses A[i][k], B[k][j] and C[i][j] in that order.
+    With register_reuse, the operand invariant in the innermost loop is held
+    in a register and only accessed on the first iteration of that loop.
+
+    Args:
+        M: Rows in A and C
+        K: Columns in A, rows in B
+        N: Columns in B and C
+        element_size: Size of each element in bytes
+        loop_order: Loop nest order from outermost to innermost, e.g. 'ikj'
+        chunk_iterations: Loop iterations per yielded chunk
+        register_reuse: Access the innermost-loop invariant operand once per
+                        execution of the innermost loop
+        layout: Optional matrix_layout (default: packed)
+
+    Yields:
+        (addresses, matrix_ids) int64/int8 arrays of equal length
+    """
+    if loop_order not in LOOP_ORDERS:
+        raise ValueError(f"Unknown loop order {loop_order!r}, expected one of {LOOP_ORDERS}")
+
+    extents = {'i': M, 'j': N, 'k': K}
+    outer, middle, inner = loop_order
+    middle_inner = extents[middle] * extents[inner]
+    total_iterations = M * N * K
+
+    for first in range(0, total_iterations, chunk_iterations):
+        t = np.arange(first, min(first + chunk_iterations, total_iterations), dtype=np.int64)
+        index = {
+            outer: t // middle_inner,
+            middle: (t // extents[inner]) % extents[middle],
+            inner: t % extents[inner]
+        }
+        yield _iteration_addresses(index['i'], index['j'], index['k'], M, K, N, element_size,
+                                   loop_order if register_reuse else None, index[inner] == 0,
+                                   layout)
+
+
+def tiled_matrix_multiplication_trace(M: int, K: int, N: int,
+                                      tile_M: int, tile_K: int, tile_N: int,
+                                      element_size: int = 8,
+                                      tile_order: str = 'ijk', point_order: str = 'ijk',
+                                      chunk_iterations: int = DEFAULT_CHUNK_ITERATIONS,
+                                      register_reuse: bool = False,
+                                      layout: Optional[Tuple[Tuple[int, int], ...]] = None
+                                      ) -> Iterator[Tuple[np.ndarray, np.ndarray]]:
+    """
+    Generate the address trace of a tiled (blocked) C = A × B in chunks
+
+    Three tile loops step over (tile_M, tile_K, tile_N) blocks in tile_order,
+    and three point loops walk the elements of each tile in point_order. Edge
+    tiles are truncated at the matrix bounds.
+
+    Args:
+        M, K, N: Matrix dimensions
+        tile_M, tile_K, tile_N: Tile extent along i, k and j
+        element_size: Size of each element in bytes
+        tile_order: Order of the tile loops from outermost to innermost
+        point_order: Order of the loops inside a tile
+        chunk_iterations: Loop iterations (padded to whole tiles) per chunk
+        register_reuse: Access the operand invariant in the innermost point
+                        loop once per execution of that loop
+        layout: Optional matrix_layout (default: packed)
+
+    Yields:
+        (addresses, matrix_ids) int64/int8 arrays of equal length
+    """
+    for order in (tile_order, point_order):
+        if order not in LOOP_ORDERS:
+            raise ValueError(f"Unknown loop order {order!r}, expected one of {LOOP_ORDERS}")
+
+    extents = {'i': M, 'j': N, 'k': K}
+    tiles = {'i': min(tile_M, M), 'j': min(tile_N, N), 'k': min(tile_K, K)}
+    # Mixed-radix digits from the innermost loop outwards
+    radices = ([(index, 'point', tiles[index]) for index in reversed(point_order)] +
+               [(index, 'tile', -(-extents[index] // tiles[index])) for index in reversed(tile_order)])
+    total_iterations = int(np.prod([radix for _, _, radix in radices]))
+
+    for first in range(0, total_iterations, chunk_iterations):
+        t = np.arange(first, min(first + chunk_iterations, total_iterations), dtype=np.int64)
+        index = {'i': 0, 'j': 0, 'k': 0}
+        innermost_first = t % radices[0][2] == 0
+        for name, kind, radix in radices:
+            digit = t % radix
+            t = t // radix
+            index[name] = index[name] + (digit * tiles[name] if kind == 'tile' else digit)
+
+        inside = (index['i'] < M) & (index['j'] < N) & (index['k'] < K)
+        if not inside.all():
+            index = {name: value[inside] for name, value in index.items()}
+            innermost_first = innermost_first[inside]
+        if index['i'].size:
+            yield _iteration_addresses(index['i'], index['j'], index['k'], M, K, N, element_size,
+                                       point_order if register_reuse else None, innermost_first,
+                                       layout)
+
+
+def sampled_matrix_multiplication_trace(M: int, K: int, N: int, block_size: int,
+                                        keep_blocks: Callable[[np.ndarray], np.ndarray],
+                                        element_size: int = 8, loop_order: str = 'ijk',
+                                        chunk_accesses: int = 3 * DEFAULT_CHUNK_ITERATIONS,
+                                        register_reuse: bool = False
+                                        ) -> Iterator[Tuple[np.ndarray, np.ndarray]]:
+    """
+    The accesses of matrix_multiplication_trace that fall into selected blocks
+
+    Generated from the selected blocks instead of by filtering the full
+    trace: every element of a selected block is accessed once per value of
+    the loop index that does not address it, so the accesses are laid out
+    directly at their trace positions and merged. The cost is proportional
+    to the selected accesses, not to M*N*K. Chunks cover ranges of the
+    outermost loop, so memory stays bounded.
+
+    Args:
+        M, K, N: Matrix dimensions
+        block_size: Block size in bytes
+        keep_blocks: Maps an array of block numbers to a boolean keep mask
+        element_size: Size of each element in bytes
+        loop_order: Loop nest order from outermost to innermost
+        chunk_accesses: Approximate accesses per yielded chunk
+        register_reuse: Access the innermost-loop invariant operand once per
+                        execution of the innermost loop
+
+    Yields:
+        (addresses, matrix_ids) int64/int8 arrays of equal length, in trace order
+    """
+    if loop_order not in LOOP_ORDERS:
+        raise ValueError(f"Unknown loop order {loop_order!r}, expected one of {LOOP_ORDERS}")
+
+    extents = {'i': M, 'j': N, 'k': K}
+    outer, middle, inner = loop_order
+    strides = {inner: 1, middle: extents[inner], outer: extents[middle] * extents[inner]}
+    # (row index, column index, index the element does not depend on, base address)
+    layout = [('i', 'k', 'j', 0),
+              ('k', 'j', 'i', M * K * element_size),
+              ('i', 'j', 'k', (M * K + K * N) * element_size)]
+
+    operands = []
+    total = 0
+    for matrix_id, (row, column, free, base) in enumerate(layout):
+        count = extents[row] * extents[column]
+        blocks = np.arange(base // block_size, (base + count * element_size - 1) // block_size + 1,
+                           dtype=np.int64)
+        blocks = blocks[keep_blocks(blocks)]
+        # Elements whose first byte lies in a kept block
+        first = np.clip(-((base - blocks * block_size) // element_size), 0, count)
+        last = np.clip(-((base - (blocks + 1) * block_size) // element_size), 0, count)
+        lengths = last - first
+        offsets = np.arange(lengths.sum(), dtype=np.int64) - np.repeat(np.cumsum(lengths) - lengths, lengths)
+        elements = np.repeat(first, lengths) + offsets
+
+        index = {row: elements // extents[column], column: elements % extents[column]}
+        if register_reuse and matrix_id == invariant_operand(loop_order):
+            free_values = np.zeros(1, dtype=np.int64)
+        else:
+            free_values = np.arange(extents[free], dtype=np.int64)
+        # Sort by outer index so each chunk is a contiguous slice of elements
+        outer_index = index[outer] if free != outer else np.zeros(elements.size, dtype=np.int64)
+        by_outer = np.argsort(outer_index, kind='stable')
+        operands.append({
+            'matrix_id': matrix_id,
+            'free': free,
+            'free_values': free_values,
+            'outer_index': outer_index[by_outer],
+            'start': (index[row] * strides[row] + index[column] * strides[column])[by_outer],
+            'addresses': (base + elements * element_size)[by_outer]
+        })
+        total += elements.size * free_values.size
+
+    step = max(1, int(extents[outer] * chunk_accesses // max(total, 1)))
+    for first_outer in range(0, extents[outer], step):
+        last_outer = min(first_outer + step, extents[outer])
+        keys = []
+        addresses = []
+        matrix_ids = []
+        for operand in operands:
+            if operand['free'] == outer:
+                free_values = operand['free_values']
+                free_values = free_values[(free_values >= first_outer) & (free_values < last_outer)]
+                chosen = slice(None)
+            else:
+                free_values = operand['free_values']
+                chosen = slice(np.searchsorted(operand['outer_index'], first_outer),
+                               np.searchsorted(operand['outer_index'], last_outer))
+            start = operand['start'][chosen]
+            if start.size == 0 or free_values.size == 0:
+                continue
+            times = start[:, None] + free_values[None, :] * strides[operand['free']]
+            # Within an iteration the trace accesses A, B, C in that order
+            keys.append((times * 3 + operand['matrix_id']).ravel())
+            addresses.append(np.repeat(operand['addresses'][chosen], free_values.size))
+            matrix_ids.append(np.full(times.size, operand['matrix_id'], dtype=np.int8))
+        if not keys:
+            continue
+        keys = np.concatenate(keys)
+        order = np.argsort(keys, kind='stable')
+        yield np.concatenate(addresses)[order], np.concatenate(matrix_ids)[order]
+
+
+def _iteration_addresses(i: np.ndarray, j: np.ndarray, k: np.ndarray,
+                         M: int, K: int, N: int, element_size: int,
+                         register_order: Optional[str] = None,
+                         innermost_first: Optional[np.ndarray] = None,
+                         layout: Optional[Tuple[Tuple[int, int], ...]] = None
+                         ) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Interleaved A[i][k], B[k][j], C[i][j] addresses of a batch of iterations
+
+    With register_order set, the operand invariant in its innermost loop is
+    kept only where innermost_first is True.
+    """
+    if layout is None:
+        layout = matrix_layout(M, K, N, element_size)
+    (A_start, A_ld), (B_start, B_ld), (C_start, C_ld) = layout
+
+    addresses = np.empty((i.size, 3), dtype=np.int64)
+    addresses[:, MATRIX_A] = A_start + (i * A_ld + k) * element_size
+    addresses[:, MATRIX_B] = B_start + (k * B_ld + j) * element_size
+    addresses[:, MATRIX_C] = C_start + (i * C_ld + j) * element_size
+    matrix_ids = np.tile(np.array([MATRIX_A, MATRIX_B, MATRIX_C], dtype=np.int8), i.size)
+
+    if register_order is None:
+        return addresses.ravel(), matrix_ids
+    keep = np.ones((i.size, 3), dtype=bool)
+    keep[:, invariant_operand(register_order)] = innermost_first
+    keep = keep.ravel()
+    return addresses.ravel()[keep], matrix_ids[keep]
+
+
+def gemm_trace(M: int, K: int, N: int, element_size: int = 8, loop_order: str = 'ijk',
+               chunk_iterations: int = DEFAULT_CHUNK_ITERATIONS,
+               tiles: Optional[Tuple[int, int, int]] = None,
+               register_reuse: bool = False,
+               layout: Optional[Tuple[Tuple[int, int], ...]] = None
+               ) -> Iterator[Tuple[np.ndarray, np.ndarray]]:
+    """Plain trace, or the tiled trace with loop_order for tile and point loops"""
+    if tiles is None:
+        return matrix_multiplication_trace(M, K, N, element_size, loop_order, chunk_iterations,
+                                           register_reuse, layout)
+    tile_M, tile_K, tile_N = tiles
+    return tiled_matrix_multiplication_trace(M, K, N, tile_M, tile_K, tile_N, element_size,
+                                             loop_order, loop_order, chunk_iterations,
+                                             register_reuse, layout)
+
+
+def simulate_matrix_multiplication(num_sets: int, block_size: int, associativity: int,
+                                   M: int, K: int, N: int, element_size: int = 8,
+                                   loop_order: str = 'ijk',
+                                   chunk_iterations: int = DEFAULT_CHUNK_ITERATIONS,
+                                   tiles: Optional[Tuple[int, int, int]] = None,
+                                   register_reuse: bool = False,
+                                   policy: str = 'lru',
+                                   prefetcher: Optional[str] = None,
+                                   layout: Optional[Tuple[Tuple[int, int], ...]] = None) -> Dict:
+    """
+    Simulate C = A × B through a set-associative cache (LRU by default)
+
+    With a prefetcher, its requests (one PC per matrix) are simulated as
+    prefetch fills between the demand accesses; hits and misses still count
+    demand accesses only.
+
+    Args:
+        num_sets: Number of cache sets
+        block_size: Block size in bytes
+        associativity: Ways per set
+        M, K, N: Matrix dimensions
+        element_size: Size of each element in bytes
+        loop_order: Loop nest order from outermost to innermost; with tiles,
+                    the order of both the tile loops and the point loops
+        chunk_iterations: Loop iterations streamed per chunk
+        tiles: Optional (tile_M, tile_K, tile_N) to simulate the tiled loop nest
+        register_reuse: Keep the innermost-loop invariant operand in a register
+        policy: Replacement policy (replacement.REPLACEMENT_POLICIES)
+        prefetcher: Optional prefetcher model (prefetch.PREFETCHERS)
+        layout: Optional matrix_layout (default: packed)
+
+    Returns:
+        Dictionary with exact hit/miss counts, overall and per matrix, plus
+        the prefetcher's coverage, accuracy and traffic under 'prefetch'
+    """
+    cache = make_cache(num_sets, associativity, policy)
+    model = None if prefetcher is None else make_prefetcher(prefetcher, block_size)
+    accesses = np.zeros(len(MATRIX_NAMES), dtype=np.int64)
+    hits = np.zeros(len(MATRIX_NAMES), dtype=np.int64)
+    requests = 0
+    redundant = 0
+
+    for addresses, matrix_ids in gemm_trace(M, K, N, element_size, loop_order,
+                                            chunk_iterations, tiles, register_reuse, layout):
+        blocks = addresses // block_size
+        if model is None:
+            hit = cache.access(blocks)
+        else:
+            positions, requested = model.requests(addresses, matrix_ids)
+            merged, is_prefetch = merge_requests(blocks, positions, requested)
+            merged_hits, _ = cache.process(merged, np.where(is_prefetch, OP_PREFETCH, OP_ACCESS))
+            hit = merged_hits[~is_prefetch]
+            requests += requested.size
+            redundant += int(np.count_nonzero(merged_hits[is_prefetch]))
+        accesses += np.bincount(matrix_ids, minlength=len(MATRIX_NAMES))
+        hits += np.bincount(matrix_ids[hit], minlength=len(MATRIX_NAMES))
+
+    result = simulation_summary(accesses, hits, loop_order, tiles, register_reuse, policy)
+    if model is not None:
+        result['prefetch'] = prefetch_summary(prefetcher, requests, redundant,
+                                              cache.prefetch_stats(), result['misses'], block_size)
+    return result
+
+
+def simulation_summary(accesses: np.ndarray, hits: np.ndarray, loop_order: str,
+                       tiles: Optional[Tuple[int, int, int]], register_reuse: bool,
+                       policy: str = 'lru') -> Dict:
+    """Result dictionary of a GEMM simulation from per-matrix access and hit counts"""
+    per_matrix = {}
+    for matrix_id, name in enumerate(MATRIX_NAMES):
+        matrix_accesses = int(accesses[matrix_id])
+        matrix_misses = matrix_accesses - int(hits[matrix_id])
+        per_matrix[name] = {
+            'accesses': matrix_accesses,
+            'hits': int(hits[matrix_id]),
+            'misses': matrix_misses,
+            'miss_rate': matrix_misses / matrix_accesses if matrix_accesses else 0.0
+        }
+
+    total_accesses = int(accesses.sum())
+    total_hits = int(hits.sum())
+    return {
+        'loop_order': loop_order,
+        'tiles': tiles,
+        'register_reuse': register_reuse,
+        'policy': policy,
+        'total_accesses': total_accesses,
+        'hits': total_hits,
+        'misses': total_accesses - total_hits,
+        'miss_rate': (total_accesses - total_hits) / total_accesses if total_accesses else 0.0,
+        'per_matrix': per_matrix
+    }
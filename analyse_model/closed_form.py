@@ -0,0 +1,129 @@
+#!/usr/bin/env python3
+"""
+Closed-Form Miss Model as Symbolic Expressions
+
+The formulas of analytical_model_summary.txt, written once over the symbols
+C, b, assoc, M, K, N, E and compiled into a single vectorized NumPy function
+(symbolic.py). Every parameter may be an array; arrays broadcast, so a
+design-space sweep of any size is one call:
+
+    T_access = 3 M K N
+    M_comp   = ceil(M K E / b) + ceil(K N E / b) + ceil(M N E / b)
+    M_cap    = (M_comp - C/b) min(M, N, K)   if M_comp > C/b and 3 M N K E > C
+               0                             otherwise
+    MR       = (M_comp + M_cap + M_conf) / T_access
+
+M_conf depends on the set mapping and is not closed form; it is an optional
+input (CacheMissModel.analyze_batch computes it for many shapes). The
+compulsory and capacity terms match CacheMissModel exactly, and derivatives
+of every output with respect to any parameter can be compiled alongside.
+"""
+
+from typing import Dict, Sequence, Tuple
+
+import numpy as np
+
+import symbolic
+from symbolic import Expr, ceil, floor, greater, logical_and, maximum, minimum, symbol, where
+
+PARAMETERS = ('C', 'b', 'assoc', 'M', 'K', 'N', 'E', 'M_conf')
+
+# Compiled functions by requested derivative parameters, shared by all models
+_COMPILED = {}
+
+
+def closed_form_expressions() -> Dict[str, Expr]:
+    """The model's outputs as expressions over PARAMETERS"""
+    C, b, assoc, M, K, N, E, M_conf = (symbol(name) for name in PARAMETERS)
+
+    total_blocks = floor(C / b)
+    compulsory = ceil(M * K * E / b) + ceil(K * N * E / b) + ceil(M * N * E / b)
+    overflowing = logical_and(greater(compulsory, total_blocks), greater(3 * M * N * K * E, C))
+    capacity = where(overflowing,
+                     maximum(compulsory - total_blocks, 0) * minimum(minimum(M, N), K), 0)
+    total_accesses = 3 * M * K * N
+    total_misses = compulsory + capacity + M_conf
+
+    return {
+        'num_sets': floor(total_blocks / assoc),
+        'total_accesses': total_accesses,
+        'compulsory_misses': compulsory,
+        'capacity_misses': capacity,
+        'total_misses': total_misses,
+        'overall_miss_rate': total_misses / total_accesses,
+        'working_set_ratio': (M * K + K * N + M * N) * E / C
+    }
+
+
+class ClosedFormModel:
+    """
+    Vectorized evaluation of the closed-form model, compiled once
+    """
+
+    def __init__(self, derivatives: Sequence[str] = ()):
+        """
+        Args:
+            derivatives: Parameters to differentiate every output by
+                         (e.g. ('C', 'M')); empty for values only
+        """
+        unknown = set(derivatives) - set(PARAMETERS)
+        if unknown:
+            raise ValueError(f"Unknown parameters {sorted(unknown)}, expected some of {PARAMETERS}")
+        self.derivatives = tuple(derivatives)
+        self.outputs = closed_form_expressions()
+        if self.derivatives not in _COMPILED:
+            expressions = dict(self.outputs)
+            for output, expr in self.outputs.items():
+                for name, derivative in symbolic.gradient(expr, self.derivatives).items():
+                    expressions[_derivative_key(output, name)] = derivative
+            _COMPILED[self.derivatives] = symbolic.compile_expressions(expressions, PARAMETERS)
+        self._function = _COMPILED[self.derivatives]
+
+    def evaluate(self, C, b, assoc, M, K, N, E=8, conflict_misses=0) -> Dict:
+        """
+        Evaluate every output over broadcast parameter arrays
+
+        Args:
+            C: Cache size in bytes
+            b: Block size in bytes
+            assoc: Associativity
+            M, K, N: Matrix dimensions
+            E: Element size in bytes
+            conflict_misses: Conflict misses to add (M_conf), default 0
+
+        Returns:
+            {output: array} plus, when derivatives were requested,
+            'derivatives': {output: {parameter: array}}
+        """
+        values = self._function(C, b, assoc, M, K, N, E, conflict_misses)
+        result = {output: values[output] for output in self.outputs}
+        if self.derivatives:
+            result['derivatives'] = {
+                output: {name: values[_derivative_key(output, name)] for name in self.derivatives}
+                for output in self.outputs
+            }
+        return result
+
+    def source(self) -> str:
+        """Generated NumPy source of the compiled function"""
+        return self._function.source
+
+
+def sweep_grid(**axes) -> Tuple[Dict[str, np.ndarray], Tuple[int, ...]]:
+    """
+    Cartesian product of parameter axes as flat arrays
+
+    Args:
+        **axes: {parameter: sequence of values}
+
+    Returns:
+        ({parameter: flat array}, grid shape)
+    """
+    names = list(axes)
+    grids = np.meshgrid(*(np.asarray(axes[name], dtype=np.float64) for name in names),
+                        indexing='ij')
+    return {name: grid.ravel() for name, grid in zip(names, grids)}, grids[0].shape
+
+
+def _derivative_key(output: str, parameter: str) -> str:
+    return f"d_{output}_d_{parameter}"
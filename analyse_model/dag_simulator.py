@@ -0,0 +1,280 @@
+#!/usr/bin/env python3
+"""
+Discrete-Event Simulation of Execution Graphs
+
+Runs one step of an ExecutionGraph on modelled GPUs and reports its
+latency, throughput, per-GPU utilization and critical path. Every GPU has
+three resources: its compute stream, its egress link and its ingress link.
+An op holds its resources from start to finish:
+
+- compute (and split/gather ops with a FLOP expression): the compute stream
+  of every GPU it is placed on, for a roofline time
+  max(flops / (peak_flops * compute_efficiency), bytes / memory_bandwidth)
+  plus kernel_overhead, where bytes are the op's output bytes
+- send: the sender's egress and the receiver's ingress, for
+  link_latency + bytes / bandwidth
+- all_reduce: egress and ingress of the whole group, for a ring all-reduce,
+  2 (n-1) link_latency + 2 (n-1)/n bytes / bandwidth
+- all_to_all: egress and ingress of the whole group, for
+  (n-1) link_latency + (n-1)/n bytes / bandwidth
+- recv, input and output ops take no time; the recv completes when its send
+  does. Split and gather ops without FLOPs only reshape or route data; with
+  host_bandwidth, those next to a host op also copy their tensor over PCIe
+  on the compute streams of their GPUs
+
+Bandwidth is the NVLink bandwidth when all GPUs involved share a node
+(gpus_per_node consecutive ids) and the inter-node bandwidth otherwise.
+Transfers from and to the host are free unless host_bandwidth is given,
+since step latency is usually measured on device.
+
+Ops are started in the order they become ready (all predecessors done),
+each at the later of its ready time and the time its resources come free.
+Weight reads are not modelled: the graph only carries output shapes, so
+small-batch layers that are bound by reading their weights come out too fast.
+"""
+
+import heapq
+from typing import Dict, List, Optional, Union
+
+import numpy as np
+
+from execution_graph import (ALL_REDUCE, ALL_TO_ALL, COMPUTE, GATHER, HOST, OP_KINDS, SEND, SPLIT,
+                             ExecutionGraph, placement_text)
+
+# One H100 SXM in an NVLink/NVSwitch node of 8, nodes joined by 400 Gb/s per GPU
+H100 = {
+    'name': 'H100 SXM',
+    'peak_flops': 989e12,             # dense FP16/BF16 tensor-core FLOP/s
+    'compute_efficiency': 0.7,        # fraction of the peak large GEMMs reach
+    'memory_bandwidth': 3.35e12,      # HBM3 bytes/s
+    'kernel_overhead': 3e-6,          # seconds per compute op
+    'gpus_per_node': 8,
+    'nvlink_bandwidth': 450e9,        # bytes/s per direction
+    'nvlink_latency': 3e-6,
+    'internode_bandwidth': 50e9,      # bytes/s per GPU per direction
+    'internode_latency': 10e-6,
+    'host_bandwidth': None,           # bytes/s over PCIe; None: host transfers are free
+}
+
+RESOURCES = ('compute', 'egress', 'ingress')
+
+
+def kernel_seconds(flops: np.ndarray, nbytes: np.ndarray, hardware: Dict) -> np.ndarray:
+    """Roofline time of compute ops with the given FLOPs and output bytes, plus the launch overhead"""
+    return (np.maximum(flops / (hardware['peak_flops'] * hardware['compute_efficiency']),
+                       nbytes / hardware['memory_bandwidth'])
+            + hardware['kernel_overhead'])
+
+
+def transfer_seconds(kind: np.ndarray, nbytes: np.ndarray, n: np.ndarray, remote: np.ndarray,
+                     hardware: Dict) -> np.ndarray:
+    """
+    Time of sends and collectives (0 for other kinds)
+
+    Args:
+        kind: Op kinds
+        nbytes: Bytes of each op's tensor
+        n: GPUs in each op's group
+        remote: Whether each op crosses nodes
+        hardware: Hardware description (keys of H100)
+    """
+    kind, nbytes, n, remote = np.broadcast_arrays(kind, nbytes, n, remote)
+    bandwidth = np.where(remote, hardware['internode_bandwidth'], hardware['nvlink_bandwidth'])
+    latency = np.where(remote, hardware['internode_latency'], hardware['nvlink_latency'])
+    seconds = np.zeros(kind.shape)
+    sends = kind == SEND
+    seconds[sends] = (latency + nbytes / bandwidth)[sends]
+    reduces = kind == ALL_REDUCE
+    seconds[reduces] = (2 * (n - 1) * latency + 2 * (n - 1) / n * nbytes / bandwidth)[reduces]
+    exchanges = kind == ALL_TO_ALL
+    seconds[exchanges] = ((n - 1) * latency + (n - 1) / n * nbytes / bandwidth)[exchanges]
+    return seconds
+
+
+def op_durations(graph: ExecutionGraph, hardware: Dict, dims: Optional[Dict[str, float]] = None) -> np.ndarray:
+    """
+    Seconds every op holds its resources
+
+    Args:
+        graph: Graph to time
+        hardware: Hardware description (keys of H100)
+        dims: Overrides of the graph's dims
+
+    Returns:
+        Array of op durations
+    """
+    kind = graph.ops['kind']
+    device, peer, group = graph.ops['device'], graph.ops['peer'], graph.ops['group']
+    flops = graph.flops(dims)
+    nbytes = graph.tensor_bytes(dims)
+    per_node = hardware['gpus_per_node']
+
+    # Group size and whether the group spans nodes, per interned group
+    sizes = np.array([len(members) for members in graph.groups.values] + [1])
+    spans = np.array([members[0] // per_node != members[-1] // per_node
+                      for members in graph.groups.values] + [False])
+    remote = np.where(kind == SEND, device // per_node != peer // per_node, spans[group])
+
+    durations = transfer_seconds(kind, nbytes, sizes[group], remote, hardware)
+    computing = (kind == COMPUTE) | (np.isin(kind, (SPLIT, GATHER)) & (flops > 0))
+    durations[computing] = kernel_seconds(flops, nbytes, hardware)[computing]
+
+    if hardware.get('host_bandwidth'):
+        # Split from and gather to the host move the whole tensor over PCIe
+        on_host = (device == HOST) & (group < 0)
+        src, dst = graph.edges['src'], graph.edges['dst']
+        host_adjacent = np.zeros(graph.num_ops, dtype=bool)
+        host_adjacent[dst[on_host[src]]] = True
+        host_adjacent[src[on_host[dst]]] = True
+        transfers = np.isin(kind, (SPLIT, GATHER)) & host_adjacent & (group >= 0)
+        durations[transfers] += (nbytes / hardware['host_bandwidth'])[transfers]
+    return durations
+
+
+def _op_resources(graph: ExecutionGraph, op: int, kind: int, duration: float, gpu_index: Dict[int, int],
+                  num_gpus: int) -> List[int]:
+    """Resource ids an op holds: compute g, egress num_gpus + g, ingress 2 num_gpus + g"""
+    if kind == SEND:
+        return [num_gpus + gpu_index[int(graph.ops['device'][op])],
+                2 * num_gpus + gpu_index[int(graph.ops['peer'][op])]]
+    if duration <= 0:
+        return []
+    gpus = [gpu_index[gpu] for gpu in graph.placement(op)]
+    if kind in (ALL_REDUCE, ALL_TO_ALL):
+        return [num_gpus + g for g in gpus] + [2 * num_gpus + g for g in gpus]
+    return gpus
+
+
+def simulate_graph(graph: ExecutionGraph, hardware: Optional[Dict] = None,
+                   dims: Optional[Dict[str, float]] = None,
+                   tokens: Union[str, float] = 'B*L', critical_path_ops: int = 20) -> Dict:
+    """
+    Simulate one step of a plan
+
+    Args:
+        graph: Plan to run
+        hardware: Overrides of H100
+        dims: Overrides of the graph's dims
+        tokens: Tokens one step processes (number or expression over dims)
+        critical_path_ops: Longest critical-path ops to list
+
+    Returns:
+        Dictionary with latency, tokens per second for one step and in a
+        steady-state pipeline (bounded by the busiest resource), per-GPU
+        utilization of every resource, the critical path and the op start
+        and finish times
+    """
+    hardware = {**H100, **(hardware or {})}
+    durations = op_durations(graph, hardware, dims)
+    kinds = graph.ops['kind'].tolist()
+    gpus = graph.devices().tolist()
+    gpu_index = {gpu: index for index, gpu in enumerate(gpus)}
+    num_gpus = len(gpus)
+
+    indptr, successors, _ = graph.adjacency()
+    indptr, successors = indptr.tolist(), successors.tolist()
+    remaining = np.bincount(graph.edges['dst'], minlength=graph.num_ops).tolist()
+    duration_list = durations.tolist()
+    ready = [0.0] * graph.num_ops
+    start = [0.0] * graph.num_ops
+    finish = [0.0] * graph.num_ops
+    blocker = [-1] * graph.num_ops        # op whose finish set the start
+    resource_bound = [False] * graph.num_ops
+    free = [0.0] * (3 * num_gpus)
+    holder = [-1] * (3 * num_gpus)
+    busy = [0.0] * (3 * num_gpus)
+    resource_cache = {}
+
+    heap = [(0.0, op) for op in range(graph.num_ops) if remaining[op] == 0]
+    heapq.heapify(heap)
+    scheduled = 0
+    while heap:
+        time, op = heapq.heappop(heap)
+        scheduled += 1
+        kind, duration = kinds[op], duration_list[op]
+        key = (kind, int(graph.ops['device'][op]), int(graph.ops['group'][op]), int(graph.ops['peer'][op]),
+               duration > 0)
+        resources = resource_cache.get(key)
+        if resources is None:
+            resources = resource_cache[key] = _op_resources(graph, op, kind, duration, gpu_index, num_gpus)
+        for resource in resources:
+            if free[resource] > time:
+                time = free[resource]
+                blocker[op] = holder[resource]
+                resource_bound[op] = True
+        start[op] = time
+        done = finish[op] = time + duration
+        for resource in resources:
+            free[resource] = done
+            holder[resource] = op
+            busy[resource] += duration
+        for successor in successors[indptr[op]:indptr[op + 1]]:
+            if done >= ready[successor]:
+                ready[successor] = done
+                blocker[successor] = op
+            remaining[successor] -= 1
+            if remaining[successor] == 0:
+                heapq.heappush(heap, (ready[successor], successor))
+    if scheduled < graph.num_ops:
+        raise ValueError(f"Graph {graph.name!r} has a cycle through {graph.num_ops - scheduled} ops")
+
+    start, finish = np.array(start), np.array(finish)
+    latency = float(finish.max()) if graph.num_ops else 0.0
+    busy = np.array(busy).reshape(len(RESOURCES), num_gpus)
+    step_tokens = graph.evaluate(tokens, dims)
+    bottleneck = np.unravel_index(np.argmax(busy), busy.shape) if num_gpus else None
+
+    # Walk back from the last op to finish along the ops that set each start
+    path = []
+    op = int(np.argmax(finish)) if graph.num_ops else -1
+    while op >= 0:
+        path.append(op)
+        op = blocker[op]
+    path.reverse()
+    path_durations = durations[path]
+    by_kind = {}
+    for op, duration in zip(path, path_durations):
+        by_kind[OP_KINDS[kinds[op]]] = by_kind.get(OP_KINDS[kinds[op]], 0.0) + float(duration)
+    longest = sorted(range(len(path)), key=lambda position: -path_durations[position])[:critical_path_ops]
+
+    return {
+        'plan': graph.name,
+        'hardware': hardware['name'],
+        'latency_s': latency,
+        'tokens': step_tokens,
+        'tokens_per_s': step_tokens / latency if latency else float('inf'),
+        'steady_state_tokens_per_s': step_tokens / busy.max() if num_gpus and busy.max() else float('inf'),
+        'bottleneck': (f"GPU {gpus[bottleneck[1]]} {RESOURCES[bottleneck[0]]}" if bottleneck else None),
+        'gpus': gpus,
+        'utilization': {resource: busy[position] / latency if latency else busy[position]
+                        for position, resource in enumerate(RESOURCES)},
+        'mean_compute_utilization': float(busy[0].mean() / latency) if latency and num_gpus else 0.0,
+        'critical_path': {
+            'ops': len(path),
+            'time_by_kind_s': by_kind,
+            'resource_waits': int(sum(resource_bound[op] for op in path)),
+            'longest': [{'op': path[position], 'label': graph.format_label(path[position]),
+                         'kind': OP_KINDS[kinds[path[position]]],
+                         'placement': placement_text(graph, path[position]),
+                         'start_s': float(start[path[position]]),
+                         'duration_s': float(path_durations[position])}
+                        for position in sorted(longest)]
+        },
+        'start_s': start,
+        'finish_s': finish
+    }
+
+
+def compare_plans(plans: Dict[str, ExecutionGraph], hardware: Optional[Dict] = None,
+                  dims: Optional[Dict[str, float]] = None, tokens: Union[str, float] = 'B*L') -> Dict:
+    """
+    Simulate several plans of the same model on the same hardware
+
+    Returns:
+        Dictionary with each plan's simulation and its speedup over the first plan
+    """
+    results = {name: simulate_graph(graph, hardware, dims, tokens) for name, graph in plans.items()}
+    reference = next(iter(results.values()))['latency_s'] if results else 0.0
+    for result in results.values():
+        result['speedup'] = reference / result['latency_s'] if result['latency_s'] else float('inf')
+    return results
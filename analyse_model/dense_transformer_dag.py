@@ -1,119 +1,171 @@
-import graphviz
-
-# Create the DAG for Dense Transformer with Ring Attention + Sequence Parallelism
-dot = graphviz.Digraph(comment='Dense Transformer - Ring Attention + Sequence Parallelism', format='svg')
-dot.attr(rankdir='TB', size='20,20')
-
-# Define node styles
-dot.attr('node', shape='rectangle', style='filled', fillcolor='lightblue')
-dot.attr('edge', fontsize='10')
-
-# Define 4 GPUs for sequence parallelism and ring attention
-P = 4
-
-# Input layer - split across GPUs via sequence parallelism
-dot.node('input_total', 'Input\n(B, L, d_model)', shape='ellipse', fillcolor='lightgreen')
-
-# Split input across sequence dimension
-dot.node('split', 'Split Sequence\n(B, L/P, d_model)', shape='parallelogram', fillcolor='yellow')
-dot.edge('input_total', 'split')
-
-# Each GPU processes its sequence segment
-for p in range(P):
-    gpu_id = f'GPU_{p}'
-    
-    # Input for this GPU
-    dot.node(f'input_{p}', f'Input Segment {p}\n(B, L/{P}, d_model)\n{gpu_id}', fillcolor='lightcyan')
-    dot.edge('split', f'input_{p}')
-    
+import os
+
+import numpy as np
+
+from execution_graph import (COMPUTE, GATHER, INPUT, OUTPUT, RECV, SEND, SPLIT,
+                             ExecutionGraph, render_dot)
+from transformer_workload import gemm_flops, layer_gemm_expressions
+
+# Ops of a layer running the transformer_workload GEMMs, by label (the MLP
+# splits ffn_hidden_size in half)
+LAYER_GEMMS = {
+    'QKV Projection': ('qkv_projection',),
+    'Ring Attention Stage {index}\nQ{device} × K{peer} × V{peer}': ('attention_scores', 'attention_values'),
+    'Output Projection': ('output_projection',),
+    'MLP Column Parallel': ('ffn_linear1',),
+    'MLP Row Parallel': ('ffn_linear2',)
+}
+
+
+def add_sequence_parallel_attention(graph, P, buffers=2):
+    """
+    Split the input sequence over P GPUs and add the Ring Attention half of the layer
+
+    Each K,V block is forwarded as soon as it arrives, into a buffer the next
+    GPU has freed: with 2 buffers the transfer for stage s + 1 overlaps the
+    compute of stage s (see ring_attention.py)
+
+    Returns:
+        (gpus, ids of the per-GPU Layer Norm 1 ops)
+    """
+    gpus = np.arange(P)
+    segment = ('B', f'L/{P}', 'd_model')
+    tokens = f'B*L/{P}'
+    gemms = layer_gemm_expressions(P)
+
+    # Input layer - split across GPUs via sequence parallelism
+    input_total = graph.add_op(INPUT, 'Input', ('B', 'L', 'd_model'))
+
+    # Split input across sequence dimension
+    split = graph.add_op(SPLIT, 'Split Sequence', segment, group=range(P))
+    graph.add_edge(input_total, split)
+
+    # Each GPU processes its sequence segment
+    inputs = graph.add_ops(INPUT, 'Input Segment {device}', segment, device=gpus)
+    graph.add_edges(split, inputs)
+
     # Layer 1: Q, K, V projections (parallel across GPUs)
-    dot.node(f'qkv_proj_{p}', f'QKV Projection\n(B, L/{P}, d_model) -> (B, L/{P}, 3*d_model)\n{gpu_id}', fillcolor='lightblue')
-    dot.edge(f'input_{p}', f'qkv_proj_{p}')
-    
+    qkv_proj = graph.add_ops(COMPUTE, 'QKV Projection', ('B', f'L/{P}', '3*d_model'), device=gpus,
+                             flops=gemm_flops(gemms, 'qkv_projection'))
+    graph.add_edges(inputs, qkv_proj)
+
     # Split into Q, K, V
-    dot.node(f'split_qkv_{p}', f'Split QKV\n(B, L/{P}, d_model) each\n{gpu_id}', shape='parallelogram', fillcolor='yellow')
-    dot.edge(f'qkv_proj_{p}', f'split_qkv_{p}')
-    
-    # Ring Attention stages
+    split_qkv = graph.add_ops(SPLIT, 'Split QKV', ('3',) + segment, device=gpus)
+    graph.add_edges(qkv_proj, split_qkv)
+
+    # Ring Attention stages: at stage s GPU p holds the K,V block of GPU p - s,
+    # received from GPU p - 1, which forwards it as soon as it arrives there
+    kv_block = ('2',) + segment
+    holding = split_qkv
+    accum = None
+    attn_stages = []
     for stage in range(P):
-        src_idx = (p - stage) % P
-        
-        # Compute attention with current K,V block
-        dot.node(f'attn_stage_{p}_{stage}', 
-                f'Ring Attention Stage {stage}\nQ{p} × K{src_idx} × V{src_idx}\n(B, L/{P}, L/{P}) × (B, L/{P}, d_model)\n{gpu_id}', 
-                fillcolor='orange')
-        
-        if stage == 0:
-            dot.edge(f'split_qkv_{p}', f'attn_stage_{p}_{stage}')
-        else:
-            # Receive K,V from previous stage
-            prev_gpu = (p - 1) % P
-            dot.node(f'recv_kv_{p}_{stage}', 
-                    f'Receive K,V from GPU{prev_gpu}\n(B, L/{P}, d_model) each\n{gpu_id}', 
-                    shape='ellipse', fillcolor='lightgreen', style='dashed')
-            dot.edge(f'recv_kv_{p}_{stage}', f'attn_stage_{p}_{stage}')
-        
-        # Send K,V to next GPU
-        next_gpu = (p + 1) % P
-        dot.node(f'send_kv_{p}_{stage}', 
-                f'Send K,V to GPU{next_gpu}\n(B, L/{P}, d_model) each\n{gpu_id}', 
-                shape='ellipse', fillcolor='lightgreen', style='dashed')
-        dot.edge(f'split_qkv_{p}', f'send_kv_{p}_{stage}')
-        
+        attn_stage = graph.add_ops(COMPUTE, 'Ring Attention Stage {index}\nQ{device} × K{peer} × V{peer}',
+                                   ('B', f'L/{P}', 'd_model'), device=gpus, peer=(gpus - stage) % P,
+                                   index=stage, flops=gemm_flops(gemms, 'attention_scores', 'attention_values',
+                                                                 ops=P))
+        graph.add_edges(holding, attn_stage)
+        if stage > 0:
+            graph.add_edges(split_qkv, attn_stage)
+        attn_stages.append(attn_stage)
+
+        if stage < P - 1:
+            # Send K,V to next GPU, which receives it for the next stage
+            send_kv = graph.add_ops(SEND, 'Send K,V to GPU{peer}', kv_block, device=gpus,
+                                    peer=(gpus + 1) % P, index=stage)
+            graph.add_edges(holding, send_kv)
+            if stage + 1 >= buffers:
+                graph.add_edges(attn_stages[stage + 1 - buffers][(gpus + 1) % P], send_kv)
+            recv_kv = graph.add_ops(RECV, 'Receive K,V from GPU{peer}', kv_block, device=gpus,
+                                    peer=(gpus - 1) % P, index=stage + 1)
+            graph.add_edges(send_kv[(gpus - 1) % P], recv_kv)
+            holding = recv_kv
+
         # Accumulate attention results
         if stage == 0:
-            dot.node(f'accum_{p}_{stage}', f'Initialize Output\n(B, L/{P}, d_model)\n{gpu_id}', fillcolor='lightgray')
+            accum_next = graph.add_ops(COMPUTE, 'Initialize Output', segment, device=gpus, index=stage,
+                                       flops=f'{tokens}*d_model')
         else:
-            dot.node(f'accum_{p}_{stage}', f'Accumulate Output {stage}\n(B, L/{P}, d_model)\n{gpu_id}', fillcolor='lightgray')
-            dot.edge(f'accum_{p}_{stage-1}', f'accum_{p}_{stage}')
-        
-        dot.edge(f'attn_stage_{p}_{stage}', f'accum_{p}_{stage}')
-    
+            accum_next = graph.add_ops(COMPUTE, 'Accumulate Output {index}', segment, device=gpus,
+                                       index=stage, flops=f'4*{tokens}*d_model')
+            graph.add_edges(accum, accum_next)
+        graph.add_edges(attn_stage, accum_next)
+        accum = accum_next
+
     # Output projection after all ring stages
-    dot.node(f'output_proj_{p}', f'Output Projection\n(B, L/{P}, d_model) -> (B, L/{P}, d_model)\n{gpu_id}', fillcolor='lightblue')
-    dot.edge(f'accum_{p}_{P-1}', f'output_proj_{p}')
-    
+    output_proj = graph.add_ops(COMPUTE, 'Output Projection', segment, device=gpus,
+                                flops=gemm_flops(gemms, 'output_projection'))
+    graph.add_edges(accum, output_proj)
+
     # Residual connection
-    dot.node(f'residual_{p}', f'Residual Add\n(B, L/{P}, d_model)\n{gpu_id}', fillcolor='pink')
-    dot.edge(f'input_{p}', f'residual_{p}')
-    dot.edge(f'output_proj_{p}', f'residual_{p}')
-    
+    residual = graph.add_ops(COMPUTE, 'Residual Add', segment, device=gpus, flops=f'{tokens}*d_model')
+    graph.add_edges(inputs, residual)
+    graph.add_edges(output_proj, residual)
+
     # Layer Norm
-    dot.node(f'ln1_{p}', f'Layer Norm 1\n(B, L/{P}, d_model)\n{gpu_id}', fillcolor='lightyellow')
-    dot.edge(f'residual_{p}', f'ln1_{p}')
-    
-    # MLP - Column and Row parallel
-    dot.node(f'mlp_col_{p}', f'MLP Column Parallel\n(B, L/{P}, d_model) -> (B, L/{P}, ffn_hidden_size/2)\n{gpu_id}', fillcolor='lightcoral')
-    dot.edge(f'ln1_{p}', f'mlp_col_{p}')
-    
-    dot.node(f'mlp_activation_{p}', f'GELU Activation\n(B, L/{P}, ffn_hidden_size/2)\n{gpu_id}', fillcolor='lightgreen')
-    dot.edge(f'mlp_col_{p}', f'mlp_activation_{p}')
-    
-    dot.node(f'mlp_row_{p}', f'MLP Row Parallel\n(B, L/{P}, ffn_hidden_size/2) -> (B, L/{P}, d_model)\n{gpu_id}', fillcolor='lightcoral')
-    dot.edge(f'mlp_activation_{p}', f'mlp_row_{p}')
-    
-    # Second residual connection
-    dot.node(f'residual2_{p}', f'Residual Add 2\n(B, L/{P}, d_model)\n{gpu_id}', fillcolor='pink')
-    dot.edge(f'ln1_{p}', f'residual2_{p}')
-    dot.edge(f'mlp_row_{p}', f'residual2_{p}')
-    
+    ln1 = graph.add_ops(COMPUTE, 'Layer Norm 1', segment, device=gpus, flops=f'5*{tokens}*d_model')
+    graph.add_edges(residual, ln1)
+    return gpus, ln1
+
+
+def add_sequence_parallel_output(graph, P, residual2):
+    """Layer Norm 2 on every GPU, then gather the P output segments"""
+    gpus = np.arange(P)
+    segment = ('B', f'L/{P}', 'd_model')
+    tokens = f'B*L/{P}'
+
     # Layer Norm 2
-    dot.node(f'ln2_{p}', f'Layer Norm 2\n(B, L/{P}, d_model)\n{gpu_id}', fillcolor='lightyellow')
-    dot.edge(f'residual2_{p}', f'ln2_{p}')
-    
+    ln2 = graph.add_ops(COMPUTE, 'Layer Norm 2', segment, device=gpus, flops=f'5*{tokens}*d_model')
+    graph.add_edges(residual2, ln2)
+
     # Output for this GPU
-    dot.node(f'output_seg_{p}', f'Output Segment {p}\n(B, L/{P}, d_model)\n{gpu_id}', fillcolor='lightcyan')
-    dot.edge(f'ln2_{p}', f'output_seg_{p}')
+    output_seg = graph.add_ops(OUTPUT, 'Output Segment {device}', segment, device=gpus)
+    graph.add_edges(ln2, output_seg)
+
+    # Gather all segments back together
+    gather = graph.add_op(GATHER, 'Gather All Segments', ('B', 'L', 'd_model'), group=range(P))
+    graph.add_edges(output_seg, gather)
+
+    # Final output
+    output_total = graph.add_op(OUTPUT, 'Final Output', ('B', 'L', 'd_model'))
+    graph.add_edge(gather, output_total)
+
+
+def build_dense_transformer_graph(P=4, dims=None):
+    """Dense Transformer with Ring Attention + Sequence Parallelism over P GPUs"""
+    graph = ExecutionGraph('Dense Transformer - Ring Attention + Sequence Parallelism', dims)
+    gpus, ln1 = add_sequence_parallel_attention(graph, P)
+    segment = ('B', f'L/{P}', 'd_model')
+    tokens = f'B*L/{P}'
+    gemms = layer_gemm_expressions(P, ffn_dim='ffn_hidden_size/2')
+
+    # MLP - Column and Row parallel
+    hidden = ('B', f'L/{P}', 'ffn_hidden_size/2')
+    mlp_col = graph.add_ops(COMPUTE, 'MLP Column Parallel', hidden, device=gpus,
+                            flops=gemm_flops(gemms, 'ffn_linear1'))
+    graph.add_edges(ln1, mlp_col)
+
+    mlp_activation = graph.add_ops(COMPUTE, 'GELU Activation', hidden, device=gpus,
+                                   flops=f'{tokens}*ffn_hidden_size/2')
+    graph.add_edges(mlp_col, mlp_activation)
+
+    mlp_row = graph.add_ops(COMPUTE, 'MLP Row Parallel', segment, device=gpus,
+                            flops=gemm_flops(gemms, 'ffn_linear2'))
+    graph.add_edges(mlp_activation, mlp_row)
+
+    # Second residual connection
+    residual2 = graph.add_ops(COMPUTE, 'Residual Add 2', segment, device=gpus, flops=f'{tokens}*d_model')
+    graph.add_edges(ln1, residual2)
+    graph.add_edges(mlp_row, residual2)
 
-# Gather all segments back together
-dot.node('gather', 'Gather All Segments\n(B, L, d_model)', shape='parallelogram', fillcolor='yellow')
-for p in range(P):
-    dot.edge(f'output_seg_{p}', 'gather')
+    add_sequence_parallel_output(graph, P, residual2)
+    return graph
 
-# Final output
-dot.node('output_total', 'Final Output\n(B, L, d_model)', shape='ellipse', fillcolor='lightgreen')
-dot.edge('gather', 'output_total')
 
-# Save the DAG
-dot.render('/home/wzc/data/file-share/submission/dense_transformer_dag', format='svg', cleanup=False)
-print("Dense Transformer DAG saved to /home/wzc/data/file-share/submission/dense_transformer_dag.svg")
\ No newline at end of file
+if __name__ == '__main__':
+    # The rendered DAGs are checked in next to this script
+    output_dir = os.path.dirname(os.path.abspath(__file__))
+    # Save the DAG
+    render_dot(build_dense_transformer_graph(), os.path.join(output_dir, 'dense_transformer_dag'),
+               size='20,20')
+    print(f"Dense Transformer DAG saved to {os.path.join(output_dir, 'dense_transformer_dag.svg')}")
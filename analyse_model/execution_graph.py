@@ -0,0 +1,536 @@
+#!/usr/bin/env python3
+"""
+Typed Parallel-Execution Graph IR
+
+The deployment DAG scripts (dense_transformer_dag.py, moe_transformer_dag.py,
+submission_SP/*_dag.py, submission/*_moe_dags.py) describe which op runs on
+which GPU and what it sends where. ExecutionGraph holds that plan as data,
+so it can be analysed as well as drawn:
+
+- kind:      one of OP_KINDS: compute, send, recv, all_reduce, all_to_all,
+             split, gather, plus input and output for the tensors entering and
+             leaving the plan
+- label:     display template, formatted with the op's index, device, peer
+             and layer ('Ring Stage {index}\\nQ_{device} x K_{peer}')
+- shape:     output tensor shape, a tuple of ints or expressions over the
+             graph's dims ('B', 'L/16', 'd_model')
+- dtype:     element type (DTYPE_BYTES)
+- placement: one GPU (device), a group of GPUs (collectives and replicated
+             ops), or the host; send/recv and ring stages also carry a peer
+- flops:     optional FLOP expression over the dims
+
+Expressions are arithmetic over dim names and numbers (+, -, *, /, //, **
+and unary signs), parsed with ast; anything else, and a name missing from
+the dims, is a ValueError.
+
+Ops and edges are stored column-wise in NumPy arrays, about 40 bytes per op
+and 13 per edge. Labels, shapes, groups, clusters and expressions are
+interned, so a plan with millions of ops repeats a few hundred distinct
+values. add_ops and add_edges take arrays, so a generator adds a whole ring
+stage, all its GPUs at once. Adjacency is kept in CSR form and rebuilt
+after edges change.
+
+to_dot renders a graph with graphviz, one backend among others. Nodes are
+styled by kind, and clusters become nested subgraphs.
+"""
+
+import ast
+import operator
+from functools import lru_cache
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Tuple, Union
+
+import numpy as np
+
+OP_KINDS = ('compute', 'send', 'recv', 'all_reduce', 'all_to_all', 'split', 'gather',
+            'input', 'output')
+COMPUTE, SEND, RECV, ALL_REDUCE, ALL_TO_ALL, SPLIT, GATHER, INPUT, OUTPUT = range(len(OP_KINDS))
+COMMUNICATION_KINDS = (SEND, RECV, ALL_REDUCE, ALL_TO_ALL)
+
+EDGE_STYLES = ('data', 'routing')
+DATA, ROUTING = range(len(EDGE_STYLES))
+
+# Bytes per element of each dtype
+DTYPE_BYTES = {'fp32': 4, 'fp16': 2, 'bf16': 2, 'fp8': 1, 'int32': 4, 'int64': 8}
+
+# Device id of ops placed on the host (and of ops placed on a group)
+HOST = -1
+
+# Initial column capacity; columns double when full
+INITIAL_CAPACITY = 1024
+
+OP_COLUMNS = (
+    ('kind', np.int8), ('label', np.int32), ('shape', np.int32), ('dtype', np.int8),
+    ('device', np.int32), ('group', np.int32), ('peer', np.int32), ('index', np.int32),
+    ('layer', np.int32), ('cluster', np.int32), ('flops', np.int32)
+)
+EDGE_COLUMNS = (('src', np.int32), ('dst', np.int32), ('style', np.int8), ('label', np.int32))
+
+Shape = Tuple[Union[int, str], ...]
+
+
+class _Interned:
+    """Values stored once, referred to by a dense integer id"""
+
+    def __init__(self):
+        self.values: List[Any] = []
+        self.ids: Dict[Any, int] = {}
+
+    def __call__(self, value: Any) -> int:
+        found = self.ids.get(value)
+        if found is None:
+            found = self.ids[value] = len(self.values)
+            self.values.append(value)
+        return found
+
+    def __len__(self) -> int:
+        return len(self.values)
+
+
+class _Columns:
+    """Growable struct-of-arrays table"""
+
+    def __init__(self, columns: Sequence[Tuple[str, type]]):
+        self.size = 0
+        self.arrays = {name: np.empty(INITIAL_CAPACITY, dtype=dtype) for name, dtype in columns}
+
+    def append(self, count: int, values: Dict[str, Any]) -> np.ndarray:
+        """Append count rows; values are scalars or arrays of length count"""
+        start, stop = self.size, self.size + count
+        capacity = next(iter(self.arrays.values())).size
+        if stop > capacity:
+            capacity = max(stop, 2 * capacity)
+            for name, array in self.arrays.items():
+                grown = np.empty(capacity, dtype=array.dtype)
+                grown[:self.size] = array[:self.size]
+                self.arrays[name] = grown
+        for name, array in self.arrays.items():
+            array[start:stop] = values[name]
+        self.size = stop
+        return np.arange(start, stop, dtype=np.int64)
+
+    def __getitem__(self, name: str) -> np.ndarray:
+        return self.arrays[name][:self.size]
+
+    @property
+    def nbytes(self) -> int:
+        return sum(array[:self.size].nbytes for array in self.arrays.values())
+
+
+class ExecutionGraph:
+    """
+    Typed DAG of the ops of a parallel execution plan
+    """
+
+    def __init__(self, name: str, dims: Optional[Dict[str, float]] = None,
+                 dtype: str = 'fp16'):
+        """
+        Args:
+            name: Plan name
+            dims: Values of the symbols used in shapes and FLOP expressions
+                  (e.g. {'B': 1, 'L': 1024, 'd_model': 8192}); can be
+                  given later to evaluate
+            dtype: Default element type of the ops
+        """
+        if dtype not in DTYPE_BYTES:
+            raise ValueError(f"Unknown dtype {dtype!r}, expected one of {tuple(DTYPE_BYTES)}")
+        self.name = name
+        self.dims = dict(dims or {})
+        self.dtype = dtype
+        self.ops = _Columns(OP_COLUMNS)
+        self.edges = _Columns(EDGE_COLUMNS)
+        self.labels = _Interned()
+        self.shapes = _Interned()
+        self.dtypes = _Interned()
+        self.groups = _Interned()
+        self.clusters = _Interned()
+        self.expressions = _Interned()
+        self._adjacency = {}
+
+    @property
+    def num_ops(self) -> int:
+        return self.ops.size
+
+    @property
+    def num_edges(self) -> int:
+        return self.edges.size
+
+    def add_ops(self, kind: int, label: str, shape: Shape = (),
+                device: Union[int, np.ndarray] = HOST,
+                group: Optional[Iterable[int]] = None,
+                peer: Union[int, np.ndarray] = -1,
+                index: Union[int, np.ndarray] = -1,
+                layer: Union[int, np.ndarray] = -1,
+                cluster: Tuple[str, ...] = (),
+                flops: Union[str, Sequence[str], None] = None,
+                dtype: Optional[str] = None,
+                count: Optional[int] = None) -> np.ndarray:
+        """
+        Add ops that differ only in device, peer, index or layer
+
+        Args:
+            kind: One of COMPUTE, SEND, RECV, ALL_REDUCE, ALL_TO_ALL, SPLIT,
+                  GATHER, INPUT, OUTPUT
+            label: Display template (str.format fields index, device, peer, layer)
+            shape: Output tensor shape (ints or expressions over dims)
+            device: GPU of each op (HOST for the host or for group placement)
+            group: GPUs an op spans (collectives, replicated ops)
+            peer: Other GPU of each op (destination of a send, source of a
+                  recv, origin of a ring stage's K/V block)
+            index: Per-op number (ring stage, expert, ...)
+            layer: Model layer of each op
+            cluster: Nested display groups, outermost first
+            flops: FLOP expression over dims, one for all ops or one per op
+            dtype: Element type (default: the graph's)
+            count: Number of ops (default: the length of the array arguments, or 1)
+
+        Returns:
+            Ids of the new ops
+        """
+        if not 0 <= kind < len(OP_KINDS):
+            raise ValueError(f"Unknown op kind {kind!r}")
+        dtype = dtype or self.dtype
+        if dtype not in DTYPE_BYTES:
+            raise ValueError(f"Unknown dtype {dtype!r}, expected one of {tuple(DTYPE_BYTES)}")
+        if count is None:
+            count = max([np.size(value) for value in (device, peer, index, layer)
+                         if isinstance(value, np.ndarray)] or [1])
+        return self.ops.append(count, {
+            'kind': kind,
+            'label': self.labels(label),
+            'shape': self.shapes(tuple(shape)),
+            'dtype': self.dtypes(dtype),
+            'device': device,
+            'group': -1 if group is None else self.groups(tuple(sorted(group))),
+            'peer': peer,
+            'index': index,
+            'layer': layer,
+            'cluster': self.clusters(tuple(cluster)),
+            'flops': (-1 if flops is None else self.expressions(flops) if isinstance(flops, str)
+                      else np.array([self.expressions(expression) for expression in flops]))
+        })
+
+    def add_op(self, kind: int, label: str, shape: Shape = (), **options) -> int:
+        """Add one op (add_ops options) and return its id"""
+        return int(self.add_ops(kind, label, shape, count=1, **options)[0])
+
+    def add_edges(self, src: Union[int, np.ndarray], dst: Union[int, np.ndarray],
+                  style: int = DATA, label: Optional[str] = None) -> None:
+        """
+        Add edges src -> dst; scalars broadcast against arrays
+
+        Args:
+            src, dst: Op ids
+            style: DATA, or ROUTING for token routing that only some ops take
+            label: Optional edge label
+        """
+        src, dst = np.broadcast_arrays(np.asarray(src, dtype=np.int64),
+                                       np.asarray(dst, dtype=np.int64))
+        if src.size and (min(src.min(), dst.min()) < 0 or
+                         max(src.max(), dst.max()) >= self.num_ops):
+            raise ValueError("Edge endpoints must be existing ops")
+        self.edges.append(src.size, {
+            'src': src.ravel(),
+            'dst': dst.ravel(),
+            'style': style,
+            'label': -1 if label is None else self.labels(label)
+        })
+        self._adjacency = {}
+
+    def add_edge(self, src: int, dst: int, style: int = DATA, label: Optional[str] = None) -> None:
+        """Add one edge src -> dst"""
+        self.add_edges(src, dst, style, label)
+
+    def adjacency(self, reverse: bool = False) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """
+        CSR adjacency of the edges
+
+        Args:
+            reverse: Index by destination (predecessors) instead of source
+
+        Returns:
+            (indptr, neighbours, edge ids): the neighbours of op v are
+            neighbours[indptr[v]:indptr[v + 1]]
+        """
+        cached = self._adjacency.get(reverse)
+        if cached is not None:
+            return cached
+        keys, neighbours = ((self.edges['dst'], self.edges['src']) if reverse
+                            else (self.edges['src'], self.edges['dst']))
+        order = np.argsort(keys, kind='stable')
+        indptr = np.zeros(self.num_ops + 1, dtype=np.int64)
+        np.cumsum(np.bincount(keys, minlength=self.num_ops), out=indptr[1:])
+        cached = (indptr, neighbours[order], order)
+        self._adjacency[reverse] = cached
+        return cached
+
+    def successors(self, op: int) -> np.ndarray:
+        """Ops with an edge from op"""
+        indptr, neighbours, _ = self.adjacency()
+        return neighbours[indptr[op]:indptr[op + 1]]
+
+    def predecessors(self, op: int) -> np.ndarray:
+        """Ops with an edge to op"""
+        indptr, neighbours, _ = self.adjacency(reverse=True)
+        return neighbours[indptr[op]:indptr[op + 1]]
+
+    def topological_levels(self) -> np.ndarray:
+        """
+        Depth of every op: 0 for ops without predecessors, else one more than the deepest predecessor
+
+        The ops of one level are expanded together (Kahn's algorithm over
+        whole frontiers).
+
+        Raises:
+            ValueError: If the edges contain a cycle
+        """
+        indptr, neighbours, _ = self.adjacency()
+        remaining = np.bincount(self.edges['dst'], minlength=self.num_ops)
+        levels = np.full(self.num_ops, -1, dtype=np.int64)
+        frontier = np.flatnonzero(remaining == 0)
+        depth = 0
+        while frontier.size:
+            levels[frontier] = depth
+            starts, stops = indptr[frontier], indptr[frontier + 1]
+            lengths = stops - starts
+            positions = (np.repeat(starts - np.cumsum(lengths) + lengths, lengths)
+                         + np.arange(lengths.sum()))
+            candidates, counts = np.unique(neighbours[positions], return_counts=True)
+            remaining[candidates] -= counts
+            frontier = candidates[remaining[candidates] == 0]
+            depth += 1
+        if (levels < 0).any():
+            raise ValueError(f"Graph {self.name!r} has a cycle through "
+                             f"{int(np.count_nonzero(levels < 0))} ops")
+        return levels
+
+    def topological_order(self) -> np.ndarray:
+        """Op ids sorted by level (ties in insertion order)"""
+        return np.argsort(self.topological_levels(), kind='stable')
+
+    def evaluate(self, expression: Union[int, float, str], dims: Optional[Dict[str, float]] = None) -> float:
+        """Value of an expression over the dims (default: the graph's)"""
+        return evaluate_expression(expression, self._dims(dims))
+
+    def shape_elements(self, dims: Optional[Dict[str, float]] = None) -> np.ndarray:
+        """Elements of every op's output tensor under dims (default: the graph's)"""
+        dims = self._dims(dims)
+        table = np.array([np.prod([evaluate_expression(entry, dims) for entry in shape])
+                          for shape in self.shapes.values], dtype=np.float64)
+        return table[self.ops['shape']]
+
+    def tensor_bytes(self, dims: Optional[Dict[str, float]] = None) -> np.ndarray:
+        """Bytes of every op's output tensor under dims (default: the graph's)"""
+        sizes = np.array([DTYPE_BYTES[dtype] for dtype in self.dtypes.values], dtype=np.float64)
+        return self.shape_elements(dims) * sizes[self.ops['dtype']]
+
+    def flops(self, dims: Optional[Dict[str, float]] = None) -> np.ndarray:
+        """FLOPs of every op under dims (0 where no expression was given)"""
+        dims = self._dims(dims)
+        table = np.array([evaluate_expression(expression, dims) for expression in self.expressions.values]
+                         + [0.0], dtype=np.float64)
+        # Expression id -1 selects the trailing 0
+        return table[self.ops['flops']]
+
+    def placement(self, op: int) -> Tuple[int, ...]:
+        """GPUs op runs on; () for the host"""
+        group = int(self.ops['group'][op])
+        if group >= 0:
+            return self.groups.values[group]
+        device = int(self.ops['device'][op])
+        return () if device == HOST else (device,)
+
+    def devices(self) -> np.ndarray:
+        """Sorted ids of every GPU the plan places an op on"""
+        single = self.ops['device'][self.ops['device'] != HOST]
+        grouped = [device for group in np.unique(self.ops['group'][self.ops['group'] >= 0])
+                   for device in self.groups.values[group]]
+        return np.unique(np.concatenate((single, np.array(grouped, dtype=np.int32)))
+                         .astype(np.int64))
+
+    def op(self, op: int) -> Dict:
+        """All fields of one op, decoded"""
+        fields = {name: int(self.ops[name][op]) for name, _ in OP_COLUMNS}
+        return {
+            'id': op,
+            'kind': OP_KINDS[fields['kind']],
+            'label': self.format_label(op),
+            'shape': self.shapes.values[fields['shape']],
+            'dtype': self.dtypes.values[fields['dtype']],
+            'placement': self.placement(op),
+            'peer': fields['peer'],
+            'index': fields['index'],
+            'layer': fields['layer'],
+            'cluster': self.clusters.values[fields['cluster']],
+            'flops': None if fields['flops'] < 0 else self.expressions.values[fields['flops']]
+        }
+
+    def format_label(self, op: int) -> str:
+        """The op's label template with its index, device, peer and layer filled in"""
+        return self.labels.values[int(self.ops['label'][op])].format(
+            index=int(self.ops['index'][op]), device=int(self.ops['device'][op]),
+            peer=int(self.ops['peer'][op]), layer=int(self.ops['layer'][op]))
+
+    def find(self, label: str) -> np.ndarray:
+        """Ids of the ops created with a label template"""
+        found = self.labels.ids.get(label)
+        if found is None:
+            return np.zeros(0, dtype=np.int64)
+        return np.flatnonzero(self.ops['label'] == found)
+
+    def nbytes(self) -> int:
+        """Bytes held by the op and edge columns"""
+        return self.ops.nbytes + self.edges.nbytes
+
+    def summary(self) -> Dict:
+        """Op counts per kind, GPU count, edge count and storage"""
+        counts = np.bincount(self.ops['kind'], minlength=len(OP_KINDS))
+        return {
+            'name': self.name,
+            'ops': self.num_ops,
+            'edges': self.num_edges,
+            'ops_per_kind': {kind: int(count) for kind, count in zip(OP_KINDS, counts) if count},
+            'gpus': int(self.devices().size),
+            'nbytes': self.nbytes()
+        }
+
+    def _dims(self, dims: Optional[Dict[str, float]]) -> Dict[str, float]:
+        return self.dims if dims is None else {**self.dims, **dims}
+
+
+# Arithmetic allowed in shape entries and FLOP expressions
+BINARY_OPERATORS = {
+    ast.Add: operator.add, ast.Sub: operator.sub, ast.Mult: operator.mul,
+    ast.Div: operator.truediv, ast.FloorDiv: operator.floordiv, ast.Pow: operator.pow
+}
+UNARY_OPERATORS = {ast.UAdd: operator.pos, ast.USub: operator.neg}
+
+
+@lru_cache(maxsize=4096)
+def _parse_expression(value: str) -> ast.AST:
+    """Syntax tree of an expression, checked to use only names, numbers and BINARY/UNARY_OPERATORS"""
+    try:
+        tree = ast.parse(value.strip(), mode='eval').body
+    except SyntaxError:
+        raise ValueError(f"Expression {value!r} is not valid arithmetic") from None
+    for node in ast.walk(tree):
+        allowed = (isinstance(node, (ast.Name, ast.Load)) or
+                   isinstance(node, ast.Constant) and type(node.value) in (int, float) or
+                   isinstance(node, ast.BinOp) and type(node.op) in BINARY_OPERATORS or
+                   isinstance(node, ast.UnaryOp) and type(node.op) in UNARY_OPERATORS or
+                   type(node) in BINARY_OPERATORS or type(node) in UNARY_OPERATORS)
+        if not allowed:
+            raise ValueError(f"Expression {value!r} uses unsupported syntax ({type(node).__name__})")
+    return tree
+
+
+def _evaluate_node(node: ast.AST, value: str, dims: Dict[str, float]) -> float:
+    if isinstance(node, ast.BinOp):
+        return BINARY_OPERATORS[type(node.op)](_evaluate_node(node.left, value, dims),
+                                               _evaluate_node(node.right, value, dims))
+    if isinstance(node, ast.UnaryOp):
+        return UNARY_OPERATORS[type(node.op)](_evaluate_node(node.operand, value, dims))
+    if isinstance(node, ast.Name):
+        if node.id not in dims:
+            raise ValueError(f"Expression {value!r} uses the unbound dimension {node.id!r}")
+        return dims[node.id]
+    return node.value
+
+
+def evaluate_expression(value: Union[int, float, str], dims: Dict[str, float]) -> float:
+    """Value of a shape entry or FLOP expression under dims"""
+    if not isinstance(value, str):
+        return float(value)
+    return float(_evaluate_node(_parse_expression(value), value, dims))
+
+
+# Node styles of the DOT backend per op kind
+DOT_NODE_STYLES = {
+    COMPUTE: {'shape': 'rectangle', 'fillcolor': 'lightblue'},
+    SEND: {'shape': 'ellipse', 'fillcolor': 'lightgreen', 'style': 'filled,dashed'},
+    RECV: {'shape': 'ellipse', 'fillcolor': 'lightgreen', 'style': 'filled,dashed'},
+    ALL_REDUCE: {'shape': 'ellipse', 'fillcolor': 'lightgreen'},
+    ALL_TO_ALL: {'shape': 'ellipse', 'fillcolor': 'lightgreen'},
+    SPLIT: {'shape': 'parallelogram', 'fillcolor': 'lightyellow'},
+    GATHER: {'shape': 'parallelogram', 'fillcolor': 'lightyellow'},
+    INPUT: {'shape': 'ellipse', 'fillcolor': 'lightcoral'},
+    OUTPUT: {'shape': 'ellipse', 'fillcolor': 'lightcoral'},
+}
+
+
+def placement_text(graph: ExecutionGraph, op: int) -> str:
+    """'GPU: 3', 'GPU: 0-7', 'GPU: 0→1' (send/recv) or 'GPU: Host'"""
+    kind = int(graph.ops['kind'][op])
+    peer = int(graph.ops['peer'][op])
+    devices = graph.placement(op)
+    if kind in (SEND, RECV) and len(devices) == 1 and peer >= 0:
+        source, target = (devices[0], peer) if kind == SEND else (peer, devices[0])
+        return f"GPU: {source}→{target}"
+    if not devices:
+        return "GPU: Host"
+    if len(devices) > 1 and devices[-1] - devices[0] == len(devices) - 1:
+        return f"GPU: {devices[0]}-{devices[-1]}"
+    return "GPU: " + ", ".join(str(device) for device in devices)
+
+
+def shape_text(shape: Shape) -> str:
+    """'[B, L/16, d_model]'"""
+    return "[" + ", ".join(str(entry) for entry in shape) + "]" if shape else ""
+
+
+def to_dot(graph: ExecutionGraph, **graph_attributes):
+    """
+    Render a graph as a graphviz.Digraph
+
+    Labels are the formatted template, the output shape and the placement.
+
+    Args:
+        graph: Graph to render
+        **graph_attributes: Digraph attributes (rankdir, size, ...)
+
+    Returns:
+        graphviz.Digraph with one node per op and nested clusters
+    """
+    import graphviz
+
+    dot = graphviz.Digraph(graph.name, comment=graph.name, format='svg')
+    dot.attr(**{'rankdir': 'TB', **graph_attributes})
+    dot.attr('node', style='filled')
+    dot.attr('edge', fontsize='10')
+
+    # Cluster tree: every prefix of every cluster path is a subgraph
+    members: Dict[Tuple[str, ...], List[int]] = {}
+    cluster_of = graph.ops['cluster']
+    for cluster_id, path in enumerate(graph.clusters.values):
+        members.setdefault(path, []).extend(np.flatnonzero(cluster_of == cluster_id).tolist())
+        for depth in range(len(path)):
+            members.setdefault(path[:depth], [])
+    children: Dict[Tuple[str, ...], List[Tuple[str, ...]]] = {}
+    for path in members:
+        if path:
+            children.setdefault(path[:-1], []).append(path)
+    cluster_names = {path: f"cluster_{number}" for number, path in enumerate(members)}
+
+    def emit(target, path):
+        for op in members[path]:
+            label = "\n".join(part for part in (graph.format_label(op),
+                                                shape_text(graph.shapes.values[graph.ops['shape'][op]]),
+                                                placement_text(graph, op)) if part)
+            target.node(f"n{op}", label, **DOT_NODE_STYLES[int(graph.ops['kind'][op])])
+        for child in children.get(path, []):
+            with target.subgraph(name=cluster_names[child]) as subgraph:
+                subgraph.attr(label=child[-1])
+                emit(subgraph, child)
+
+    emit(dot, ())
+    for src, dst, style, label in zip(graph.edges['src'].tolist(), graph.edges['dst'].tolist(),
+                                      graph.edges['style'].tolist(), graph.edges['label'].tolist()):
+        attributes = {'style': 'dashed'} if style == ROUTING else {}
+        if label >= 0:
+            attributes['label'] = graph.labels.values[label]
+        dot.edge(f"n{src}", f"n{dst}", **attributes)
+    return dot
+
+
+def render_dot(graph: ExecutionGraph, path: str, format: str = 'svg', **graph_attributes) -> str:
+    """Render a graph to path.<format> with graphviz and return the output file"""
+    return to_dot(graph, **graph_attributes).render(path, format=format)
@@ -0,0 +1,543 @@
+#!/usr/bin/env python3
+"""
+Templated Execution Graphs: Compressed Plans, Lazy Expansion, Analytic Simulation
+
+A sequence-parallel plan runs the same program on every GPU of a replica,
+so its ExecutionGraph repeats a handful of ops many times: P ring stages on
+P GPUs in every layer of every replica. The RA+SP DAG has O(layers · P²)
+ops, about 4,000 at P = 16 and 4 layers but about 13 million at P = 256 and
+96 layers. A PlanTemplate stores the program once:
+
+- Op:       one op on every GPU of the replica (placement 'gpu'), one op
+            over all of them ('group', e.g. a split or an all-reduce) or one
+            on the host ('host'). Each op depends on the op before it, and
+            on earlier named ops of the same layer (inputs; 'input' is the
+            layer's input)
+- Ring:     P stages of a compute op on every GPU, stage s working on the
+            block of GPU p - s, and a send forwarding the block to GPU p + 1
+            into one of `buffers` buffers (see ring_attention.py). Per-GPU,
+            per-stage FLOPs (a causal mask) are a (stage, GPU) expression array
+- Branches: count copies of a chain of ops on every GPU, numbered by index
+            and all fed by the op before (experts); the next op joins them
+- Layers:   count copies of a body, numbered by layer
+- replicas: copies of the whole plan on disjoint GPUs (data parallelism)
+
+Labels and FLOP expressions are the ExecutionGraph ones; cluster names may
+also use {layer}. Three functions work on a template:
+
+- expand_template materializes the ExecutionGraph, or only the chosen
+  layers and replicas of it (for drawing or a detailed simulation)
+- template_size counts the ops and edges of the full expansion from one
+  layer of one replica
+- simulate_template times the plan without expanding it. Op times and
+  resources are the dag_simulator ones: every GPU holds a compute stream,
+  an egress and an ingress link, an op starts once its inputs are done and
+  its resources are free. Each resource serves its ops in program order,
+  as one stream does. dag_simulator serves them in order of ready time,
+  so where a ring crosses nodes a send of the next layer can overtake a
+  late send of this one on the slow link, and the two schedules differ
+  (ring_crosses_nodes; the template is up to a few percent faster).
+  Within a node they agree. The ring is a recurrence over whole (P,)
+  vectors, one step per stage.
+  Branches run one after the other on the compute stream, which is exact
+  while they only compute. The schedule only uses max and +, so two layers
+  entered in states that differ by a constant leave in states that differ
+  by the same constant: once one layer's output state repeats the previous
+  one's up to a shift, every later layer adds that shift and the rest is
+  extrapolated. Replicas only differ in which sends and groups cross nodes,
+  which depends on their first GPU modulo gpus_per_node, so one replica per
+  distinct layout is simulated.
+
+The cost of simulate_template is O(P) vector steps for each of the few
+layers simulated, independent of the layer and replica counts.
+"""
+
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple, Union
+
+import numpy as np
+
+from dag_simulator import H100, RESOURCES, kernel_seconds, transfer_seconds
+from execution_graph import (ALL_REDUCE, ALL_TO_ALL, COMPUTE, DATA, DTYPE_BYTES, GATHER, OP_KINDS, RECV,
+                             SEND, SPLIT, ExecutionGraph, Shape, evaluate_expression)
+
+PLACEMENTS = ('gpu', 'group', 'host')
+
+# Op kinds an Op template may have on every GPU; sends only run in a Ring
+GPU_KINDS = (COMPUTE, SPLIT, GATHER, RECV)
+
+
+class Op:
+    """
+    Op template: one op per GPU, one over the replica's GPUs, or one on the host
+    """
+
+    def __init__(self, kind: int, label: str, shape: Shape = (), flops: Optional[str] = None,
+                 placement: str = 'gpu', cluster: Tuple[str, ...] = (), name: Optional[str] = None,
+                 inputs: Sequence[str] = (), style: int = DATA, edge_label: Optional[str] = None,
+                 dtype: Optional[str] = None):
+        """
+        Args:
+            kind, label, shape, flops, dtype: As in ExecutionGraph.add_ops
+            placement: One of PLACEMENTS
+            cluster: Nested display groups, may use {layer}
+            name: Name later ops of the layer refer to it by
+            inputs: Names of earlier ops of the layer this op also depends on
+            style, edge_label: Style and label of the edges from the op before
+        """
+        if placement not in PLACEMENTS:
+            raise ValueError(f"Unknown placement {placement!r}, expected one of {PLACEMENTS}")
+        self.kind = kind
+        self.label = label
+        self.shape = tuple(shape)
+        self.flops = flops
+        self.placement = placement
+        self.cluster = tuple(cluster)
+        self.name = name
+        self.inputs = tuple(inputs)
+        self.style = style
+        self.edge_label = edge_label
+        self.dtype = dtype
+
+
+class Ring:
+    """
+    P ring stages: compute on the block of GPU p - s, then send it on to GPU p + 1
+    """
+
+    def __init__(self, compute: Op, send: Op, buffers: int = 2, stage_flops: Optional[np.ndarray] = None):
+        """
+        Args:
+            compute: Stage op (labels may use {index} for the stage, {peer}
+                     for the GPU the block comes from)
+            send: Forwarding op, a SEND
+            buffers: K,V buffers per GPU
+            stage_flops: (P, P) array of FLOP expressions of stage s on GPU
+                         p (default: compute.flops everywhere)
+        """
+        if send.kind != SEND:
+            raise ValueError(f"A ring forwards with a send, got {OP_KINDS[send.kind]}")
+        if buffers < 1:
+            raise ValueError(f"Need at least one K,V buffer, got {buffers}")
+        self.compute = compute
+        self.send = send
+        self.buffers = buffers
+        self.stage_flops = stage_flops
+
+
+class Branches:
+    """
+    count parallel chains of ops on every GPU, fed by the op before and joined by the op after
+    """
+
+    def __init__(self, count: int, body: List[Op]):
+        self.count = count
+        self.body = body
+
+
+class Layers:
+    """
+    count copies of a body, the layer field numbering them
+    """
+
+    def __init__(self, count: int, body: List):
+        self.count = count
+        self.body = body
+
+
+class PlanTemplate:
+    """
+    Program of every GPU of a replica, repeated over replicas
+    """
+
+    def __init__(self, name: str, gpus: int, body: List, replicas: int = 1,
+                 dims: Optional[Dict[str, float]] = None, dtype: str = 'fp16'):
+        """
+        Args:
+            name: Plan name
+            gpus: GPUs per replica (P)
+            body: Op, Ring, Branches and Layers in program order
+            replicas: Copies of the plan, replica r on GPUs r·P .. (r+1)·P - 1
+            dims: Values of the symbols of shapes and FLOP expressions
+            dtype: Default element type
+        """
+        self.name = name
+        self.gpus = gpus
+        self.body = body
+        self.replicas = replicas
+        self.dims = dict(dims or {})
+        self.dtype = dtype
+
+
+# Expansion ------------------------------------------------------------------
+
+def _check(op: Op) -> None:
+    if op.placement == 'gpu' and op.kind not in GPU_KINDS:
+        raise ValueError(f"{OP_KINDS[op.kind]} ops cannot be placed on every GPU outside a Ring")
+
+
+def _connect(graph: ExecutionGraph, sources: List, dst, style: int = DATA, label: Optional[str] = None) -> None:
+    for src in sources:
+        graph.add_edges(src, dst, style, label)
+
+
+def _expand(graph: ExecutionGraph, template: PlanTemplate, elements: List, frontier: List, names: Dict,
+            offset: int, layer: int, index: int, layers: Optional[set]) -> List:
+    """Add the ops of elements after frontier; returns the new frontier"""
+    P = template.gpus
+    gpus = np.arange(P)
+    devices = offset + gpus
+    for element in elements:
+        if isinstance(element, Op):
+            _check(element)
+            cluster = tuple(name.format(layer=layer) for name in element.cluster)
+            options = dict(layer=layer, cluster=cluster, flops=element.flops, dtype=element.dtype)
+            if element.placement == 'gpu':
+                ops = graph.add_ops(element.kind, element.label, element.shape, device=devices, index=index,
+                                    **options)
+            elif element.placement == 'group':
+                ops = graph.add_op(element.kind, element.label, element.shape, group=devices.tolist(), **options)
+            else:
+                ops = graph.add_op(element.kind, element.label, element.shape, **options)
+            _connect(graph, frontier, ops, element.style, element.edge_label)
+            _connect(graph, [names[name] for name in element.inputs], ops)
+            if element.name:
+                names[element.name] = ops
+            frontier = [ops]
+        elif isinstance(element, Ring):
+            compute, send = element.compute, element.send
+            cluster = tuple(name.format(layer=layer) for name in compute.cluster)
+            send_cluster = tuple(name.format(layer=layer) for name in send.cluster)
+            stages = []
+            arrival = frontier
+            for stage in range(P):
+                flops = compute.flops if element.stage_flops is None else element.stage_flops[stage].tolist()
+                ring_stage = graph.add_ops(COMPUTE, compute.label, compute.shape, device=devices,
+                                           peer=offset + (gpus - stage) % P, index=stage, layer=layer,
+                                           cluster=cluster, flops=flops, dtype=compute.dtype)
+                _connect(graph, arrival, ring_stage)
+                if stage:
+                    graph.add_edges(stages[-1], ring_stage)
+                stages.append(ring_stage)
+                if stage < P - 1:
+                    kv_send = graph.add_ops(SEND, send.label, send.shape, device=devices,
+                                            peer=offset + (gpus + 1) % P, index=stage, layer=layer,
+                                            cluster=send_cluster, dtype=send.dtype)
+                    _connect(graph, arrival, kv_send)
+                    if stage + 1 >= element.buffers:
+                        graph.add_edges(stages[stage + 1 - element.buffers][(gpus + 1) % P], kv_send)
+                    arrival = [kv_send[(gpus - 1) % P]]
+            frontier = [stages[-1]]
+        elif isinstance(element, Branches):
+            ends = []
+            for branch in range(element.count):
+                ends += _expand(graph, template, element.body, frontier, names, offset, layer, branch, layers)
+            frontier = ends
+        elif isinstance(element, Layers):
+            for layer_id in range(element.count):
+                if layers is None or layer_id in layers:
+                    frontier = _expand(graph, template, element.body, frontier, {'input': frontier[0]},
+                                       offset, layer_id, -1, layers)
+        else:
+            raise TypeError(f"Unknown template element {element!r}")
+    return frontier
+
+
+def expand_template(template: PlanTemplate, layers: Optional[Iterable[int]] = None,
+                    replicas: Optional[Iterable[int]] = None) -> ExecutionGraph:
+    """
+    Materialize a template as an ExecutionGraph
+
+    Args:
+        template: Plan to expand
+        layers: Layers to materialize (default: all); the others are left
+                out and the kept ones chained in order
+        replicas: Replicas to materialize (default: all)
+
+    Returns:
+        The graph, ops in the order the RA+SP generators have always added them
+    """
+    graph = ExecutionGraph(template.name, template.dims, template.dtype)
+    layers = None if layers is None else set(layers)
+    for replica in (range(template.replicas) if replicas is None else replicas):
+        _expand(graph, template, template.body, [], {}, replica * template.gpus, -1, -1, layers)
+    return graph
+
+
+def _count(elements: List, frontier: List[int], names: Dict, P: int) -> Tuple[int, int, List[int]]:
+    """Ops and edges of elements after a frontier of the given source sizes"""
+    ops = edges = 0
+    for element in elements:
+        if isinstance(element, Op):
+            _check(element)
+            inputs = [names[name] for name in element.inputs]
+            size = P if element.placement == 'gpu' else 1
+            ops += size
+            edges += sum(max(size, source) for source in frontier + inputs)
+            frontier = [size]
+            if element.name:
+                names[element.name] = size
+        elif isinstance(element, Ring):
+            arrival = sum(max(P, source) for source in frontier)
+            sends = P - 1
+            ops += P * P + sends * P
+            # Stage 0 and the first send hang off the frontier, later ones off the arriving send;
+            # later stages also follow the stage before, sends from stage buffers - 1 on wait for a buffer
+            edges += arrival + sends * 2 * P
+            if sends:
+                edges += arrival + (sends - 1) * P + P * max(0, sends - element.buffers + 1)
+            frontier = [P]
+        elif isinstance(element, Branches):
+            ends = []
+            for _ in range(element.count):
+                branch_ops, branch_edges, branch_frontier = _count(element.body, frontier, names, P)
+                ops += branch_ops
+                edges += branch_edges
+                ends += branch_frontier
+            frontier = ends
+        elif isinstance(element, Layers):
+            if element.count:
+                first_ops, first_edges, frontier = _count(element.body, frontier, {'input': frontier[0]}, P)
+                ops += first_ops
+                edges += first_edges
+            if element.count > 1:
+                # Every later layer starts from the same frontier as the second
+                later_ops, later_edges, frontier = _count(element.body, frontier, {'input': frontier[0]}, P)
+                ops += (element.count - 1) * later_ops
+                edges += (element.count - 1) * later_edges
+        else:
+            raise TypeError(f"Unknown template element {element!r}")
+    return ops, edges, frontier
+
+
+def template_size(template: PlanTemplate) -> Dict:
+    """
+    Size of the full expansion, counted without expanding
+
+    Returns:
+        Dictionary with the op and edge counts of expand_template(template)
+        and the number of op templates it is stored as
+    """
+    ops, edges, _ = _count(template.body, [], {}, template.gpus)
+
+    def templates(elements):
+        return sum(templates(element.body) if isinstance(element, (Branches, Layers))
+                   else 2 if isinstance(element, Ring) else 1 for element in elements)
+
+    return {
+        'name': template.name,
+        'ops': ops * template.replicas,
+        'edges': edges * template.replicas,
+        'gpus': template.gpus * template.replicas,
+        'op_templates': templates(template.body)
+    }
+
+
+# Analytic simulation ----------------------------------------------------------
+
+class _Timer:
+    """Schedule of one replica: per-GPU resource free times and busy seconds"""
+
+    def __init__(self, template: PlanTemplate, hardware: Dict, dims: Dict, offset: int):
+        self.P = P = template.gpus
+        self.offset = offset
+        self.hardware = hardware
+        self.dims = dims
+        self.dtype = template.dtype
+        node = (offset + np.arange(P)) // hardware['gpus_per_node']
+        self.spans = bool(node[0] != node[-1])
+        self.send_remote = node != np.roll(node, -1)
+        self.ring_crosses_nodes = False
+        self.free = np.zeros((len(RESOURCES), P))
+        self.busy = np.zeros((len(RESOURCES), P))
+        self.values = {}
+        self.seconds = {}
+        self.layers_simulated = 0
+        self.layer_s = 0.0
+
+    def value(self, expression) -> float:
+        found = self.values.get(expression)
+        if found is None:
+            found = self.values[expression] = evaluate_expression(expression, self.dims)
+        return found
+
+    def nbytes(self, op: Op) -> float:
+        return float(np.prod([self.value(entry) for entry in op.shape])) * DTYPE_BYTES[op.dtype or self.dtype]
+
+    def duration(self, op: Op, host_adjacent: bool = False) -> float:
+        """Seconds op holds its resources, as dag_simulator.op_durations times it"""
+        key = (id(op), host_adjacent)
+        found = self.seconds.get(key)
+        if found is None:
+            flops = 0.0 if op.flops is None else self.value(op.flops)
+            nbytes = self.nbytes(op)
+            if op.kind == COMPUTE or (op.kind in (SPLIT, GATHER) and flops > 0):
+                found = float(kernel_seconds(flops, nbytes, self.hardware))
+            else:
+                found = float(transfer_seconds(op.kind, nbytes, self.P, self.spans, self.hardware))
+            if host_adjacent and op.placement == 'group' and op.kind in (SPLIT, GATHER):
+                found += nbytes / self.hardware['host_bandwidth']
+            found = self.seconds[key] = found
+        return found
+
+    def hold(self, resources: Sequence[int], ready: np.ndarray, seconds) -> np.ndarray:
+        """Finish times of per-GPU ops holding the given resources of their own GPU"""
+        start = np.max([ready] + [self.free[resource] for resource in resources], axis=0)
+        end = start + seconds
+        for resource in resources:
+            self.free[resource] = end
+            self.busy[resource] += seconds
+        return end
+
+    def op(self, op: Op, frontier: List, names: Dict, host_adjacent: bool):
+        sources = frontier + [names[name] for name in op.inputs]
+        ready = np.max(np.broadcast_arrays(*sources), axis=0) if sources else 0.0
+        seconds = self.duration(op, host_adjacent)
+        if op.placement == 'gpu':
+            ready = np.broadcast_to(ready, (self.P,))
+            return self.hold([0], ready, seconds) if seconds > 0 else ready
+        ready = float(np.max(ready))
+        if seconds <= 0:
+            return ready
+        if op.placement == 'host':
+            return ready + seconds
+        resources = [1, 2] if op.kind in (ALL_REDUCE, ALL_TO_ALL) else [0]
+        start = max([ready] + [float(self.free[resource].max()) for resource in resources])
+        for resource in resources:
+            self.free[resource] = start + seconds
+            self.busy[resource] += seconds
+        return start + seconds
+
+    def ring(self, ring: Ring, frontier: List) -> np.ndarray:
+        P, gpus = self.P, np.arange(self.P)
+        compute_bytes = self.nbytes(ring.compute)
+        if ring.stage_flops is None:
+            stage_s = np.full((P, P), self.duration(ring.compute))
+        else:
+            flops = np.array([self.value(expression) for expression in ring.stage_flops.ravel().tolist()])
+            flops = flops.reshape(P, P)
+            stage_s = kernel_seconds(flops, compute_bytes, self.hardware)
+        send_bytes = self.nbytes(ring.send)
+        self.ring_crosses_nodes |= bool(self.send_remote.any())
+        transfer_s = transfer_seconds(SEND, send_bytes, 1, self.send_remote, self.hardware)
+
+        arrival = np.broadcast_to(np.max(np.broadcast_arrays(*frontier), axis=0), (P,))
+        ends = []
+        for stage in range(P):
+            ready = arrival if not stage else np.maximum(arrival, ends[-1])
+            ends.append(self.hold([0], ready, stage_s[stage]))
+            if stage < P - 1:
+                ready = arrival
+                if stage + 1 >= ring.buffers:
+                    ready = np.maximum(ready, ends[stage + 1 - ring.buffers][(gpus + 1) % P])
+                # A send holds its GPU's egress and the next GPU's ingress
+                start = np.max([ready, self.free[1], self.free[2][(gpus + 1) % P]], axis=0)
+                end = start + transfer_s
+                self.free[1] = end
+                self.free[2] = np.roll(end, 1)
+                self.busy[1] += transfer_s
+                self.busy[2] += np.roll(transfer_s, 1)
+                arrival = np.roll(end, 1)
+        return ends[-1]
+
+    def run(self, elements: List, frontier: List, names: Dict) -> List:
+        for position, element in enumerate(elements):
+            if isinstance(element, Op):
+                neighbours = elements[max(position - 1, 0):position + 2]
+                host_adjacent = bool(self.hardware.get('host_bandwidth')) and any(
+                    isinstance(other, Op) and other.placement == 'host' for other in neighbours)
+                done = self.op(element, frontier, names, host_adjacent)
+                if element.name:
+                    names[element.name] = done
+                frontier = [done]
+            elif isinstance(element, Ring):
+                frontier = [self.ring(element, frontier)]
+            elif isinstance(element, Branches):
+                ends = []
+                for _ in range(element.count):
+                    ends += self.run(element.body, frontier, names)
+                frontier = ends
+            elif isinstance(element, Layers):
+                frontier = self.layers(element, frontier)
+            else:
+                raise TypeError(f"Unknown template element {element!r}")
+        return frontier
+
+    def state(self, frontier: List) -> np.ndarray:
+        """Frontier and resource free times; free times before the frontier no longer matter"""
+        ready = [np.broadcast_to(np.asarray(done, dtype=float), (self.P,)) for done in frontier]
+        return np.concatenate(ready + list(np.maximum(self.free, np.min(ready))))
+
+    def layers(self, layers: Layers, frontier: List) -> List:
+        previous = None
+        for layer in range(layers.count):
+            busy = self.busy.copy()
+            frontier = self.run(layers.body, frontier, {'input': frontier[0]})
+            self.layers_simulated += 1
+            state = self.state(frontier)
+            if previous is not None and state.shape == previous.shape:
+                shift = state.min() - previous.min()
+                self.layer_s = shift
+                if np.allclose(state - state.min(), previous - previous.min(), rtol=0, atol=1e-12):
+                    # Every remaining layer repeats this one, shifted
+                    remaining = layers.count - layer - 1
+                    self.free = np.maximum(self.free, state.min()) + remaining * shift
+                    self.busy += remaining * (self.busy - busy)
+                    return [np.asarray(done, dtype=float) + remaining * shift for done in frontier]
+            previous = state
+        return frontier
+
+
+def simulate_template(template: PlanTemplate, hardware: Optional[Dict] = None,
+                      dims: Optional[Dict[str, float]] = None, tokens: Union[str, float] = 'B*L') -> Dict:
+    """
+    Simulate one step of a templated plan without expanding it
+
+    Args:
+        template: Plan to run
+        hardware: Overrides of dag_simulator.H100
+        dims: Overrides of the template's dims
+        tokens: Tokens one replica processes per step (number or expression over dims)
+
+    Returns:
+        Dictionary with latency, tokens per second for one step and in a
+        steady-state pipeline, mean compute utilization and the busiest
+        resource, as dag_simulator.simulate_graph reports them, plus the
+        size of the expansion, the layers actually simulated and whether
+        a ring send crosses nodes (where the schedule may differ from
+        simulate_graph's)
+    """
+    hardware = {**H100, **(hardware or {})}
+    dims = {**template.dims, **(dims or {})}
+    P = template.gpus
+    layouts = {}
+    for replica in range(template.replicas):
+        layouts.setdefault(replica * P % hardware['gpus_per_node'], replica * P)
+    timers = []
+    for offset in layouts.values():
+        timer = _Timer(template, hardware, dims, offset)
+        frontier = timer.run(template.body, [], {})
+        timer.latency_s = float(max(np.max(done) for done in frontier)) if frontier else 0.0
+        timers.append(timer)
+    latency = max(timer.latency_s for timer in timers)
+    busiest = max(timers, key=lambda timer: timer.busy.max())
+    busy = busiest.busy
+    bottleneck = np.unravel_index(np.argmax(busy), busy.shape)
+    step_tokens = template.replicas * evaluate_expression(tokens, dims)
+    size = template_size(template)
+    return {
+        'plan': template.name,
+        'hardware': hardware['name'],
+        'latency_s': latency,
+        'tokens': step_tokens,
+        'tokens_per_s': step_tokens / latency if latency else float('inf'),
+        'steady_state_tokens_per_s': step_tokens / busy.max() if busy.max() else float('inf'),
+        'bottleneck': f"GPU {busiest.offset + bottleneck[1]} {RESOURCES[bottleneck[0]]}",
+        'gpus': size['gpus'],
+        'mean_compute_utilization': float(busy[0].mean() / latency) if latency else 0.0,
+        'layer_s': max(timer.layer_s for timer in timers),
+        'layers_simulated': max(timer.layers_simulated for timer in timers),
+        'layouts_simulated': len(timers),
+        'ring_crosses_nodes': any(timer.ring_crosses_nodes for timer in timers),
+        'ops': size['ops'],
+        'edges': size['edges']
+    }
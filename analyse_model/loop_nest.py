@@ -0,0 +1,654 @@
+#!/usr/bin/env python3
+"""
+Affine Loop-Nest Kernels: Description Language, Traces and 3C Analysis
+
+A kernel is a tree of loops with affine bounds and array accesses with
+affine subscripts. Arrays are row-major and allocated one after the other
+in declaration order, element_size bytes per element, so
+    array A[M][K]
+    array B[K][N]
+    array C[M][N]
+is exactly the packed GEMM layout of cache_simulator. Source text:
+
+    # comments run to the end of the line
+    array NAME[dim][dim]...        dims: affine in the size parameters
+    for IDX in LOW..HIGH           HIGH exclusive; affine in the size
+                                   parameters and the enclosing indices
+    for IDX in HIGH                shorthand for 0..HIGH
+    read NAME[expr]...             subscripts: affine in all of the above
+    write NAME[expr]...
+    update NAME[expr]...           read-modify-write, one access
+
+Nesting follows indentation, and a loop body may mix accesses and loops
+(imperfect nests such as softmax's max, sum and normalize passes). Size
+parameters are bound when the source is parsed:
+
+    nest = parse_loop_nest(source, M=64, K=64, N=64)
+
+Trace order is program order: an access at depth d comes at
+(p_0, i_0, p_1, i_1, ..., p_d) in lexicographic order, where p_l is its
+position in the body of level l and i_l is the index of the loop at
+level l. Each chunk of the trace covers a range of one top-level loop's
+iterations. The accesses of each leaf body are enumerated as arrays
+(mixed-radix over the loop box, masked by the affine bounds), and the
+chunk is sorted by that key. A body with a single leaf (a perfect nest,
+like GEMM) needs no sort.
+
+simulate_loop_nest makes one pass over the trace. A set-associative cache
+simulation counts the misses, and fully associative stack distances
+(reuse_distance.py) split them into compulsory, capacity and conflict
+misses, per array. gemm_source(loop_order) generates the same trace as
+cache_simulator.matrix_multiplication_trace, so GEMM is one instance of the
+engine; KERNELS holds attention, softmax, layer norm and convolution.
+"""
+
+import ast
+import re
+from typing import Dict, Iterator, List, Optional, Tuple
+
+import numpy as np
+
+from cache_simulator import DEFAULT_CHUNK_ITERATIONS, LOOP_ORDERS
+from replacement import OP_ACCESS, OP_WRITE, make_cache
+from reuse_distance import StackDistanceAnalyzer
+
+ACCESS_KINDS = ('read', 'write', 'update')
+
+# Largest trace-order key; deeper nests must be split into chunks
+MAX_KEY = 1 << 62
+
+
+class Affine:
+    """
+    Affine expression: constant + sum of coefficient * variable
+    """
+
+    __slots__ = ('constant', 'terms')
+
+    def __init__(self, constant: int = 0, terms: Optional[Dict[str, int]] = None):
+        self.constant = constant
+        self.terms = {name: value for name, value in (terms or {}).items() if value != 0}
+
+    def __add__(self, other: 'Affine') -> 'Affine':
+        terms = dict(self.terms)
+        for name, value in other.terms.items():
+            terms[name] = terms.get(name, 0) + value
+        return Affine(self.constant + other.constant, terms)
+
+    def scale(self, factor: int) -> 'Affine':
+        return Affine(self.constant * factor,
+                      {name: value * factor for name, value in self.terms.items()})
+
+    def __repr__(self) -> str:
+        parts = [f"{value}*{name}" for name, value in self.terms.items()]
+        return ' + '.join(parts + [str(self.constant)]) if parts else str(self.constant)
+
+    def variables(self) -> set:
+        return set(self.terms)
+
+    def evaluate(self, env: Dict[str, np.ndarray]):
+        """Value over broadcast index arrays"""
+        value = self.constant
+        for name, coefficient in self.terms.items():
+            value = value + coefficient * env[name]
+        return value
+
+    def interval(self, ranges: Dict[str, Tuple[int, int]]) -> Tuple[int, int]:
+        """Smallest and largest value when each variable ranges over [low, high]"""
+        low = high = self.constant
+        for name, coefficient in self.terms.items():
+            a, b = coefficient * ranges[name][0], coefficient * ranges[name][1]
+            low += min(a, b)
+            high += max(a, b)
+        return low, high
+
+
+class Loop:
+    """
+    for index in lower..upper over body (Loop and Access nodes in program order)
+    """
+
+    def __init__(self, index: str, lower: Affine, upper: Affine, body: List):
+        self.index = index
+        self.lower = lower
+        self.upper = upper
+        self.body = body
+        # Index range covering every execution, set by LoopNest
+        self.box = (0, 0)
+
+
+class Access:
+    """
+    One array reference: kind (read, write or update), array name, subscripts
+    """
+
+    def __init__(self, kind: str, array: str, subscripts: Tuple[Affine, ...]):
+        self.kind = kind
+        self.array = array
+        self.subscripts = subscripts
+
+
+class LoopNest:
+    """
+    Parsed kernel with its arrays laid out in memory
+    """
+
+    def __init__(self, arrays: Dict[str, Tuple[int, ...]], body: List,
+                 element_size: int = 8, name: str = 'kernel'):
+        """
+        Args:
+            arrays: {name: dimensions} in allocation order
+            body: Top-level Loop and Access nodes in program order
+            element_size: Size of each element in bytes
+            name: Kernel name for reports
+        """
+        self.name = name
+        self.arrays = dict(arrays)
+        self.array_names = tuple(self.arrays)
+        self.body = body
+        self.element_size = element_size
+
+        # Row-major layout, one array after the other
+        self.bases = {}
+        self.strides = {}
+        address = 0
+        for array, dims in self.arrays.items():
+            self.bases[array] = address
+            strides = [1] * len(dims)
+            for position in range(len(dims) - 2, -1, -1):
+                strides[position] = strides[position + 1] * dims[position + 1]
+            self.strides[array] = tuple(strides)
+            address += int(np.prod(dims)) * element_size
+        self.footprint_bytes = address
+
+        # Leaf bodies: (enclosing loops, accesses with their program-order
+        # path) in program order
+        self._leaves = []
+        self.depth = 0
+        self._collect(body, [], [], {})
+        self._positions = max(self._max_children(body, 0, {}).values()) if body else 1
+
+    def _collect(self, body: List, loops: List[Loop], path: List[int],
+                 ranges: Dict[str, Tuple[int, int]]):
+        """Resolve loop boxes, check subscripts and record the leaf bodies"""
+        leaf = None
+        for position, node in enumerate(body):
+            if isinstance(node, Loop):
+                leaf = None
+                if node.index in ranges:
+                    raise ValueError(f"Loop index {node.index!r} is reused by a nested loop")
+                unknown = (node.lower.variables() | node.upper.variables()) - set(ranges)
+                if unknown:
+                    raise ValueError(f"Bounds of loop {node.index!r} use unknown names {sorted(unknown)}")
+                low = node.lower.interval(ranges)[0]
+                high = node.upper.interval(ranges)[1]
+                node.box = (low, max(high, low))
+                inner = dict(ranges)
+                inner[node.index] = (low, max(high - 1, low))
+                self._collect(node.body, loops + [node], path + [position], inner)
+            else:
+                if node.array not in self.arrays:
+                    raise ValueError(f"Access to undeclared array {node.array!r}")
+                dims = self.arrays[node.array]
+                if len(node.subscripts) != len(dims):
+                    raise ValueError(f"{node.array} has {len(dims)} dimensions, "
+                                     f"accessed with {len(node.subscripts)} subscripts")
+                for subscript, extent in zip(node.subscripts, dims):
+                    unknown = subscript.variables() - set(ranges)
+                    if unknown:
+                        raise ValueError(f"Subscript of {node.array} uses unknown names {sorted(unknown)}")
+                    if all(loop.box[1] > loop.box[0] for loop in loops):
+                        low, high = subscript.interval(ranges)
+                        if low < 0 or high >= extent:
+                            raise ValueError(f"Subscript {subscript!r} of {node.array} leaves "
+                                             f"[0, {extent}) (spans {low}..{high})")
+                if leaf is None:
+                    leaf = (list(loops), [])
+                    self._leaves.append(leaf)
+                leaf[1].append((node, path + [position]))
+                self.depth = max(self.depth, len(loops))
+
+    def _max_children(self, body: List, level: int, widest: Dict[int, int]) -> Dict[int, int]:
+        widest[level] = max(widest.get(level, 0), len(body))
+        for node in body:
+            if isinstance(node, Loop):
+                self._max_children(node.body, level + 1, widest)
+        return widest
+
+    def trace(self, chunk_accesses: int = 3 * DEFAULT_CHUNK_ITERATIONS
+              ) -> Iterator[Tuple[np.ndarray, np.ndarray, np.ndarray]]:
+        """
+        Generate the byte-address trace in program order, in chunks
+
+        Args:
+            chunk_accesses: Approximate accesses per yielded chunk
+
+        Yields:
+            (addresses, array ids, ops) with ops OP_ACCESS for reads and
+            OP_WRITE for writes and updates
+        """
+        top = 0
+        while top < len(self.body):
+            node = self.body[top]
+            # Top-level accesses and loops are chunked separately; a
+            # top-level loop is split along its own index
+            leaves = [leaf for leaf in self._leaves
+                      if (leaf[0][0] is node if leaf[0] else leaf[1][0][1][0] == top)]
+            if not isinstance(node, Loop):
+                # Consecutive top-level accesses form one leaf
+                yield self._leaf_chunk(leaves, None)
+                top += len(leaves[0][1])
+                continue
+            low, high = node.box
+            per_iteration = sum(len(accesses) * _box_size(loops[1:]) for loops, accesses in leaves)
+            step = max(1, chunk_accesses // max(per_iteration, 1))
+            for first in range(low, high, step):
+                chunk = self._leaf_chunk(leaves, (first, min(first + step, high)))
+                if chunk[0].size:
+                    yield chunk
+            top += 1
+
+    def _leaf_chunk(self, leaves: List, outer: Optional[Tuple[int, int]]
+                    ) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """Accesses of some leaf bodies with the outermost index in [outer)"""
+        addresses, array_ids, ops, keys = [], [], [], []
+        for loops, accesses in leaves:
+            env, count = self._enumerate(loops, outer)
+            if count == 0:
+                continue
+            key = None if len(leaves) == 1 else self._order_key(loops, env, accesses[0][1], count)
+            for slot, (access, path) in enumerate(accesses):
+                offset = sum(subscript.evaluate(env) * stride for subscript, stride
+                             in zip(access.subscripts, self.strides[access.array]))
+                offset = np.broadcast_to(np.asarray(offset, dtype=np.int64), (count,))
+                addresses.append(self.bases[access.array] + offset * self.element_size)
+                array_ids.append(np.full(count, self.array_names.index(access.array), dtype=np.int8))
+                ops.append(np.full(count, OP_ACCESS if access.kind == 'read' else OP_WRITE,
+                                   dtype=np.int8))
+                if key is not None:
+                    keys.append(key + slot)
+        if not addresses:
+            empty = np.zeros(0, dtype=np.int64)
+            return empty, empty.astype(np.int8), empty.astype(np.int8)
+        if len(leaves) == 1:
+            # One leaf: iteration-major, then the accesses of the body in order
+            stack = lambda parts: np.stack(parts, axis=1).ravel()
+            return stack(addresses), stack(array_ids), stack(ops)
+        order = np.argsort(np.concatenate(keys), kind='stable')
+        return (np.concatenate(addresses)[order], np.concatenate(array_ids)[order],
+                np.concatenate(ops)[order])
+
+    def _enumerate(self, loops: List[Loop],
+                   outer: Optional[Tuple[int, int]]) -> Tuple[Dict[str, np.ndarray], int]:
+        """Index arrays of every iteration of loops, restricted to the outer range"""
+        extents = []
+        lows = []
+        for depth, loop in enumerate(loops):
+            low, high = outer if depth == 0 and outer is not None else loop.box
+            lows.append(low)
+            extents.append(max(high - low, 0))
+        total = int(np.prod(extents)) if extents else 1
+        if total == 0:
+            return {}, 0
+        t = np.arange(total, dtype=np.int64)
+        env = {}
+        for loop, low, extent in zip(reversed(loops), reversed(lows), reversed(extents)):
+            env[loop.index] = low + t % extent
+            t //= extent
+        inside = np.ones(total, dtype=bool)
+        for loop in loops:
+            index = env[loop.index]
+            inside &= (index >= loop.lower.evaluate(env)) & (index < loop.upper.evaluate(env))
+        if not inside.all():
+            env = {name: values[inside] for name, values in env.items()}
+        return env, int(np.count_nonzero(inside))
+
+    def _order_key(self, loops: List[Loop], env: Dict[str, np.ndarray], path: List[int],
+                   count: int) -> np.ndarray:
+        """Program-order key (p_0, i_0, p_1, i_1, ...) of a leaf's first access"""
+        key = np.zeros(count, dtype=np.int64)
+        scale = 1
+        for level in range(self.depth + 1):
+            scale *= self._positions
+            if level < self.depth:
+                scale *= self._index_radix(level)
+        if scale >= MAX_KEY:
+            raise ValueError("Loop nest too deep for one program-order key")
+        for level in range(self.depth + 1):
+            key = key * self._positions + (path[level] if level < len(path) else 0)
+            if level < self.depth:
+                radix = self._index_radix(level)
+                if level < len(loops):
+                    low = self._level_low(level)
+                    key = key * radix + (env[loops[level].index] - low)
+                else:
+                    key = key * radix
+        # Room for the accesses that follow in the same body
+        return key
+
+    def _level_loops(self, level: int) -> List[Loop]:
+        found = []
+
+        def walk(body, depth):
+            for node in body:
+                if isinstance(node, Loop):
+                    if depth == level:
+                        found.append(node)
+                    else:
+                        walk(node.body, depth + 1)
+        walk(self.body, 0)
+        return found
+
+    def _level_low(self, level: int) -> int:
+        return min(loop.box[0] for loop in self._level_loops(level))
+
+    def _index_radix(self, level: int) -> int:
+        loops = self._level_loops(level)
+        return max(loop.box[1] for loop in loops) - self._level_low(level) + 1
+
+    def total_accesses(self) -> int:
+        """Accesses in the whole trace"""
+        total = 0
+        for loops, accesses in self._leaves:
+            total += len(accesses) * self._enumerate(loops, None)[1]
+        return total
+
+
+def _box_size(loops: List[Loop]) -> int:
+    return int(np.prod([loop.box[1] - loop.box[0] for loop in loops])) if loops else 1
+
+
+def parse_affine(text: str, names: Dict[str, int]) -> Affine:
+    """
+    Parse an affine expression; names maps size parameters to their values
+
+    Other names are kept as variables (loop indices). Integer constants,
+    +, -, and products with a constant factor are allowed.
+    """
+    def walk(node) -> Affine:
+        if isinstance(node, ast.Expression):
+            return walk(node.body)
+        if isinstance(node, ast.Constant) and isinstance(node.value, int):
+            return Affine(node.value)
+        if isinstance(node, ast.Name):
+            if node.id in names:
+                return Affine(int(names[node.id]))
+            return Affine(0, {node.id: 1})
+        if isinstance(node, ast.UnaryOp) and isinstance(node.op, (ast.USub, ast.UAdd)):
+            value = walk(node.operand)
+            return value.scale(-1) if isinstance(node.op, ast.USub) else value
+        if isinstance(node, ast.BinOp):
+            left, right = walk(node.left), walk(node.right)
+            if isinstance(node.op, ast.Add):
+                return left + right
+            if isinstance(node.op, ast.Sub):
+                return left + right.scale(-1)
+            if isinstance(node.op, ast.Mult):
+                if not left.terms:
+                    return right.scale(left.constant)
+                if not right.terms:
+                    return left.scale(right.constant)
+                raise ValueError(f"Not affine: {text!r}")
+            if isinstance(node.op, ast.FloorDiv) and not left.terms and not right.terms:
+                return Affine(left.constant // right.constant)
+        raise ValueError(f"Not an affine expression: {text!r}")
+
+    try:
+        tree = ast.parse(text.strip(), mode='eval')
+    except SyntaxError:
+        raise ValueError(f"Cannot parse expression {text!r}") from None
+    return walk(tree)
+
+
+_SUBSCRIPTED = re.compile(r'^([A-Za-z_]\w*)((?:\[[^\[\]]+\])+)$')
+
+
+def _parse_reference(text: str, names: Dict[str, int]) -> Tuple[str, Tuple[Affine, ...]]:
+    match = _SUBSCRIPTED.match(text.replace(' ', ''))
+    if match is None:
+        raise ValueError(f"Cannot parse array reference {text!r}")
+    subscripts = re.findall(r'\[([^\[\]]+)\]', match.group(2))
+    return match.group(1), tuple(parse_affine(subscript, names) for subscript in subscripts)
+
+
+def parse_loop_nest(source: str, element_size: int = 8, name: str = 'kernel',
+                    **sizes: int) -> LoopNest:
+    """
+    Parse kernel source (see the module docstring) with its size parameters bound
+
+    Args:
+        source: Kernel text
+        element_size: Size of each element in bytes
+        name: Kernel name for reports
+        **sizes: Values of the size parameters (e.g. M=64)
+
+    Returns:
+        LoopNest
+    """
+    arrays = {}
+    root = []
+    # (indentation, body) of the open blocks, innermost last; the indentation
+    # of a block is set by its first statement
+    stack = [[None, root]]
+    opened = False
+    for number, raw in enumerate(source.splitlines(), start=1):
+        line = raw.split('#', 1)[0].rstrip()
+        if not line.strip():
+            continue
+        indent = len(line) - len(line.lstrip())
+        words = line.split(None, 1)
+        keyword, rest = words[0], words[1] if len(words) > 1 else ''
+        try:
+            if keyword == 'array':
+                array, dims = _parse_reference(rest, sizes)
+                if any(dim.terms for dim in dims):
+                    raise ValueError(f"Dimensions of {array} must be sizes")
+                arrays[array] = tuple(dim.constant for dim in dims)
+                continue
+            if opened:
+                if indent <= stack[-2][0]:
+                    raise ValueError("Loop without a body")
+                stack[-1][0] = indent
+                opened = False
+            else:
+                while len(stack) > 1 and indent < stack[-1][0]:
+                    stack.pop()
+                if stack[-1][0] is None:
+                    stack[-1][0] = indent
+                if indent != stack[-1][0]:
+                    raise ValueError("Inconsistent indentation")
+            body = stack[-1][1]
+            if keyword == 'for':
+                match = re.match(r'^([A-Za-z_]\w*)\s+in\s+(.+)$', rest)
+                bounds = match.group(2).split('..') if match else []
+                if len(bounds) == 1:
+                    lower, upper = Affine(0), parse_affine(bounds[0], sizes)
+                elif len(bounds) == 2:
+                    lower, upper = (parse_affine(bound, sizes) for bound in bounds)
+                else:
+                    raise ValueError("Expected 'for INDEX in LOW..HIGH'")
+                loop = Loop(match.group(1), lower, upper, [])
+                body.append(loop)
+                stack.append([None, loop.body])
+                opened = True
+            elif keyword in ACCESS_KINDS:
+                array, subscripts = _parse_reference(rest, sizes)
+                body.append(Access(keyword, array, subscripts))
+            else:
+                raise ValueError(f"Unknown statement {keyword!r}")
+        except ValueError as error:
+            raise ValueError(f"Line {number}: {error}") from None
+    if opened:
+        raise ValueError("Loop without a body at the end of the source")
+    return LoopNest(arrays, root, element_size, name)
+
+
+def gemm_source(loop_order: str = 'ijk') -> str:
+    """Kernel source of C = A × B in a loop order; matches cache_simulator's trace"""
+    if loop_order not in LOOP_ORDERS:
+        raise ValueError(f"Unknown loop order {loop_order!r}, expected one of {LOOP_ORDERS}")
+    extents = {'i': 'M', 'j': 'N', 'k': 'K'}
+    lines = ['array A[M][K]', 'array B[K][N]', 'array C[M][N]']
+    for depth, index in enumerate(loop_order):
+        lines.append('    ' * depth + f"for {index} in {extents[index]}")
+    body = '    ' * len(loop_order)
+    lines += [body + 'read A[i][k]', body + 'read B[k][j]', body + 'update C[i][j]']
+    return '\n'.join(lines)
+
+
+# Transformer and convolution kernels, with their size parameters
+KERNELS = {
+    'gemm': gemm_source('ijk'),
+    # Scores S = Q Kᵀ of one head (L queries, L keys, head dimension D)
+    'attention_scores': '''
+array Q[L][D]
+array Kt[L][D]
+array S[L][L]
+for i in L
+    for j in L
+        for d in D
+            read Q[i][d]
+            read Kt[j][d]
+            update S[i][j]
+''',
+    # Causal scores: key j only up to query i
+    'causal_attention_scores': '''
+array Q[L][D]
+array Kt[L][D]
+array S[L][L]
+for i in L
+    for j in 0..i+1
+        for d in D
+            read Q[i][d]
+            read Kt[j][d]
+            update S[i][j]
+''',
+    # Row softmax: max pass, exponent-and-sum pass, normalize pass
+    'softmax': '''
+array S[L][L]
+array P[L][L]
+array stats[L][2]
+for i in L
+    for j in L
+        read S[i][j]
+        update stats[i][0]
+    for j in L
+        read S[i][j]
+        write P[i][j]
+        update stats[i][1]
+    for j in L
+        read stats[i][1]
+        update P[i][j]
+''',
+    # Attention output O = P V
+    'attention_output': '''
+array P[L][L]
+array V[L][D]
+array O[L][D]
+for i in L
+    for j in L
+        for d in D
+            read P[i][j]
+            read V[j][d]
+            update O[i][d]
+''',
+    # Layer norm over rows of width H: mean and variance, then normalize
+    'layer_norm': '''
+array X[T][H]
+array gamma[H]
+array Y[T][H]
+array stats[T][2]
+for t in T
+    for h in H
+        read X[t][h]
+        update stats[t][0]
+        update stats[t][1]
+    for h in H
+        read X[t][h]
+        read stats[t][0]
+        read gamma[h]
+        write Y[t][h]
+''',
+    # Direct 2-D convolution, valid padding, stride 1
+    'conv2d': '''
+array X[CI][H+R-1][W+S-1]
+array F[CO][CI][R][S]
+array Y[CO][H][W]
+for co in CO
+    for ci in CI
+        for h in H
+            for w in W
+                for r in R
+                    for s in S
+                        read X[ci][h+r][w+s]
+                        read F[co][ci][r][s]
+                        update Y[co][h][w]
+''',
+}
+
+
+def simulate_loop_nest(nest: LoopNest, num_sets: int, block_size: int, associativity: int,
+                       policy: str = 'lru', classify: bool = True) -> Dict:
+    """
+    Simulate a kernel's trace and split its misses into the three Cs
+
+    Args:
+        nest: Parsed kernel
+        num_sets: Number of cache sets
+        block_size: Block size in bytes
+        associativity: Ways per set
+        policy: Replacement policy (replacement.REPLACEMENT_POLICIES)
+        classify: Also measure fully associative stack distances to split
+                  misses into compulsory, capacity and conflict
+
+    Returns:
+        Dictionary with accesses, misses and miss rate, overall and per
+        array; with classify, the compulsory, capacity and conflict misses
+        (conflict = set-associative minus fully associative LRU misses) and
+        the set-mapping gain. As in CacheMissModel, capacity is capped at the
+        misses and conflict at zero; fully associative misses avoided by the
+        set mapping are reported as set_mapping_gain.
+    """
+    cache = make_cache(num_sets, associativity, policy)
+    fully_associative = StackDistanceAnalyzer(1) if classify else None
+    total_blocks = num_sets * associativity
+    arrays = len(nest.array_names)
+    counts = {name: np.zeros(arrays, dtype=np.int64)
+              for name in ('accesses', 'misses', 'compulsory', 'fully_associative')}
+
+    for addresses, array_ids, _ in nest.trace():
+        blocks = addresses // block_size
+        hit = cache.access(blocks)
+        counts['accesses'] += np.bincount(array_ids, minlength=arrays)
+        counts['misses'] += np.bincount(array_ids[~hit], minlength=arrays)
+        if classify:
+            distances = fully_associative.update(blocks)
+            counts['compulsory'] += np.bincount(array_ids[distances < 0], minlength=arrays)
+            counts['fully_associative'] += np.bincount(
+                array_ids[(distances < 0) | (distances >= total_blocks)], minlength=arrays)
+
+    # Capacity is capped at each array's misses, as in CacheMissModel, and
+    # the overall split is the sum of the per-array ones
+    capped = np.minimum(counts['fully_associative'], counts['misses'])
+
+    def breakdown(index) -> Dict:
+        accesses = int(counts['accesses'][index].sum())
+        misses = int(counts['misses'][index].sum())
+        result = {
+            'accesses': accesses,
+            'misses': misses,
+            'miss_rate': misses / accesses if accesses else 0.0
+        }
+        if classify:
+            compulsory = int(counts['compulsory'][index].sum())
+            fully = int(counts['fully_associative'][index].sum())
+            capacity_bound = int(capped[index].sum())
+            result.update(compulsory_misses=compulsory, capacity_misses=capacity_bound - compulsory,
+                          conflict_misses=misses - capacity_bound,
+                          set_mapping_gain=fully - capacity_bound)
+        return result
+
+    result = {'kernel': nest.name, 'policy': policy, 'footprint_bytes': nest.footprint_bytes}
+    result.update(breakdown(slice(None)))
+    result['per_array'] = {name: breakdown(index) for index, name in enumerate(nest.array_names)}
+    return result
@@ -0,0 +1,195 @@
+#!/usr/bin/env python3
+"""
+Memoization Layer for Cache Model Analyses
+
+Analyses are pure functions of the cache parameters and the call arguments,
+so results are stored under a canonical key:
+
+    (method name, (C, S, b, assoc), ((argument, value), ...))
+
+with defaults applied and arguments sorted by name, so positional, keyword
+and default spellings of the same call share one entry. Values are
+normalized (NumPy scalars to Python numbers, lists to tuples) before keying.
+
+AnalysisMemo is a bounded LRU map with hit/miss/eviction counters. Results
+are deep-copied in and out, so callers may annotate what they get back. A
+memo with a path loads earlier results at construction and writes them back
+with save(); the file is a pickle, so only load files this tool wrote. Saved
+files are keyed on a hash of the analysis sources (the .py files next to this
+module), so any code change discards them.
+"""
+
+import copy
+import functools
+import glob
+import hashlib
+import inspect
+import os
+import pickle
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Optional, Tuple
+
+DEFAULT_MAX_SIZE = 1024
+SOURCE_DIRECTORY = os.path.dirname(os.path.abspath(__file__))
+DEFAULT_MEMO_PATH = os.path.join(SOURCE_DIRECTORY, 'analysis_memo.pkl')
+
+
+def source_fingerprint(directory: str = SOURCE_DIRECTORY) -> str:
+    """Hash of the Python sources in directory, which saved results depend on"""
+    digest = hashlib.sha256()
+    for path in sorted(glob.glob(os.path.join(directory, '*.py'))):
+        digest.update(os.path.basename(path).encode())
+        with open(path, 'rb') as handle:
+            digest.update(handle.read())
+    return digest.hexdigest()
+
+
+# Saved results are discarded whenever an analysis source changes
+MEMO_VERSION = source_fingerprint()
+
+
+class AnalysisMemo:
+    """
+    Bounded LRU store of analysis results
+    """
+
+    def __init__(self, max_size: int = DEFAULT_MAX_SIZE, path: Optional[str] = None):
+        """
+        Args:
+            max_size: Maximum number of stored results (0 disables memoization)
+            path: Optional pickle file to load from and save() to
+        """
+        self.max_size = max_size
+        self.path = path
+        self.entries = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        if path is not None and os.path.exists(path):
+            self.load(path)
+
+    def __len__(self) -> int:
+        return len(self.entries)
+
+    def lookup(self, key: Tuple) -> Tuple[bool, Any]:
+        """
+        Find a stored result and mark it most recently used
+
+        Returns:
+            (found, copy of the result or None)
+        """
+        if key in self.entries:
+            self.entries.move_to_end(key)
+            self.hits += 1
+            return True, copy.deepcopy(self.entries[key])
+        self.misses += 1
+        return False, None
+
+    def store(self, key: Tuple, value: Any):
+        """Store a result, evicting the least recently used beyond max_size"""
+        if self.max_size <= 0:
+            return
+        self.entries[key] = copy.deepcopy(value)
+        self.entries.move_to_end(key)
+        while len(self.entries) > self.max_size:
+            self.entries.popitem(last=False)
+            self.evictions += 1
+
+    def resize(self, max_size: int):
+        """Change the bound, evicting least recently used entries if needed"""
+        self.max_size = max_size
+        while len(self.entries) > max(max_size, 0):
+            self.entries.popitem(last=False)
+            self.evictions += 1
+
+    def clear(self):
+        """Drop all results and reset the counters"""
+        self.entries.clear()
+        self.hits = self.misses = self.evictions = 0
+
+    def stats(self) -> Dict:
+        """Hit/miss statistics"""
+        lookups = self.hits + self.misses
+        return {
+            'size': len(self.entries),
+            'max_size': self.max_size,
+            'hits': self.hits,
+            'misses': self.misses,
+            'evictions': self.evictions,
+            'hit_rate': self.hits / lookups if lookups else 0.0
+        }
+
+    def save(self, path: Optional[str] = None):
+        """Write the stored results (oldest first) to path or self.path"""
+        path = path or self.path
+        if path is None:
+            raise ValueError("No path to save the memo to")
+        temporary = path + '.tmp'
+        with open(temporary, 'wb') as handle:
+            pickle.dump({'version': MEMO_VERSION, 'entries': list(self.entries.items())}, handle)
+        os.replace(temporary, path)
+
+    def load(self, path: str):
+        """Add results saved by save(); files written by other sources are ignored"""
+        with open(path, 'rb') as handle:
+            saved = pickle.load(handle)
+        if saved.get('version') != MEMO_VERSION:
+            return
+        for key, value in saved['entries']:
+            self.entries[key] = value
+            self.entries.move_to_end(key)
+        self.resize(self.max_size)
+
+
+# Shared by every model that is not given its own memo, so rebuilding a model
+# with the same parameters reuses earlier results
+DEFAULT_MEMO = AnalysisMemo()
+
+
+def canonical_key(method_name: str, identity: Tuple, arguments: Dict[str, Any]) -> Tuple:
+    """Hashable key of one call, independent of how its arguments were spelled"""
+    return (method_name, _normalize(identity),
+            tuple(sorted((name, _normalize(value)) for name, value in arguments.items())))
+
+
+def memoized(method: Callable) -> Callable:
+    """
+    Memoize a model method through the instance's memo
+
+    The instance provides memo (an AnalysisMemo or None) and memo_identity(),
+    the tuple of parameters that, with the arguments, determine the result.
+    """
+    signature = inspect.signature(method)
+
+    @functools.wraps(method)
+    def wrapper(self, *args, **kwargs):
+        memo = self.memo
+        if memo is None or memo.max_size <= 0:
+            return method(self, *args, **kwargs)
+        bound = signature.bind(self, *args, **kwargs)
+        bound.apply_defaults()
+        arguments = dict(bound.arguments)
+        del arguments[next(iter(signature.parameters))]
+        key = canonical_key(method.__qualname__, self.memo_identity(), arguments)
+
+        found, value = memo.lookup(key)
+        if found:
+            return value
+        value = method(self, *args, **kwargs)
+        memo.store(key, value)
+        return value
+
+    return wrapper
+
+
+def _normalize(value: Any) -> Any:
+    """Turn a value into a hashable, type-stable key component"""
+    if hasattr(value, 'item') and getattr(value, 'ndim', None) == 0:
+        return value.item()
+    if hasattr(value, 'tolist'):
+        return _normalize(value.tolist())
+    if isinstance(value, (list, tuple)):
+        return tuple(_normalize(item) for item in value)
+    if isinstance(value, dict):
+        return tuple(sorted((key, _normalize(item)) for key, item in value.items()))
+    return value
@@ -0,0 +1,224 @@
+#!/usr/bin/env python3
+"""
+Set-Sharded Multi-Process LRU Simulation
+
+Under LRU (and every policy of replacement.py) each cache set evolves
+independently of the others, so the sets can be split into contiguous shards, one per worker process, and simulated
+in parallel without any communication until the end.
+
+The coordinator streams the GEMM trace into a ring of shared-memory slots.
+For each slot every worker maps the addresses to set indices with array
+operations, keeps the accesses that fall into its shard and replays them in
+trace order through its own cache. Workers acknowledge each
+slot, so the coordinator can fill the other slot while they work. At the end
+the per-set and per-matrix counters of all shards are merged; the result is
+identical to cache_simulator.simulate_matrix_multiplication.
+"""
+
+import multiprocessing
+import os
+from multiprocessing import shared_memory
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+from cache_simulator import DEFAULT_CHUNK_ITERATIONS, MATRIX_NAMES, gemm_trace, simulation_summary
+from replacement import make_cache
+
+# Shared-memory trace slots; the coordinator fills one while workers read another
+NUM_SLOTS = 2
+
+
+class SetShard:
+    """
+    Cache state and counters of a contiguous range of sets [first_set, last_set)
+    """
+
+    def __init__(self, num_sets: int, block_size: int, associativity: int,
+                 first_set: int, last_set: int, policy: str = 'lru'):
+        self.S = num_sets
+        self.b = block_size
+        self.first_set = first_set
+        self.last_set = last_set
+        self.cache = make_cache(last_set - first_set, associativity, policy, first_set=first_set)
+        self.set_accesses = np.zeros(last_set - first_set, dtype=np.int64)
+        self.set_hits = np.zeros(last_set - first_set, dtype=np.int64)
+        self.matrix_accesses = np.zeros(len(MATRIX_NAMES), dtype=np.int64)
+        self.matrix_hits = np.zeros(len(MATRIX_NAMES), dtype=np.int64)
+
+    def process(self, addresses: np.ndarray, matrix_ids: np.ndarray):
+        """Replay the accesses of a trace chunk that fall into this shard"""
+        blocks = addresses // self.b
+        sets = blocks % self.S
+        mine = np.flatnonzero((sets >= self.first_set) & (sets < self.last_set))
+        if mine.size == 0:
+            return
+        local_sets = sets[mine] - self.first_set
+        ids = matrix_ids[mine]
+        hit = self.cache.access(blocks[mine], local_sets)
+
+        size = self.last_set - self.first_set
+        self.set_accesses += np.bincount(local_sets, minlength=size)
+        self.set_hits += np.bincount(local_sets[hit], minlength=size)
+        self.matrix_accesses += np.bincount(ids, minlength=len(MATRIX_NAMES))
+        self.matrix_hits += np.bincount(ids[hit], minlength=len(MATRIX_NAMES))
+
+    def counters(self) -> Tuple[int, np.ndarray, np.ndarray, np.ndarray, np.ndarray]:
+        return (self.first_set, self.set_accesses, self.set_hits,
+                self.matrix_accesses, self.matrix_hits)
+
+
+def shard_boundaries(num_sets: int, shards: int) -> List[Tuple[int, int]]:
+    """Split sets 0..num_sets-1 into at most `shards` contiguous, near-equal ranges"""
+    shards = max(1, min(shards, num_sets))
+    edges = np.linspace(0, num_sets, shards + 1).round().astype(np.int64)
+    return [(int(edges[s]), int(edges[s + 1])) for s in range(shards)]
+
+
+def _shard_worker(connection, memory_name: str, slot_capacity: int,
+                  num_sets: int, block_size: int, associativity: int,
+                  first_set: int, last_set: int, policy: str):
+    """Worker loop: replay every announced slot, then return the counters"""
+    memory = shared_memory.SharedMemory(name=memory_name)
+    addresses, matrix_ids = _slot_views(memory, slot_capacity)
+    try:
+        shard = SetShard(num_sets, block_size, associativity, first_set, last_set, policy)
+        while True:
+            message = connection.recv()
+            if message is None:
+                break
+            slot, length = message
+            shard.process(addresses[slot, :length], matrix_ids[slot, :length])
+            connection.send(slot)
+        connection.send(shard.counters())
+    finally:
+        # Views must be released before the mapping can be closed
+        del addresses, matrix_ids
+        memory.close()
+        connection.close()
+
+
+def _slot_views(memory: shared_memory.SharedMemory,
+                slot_capacity: int) -> Tuple[np.ndarray, np.ndarray]:
+    """(NUM_SLOTS, capacity) address and matrix-id arrays over a shared block"""
+    address_bytes = NUM_SLOTS * slot_capacity * 8
+    addresses = np.ndarray((NUM_SLOTS, slot_capacity), dtype=np.int64, buffer=memory.buf)
+    matrix_ids = np.ndarray((NUM_SLOTS, slot_capacity), dtype=np.int8,
+                            buffer=memory.buf, offset=address_bytes)
+    return addresses, matrix_ids
+
+
+def simulate_matrix_multiplication_sharded(num_sets: int, block_size: int, associativity: int,
+                                           M: int, K: int, N: int, element_size: int = 8,
+                                           loop_order: str = 'ijk',
+                                           chunk_iterations: int = DEFAULT_CHUNK_ITERATIONS,
+                                           tiles: Optional[Tuple[int, int, int]] = None,
+                                           register_reuse: bool = False,
+                                           workers: Optional[int] = None,
+                                           policy: str = 'lru') -> Dict:
+    """
+    Simulate C = A × B through a set-associative cache, sets sharded over processes
+
+    Args:
+        num_sets: Number of cache sets
+        block_size: Block size in bytes
+        associativity: Ways per set
+        M, K, N: Matrix dimensions
+        element_size: Size of each element in bytes
+        loop_order: Loop nest order from outermost to innermost; with tiles,
+                    the order of both the tile loops and the point loops
+        chunk_iterations: Loop iterations streamed per chunk
+        tiles: Optional (tile_M, tile_K, tile_N) to simulate the tiled loop nest
+        register_reuse: Keep the innermost-loop invariant operand in a register
+        workers: Worker processes (default: one per CPU; 1 runs in-process)
+        policy: Replacement policy (replacement.REPLACEMENT_POLICIES)
+
+    Returns:
+        Dictionary of cache_simulator.simulate_matrix_multiplication plus the
+        number of workers and per-set access/miss counters
+    """
+    trace = gemm_trace(M, K, N, element_size, loop_order, chunk_iterations, tiles, register_reuse)
+    boundaries = shard_boundaries(num_sets, workers or os.cpu_count() or 1)
+
+    if len(boundaries) == 1:
+        shard = SetShard(num_sets, block_size, associativity, 0, num_sets, policy)
+        for addresses, matrix_ids in trace:
+            shard.process(addresses, matrix_ids)
+        counters = [shard.counters()]
+    else:
+        counters = _run_shards(trace, boundaries, num_sets, block_size, associativity,
+                               3 * chunk_iterations, policy)
+
+    set_accesses = np.zeros(num_sets, dtype=np.int64)
+    set_hits = np.zeros(num_sets, dtype=np.int64)
+    accesses = np.zeros(len(MATRIX_NAMES), dtype=np.int64)
+    hits = np.zeros(len(MATRIX_NAMES), dtype=np.int64)
+    for first_set, shard_accesses, shard_hits, matrix_accesses, matrix_hits in counters:
+        set_accesses[first_set:first_set + shard_accesses.size] = shard_accesses
+        set_hits[first_set:first_set + shard_hits.size] = shard_hits
+        accesses += matrix_accesses
+        hits += matrix_hits
+
+    result = simulation_summary(accesses, hits, loop_order, tiles, register_reuse, policy)
+    result['workers'] = len(boundaries)
+    result['per_set'] = {
+        'accesses': set_accesses,
+        'misses': set_accesses - set_hits
+    }
+    return result
+
+
+def _run_shards(trace, boundaries: List[Tuple[int, int]], num_sets: int, block_size: int,
+                associativity: int, slot_capacity: int, policy: str) -> List[Tuple]:
+    """Stream the trace through shared memory to one worker process per shard"""
+    memory = shared_memory.SharedMemory(create=True, size=NUM_SLOTS * slot_capacity * 9)
+    addresses, matrix_ids = _slot_views(memory, slot_capacity)
+    processes = []
+    connections = []
+    try:
+        for first_set, last_set in boundaries:
+            parent, child = multiprocessing.Pipe()
+            process = multiprocessing.Process(
+                target=_shard_worker,
+                args=(child, memory.name, slot_capacity, num_sets, block_size, associativity,
+                      first_set, last_set, policy),
+                daemon=True)
+            process.start()
+            child.close()
+            processes.append(process)
+            connections.append(parent)
+
+        # Slots the workers have not acknowledged yet
+        busy = [False] * NUM_SLOTS
+        slot = 0
+        for chunk_addresses, chunk_matrix_ids in trace:
+            if busy[slot]:
+                for connection in connections:
+                    connection.recv()
+            length = chunk_addresses.size
+            addresses[slot, :length] = chunk_addresses
+            matrix_ids[slot, :length] = chunk_matrix_ids
+            for connection in connections:
+                connection.send((slot, length))
+            busy[slot] = True
+            slot = (slot + 1) % NUM_SLOTS
+
+        # Acknowledgements arrive in slot order, so drain the rest in that order
+        for _ in range(sum(busy)):
+            for connection in connections:
+                connection.recv()
+        for connection in connections:
+            connection.send(None)
+        counters = [connection.recv() for connection in connections]
+        for process in processes:
+            process.join()
+        return counters
+    finally:
+        for process in processes:
+            if process.is_alive():
+                process.terminate()
+        for connection in connections:
+            connection.close()
+        del addresses, matrix_ids
+        memory.close()
+        memory.unlink()
@@ -0,0 +1,238 @@
+#!/usr/bin/env python3
+"""
+Hardware Prefetcher Models
+
+Prefetchers watch the demand access stream and request blocks ahead of it.
+Each demand access carries a PC (the load instruction; in GEMM traces the
+matrix id, since A, B and C are three different loads), and both models keep
+their training state per PC:
+
+- next_line: when a PC's stream enters a new block b, request b + degree
+  (blocks b+1 .. b+degree-1 were requested by the earlier entries)
+- stride:    reference prediction table; once the last `threshold` address
+  strides of a PC agree, request the block `distance` strides ahead
+
+Training only depends on addresses, never on hits, so the requests of a
+whole trace chunk are computed at once with array operations. The simulator
+inserts every request right after the access that triggered it as an
+OP_PREFETCH (replacement.py), which fills absent blocks; the cache counts
+which prefetched blocks a demand access used before they were evicted.
+"""
+
+from typing import Dict, List, Tuple
+
+import numpy as np
+
+# Defaults of the two models
+DEFAULT_NEXT_LINE_DEGREE = 1
+DEFAULT_STRIDE_DISTANCE = 4
+DEFAULT_STRIDE_THRESHOLD = 2
+
+
+class NextLinePrefetcher:
+    """
+    Request block b + degree whenever a PC's accesses move into a new block b
+    """
+
+    name = 'next_line'
+
+    def __init__(self, block_size: int, degree: int = DEFAULT_NEXT_LINE_DEGREE):
+        """
+        Args:
+            block_size: Block size in bytes
+            degree: How many blocks ahead of the stream to request
+        """
+        self.b = block_size
+        self.degree = degree
+        # Last block accessed by each PC
+        self.last_block: Dict[int, int] = {}
+
+    def requests(self, addresses: np.ndarray, pcs: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Prefetch requests triggered by a chunk of demand accesses
+
+        Args:
+            addresses: Byte addresses in trace order
+            pcs: PC of each access
+
+        Returns:
+            (positions, blocks): index of the triggering access and requested block
+        """
+        positions = []
+        blocks = []
+        for pc in np.unique(pcs):
+            index = np.flatnonzero(pcs == pc)
+            pc_blocks = addresses[index] // self.b
+            previous = np.empty_like(pc_blocks)
+            previous[0] = self.last_block.get(int(pc), -1)
+            previous[1:] = pc_blocks[:-1]
+            self.last_block[int(pc)] = int(pc_blocks[-1])
+            entered = pc_blocks != previous
+            positions.append(index[entered])
+            blocks.append(pc_blocks[entered] + self.degree)
+        return _in_trace_order(positions, blocks)
+
+
+class StridePrefetcher:
+    """
+    Per-PC stride prefetcher (reference prediction table)
+
+    Each PC remembers its last address, last stride and how many consecutive
+    accesses repeated that stride. Once the run reaches `threshold`, every
+    access requests the block `distance` strides ahead, unless it is the
+    block being accessed or the block the PC requested last.
+    """
+
+    name = 'stride'
+
+    def __init__(self, block_size: int, distance: int = DEFAULT_STRIDE_DISTANCE,
+                 threshold: int = DEFAULT_STRIDE_THRESHOLD):
+        """
+        Args:
+            block_size: Block size in bytes
+            distance: Strides ahead of the access to prefetch
+            threshold: Consecutive equal strides before the PC prefetches
+        """
+        self.b = block_size
+        self.distance = distance
+        self.threshold = threshold
+        # PC -> (last address, last stride, run of that stride, last requested block)
+        self.table: Dict[int, Tuple[int, int, int, int]] = {}
+
+    def requests(self, addresses: np.ndarray, pcs: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Prefetch requests triggered by a chunk of demand accesses
+
+        Args:
+            addresses: Byte addresses in trace order
+            pcs: PC of each access
+
+        Returns:
+            (positions, blocks): index of the triggering access and requested block
+        """
+        positions = []
+        blocks = []
+        for pc in np.unique(pcs):
+            index = np.flatnonzero(pcs == pc)
+            pc_addresses = addresses[index]
+            last_address, last_stride, last_run, last_request = self.table.get(
+                int(pc), (None, 0, 0, -1))
+
+            strides = np.empty_like(pc_addresses)
+            strides[1:] = np.diff(pc_addresses)
+            # The first access of a PC has no stride yet
+            strides[0] = 0 if last_address is None else pc_addresses[0] - last_address
+            previous_strides = np.empty_like(strides)
+            previous_strides[0] = last_stride
+            previous_strides[1:] = strides[:-1]
+
+            # Length of the run of equal strides ending at each access
+            steps = np.arange(strides.size)
+            resets = np.where(strides != previous_strides, steps, -1)
+            last_reset = np.maximum.accumulate(resets)
+            runs = np.where(last_reset >= 0, steps - last_reset + 1, last_run + steps + 1)
+            if last_address is None:
+                runs[last_reset < 0] = 0
+
+            targets = (pc_addresses + strides * self.distance) // self.b
+            issue = (runs >= self.threshold) & (strides != 0) & (targets != pc_addresses // self.b)
+            issued = np.flatnonzero(issue)
+            # Drop repeats of the PC's previous request
+            requested = targets[issued]
+            previous_requests = np.empty_like(requested)
+            if requested.size:
+                previous_requests[0] = last_request
+                previous_requests[1:] = requested[:-1]
+                new = requested != previous_requests
+                positions.append(index[issued[new]])
+                blocks.append(requested[new])
+                last_request = int(requested[-1])
+
+            self.table[int(pc)] = (int(pc_addresses[-1]), int(strides[-1]), int(runs[-1]),
+                                   last_request)
+        return _in_trace_order(positions, blocks)
+
+
+PREFETCHERS = {
+    prefetcher_class.name: prefetcher_class
+    for prefetcher_class in (NextLinePrefetcher, StridePrefetcher)
+}
+
+
+def make_prefetcher(name: str, block_size: int, **options):
+    """
+    New prefetcher model
+
+    Args:
+        name: One of PREFETCHERS ('next_line', 'stride')
+        block_size: Block size in bytes
+        **options: Model parameters (degree; distance, threshold)
+    """
+    if name not in PREFETCHERS:
+        raise ValueError(f"Unknown prefetcher {name!r}, expected one of {tuple(PREFETCHERS)}")
+    return PREFETCHERS[name](block_size, **options)
+
+
+def _in_trace_order(positions: List[np.ndarray],
+                    blocks: List[np.ndarray]) -> Tuple[np.ndarray, np.ndarray]:
+    """Concatenate per-PC requests and sort them by triggering access"""
+    if not positions:
+        return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.int64)
+    positions = np.concatenate(positions)
+    order = np.argsort(positions, kind='stable')
+    return positions[order], np.concatenate(blocks)[order]
+
+
+def merge_requests(blocks: np.ndarray, positions: np.ndarray,
+                   requested: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Interleave prefetch requests into a demand block stream
+
+    Args:
+        blocks: Demand block numbers in trace order
+        positions: Index of the demand access that triggered each request
+        requested: Requested block numbers
+
+    Returns:
+        (merged blocks, is_prefetch) with every request right after its trigger
+    """
+    keys = np.concatenate((2 * np.arange(blocks.size, dtype=np.int64), 2 * positions + 1))
+    order = np.argsort(keys, kind='stable')
+    merged = np.concatenate((blocks, requested))[order]
+    is_prefetch = order >= blocks.size
+    return merged, is_prefetch
+
+
+def prefetch_summary(prefetcher_name: str, requests: int, redundant: int,
+                     cache_stats: Dict[str, int], demand_misses: int, block_size: int) -> Dict:
+    """
+    Coverage, accuracy and traffic of a prefetcher, separate from demand misses
+
+    Args:
+        prefetcher_name: Name of the model
+        requests: Requests issued
+        redundant: Requests for blocks already present (dropped)
+        cache_stats: SetAssociativeCache.prefetch_stats() at the end of the run
+        demand_misses: Demand misses left with prefetching
+        block_size: Block size in bytes
+
+    Returns:
+        Dictionary with the counts plus coverage (share of the would-be
+        misses that prefetches served), accuracy (share of prefetch fills a
+        demand access used) and prefetch and useless traffic in bytes
+    """
+    filled = cache_stats['filled']
+    useful = cache_stats['useful']
+    useless = cache_stats['evicted_unused'] + cache_stats['resident_unused']
+    return {
+        'prefetcher': prefetcher_name,
+        'requests': requests,
+        'redundant': redundant,
+        'filled': filled,
+        'useful': useful,
+        'useless': useless,
+        'coverage': useful / (useful + demand_misses) if useful + demand_misses else 0.0,
+        'accuracy': useful / filled if filled else 0.0,
+        'prefetch_traffic_bytes': filled * block_size,
+        'useless_traffic_bytes': useless * block_size
+    }
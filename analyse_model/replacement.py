@@ -0,0 +1,564 @@
+#!/usr/bin/env python3
+"""
+Array-Backed Set-Associative Caches with Pluggable Replacement Policies
+
+Every cache keeps its block tags in an (S × assoc) array plus per-way
+replacement state in further (S × assoc) arrays. A sequence of accesses is
+grouped by set (sets are independent under every policy here) and the sets
+are stepped in lockstep: step r applies the r-th access of every set at once
+with array operations. Policies only differ in how a step picks victims and
+updates the replacement state:
+
+- lru:    true LRU, last-use stamps
+- plru:   tree pseudo-LRU, assoc-1 direction bits per set (assoc a power of 2)
+- fifo:   first in, first out, insertion stamps; hits do not reorder
+- srrip:  static re-reference interval prediction (2-bit RRPV, hit promotion,
+          insertion at "long" re-reference)
+- brrip:  bimodal RRIP, insertion at "distant" except one fill in 32
+- random: uniformly random victim
+
+Invalid ways are always filled first. The random choices of random and
+brrip are a hash of (seed, set, per-set fill count), so a simulation gives
+the same result however its trace is chunked or its sets are sharded.
+
+Prefetches (OP_PREFETCH) fill an absent block like a miss but leave a
+present one untouched. Prefetched ways stay flagged until their first demand
+access, so the cache counts useful prefetches and those evicted unused.
+
+Writes (OP_WRITE) mark their block dirty, and evicting a dirty block counts
+a write-back. A write miss fills the block (write-allocate) unless
+write_allocate is off, in which case it bypasses the cache.
+"""
+
+from abc import ABC, abstractmethod
+from typing import Dict, Optional, Tuple
+
+import numpy as np
+
+# Operations understood by SetAssociativeCache.process
+OP_ACCESS = 0      # look up, fill on miss (evicting the policy's victim)
+OP_INVALIDATE = 1  # drop the block if present; "hit" reports presence
+OP_PREFETCH = 2    # fill the block if absent, leaving the state alone if present
+OP_WRITE = 3       # access that dirties the block (write-back cache)
+
+# Multiplicative hash of the pseudo-random policies (64-bit golden ratio)
+_HASH_MULTIPLIER = np.uint64(0x9E3779B97F4A7C15)
+
+# BRRIP inserts one fill in BRRIP_THROTTLE at "long" instead of "distant"
+BRRIP_THROTTLE = 32
+
+
+class SetAssociativeCache(ABC):
+    """
+    Array-backed set-associative cache; subclasses supply the replacement policy
+
+    State:
+        tags: (S, assoc) int64 block numbers, -1 for an invalid way
+        prefetched: (S, assoc) bool, filled by a prefetch and not yet accessed
+        dirty: (S, assoc) bool, written since the block was filled
+        plus the arrays named in STATE, which snapshot() and restore() cover
+
+    Subclasses implement _victims (the way each missing access would evict,
+    without changing state), _touch (update after an access filled or hit a
+    way) and _clear (reset a way that was invalidated).
+    """
+
+    policy = None
+    STATE: Tuple[str, ...] = ()
+    # Whether a hit on the most recently used block can still change the
+    # replacement state (RRIP promotes a block only once it is re-referenced)
+    REPEAT_UPDATES = False
+
+    def __init__(self, num_sets: int, associativity: int, seed: int = 0, first_set: int = 0):
+        """
+        Initialize an empty cache
+
+        Args:
+            num_sets: Number of cache sets
+            associativity: Ways per set
+            seed: Seed of the pseudo-random policies
+            first_set: Index of set 0 within the whole cache, when this
+                       object simulates a shard of its sets
+        """
+        self.S = num_sets
+        self.assoc = associativity
+        self.seed = seed
+        self.first_set = first_set
+        # Whether a write miss fills the block (else the write bypasses the cache)
+        self.write_allocate = True
+        self.tags = np.full((num_sets, associativity), -1, dtype=np.int64)
+        self.prefetched = np.zeros((num_sets, associativity), dtype=bool)
+        self.dirty = np.zeros((num_sets, associativity), dtype=bool)
+        self.counts = {'prefetch_filled': 0, 'prefetch_useful': 0, 'prefetch_evicted_unused': 0,
+                       'writebacks': 0, 'bypassed_writes': 0}
+        # Set once prefetches or writes were processed: from then on every
+        # access has to maintain the prefetched and dirty flags
+        self.tracking = False
+        # Most recently used block of each set; a repeat of it is a hit that
+        # never has to enter the lockstep loop
+        self.mru_block = np.full(num_sets, -1, dtype=np.int64)
+        self.clock = 0
+
+    def access(self, blocks: np.ndarray, sets: Optional[np.ndarray] = None) -> np.ndarray:
+        """
+        Apply a sequence of block accesses (reads) in order
+
+        Args:
+            blocks: Block numbers (address // block_size) in trace order
+            sets: Optional precomputed set index of each block
+                  (defaults to blocks % S)
+
+        Returns:
+            Boolean array, True where the access hit
+        """
+        if self.tracking:
+            return self._run(blocks, sets, np.full(np.size(blocks), OP_ACCESS, dtype=np.int8))[0]
+        return self._run(blocks, sets, None)[0]
+
+    def process(self, blocks: np.ndarray, ops: np.ndarray,
+                writebacks: bool = False) -> Tuple[np.ndarray, ...]:
+        """
+        Apply a mixed sequence of reads, writes, invalidations and prefetches in order
+
+        Args:
+            blocks: Block numbers in trace order
+            ops: OP_ACCESS, OP_WRITE, OP_INVALIDATE or OP_PREFETCH for each block
+            writebacks: Also return which operations wrote a dirty block back
+
+        Returns:
+            (hits, victims): hits is True where the block was present;
+            victims holds the block evicted by each fill (-1 if none).
+            With writebacks, a third array is True where the evicted (or
+            invalidated) block was dirty.
+        """
+        ops = np.asarray(ops, dtype=np.int8)
+        self.tracking |= bool(np.any(ops >= OP_PREFETCH))
+        hits, victims, written_back = self._run(blocks, None, ops)
+        return (hits, victims, written_back) if writebacks else (hits, victims)
+
+    def snapshot(self) -> Tuple:
+        """Copy of the cache state, for restore()"""
+        return (self.tags.copy(), self.mru_block.copy(), self.clock, self.prefetched.copy(),
+                self.dirty.copy(), dict(self.counts), self.tracking,
+                tuple(getattr(self, name).copy() for name in self.STATE))
+
+    def restore(self, state: Tuple):
+        """Return to a state captured by snapshot()"""
+        tags, mru_block, clock, prefetched, dirty, counts, tracking, policy_state = state
+        self.tags[:] = tags
+        self.mru_block[:] = mru_block
+        self.clock = clock
+        self.prefetched[:] = prefetched
+        self.dirty[:] = dirty
+        self.counts = dict(counts)
+        self.tracking = tracking
+        for name, value in zip(self.STATE, policy_state):
+            getattr(self, name)[:] = value
+
+    def prefetch_stats(self) -> Dict[str, int]:
+        """
+        Prefetch fills so far, those a demand access used, and the unused
+        ones that were evicted (or invalidated) or are still resident
+        """
+        return {
+            'filled': self.counts['prefetch_filled'],
+            'useful': self.counts['prefetch_useful'],
+            'evicted_unused': self.counts['prefetch_evicted_unused'],
+            'resident_unused': int(self.prefetched.sum())
+        }
+
+    def write_stats(self) -> Dict[str, int]:
+        """
+        Dirty blocks written back on eviction (or invalidation) so far, the
+        dirty blocks still resident (written back by a final flush) and the
+        write misses that bypassed a no-write-allocate cache
+        """
+        return {
+            'writebacks': self.counts['writebacks'],
+            'dirty_resident': int(self.dirty.sum()),
+            'bypassed_writes': self.counts['bypassed_writes']
+        }
+
+    def contents(self) -> np.ndarray:
+        """Sorted array of the blocks currently held"""
+        return np.sort(self.tags[self.tags >= 0])
+
+    @abstractmethod
+    def _victims(self, sets: np.ndarray, tags: np.ndarray, time: int) -> np.ndarray:
+        """Way each missing access in sets would evict (tags: their rows), without changing state"""
+
+    @abstractmethod
+    def _touch(self, sets: np.ndarray, ways: np.ndarray, hit: np.ndarray, time: int):
+        """Update the replacement state after the accesses filled or hit ways"""
+
+    @abstractmethod
+    def _clear(self, sets: np.ndarray, ways: np.ndarray):
+        """Reset the replacement state of invalidated ways"""
+
+    @staticmethod
+    def _prefer_invalid(tags: np.ndarray, ways: np.ndarray) -> np.ndarray:
+        """The first invalid way of each set that has one, else `ways`"""
+        invalid = tags < 0
+        return np.where(invalid.any(axis=1), invalid.argmax(axis=1), ways)
+
+    def _random(self, sets: np.ndarray, draws: np.ndarray) -> np.ndarray:
+        """Pseudo-random uint64 per (set, draw number), independent of chunking"""
+        key = ((sets + self.first_set).astype(np.uint64) << np.uint64(32)) ^ \
+            draws.astype(np.uint64) ^ np.uint64(self.seed)
+        with np.errstate(over='ignore'):
+            key = key * _HASH_MULTIPLIER
+            key ^= key >> np.uint64(29)
+            key = key * _HASH_MULTIPLIER
+        return key >> np.uint64(32)
+
+    def _run(self, blocks: np.ndarray, sets: Optional[np.ndarray],
+             ops: Optional[np.ndarray]) -> Tuple[np.ndarray, Optional[np.ndarray],
+                                                 Optional[np.ndarray]]:
+        blocks = np.asarray(blocks, dtype=np.int64)
+        if sets is None:
+            sets = blocks % self.S
+        hits = np.zeros(blocks.size, dtype=bool)
+        victims = None if ops is None else np.full(blocks.size, -1, dtype=np.int64)
+        written_back = None if ops is None else np.zeros(blocks.size, dtype=bool)
+        if blocks.size == 0:
+            return hits, victims, written_back
+
+        # Group the trace by set, keeping trace order inside each set (narrow
+        # keys let NumPy use a radix sort)
+        set_keys = sets.astype(np.uint16) if self.S <= 1 << 16 else sets
+        order = np.argsort(set_keys, kind='stable')
+        set_sorted = sets[order]
+        block_sorted = blocks[order]
+        op_sorted = None if ops is None else ops[order]
+
+        # A block left most recently used by the previous access of its set
+        # is still resident, so repeating it (by a read or a write) is a hit.
+        # Its only effects are a write's dirty bit and, with REPEAT_UPDATES,
+        # a touch; both are applied right after the access it repeats.
+        resident_sorted = block_sorted
+        write_sorted = None
+        if op_sorted is not None:
+            write_sorted = op_sorted == OP_WRITE
+            demand = (op_sorted == OP_ACCESS) | write_sorted
+            resident = (op_sorted == OP_ACCESS) | (write_sorted & self.write_allocate)
+            resident_sorted = np.where(resident, block_sorted, -1)
+
+        run_start = np.ones(block_sorted.size, dtype=bool)
+        run_start[1:] = set_sorted[1:] != set_sorted[:-1]
+        previous = np.empty_like(block_sorted)
+        previous[1:] = resident_sorted[:-1]
+        previous[run_start] = self.mru_block[set_sorted[run_start]]
+        repeat = block_sorted == previous
+        if op_sorted is not None:
+            repeat &= demand
+
+        run_end = np.ones(block_sorted.size, dtype=bool)
+        run_end[:-1] = run_start[1:]
+        self.mru_block[set_sorted[run_end]] = resident_sorted[run_end]
+
+        # Remaining accesses form one contiguous run per set; step r applies
+        # the r-th access of every run that is longer than r
+        pending = np.flatnonzero(~repeat)
+        pending_sets = set_sorted[pending]
+        pending_blocks = block_sorted[pending]
+        pending_ops = None if op_sorted is None else op_sorted[pending]
+        pending_hits = np.zeros(pending.size, dtype=bool)
+        pending_victims = None if ops is None else np.full(pending.size, -1, dtype=np.int64)
+        pending_written_back = None if ops is None else np.zeros(pending.size, dtype=bool)
+
+        repeat_writes = write_sorted is not None and bool(np.any(repeat & write_sorted))
+        pending_retouch = pending_redirty = None
+        if self.REPEAT_UPDATES or repeat_writes:
+            # Each repeat belongs to the last pending access of its set before
+            # it; repeats before any (leading) repeat a previous call's block
+            positions = np.arange(block_sorted.size)
+            last_pending = np.maximum.accumulate(np.where(repeat, -1, positions))
+            first_in_run = np.maximum.accumulate(np.where(run_start, positions, -1))
+            leading = repeat & (last_pending < first_in_run)
+            owner = np.cumsum(~repeat) - 1
+            following = repeat & ~leading
+            if leading.any():
+                leading_sets = set_sorted[leading]
+                ways = (self.tags[leading_sets] == block_sorted[leading][:, None]).argmax(axis=1)
+                if self.REPEAT_UPDATES:
+                    self._touch(leading_sets, ways, np.ones(ways.size, dtype=bool), self.clock)
+                if repeat_writes:
+                    written = write_sorted[leading]
+                    self.dirty[leading_sets[written], ways[written]] = True
+            if self.REPEAT_UPDATES:
+                pending_retouch = np.zeros(pending.size, dtype=bool)
+                pending_retouch[owner[following]] = True
+            if repeat_writes:
+                pending_redirty = np.zeros(pending.size, dtype=bool)
+                pending_redirty[owner[following & write_sorted]] = True
+
+        if pending.size:
+            starts = np.flatnonzero(np.diff(pending_sets, prepend=-1))
+            lengths = np.diff(starts, append=pending.size)
+            by_length = np.argsort(-lengths, kind='stable')
+            starts = starts[by_length]
+            # active[r] = number of runs longer than r
+            active = np.searchsorted(-lengths[by_length], -np.arange(lengths.max()), side='left')
+
+            for step in range(active.size):
+                lanes = starts[:active[step]] + step
+                step_sets = pending_sets[lanes]
+                step_blocks = pending_blocks[lanes]
+                step_tags = self.tags[step_sets]
+                time = self.clock + step + 1
+
+                match = step_tags == step_blocks[:, None]
+                hit = match.any(axis=1)
+                way = np.where(hit, match.argmax(axis=1), self._victims(step_sets, step_tags, time))
+                pending_hits[lanes] = hit
+
+                if pending_ops is None:
+                    self.tags[step_sets, way] = step_blocks
+                    self._touch(step_sets, way, hit, time)
+                    if pending_retouch is not None:
+                        again = pending_retouch[lanes]
+                        self._touch(step_sets[again], way[again],
+                                    np.ones(np.count_nonzero(again), dtype=bool), time)
+                    continue
+
+                step_ops = pending_ops[lanes]
+                invalidate = step_ops == OP_INVALIDATE
+                prefetch = step_ops == OP_PREFETCH
+                write = step_ops == OP_WRITE
+                # Reads and writes fill or refresh their way, prefetches only
+                # fill an absent block and write misses of a no-write-allocate
+                # cache bypass it; invalidations clear a hit way
+                bypass = write & ~hit & (not self.write_allocate)
+                fill = ~invalidate & ~(prefetch & hit) & ~bypass
+                cleared = invalidate & hit
+                pending_victims[lanes] = np.where(fill & ~hit, step_tags[np.arange(way.size), way], -1)
+                if self.tracking:
+                    counts = self.counts
+                    leaving = ((fill & ~hit) | cleared)
+                    flagged = self.prefetched[step_sets, way]
+                    dirty = self.dirty[step_sets, way]
+                    counts['prefetch_useful'] += int(np.count_nonzero(fill & hit & flagged))
+                    counts['prefetch_evicted_unused'] += int(np.count_nonzero(leaving & flagged))
+                    counts['prefetch_filled'] += int(np.count_nonzero(prefetch & ~hit))
+                    pending_written_back[lanes] = leaving & dirty
+                    counts['writebacks'] += int(np.count_nonzero(leaving & dirty))
+                    counts['bypassed_writes'] += int(np.count_nonzero(bypass))
+                    changed = fill | cleared
+                    self.prefetched[step_sets[changed], way[changed]] = prefetch[changed]
+                    self.dirty[step_sets[changed], way[changed]] = (write | (hit & dirty & ~cleared))[changed]
+                self.tags[step_sets[fill], way[fill]] = step_blocks[fill]
+                self._touch(step_sets[fill], way[fill], hit[fill], time)
+                # Only reads and writes are repeated, never the other operations
+                if pending_retouch is not None:
+                    again = pending_retouch[lanes]
+                    self._touch(step_sets[again], way[again], np.ones(np.count_nonzero(again), dtype=bool), time)
+                if pending_redirty is not None:
+                    written = pending_redirty[lanes]
+                    self.dirty[step_sets[written], way[written]] = True
+                self.tags[step_sets[cleared], way[cleared]] = -1
+                self._clear(step_sets[cleared], way[cleared])
+
+            self.clock += active.size
+
+        sorted_hits = repeat
+        sorted_hits[pending] = pending_hits
+        hits[order] = sorted_hits
+        if victims is not None:
+            sorted_victims = np.full(blocks.size, -1, dtype=np.int64)
+            sorted_victims[pending] = pending_victims
+            victims[order] = sorted_victims
+            sorted_written_back = np.zeros(blocks.size, dtype=bool)
+            sorted_written_back[pending] = pending_written_back
+            written_back[order] = sorted_written_back
+        return hits, victims, written_back
+
+
+class SetAssociativeLRU(SetAssociativeCache):
+    """
+    True LRU: the victim is the way with the oldest last-use stamp
+
+    State:
+        stamps: (S, assoc) int64 time of last use, 0 for an invalid way
+    """
+
+    policy = 'lru'
+    STATE = ('stamps',)
+
+    def __init__(self, num_sets: int, associativity: int, seed: int = 0, first_set: int = 0):
+        super().__init__(num_sets, associativity, seed, first_set)
+        self.stamps = np.zeros((num_sets, associativity), dtype=np.int64)
+
+    def _victims(self, sets, tags, time):
+        # Invalid ways have stamp 0, older than any use
+        return self.stamps[sets].argmin(axis=1)
+
+    def _touch(self, sets, ways, hit, time):
+        self.stamps[sets, ways] = time
+
+    def _clear(self, sets, ways):
+        self.stamps[sets, ways] = 0
+
+
+class FIFOCache(SetAssociativeLRU):
+    """
+    FIFO: the victim is the way filled longest ago; hits change nothing
+
+    State:
+        stamps: (S, assoc) int64 time of fill, 0 for an invalid way
+    """
+
+    policy = 'fifo'
+
+    def _touch(self, sets, ways, hit, time):
+        self.stamps[sets[~hit], ways[~hit]] = time
+
+
+class TreePLRUCache(SetAssociativeCache):
+    """
+    Tree pseudo-LRU over a binary tree of assoc-1 direction bits per set
+
+    Node n has children 2n+1 (bit 0) and 2n+2 (bit 1); the leaves are the
+    ways. The victim is found by following the bits from the root, and an
+    access flips the bits on its path to point away from its way.
+
+    State:
+        bits: (S, assoc-1) uint8 direction bits
+    """
+
+    policy = 'plru'
+    STATE = ('bits',)
+
+    def __init__(self, num_sets: int, associativity: int, seed: int = 0, first_set: int = 0):
+        if associativity & (associativity - 1):
+            raise ValueError(f"Tree PLRU needs a power-of-two associativity, got {associativity}")
+        super().__init__(num_sets, associativity, seed, first_set)
+        self.levels = associativity.bit_length() - 1
+        self.bits = np.zeros((num_sets, max(associativity - 1, 1)), dtype=np.uint8)
+
+    def _victims(self, sets, tags, time):
+        node = np.zeros(sets.size, dtype=np.int64)
+        for _ in range(self.levels):
+            node = 2 * node + 1 + self.bits[sets, node]
+        return self._prefer_invalid(tags, node - (self.assoc - 1))
+
+    def _touch(self, sets, ways, hit, time):
+        node = np.zeros(sets.size, dtype=np.int64)
+        for level in range(self.levels):
+            direction = (ways >> (self.levels - 1 - level)) & 1
+            self.bits[sets, node] = 1 - direction
+            node = 2 * node + 1 + direction
+
+    def _clear(self, sets, ways):
+        pass
+
+
+class SRRIPCache(SetAssociativeCache):
+    """
+    Static RRIP with 2-bit re-reference prediction values (RRPV)
+
+    The victim is the first way predicted "distant" (RRPV 3); when no way
+    is, every RRPV of the set ages until one is. Hits promote to RRPV 0 and
+    fills insert at "long" (RRPV 2).
+
+    State:
+        rrpv: (S, assoc) uint8 re-reference prediction, 3 for an invalid way
+        fills: (S,) int64 fills so far, numbering BRRIP's random draws
+    """
+
+    policy = 'srrip'
+    STATE = ('rrpv', 'fills')
+    REPEAT_UPDATES = True
+    DISTANT = 3
+
+    def __init__(self, num_sets: int, associativity: int, seed: int = 0, first_set: int = 0):
+        super().__init__(num_sets, associativity, seed, first_set)
+        self.rrpv = np.full((num_sets, associativity), self.DISTANT, dtype=np.uint8)
+        self.fills = np.zeros(num_sets, dtype=np.int64)
+
+    def _victims(self, sets, tags, time):
+        # After aging, the first way holding the set's largest RRPV is distant
+        return self._prefer_invalid(tags, self.rrpv[sets].argmax(axis=1))
+
+    def _touch(self, sets, ways, hit, time):
+        self.rrpv[sets[hit], ways[hit]] = 0
+        miss = ~hit
+        sets, ways = sets[miss], ways[miss]
+        # The victim search aged the set so that its largest RRPV is distant
+        rrpv = self.rrpv[sets]
+        rrpv += (self.DISTANT - rrpv.max(axis=1))[:, None]
+        rrpv[np.arange(sets.size), ways] = self._insertion(sets)
+        self.rrpv[sets] = rrpv
+        self.fills[sets] += 1
+
+    def _clear(self, sets, ways):
+        self.rrpv[sets, ways] = self.DISTANT
+
+    def _insertion(self, sets: np.ndarray) -> np.ndarray:
+        return np.full(sets.size, self.DISTANT - 1, dtype=np.uint8)
+
+
+class BRRIPCache(SRRIPCache):
+    """
+    Bimodal RRIP: fills insert at "distant", one in BRRIP_THROTTLE at "long",
+    so a scan larger than the cache cannot flush the whole working set
+    """
+
+    policy = 'brrip'
+
+    def _insertion(self, sets):
+        long_insert = self._random(sets, self.fills[sets]) % BRRIP_THROTTLE == 0
+        return np.where(long_insert, self.DISTANT - 1, self.DISTANT).astype(np.uint8)
+
+
+class RandomCache(SetAssociativeCache):
+    """
+    Random replacement: the victim is a pseudo-random way of the set
+
+    State:
+        fills: (S,) int64 fills so far, numbering each set's random draws
+    """
+
+    policy = 'random'
+    STATE = ('fills',)
+
+    def __init__(self, num_sets: int, associativity: int, seed: int = 0, first_set: int = 0):
+        super().__init__(num_sets, associativity, seed, first_set)
+        self.fills = np.zeros(num_sets, dtype=np.int64)
+
+    def _victims(self, sets, tags, time):
+        ways = (self._random(sets, self.fills[sets]) % np.uint64(self.assoc)).astype(np.int64)
+        return self._prefer_invalid(tags, ways)
+
+    def _touch(self, sets, ways, hit, time):
+        self.fills[sets[~hit]] += 1
+
+    def _clear(self, sets, ways):
+        pass
+
+
+REPLACEMENT_POLICIES: Dict[str, type] = {
+    cache_class.policy: cache_class
+    for cache_class in (SetAssociativeLRU, TreePLRUCache, FIFOCache, SRRIPCache, BRRIPCache,
+                        RandomCache)
+}
+
+
+def make_cache(num_sets: int, associativity: int, policy: str = 'lru', seed: int = 0,
+               first_set: int = 0, write_allocate: bool = True) -> SetAssociativeCache:
+    """
+    Empty cache with the named replacement policy
+
+    Args:
+        num_sets: Number of cache sets
+        associativity: Ways per set
+        policy: One of REPLACEMENT_POLICIES
+        seed: Seed of the pseudo-random policies (random, brrip)
+        first_set: Index of set 0 within the whole cache, for set shards
+        write_allocate: Fill the block on a write miss (else bypass the cache)
+    """
+    if policy not in REPLACEMENT_POLICIES:
+        raise ValueError(f"Unknown replacement policy {policy!r}, "
+                         f"expected one of {tuple(REPLACEMENT_POLICIES)}")
+    cache = REPLACEMENT_POLICIES[policy](num_sets, associativity, seed, first_set)
+    cache.write_allocate = write_allocate
+    return cache
@@ -0,0 +1,297 @@
+#!/usr/bin/env python3
+"""
+LRU Stack-Distance (Reuse-Distance) Histogram Engine
+
+The stack distance of an access is the number of distinct blocks touched since
+the previous access to the same block. An LRU cache holding D blocks hits
+exactly the accesses whose stack distance is below D, so one histogram gives
+the miss count of every cache size in a single trace walk:
+- Fully associative (one set): misses(D) = cold + #{d >= D}
+- S sets, per-set distances: misses(assoc) = cold + #{d >= assoc}
+- Other set counts: Smith's binomial approximation over the fully
+  associative histogram, P(hit | d) = P(Binomial(d, 1/S) < assoc)
+
+Distances are computed offline. For an access at time t whose block was last
+used at time p, the distinct blocks in (p, t) are exactly the accesses r in
+(p, t) whose own previous use is at or before p:
+
+    d(t) = #{r in (p, t) : prev(r) <= p}
+
+This is a 2-D dominance count, the query a Fenwick-tree sweep answers one
+access at a time. Here it is answered for a whole chunk at once by a
+bottom-up merge pass: log2(n) levels, each one vectorized merge plus one
+searchsorted. Blocks last used before the chunk are counted from their
+last-use times with one more searchsorted, so a trace streams in fixed-size
+chunks and memory stays bounded by the chunk and the block footprint.
+"""
+
+from typing import Iterable, List, Optional
+
+import numpy as np
+
+
+def count_prior_at_most(values: np.ndarray, thresholds: np.ndarray) -> np.ndarray:
+    """
+    For every position t, count earlier positions r < t with values[r] <= thresholds[t]
+
+    Bottom-up merge: at each level, the left half of every block is already
+    sorted, so each right-half position counts its left-half matches with
+    one global searchsorted over block-offset keys.
+
+    Args:
+        values: int64 array, all entries >= -1
+        thresholds: int64 array of the same length, all entries >= -1
+
+    Returns:
+        int64 array of counts
+    """
+    n = values.size
+    if n < 2:
+        return np.zeros(n, dtype=np.int64)
+
+    # Pad to a power of two with values no threshold reaches, then shift
+    # everything into [0, span) so block-offset keys never collide
+    size = 1 << (n - 1).bit_length()
+    span = int(max(values.max(), thresholds.max())) + 3
+    merged = np.full(size, span - 1, dtype=np.int64)
+    merged[:n] = values + 1
+    queries = np.zeros(size, dtype=np.int64)
+    queries[:n] = thresholds + 1
+    counts = np.zeros(size, dtype=np.int64)
+
+    width = 1
+    while width < size:
+        num_blocks = size // (2 * width)
+        offsets = np.arange(num_blocks, dtype=np.int64)[:, None] * span
+
+        # Left halves are sorted, so with block offsets they form one sorted array
+        left_keys = (merged.reshape(num_blocks, 2, width)[:, 0, :] + offsets).ravel()
+        right_queries = queries.reshape(num_blocks, 2, width)[:, 1, :] + offsets
+        matched = np.searchsorted(left_keys, right_queries.ravel(), side='right')
+        left_begin = np.arange(num_blocks, dtype=np.int64)[:, None] * width
+        counts.reshape(num_blocks, 2, width)[:, 1, :] += matched.reshape(num_blocks, width) - left_begin
+
+        # Merge the two sorted halves of every block (two runs per row, so the
+        # stable sort is a linear merge)
+        merged = np.sort(merged.reshape(num_blocks, 2 * width), axis=1, kind='stable').ravel()
+        width *= 2
+
+    return counts[:n]
+
+
+class ReuseDistanceHistogram:
+    """
+    Stack-distance histogram of a trace
+
+    counts[d] is the number of non-cold accesses with stack distance d.
+    Distances are per set when num_sets > 1, so misses for any associativity
+    of that set count are exact.
+    """
+
+    def __init__(self, counts: np.ndarray, cold_misses: int, num_sets: int = 1,
+                 block_size: Optional[int] = None):
+        self.counts = np.asarray(counts, dtype=np.int64)
+        self.cold_misses = int(cold_misses)
+        self.num_sets = num_sets
+        self.block_size = block_size
+        self.total_accesses = int(self.counts.sum()) + self.cold_misses
+        # at_least[d] = number of accesses with distance >= d
+        self._at_least = np.concatenate((np.cumsum(self.counts[::-1])[::-1], [0]))
+
+    def lru_misses(self, blocks_per_set: int) -> int:
+        """Exact LRU misses when each of the num_sets sets holds blocks_per_set blocks"""
+        capped = min(max(int(blocks_per_set), 0), self.counts.size)
+        return self.cold_misses + int(self._at_least[capped])
+
+    def set_associative_misses(self, num_sets: int, associativity: int) -> float:
+        """
+        Misses of an S-set, assoc-way LRU cache
+
+        Exact when num_sets matches the histogram's set count (or the
+        histogram is fully associative and num_sets == 1); otherwise Smith's
+        binomial approximation maps the fully associative histogram onto
+        randomly indexed sets.
+        """
+        if num_sets == self.num_sets:
+            return float(self.lru_misses(associativity))
+        return self.cold_misses + float(np.dot(self.counts,
+                                               self.miss_probability(num_sets, associativity)))
+
+    def miss_probability(self, num_sets: int, associativity: int) -> np.ndarray:
+        """
+        Probability that a reuse at each stack distance misses in an S-set,
+        assoc-way LRU cache (0/1 when num_sets matches the histogram)
+        """
+        distances = np.arange(self.counts.size, dtype=np.float64)
+        if num_sets == self.num_sets:
+            return (distances >= associativity).astype(np.float64)
+        if self.num_sets != 1:
+            raise ValueError(f"Histogram was built for {self.num_sets} sets; "
+                             f"build it with num_sets=1 or {num_sets}")
+
+        p = 1.0 / num_sets
+        # P(Binomial(d, p) < assoc) via the pmf recurrence
+        pmf = np.power(1.0 - p, distances)
+        hit_probability = pmf.copy()
+        for k in range(1, associativity):
+            pmf = pmf * np.maximum(distances - k + 1, 0) / k * (p / (1.0 - p))
+            hit_probability += pmf
+        return 1.0 - np.minimum(hit_probability, 1.0)
+
+    def miss_rate(self, cache_size: int, associativity: int, block_size: Optional[int] = None) -> float:
+        """Miss rate of an LRU cache with the given size and associativity"""
+        block_size = block_size or self.block_size
+        if block_size is None:
+            raise ValueError("block_size is required")
+        num_sets = max(1, (cache_size // block_size) // associativity)
+        if self.total_accesses == 0:
+            return 0.0
+        return self.set_associative_misses(num_sets, associativity) / self.total_accesses
+
+    def miss_rate_curve(self, cache_sizes: Iterable[int], associativity: int,
+                        block_size: Optional[int] = None) -> List[float]:
+        """Miss rates for a sweep of cache sizes from this one histogram"""
+        return [self.miss_rate(size, associativity, block_size) for size in cache_sizes]
+
+    def percentile(self, q: float) -> float:
+        """Stack distance at percentile q (0-100) of the non-cold accesses"""
+        reuses = self.total_accesses - self.cold_misses
+        if reuses == 0:
+            return float('nan')
+        rank = np.searchsorted(np.cumsum(self.counts), q / 100.0 * reuses, side='left')
+        return float(min(rank, self.counts.size - 1))
+
+
+class StackDistanceAnalyzer:
+    """
+    Streaming stack-distance computation over chunks of a block trace
+
+    State between chunks is the last-use time of every block seen so far,
+    kept as two aligned arrays sorted by block number.
+    """
+
+    def __init__(self, num_sets: int = 1):
+        """
+        Args:
+            num_sets: 1 for fully associative distances, S for per-set distances
+        """
+        self.num_sets = num_sets
+        self.known_blocks = np.empty(0, dtype=np.int64)
+        self.last_use = np.empty(0, dtype=np.int64)
+        self.time = 0
+        self.counts = np.zeros(0, dtype=np.int64)
+        self.cold_misses = 0
+
+    def update(self, blocks: np.ndarray) -> np.ndarray:
+        """
+        Process the next chunk of the trace
+
+        Args:
+            blocks: Block numbers in trace order
+
+        Returns:
+            Stack distance of each access, -1 for cold (first) accesses
+        """
+        blocks = np.asarray(blocks, dtype=np.int64)
+        n = blocks.size
+        if n == 0:
+            return np.empty(0, dtype=np.int64)
+        chunk_start = self.time
+        times = chunk_start + np.arange(n, dtype=np.int64)
+
+        # Register new blocks so every block in the chunk has a last-use slot
+        unique_blocks = np.unique(blocks)
+        new_blocks = unique_blocks[~np.isin(unique_blocks, self.known_blocks, assume_unique=True)]
+        if new_blocks.size:
+            merged = np.concatenate((self.known_blocks, new_blocks))
+            order = np.argsort(merged, kind='stable')
+            self.known_blocks = merged[order]
+            self.last_use = np.concatenate((self.last_use,
+                                            np.full(new_blocks.size, -1, dtype=np.int64)))[order]
+        slot = np.searchsorted(self.known_blocks, blocks)
+
+        # Group by set (trace order kept inside each set)
+        sets = blocks % self.num_sets
+        if self.num_sets > 1:
+            order = np.argsort(sets, kind='stable')
+        else:
+            order = np.arange(n)
+        s_sets = sets[order]
+        s_blocks = blocks[order]
+        s_times = times[order]
+        s_slot = slot[order]
+
+        positions = np.arange(n, dtype=np.int64)
+        run_start = np.ones(n, dtype=bool)
+        run_start[1:] = s_sets[1:] != s_sets[:-1]
+        run_first = np.maximum.accumulate(np.where(run_start, positions, 0))
+
+        # Previous use of the same block: inside the chunk (sorted position) or
+        # before it (last-use time from earlier chunks)
+        by_block = np.lexsort((positions, s_blocks))
+        same_as_prev = np.zeros(n, dtype=bool)
+        same_as_prev[1:] = s_blocks[by_block[1:]] == s_blocks[by_block[:-1]]
+        prev_position = np.full(n, -1, dtype=np.int64)
+        prev_position[by_block[1:][same_as_prev[1:]]] = by_block[:-1][same_as_prev[1:]]
+        in_chunk = prev_position >= 0
+        prev_time = np.where(in_chunk, s_times[np.maximum(prev_position, 0)],
+                             self.last_use[s_slot])
+
+        # Dominance count restricted to the same set: earlier sets always pass
+        # because their keys are smaller, so subtract the run offset
+        horizon = self.time + n + 2
+        keys = s_sets * horizon + prev_time + 1
+        counted = count_prior_at_most(keys, keys) - run_first
+
+        distances = np.full(n, -1, dtype=np.int64)
+        # Reuse inside the chunk
+        distances[in_chunk] = counted[in_chunk] - (prev_position[in_chunk] - run_first[in_chunk] + 1)
+        # Reuse of a block last used before the chunk
+        earlier = ~in_chunk & (prev_time >= 0)
+        if earlier.any():
+            keys = np.sort((self.known_blocks % self.num_sets) * horizon + self.last_use + 1)
+            set_base = s_sets[earlier] * horizon
+            newer = (np.searchsorted(keys, set_base + horizon, side='left')
+                     - np.searchsorted(keys, set_base + prev_time[earlier] + 1, side='right'))
+            distances[earlier] = newer + counted[earlier]
+
+        # Record last use of every block touched in this chunk
+        np.maximum.at(self.last_use, slot, times)
+        self.time += n
+
+        reuse = distances[distances >= 0]
+        self.cold_misses += int(n - reuse.size)
+        if reuse.size:
+            chunk_counts = np.bincount(reuse)
+            if chunk_counts.size > self.counts.size:
+                chunk_counts[:self.counts.size] += self.counts
+                self.counts = chunk_counts
+            else:
+                self.counts[:chunk_counts.size] += chunk_counts
+
+        result = np.empty(n, dtype=np.int64)
+        result[order] = distances
+        return result
+
+    def histogram(self, block_size: Optional[int] = None) -> ReuseDistanceHistogram:
+        """Histogram of all accesses processed so far"""
+        return ReuseDistanceHistogram(self.counts, self.cold_misses, self.num_sets, block_size)
+
+
+def reuse_distance_histogram(block_chunks: Iterable[np.ndarray], num_sets: int = 1,
+                             block_size: Optional[int] = None) -> ReuseDistanceHistogram:
+    """
+    Build the stack-distance histogram of a chunked block trace in one pass
+
+    Args:
+        block_chunks: Iterable of block-number arrays in trace order
+        num_sets: 1 for fully associative distances, S for per-set distances
+        block_size: Block size in bytes, recorded for miss_rate()
+
+    Returns:
+        ReuseDistanceHistogram
+    """
+    analyzer = StackDistanceAnalyzer(num_sets)
+    for blocks in block_chunks:
+        analyzer.update(blocks)
+    return analyzer.histogram(block_size)
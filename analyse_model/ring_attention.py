@@ -0,0 +1,315 @@
+#!/usr/bin/env python3
+"""
+Ring Attention Compute/Communication Overlap Model
+
+With sequence parallelism over P GPUs, every GPU holds one L/P block of
+queries and, at each of the P ring stages, one K,V block of B·(L/P)·d_model
+elements each. It attends its queries to the block it holds and passes the
+block to the next GPU. Per stage:
+
+    attention FLOPs  = 4 · B · (L/P)² · d_model        (QK^T and SV)
+    transfer bytes   = 2 · B · (L/P) · d_model · E     (K and V)
+    compute time     = FLOPs / (peak_flops · compute_efficiency)
+    transfer time    = link_latency + bytes / bandwidth
+
+With k K,V buffers per GPU the block for stage s can be received while
+stage s-1 computes, once the buffer of stage s-k is free:
+
+    transfer_start[s] = max(transfer_end[s-1], compute_end[s-k])
+    compute_start[s]  = max(compute_end[s-1], transfer_end[s])
+
+One buffer serialises transfer and compute. Double buffering (k=2) exposes
+max(0, transfer - compute) per stage, and more buffers do not help in the
+steady state. Communication is fully hidden once compute ≥ transfer. The
+compute grows with (L/P)² and the transfer with L/P, so that holds from a
+block of about E · F / (2 · bandwidth) tokens per GPU, whatever B and d_model.
+The ring runs at its slowest link: NVLink within a node, the inter-node link
+once P exceeds gpus_per_node.
+
+Under a causal mask query i only sees keys j <= i, and how much of a
+stage's block survives depends on which tokens each GPU holds
+(SEQUENCE_PARTITIONS):
+
+- contiguous: GPU p holds tokens [p·L/P, (p+1)·L/P). At stage s it attends to
+  the block of GPU p-s: a full block when that is earlier, nothing when it
+  wraps around to a later one, so GPU 0 idles while GPU P-1 always works
+- zigzag: the sequence is cut into 2P chunks and GPU p holds chunks p and
+  2P-1-p. Every off-diagonal pair of GPUs shares exactly half a block
+- striped: GPU p holds tokens p, p+P, p+2P, ...; every pair shares about
+  half a block, off by one diagonal
+
+The surviving query-key pairs of GPU q against the block of GPU k are
+(u·c² + v·c) / 2 for integer u, v and chunk length c (L/P, or L/(2P) for
+zigzag), so the same coefficients give exact counts and the per-GPU FLOP
+expressions of the RA+SP generators. The ring advances in lockstep, so a
+stage lasts as long as its busiest GPU.
+"""
+
+import math
+from typing import Dict, Optional, Sequence
+
+import numpy as np
+
+from dag_simulator import H100
+
+SEQUENCE_PARTITIONS = ('contiguous', 'zigzag', 'striped')
+
+
+def ring_link(P: int, hardware: Dict) -> Dict:
+    """Bandwidth and latency of the slowest link of a P-GPU ring"""
+    if P > hardware['gpus_per_node']:
+        return {'bandwidth': hardware['internode_bandwidth'], 'latency': hardware['internode_latency']}
+    return {'bandwidth': hardware['nvlink_bandwidth'], 'latency': hardware['nvlink_latency']}
+
+
+def stage_costs(B: int, L: int, d_model: int, P: int, hardware: Optional[Dict] = None,
+                element_size: int = 2) -> Dict:
+    """
+    Work and time of one ring stage on one GPU
+
+    Returns:
+        Dictionary with block tokens, attention FLOPs, K,V bytes, compute
+        and transfer seconds
+    """
+    hardware = {**H100, **(hardware or {})}
+    link = ring_link(P, hardware)
+    block = L / P
+    flops = 4 * B * block ** 2 * d_model
+    nbytes = 2 * B * block * d_model * element_size
+    return {
+        'block_tokens': block,
+        'flops': flops,
+        'kv_bytes': nbytes,
+        'compute_s': flops / (hardware['peak_flops'] * hardware['compute_efficiency']),
+        'transfer_s': link['latency'] + nbytes / link['bandwidth']
+    }
+
+
+def ring_schedule(P: int, compute_s: Sequence[float], transfer_s: float, buffers: int = 2) -> Dict:
+    """
+    Timeline of the P stages of one GPU
+
+    Args:
+        P: Ring stages
+        compute_s: Compute seconds of every stage (one value for all)
+        transfer_s: Seconds to receive one K,V block
+        buffers: K,V buffers per GPU (1: no overlap, 2: double buffering)
+
+    Returns:
+        Dictionary with per-stage transfer and compute start/end, the
+        exposed communication before each stage and the total time
+    """
+    if buffers < 1:
+        raise ValueError(f"Need at least one K,V buffer, got {buffers}")
+    compute = np.broadcast_to(np.asarray(compute_s, dtype=float), (P,))
+    transfer_start, transfer_end = np.zeros(P), np.zeros(P)
+    compute_start, compute_end = np.zeros(P), np.zeros(P)
+    for stage in range(P):
+        if stage:
+            freed = compute_end[stage - buffers] if stage >= buffers else 0.0
+            transfer_start[stage] = max(transfer_end[stage - 1], freed)
+            transfer_end[stage] = transfer_start[stage] + transfer_s
+            compute_start[stage] = max(compute_end[stage - 1], transfer_end[stage])
+        compute_end[stage] = compute_start[stage] + compute[stage]
+    exposed = compute_start - np.concatenate(([0.0], compute_end[:-1]))
+    return {
+        'buffers': buffers,
+        'transfer_start_s': transfer_start,
+        'transfer_end_s': transfer_end,
+        'compute_start_s': compute_start,
+        'compute_end_s': compute_end,
+        'exposed_s': exposed,
+        'total_s': float(compute_end[-1])
+    }
+
+
+def min_hidden_seq_len(B: int, d_model: int, P: int, hardware: Optional[Dict] = None,
+                       element_size: int = 2) -> int:
+    """
+    Shortest L (a multiple of P) at which every transfer hides behind a stage's compute
+
+    Solves a·n² ≥ b·n + latency for the block size n = L/P, with
+    a = 4·B·d_model / F and b = 2·B·d_model·E / bandwidth.
+    """
+    hardware = {**H100, **(hardware or {})}
+    link = ring_link(P, hardware)
+    a = 4 * B * d_model / (hardware['peak_flops'] * hardware['compute_efficiency'])
+    b = 2 * B * d_model * element_size / link['bandwidth']
+    block = (b + math.sqrt(b * b + 4 * a * link['latency'])) / (2 * a)
+    return P * math.ceil(block)
+
+
+def ring_attention_overlap(B: int, L: int, d_model: int, P: int, hardware: Optional[Dict] = None,
+                           buffers: int = 2, element_size: int = 2) -> Dict:
+    """
+    Exposed communication of a Ring Attention pass with double-buffered K,V blocks
+
+    Args:
+        B, L, d_model: Batch, sequence length and model width
+        P: GPUs in the ring
+        hardware: Overrides of dag_simulator.H100
+        buffers: K,V buffers per GPU
+        element_size: Bytes per element
+
+    Returns:
+        Dictionary with the stage costs, the schedule with the given buffers
+        and with one buffer, the exposed communication per stage and in
+        total, the fraction of transfer time hidden and the minimum L at
+        which communication is fully hidden
+    """
+    costs = stage_costs(B, L, d_model, P, hardware, element_size)
+    schedule = ring_schedule(P, costs['compute_s'], costs['transfer_s'], buffers)
+    serial = ring_schedule(P, costs['compute_s'], costs['transfer_s'], 1)
+    transfers = (P - 1) * costs['transfer_s']
+    exposed = float(schedule['exposed_s'].sum())
+    return {
+        'B': B, 'L': L, 'd_model': d_model, 'P': P,
+        'stage': costs,
+        'schedule': schedule,
+        'exposed_per_stage_s': schedule['exposed_s'],
+        'exposed_s': exposed,
+        'total_s': schedule['total_s'],
+        'serial_total_s': serial['total_s'],
+        'hidden_fraction': 1 - exposed / transfers if transfers else 1.0,
+        'fully_hidden': costs['compute_s'] >= costs['transfer_s'],
+        'min_hidden_seq_len': min_hidden_seq_len(B, d_model, P, hardware, element_size)
+    }
+
+
+def _check_partition(partition: str) -> None:
+    if partition not in SEQUENCE_PARTITIONS:
+        raise ValueError(f"Unknown sequence partition {partition!r}, expected one of {SEQUENCE_PARTITIONS}")
+
+
+def chunk_length(P: int, partition: str = 'contiguous') -> str:
+    """Tokens of one chunk as an expression over L"""
+    _check_partition(partition)
+    return f'L/{2 * P}' if partition == 'zigzag' else f'L/{P}'
+
+
+def partition_tokens(L: int, P: int, partition: str = 'contiguous') -> np.ndarray:
+    """
+    Token positions each GPU holds
+
+    Returns:
+        (P, L/P) array, row p holding GPU p's tokens in ascending order
+    """
+    _check_partition(partition)
+    parts = 2 * P if partition == 'zigzag' else P
+    if L % parts:
+        raise ValueError(f"L={L} does not split into {parts} equal {partition} chunks")
+    tokens = np.arange(L)
+    if partition == 'contiguous':
+        return tokens.reshape(P, L // P)
+    if partition == 'striped':
+        return tokens.reshape(L // P, P).T
+    chunks = tokens.reshape(parts, L // parts)
+    return np.concatenate((chunks[:P], chunks[::-1][:P]), axis=1)
+
+
+def causal_pair_coefficients(P: int, partition: str = 'contiguous') -> np.ndarray:
+    """
+    Causal query-key pairs of every GPU pair as (u·c² + v·c) / 2
+
+    Returns:
+        (2, P, P) integer array [u, v]; entry [:, q, k] is GPU q's queries
+        against GPU k's keys
+    """
+    _check_partition(partition)
+    gpus = np.arange(P)
+    if partition == 'striped':
+        # Query a·P + q sees key b·P + k iff b < a, or b = a and k <= q
+        return np.stack((np.ones((P, P), dtype=np.int64), np.where(gpus[None, :] <= gpus[:, None], 1, -1)))
+    chunks = gpus[:, None] if partition == 'contiguous' else np.stack((gpus, 2 * P - 1 - gpus), axis=1)
+    # Earlier chunk: c² pairs (u=2); same chunk: c(c+1)/2 (u=1, v=1); later chunk: none
+    query, key = chunks[:, None, :, None], chunks[None, :, None, :]
+    u = (2 * (key < query) + (key == query)).sum(axis=(2, 3))
+    v = (key == query).sum(axis=(2, 3))
+    return np.stack((u, v))
+
+
+def causal_pairs(L: int, P: int, partition: str = 'contiguous') -> np.ndarray:
+    """Causal query-key pairs of GPU q's queries against GPU k's keys, as a (P, P) array"""
+    u, v = causal_pair_coefficients(P, partition)
+    c = L // (2 * P) if partition == 'zigzag' else L // P
+    return (u * c * c + v * c) // 2
+
+
+def causal_flops_expressions(P: int, partition: str = 'contiguous') -> np.ndarray:
+    """
+    Attention FLOP expressions over B, L and d_model of every ring stage on every GPU
+
+    Returns:
+        (P, P) object array; entry [s, p] is GPU p attending to the block of GPU p - s
+    """
+    u, v = causal_pair_coefficients(P, partition)
+    c = chunk_length(P, partition)
+    gpus = np.arange(P)[None, :]
+    origins = (gpus - np.arange(P)[:, None]) % P
+    u, v = u[gpus, origins], v[gpus, origins]
+    # Few distinct (u, v) pairs: write each expression once
+    width = int(v.max() - v.min()) + 1
+    keys = u * width + (v - v.min())
+    expressions = np.empty(keys.max() + 1, dtype=object)
+    for key in np.flatnonzero(np.bincount(keys.ravel())):
+        a, b = divmod(int(key), width)
+        expressions[key] = f'2*B*d_model*({a}*({c})**2 + {b + int(v.min())}*{c})'
+    return expressions[keys]
+
+
+def causal_balance(B: int, L: int, d_model: int, P: int, partition: str = 'zigzag',
+                   hardware: Optional[Dict] = None, buffers: int = 2, element_size: int = 2) -> Dict:
+    """
+    Per-GPU, per-stage causal attention work and the time of the lockstep ring
+
+    Args:
+        B, L, d_model: Batch, sequence length and model width
+        P: GPUs in the ring
+        partition: One of SEQUENCE_PARTITIONS
+        hardware: Overrides of dag_simulator.H100
+        buffers: K,V buffers per GPU
+        element_size: Bytes per element
+
+    Returns:
+        Dictionary with the FLOPs of every stage on every GPU, per GPU and in
+        total, the stage times (busiest GPU), the ring schedule, the
+        imbalance (busiest GPU over the mean) and the lockstep efficiency
+        (useful compute over P times the compute the stages take)
+    """
+    hardware = {**H100, **(hardware or {})}
+    pairs = causal_pairs(L, P, partition)
+    gpus = np.arange(P)
+    stage_flops = np.stack([4 * B * d_model * pairs[gpus, (gpus - stage) % P] for stage in range(P)]).astype(float)
+    per_gpu = stage_flops.sum(axis=0)
+    rate = hardware['peak_flops'] * hardware['compute_efficiency']
+    stage_s = stage_flops.max(axis=1) / rate
+    costs = stage_costs(B, L, d_model, P, hardware, element_size)
+    schedule = ring_schedule(P, stage_s, costs['transfer_s'], buffers)
+    return {
+        'partition': partition,
+        'B': B, 'L': L, 'd_model': d_model, 'P': P,
+        'stage_flops': stage_flops,
+        'per_gpu_flops': per_gpu,
+        'total_flops': float(per_gpu.sum()),
+        'stage_s': stage_s,
+        'transfer_s': costs['transfer_s'],
+        'schedule': schedule,
+        'total_s': schedule['total_s'],
+        'imbalance': float(per_gpu.max() / per_gpu.mean()),
+        'lockstep_efficiency': float(per_gpu.sum() / (P * stage_flops.max(axis=1).sum()))
+    }
+
+
+def compare_partitions(B: int, L: int, d_model: int, P: int, hardware: Optional[Dict] = None,
+                       buffers: int = 2, element_size: int = 2) -> Dict:
+    """
+    causal_balance for every partition, with each one's gain over contiguous
+
+    Returns:
+        {partition: causal_balance result plus 'gain', contiguous time over its time}
+    """
+    results = {partition: causal_balance(B, L, d_model, P, partition, hardware, buffers, element_size)
+               for partition in SEQUENCE_PARTITIONS}
+    for result in results.values():
+        result['gain'] = results['contiguous']['total_s'] / result['total_s']
+    return results
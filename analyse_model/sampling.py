@@ -0,0 +1,297 @@
+#!/usr/bin/env python3
+"""
+Sampled (Approximate) GEMM Miss Analysis with Confidence Intervals
+
+Two estimators trade exactness for speed on large shapes. Both generate only
+the sampled part of the trace (cache_simulator.sampled_matrix_multiplication_trace),
+so their cost scales with the sample, not with M*N*K.
+
+Set sampling. LRU sets are independent, so the accesses of a sample of sets
+are replayed exactly (per-set stack distances) and the miss ratio of the
+sample is scaled to the whole cache. Sets are drawn uniformly ('random') or
+a few from each contiguous range of sets ('stratified'). The sampled sets
+are clusters of accesses; the interval comes from the ratio estimator
+
+    r = sum(misses) / sum(accesses),
+    Var(r) ~ sum_h N_h^2 (1 - n_h/N_h) s_h^2 / n_h / X^2
+
+with s_h^2 the variance of (misses - r*accesses) over the sampled sets of
+stratum h and X the estimated total accesses. A stratum that is not
+exhausted but has fewer than two sampled sets gives no variance estimate,
+and the interval is then the uninformative [0, 1].
+
+SHARDS. Blocks are kept when a hash of the block number falls below
+rate * 2^24, which samples a fixed fraction of the blocks together with all
+of their accesses. Stack distances on the sampled trace, divided by the
+rate, estimate the distances of the full trace, which gives the
+fully-associative miss-ratio curve (and Smith's set-associative estimate)
+for every cache size at once. Sampled blocks are the clusters of the same
+ratio estimator; a single sampled block likewise gives the interval [0, 1].
+"""
+
+from statistics import NormalDist
+from typing import Dict, Optional, Sequence
+
+import numpy as np
+
+from cache_simulator import MATRIX_NAMES, sampled_matrix_multiplication_trace
+from reuse_distance import ReuseDistanceHistogram, StackDistanceAnalyzer
+
+SAMPLING_METHODS = ('random', 'stratified')
+DEFAULT_CONFIDENCE = 0.95
+
+# Hash precision of SHARDS block sampling
+SHARDS_HASH_BITS = 24
+SHARDS_MULTIPLIER = np.uint64(0x9E3779B97F4A7C15)
+
+
+def ratio_estimate(misses: np.ndarray, accesses: np.ndarray, strata: np.ndarray,
+                   stratum_sizes: Sequence[int], confidence: float = DEFAULT_CONFIDENCE) -> Dict:
+    """
+    Miss ratio of a cluster sample with a normal-approximation confidence interval
+
+    Args:
+        misses: Misses of each sampled cluster (set or block)
+        accesses: Accesses of each sampled cluster
+        strata: Stratum of each sampled cluster
+        stratum_sizes: Number of clusters in each stratum of the population
+        confidence: Two-sided confidence level
+
+    Returns:
+        Dictionary with the miss ratio, its standard error and interval.
+        A stratum sampled short of exhaustion with fewer than two clusters
+        has no variance estimate; the standard error is then infinite and
+        the interval [0, 1].
+    """
+    misses = np.asarray(misses, dtype=np.float64)
+    accesses = np.asarray(accesses, dtype=np.float64)
+    strata = np.asarray(strata)
+
+    estimated_misses = 0.0
+    estimated_accesses = 0.0
+    for stratum, size in enumerate(stratum_sizes):
+        chosen = strata == stratum
+        if chosen.any():
+            estimated_misses += size * misses[chosen].mean()
+            estimated_accesses += size * accesses[chosen].mean()
+    ratio = estimated_misses / estimated_accesses if estimated_accesses else 0.0
+
+    variance = 0.0
+    for stratum, size in enumerate(stratum_sizes):
+        chosen = strata == stratum
+        sampled = int(chosen.sum())
+        if sampled >= size:
+            continue
+        if sampled < 2:
+            variance = np.inf
+            break
+        residuals = misses[chosen] - ratio * accesses[chosen]
+        variance += size**2 * (1 - sampled / size) * residuals.var(ddof=1) / sampled
+    standard_error = float(np.sqrt(variance)) / estimated_accesses if estimated_accesses else 0.0
+
+    z = NormalDist().inv_cdf(0.5 + confidence / 2)
+    return {
+        'miss_rate': float(ratio),
+        'standard_error': standard_error,
+        'confidence': confidence,
+        'confidence_interval': (float(max(ratio - z * standard_error, 0.0)),
+                                float(min(ratio + z * standard_error, 1.0)))
+    }
+
+
+def sample_cache_sets(num_sets: int, sample_sets: int, method: str = 'stratified',
+                      seed: int = 0) -> Dict:
+    """
+    Choose the sets to simulate
+
+    'random' draws sample_sets sets uniformly without replacement.
+    'stratified' splits the sets into sample_sets // 2 contiguous ranges and
+    draws two from each, so every region of the index space is represented
+    and each stratum still has a variance estimate.
+
+    Returns:
+        Dictionary with the sorted sampled sets, their strata and the
+        number of sets in each stratum
+    """
+    if method not in SAMPLING_METHODS:
+        raise ValueError(f"Unknown sampling method {method!r}, expected one of {SAMPLING_METHODS}")
+    rng = np.random.default_rng(seed)
+    sample_sets = max(1, min(sample_sets, num_sets))
+
+    if method == 'random':
+        ranges = [np.arange(num_sets)]
+        counts = [sample_sets]
+    else:
+        ranges = np.array_split(np.arange(num_sets), max(1, sample_sets // 2))
+        counts = [len(part) for part in np.array_split(np.arange(sample_sets), len(ranges))]
+
+    sets = []
+    strata = []
+    for stratum, (candidates, count) in enumerate(zip(ranges, counts)):
+        chosen = rng.choice(candidates, size=min(count, candidates.size), replace=False)
+        sets.append(chosen)
+        strata.append(np.full(chosen.size, stratum))
+    sets = np.concatenate(sets)
+    strata = np.concatenate(strata)
+    order = np.argsort(sets)
+    return {
+        'sets': sets[order],
+        'strata': strata[order],
+        'stratum_sizes': [candidates.size for candidates in ranges]
+    }
+
+
+def set_sampled_analysis(num_sets: int, block_size: int, associativity: int,
+                         M: int, K: int, N: int, element_size: int = 8,
+                         loop_order: str = 'ijk', register_reuse: bool = False,
+                         sample_sets: int = 32, method: str = 'stratified', seed: int = 0,
+                         confidence: float = DEFAULT_CONFIDENCE) -> Dict:
+    """
+    Estimate the LRU miss rate of a GEMM by simulating a sample of cache sets
+
+    Args:
+        num_sets, block_size, associativity: Cache geometry
+        M, K, N: Matrix dimensions
+        element_size: Size of each element in bytes
+        loop_order: Loop nest order from outermost to innermost
+        register_reuse: Keep the innermost-loop invariant operand in a register
+        sample_sets: Number of sets to simulate
+        method: 'stratified' or 'random'
+        seed: Seed of the set selection
+        confidence: Two-sided confidence level of the interval
+
+    Returns:
+        Dictionary with the estimated miss rate, its interval, the estimated
+        misses, the sampling rate and the work done
+    """
+    sample = sample_cache_sets(num_sets, sample_sets, method, seed)
+    sets = sample['sets']
+    set_accesses = np.zeros(sets.size, dtype=np.int64)
+    set_misses = np.zeros(sets.size, dtype=np.int64)
+    matrix_accesses = np.zeros(len(MATRIX_NAMES), dtype=np.int64)
+    matrix_misses = np.zeros(len(MATRIX_NAMES), dtype=np.int64)
+
+    # Per-set stack distances replay each sampled set's LRU state exactly
+    analyzer = StackDistanceAnalyzer(num_sets)
+    trace = sampled_matrix_multiplication_trace(
+        M, K, N, block_size, lambda blocks: np.isin(blocks % num_sets, sets),
+        element_size, loop_order, register_reuse=register_reuse)
+    for addresses, matrix_ids in trace:
+        blocks = addresses // block_size
+        distances = analyzer.update(blocks)
+        miss = (distances < 0) | (distances >= associativity)
+        slot = np.searchsorted(sets, blocks % num_sets)
+        set_accesses += np.bincount(slot, minlength=sets.size)
+        set_misses += np.bincount(slot[miss], minlength=sets.size)
+        matrix_accesses += np.bincount(matrix_ids, minlength=len(MATRIX_NAMES))
+        matrix_misses += np.bincount(matrix_ids[miss], minlength=len(MATRIX_NAMES))
+
+    estimate = ratio_estimate(set_misses, set_accesses, sample['strata'],
+                              sample['stratum_sizes'], confidence)
+    total_accesses = _total_accesses(M, K, N, loop_order, register_reuse)
+    return {
+        'method': method,
+        'sampled_sets': int(sets.size),
+        'sampling_rate': sets.size / num_sets,
+        'sampled_accesses': int(set_accesses.sum()),
+        'total_accesses': total_accesses,
+        'estimated_misses': estimate['miss_rate'] * total_accesses,
+        **estimate,
+        'per_matrix_sampled': {
+            name: {'accesses': int(matrix_accesses[matrix_id]),
+                   'misses': int(matrix_misses[matrix_id])}
+            for matrix_id, name in enumerate(MATRIX_NAMES)
+        }
+    }
+
+
+def shards_analysis(num_sets: int, block_size: int, associativity: int,
+                    M: int, K: int, N: int, element_size: int = 8,
+                    loop_order: str = 'ijk', register_reuse: bool = False,
+                    sampling_rate: float = 0.01, cache_sizes: Optional[Sequence[int]] = None,
+                    seed: int = 0, confidence: float = DEFAULT_CONFIDENCE) -> Dict:
+    """
+    SHARDS miss-ratio curve of a GEMM from a hash-selected sample of blocks
+
+    Args:
+        num_sets, block_size, associativity: Geometry of the cache whose
+            miss rate gets a confidence interval
+        M, K, N: Matrix dimensions
+        element_size: Size of each element in bytes
+        loop_order: Loop nest order from outermost to innermost
+        register_reuse: Keep the innermost-loop invariant operand in a register
+        sampling_rate: Fraction of blocks sampled, in (0, 1] and no finer than 2^-24
+        cache_sizes: Cache sizes in bytes for the miss-ratio curve
+        seed: Salt of the block hash
+        confidence: Two-sided confidence level of the interval
+
+    Returns:
+        Dictionary with the miss rate of the given cache and its interval,
+        the fully associative and set-associative miss-ratio curves, and
+        the sampling rate and work done
+    """
+    if not 0 < sampling_rate <= 1:
+        raise ValueError(f"sampling_rate must be in (0, 1], got {sampling_rate}")
+    if int(sampling_rate * (1 << SHARDS_HASH_BITS)) < 1:
+        raise ValueError(f"sampling_rate {sampling_rate} is below the hash resolution "
+                         f"2^-{SHARDS_HASH_BITS}")
+    threshold = np.uint64(int(sampling_rate * (1 << SHARDS_HASH_BITS)))
+    salt = np.uint64(seed)
+
+    def keep_blocks(blocks: np.ndarray) -> np.ndarray:
+        hashed = (blocks.astype(np.uint64) ^ salt) * SHARDS_MULTIPLIER
+        return (hashed >> np.uint64(64 - SHARDS_HASH_BITS)) < threshold
+
+    analyzer = StackDistanceAnalyzer(1)
+    block_chunks = []
+    distance_chunks = []
+    trace = sampled_matrix_multiplication_trace(M, K, N, block_size, keep_blocks, element_size,
+                                                loop_order, register_reuse=register_reuse)
+    for addresses, _ in trace:
+        blocks = addresses // block_size
+        block_chunks.append(blocks)
+        distance_chunks.append(analyzer.update(blocks))
+    blocks = np.concatenate(block_chunks) if block_chunks else np.zeros(0, dtype=np.int64)
+    distances = np.concatenate(distance_chunks) if distance_chunks else np.zeros(0, dtype=np.int64)
+
+    # Distances among sampled blocks scale up by the sampling rate
+    effective_rate = int(threshold) / (1 << SHARDS_HASH_BITS)
+    reuse = distances >= 0
+    scaled = np.zeros(distances.size, dtype=np.int64)
+    scaled[reuse] = np.floor(distances[reuse] / effective_rate).astype(np.int64)
+    histogram = ReuseDistanceHistogram(np.bincount(scaled[reuse]) if reuse.any() else np.zeros(1),
+                                       int((~reuse).sum()), 1, block_size)
+
+    # Per-block misses of the given cache for the interval
+    miss_probability = np.ones(distances.size)
+    miss_probability[reuse] = histogram.miss_probability(num_sets, associativity)[scaled[reuse]]
+    sampled_blocks, slot = np.unique(blocks, return_inverse=True)
+    total_blocks = sum(-(-count * element_size // block_size) for count in (M * K, K * N, M * N))
+    estimate = ratio_estimate(np.bincount(slot, weights=miss_probability),
+                              np.bincount(slot), np.zeros(sampled_blocks.size, dtype=np.int64),
+                              [max(total_blocks, sampled_blocks.size)], confidence)
+
+    if cache_sizes is None:
+        cache_sizes = [(1 << exponent) * 1024 for exponent in range(2, 15)]
+    accesses = histogram.total_accesses
+    return {
+        'sampling_rate': effective_rate,
+        'sampled_blocks': int(sampled_blocks.size),
+        'sampled_accesses': int(distances.size),
+        'total_accesses': _total_accesses(M, K, N, loop_order, register_reuse),
+        **estimate,
+        'cache_sizes': list(cache_sizes),
+        'fully_associative_miss_rates': [
+            histogram.lru_misses(size // block_size) / accesses if accesses else 0.0
+            for size in cache_sizes
+        ],
+        'set_associative_miss_rates': histogram.miss_rate_curve(cache_sizes, associativity)
+    }
+
+
+def _total_accesses(M: int, K: int, N: int, loop_order: str, register_reuse: bool) -> int:
+    """Accesses of the full trace (the invariant operand once per innermost loop)"""
+    if not register_reuse:
+        return 3 * M * K * N
+    extents = {'i': M, 'j': N, 'k': K}
+    return 2 * M * K * N + M * K * N // extents[loop_order[-1]]
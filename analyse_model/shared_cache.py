@@ -0,0 +1,328 @@
+#!/usr/bin/env python3
+"""
+Shared-Cache Contention Model for Multi-Threaded GEMM
+
+T threads split C = A × B by rows (partition 'i') or columns (partition
+'j'). Thread t runs the whole loop nest, plain or tiled, over its own slice:
+- partition 'i': C[i0:i1, :] = A[i0:i1, :] × B, so every thread streams all of B
+- partition 'j': C[:, j0:j1] = A × B[:, j0:j1], so every thread streams all of A
+
+The slices are sub-GEMMs with the leading dimensions of the full matrices,
+so each thread's trace is gemm_trace on the slice's shape and layout.
+The threads run at the same rate: their streams are interleaved round-robin,
+`quantum` accesses per thread per turn, into one set-associative cache,
+the last-level cache they share.
+
+Every miss is charged to the thread that caused it. Each thread's stream is
+also simulated alone in a cache of the same size. Interference misses are
+the shared misses minus these isolated misses. They are positive when the
+threads evict each other's data, and negative when a thread hits on a block
+another thread brought in (the shared operand).
+
+shared_tile_sweep simulates a set of tile candidates for each thread count
+and reports every candidate with the fewest aggregate misses; best_tile
+breaks ties toward a tiled candidate. The best tile need not shrink as T
+grows: with an 'i' split the threads share B. At 96³ ikj in 32KB, 32³ stays
+best up to 16 threads and ties the untiled nest at 32 (three rows each);
+16³ only wins at 64 threads, where the uneven one- and two-row slices fall
+out of step. The sweep also reports the tile tiling.TiledGEMMModel picks
+for thread 0's slice in a fair share of the cache (C/T). That estimate
+ignores the shared operand and is not predictive here: it disagrees with
+the simulation at 4 and 8 threads (fair_share_agrees).
+"""
+
+from typing import Dict, Iterator, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from cache_simulator import (DEFAULT_CHUNK_ITERATIONS, MATRIX_NAMES, gemm_trace,
+                             matrix_layout, simulation_summary)
+from replacement import make_cache
+from tiling import TiledGEMMModel
+
+PARTITIONS = ('i', 'j')
+
+# Thread counts of the default tile sweep
+DEFAULT_THREAD_COUNTS = (1, 2, 4, 8, 16, 32, 64)
+
+
+def thread_ranges(extent: int, threads: int) -> List[Tuple[int, int]]:
+    """
+    Contiguous [start, stop) slices of a loop for each thread, sizes differing by at most one
+
+    Threads beyond the extent get empty slices.
+    """
+    bounds = [extent * thread // threads for thread in range(threads + 1)]
+    return list(zip(bounds[:-1], bounds[1:]))
+
+
+def thread_slice(M: int, K: int, N: int, start: int, stop: int, partition: str = 'i',
+                 element_size: int = 8,
+                 layout: Optional[Tuple[Tuple[int, int], ...]] = None
+                 ) -> Tuple[Tuple[int, int, int], Tuple[Tuple[int, int], ...]]:
+    """
+    Shape and layout of one thread's sub-GEMM
+
+    Args:
+        M, K, N: Dimensions of the whole multiplication
+        start, stop: Range of the partitioned loop owned by the thread
+        partition: 'i' (rows of A and C) or 'j' (columns of B and C)
+        element_size: Size of each element in bytes
+        layout: Optional matrix_layout of the whole matrices (default: packed)
+
+    Returns:
+        ((M, K, N) of the slice, matrix_layout of the slice)
+    """
+    if partition not in PARTITIONS:
+        raise ValueError(f"Unknown partition {partition!r}, expected one of {PARTITIONS}")
+    if layout is None:
+        layout = matrix_layout(M, K, N, element_size)
+    (A_start, A_ld), (B_start, B_ld), (C_start, C_ld) = layout
+    if partition == 'i':
+        return ((stop - start, K, N),
+                ((A_start + start * A_ld * element_size, A_ld), (B_start, B_ld),
+                 (C_start + start * C_ld * element_size, C_ld)))
+    return ((M, K, stop - start),
+            ((A_start, A_ld), (B_start + start * element_size, B_ld),
+             (C_start + start * element_size, C_ld)))
+
+
+def interleave_threads(traces: Sequence[Iterator[Tuple[np.ndarray, np.ndarray]]],
+                       quantum: int = 1, round_accesses: int = 3 * DEFAULT_CHUNK_ITERATIONS
+                       ) -> Iterator[Tuple[np.ndarray, np.ndarray, np.ndarray]]:
+    """
+    Merge per-thread traces round-robin, quantum accesses per thread per turn
+
+    Threads whose trace has ended drop out; the others keep their turns.
+
+    Args:
+        traces: One chunked (addresses, matrix_ids) trace per thread
+        quantum: Consecutive accesses a thread issues per turn
+        round_accesses: Accesses merged per chunk over all threads
+
+    Yields:
+        (addresses, matrix_ids, thread_ids) in shared-cache order
+    """
+    threads = len(traces)
+    per_thread = max(quantum, round_accesses // max(threads, 1) // quantum * quantum)
+    buffers = [_ChunkBuffer(trace) for trace in traces]
+    while True:
+        pieces = [buffer.take(per_thread) for buffer in buffers]
+        if not any(addresses.size for addresses, _ in pieces):
+            return
+        # Turn number of each access, then thread number within the turn
+        keys = np.concatenate([np.arange(addresses.size, dtype=np.int64) // quantum * threads
+                               + thread for thread, (addresses, _) in enumerate(pieces)])
+        order = np.argsort(keys, kind='stable')
+        thread_ids = np.repeat(np.arange(threads, dtype=np.int32),
+                               [addresses.size for addresses, _ in pieces])
+        yield (np.concatenate([addresses for addresses, _ in pieces])[order],
+               np.concatenate([matrix_ids for _, matrix_ids in pieces])[order],
+               thread_ids[order])
+
+
+class _ChunkBuffer:
+    """Re-chunk a trace into pieces of a requested length"""
+
+    def __init__(self, trace: Iterator[Tuple[np.ndarray, np.ndarray]]):
+        self.trace = iter(trace)
+        self.addresses = np.zeros(0, dtype=np.int64)
+        self.matrix_ids = np.zeros(0, dtype=np.int8)
+
+    def take(self, count: int) -> Tuple[np.ndarray, np.ndarray]:
+        """The next count accesses (fewer at the end of the trace)"""
+        addresses, matrix_ids = [self.addresses], [self.matrix_ids]
+        available = self.addresses.size
+        while available < count:
+            chunk = next(self.trace, None)
+            if chunk is None:
+                break
+            addresses.append(chunk[0])
+            matrix_ids.append(chunk[1])
+            available += chunk[0].size
+        addresses = np.concatenate(addresses)
+        matrix_ids = np.concatenate(matrix_ids)
+        self.addresses, self.matrix_ids = addresses[count:], matrix_ids[count:]
+        return addresses[:count], matrix_ids[:count]
+
+
+def simulate_shared_gemm(num_sets: int, block_size: int, associativity: int,
+                         M: int, K: int, N: int, threads: int, partition: str = 'i',
+                         element_size: int = 8, loop_order: str = 'ijk',
+                         tiles: Optional[Tuple[int, int, int]] = None,
+                         register_reuse: bool = False, policy: str = 'lru',
+                         quantum: int = 1, isolated: bool = True,
+                         chunk_iterations: int = DEFAULT_CHUNK_ITERATIONS) -> Dict:
+    """
+    Simulate T threads multiplying slices of C = A × B through one shared cache
+
+    Args:
+        num_sets: Number of sets of the shared cache
+        block_size: Block size in bytes
+        associativity: Ways per set
+        M, K, N: Matrix dimensions
+        threads: Number of threads
+        partition: Loop split across the threads, 'i' or 'j'
+        element_size: Size of each element in bytes
+        loop_order: Loop nest order of every thread (of the tile and point
+                    loops with tiles)
+        tiles: Optional (tile_M, tile_K, tile_N) of every thread's loop nest
+        register_reuse: Keep the innermost-loop invariant operand in a register
+        policy: Replacement policy (replacement.REPLACEMENT_POLICIES)
+        quantum: Consecutive accesses a thread issues per turn
+        isolated: Also simulate each thread alone in the cache, to separate
+                  interference misses
+        chunk_iterations: Loop iterations streamed per chunk over all threads
+
+    Returns:
+        Dictionary with the aggregate result (simulation_summary form), the
+        per-thread accesses, misses and miss rates, and, with isolated, each
+        thread's misses alone and the interference misses
+    """
+    slices = [thread_slice(M, K, N, start, stop, partition, element_size)
+              for start, stop in thread_ranges(M if partition == 'i' else N, threads)]
+    per_thread_iterations = max(1, chunk_iterations // threads)
+
+    def traces():
+        return [gemm_trace(*shape, element_size, loop_order, per_thread_iterations, tiles,
+                           register_reuse, layout)
+                for shape, layout in slices]
+
+    cache = make_cache(num_sets, associativity, policy)
+    accesses = np.zeros(len(MATRIX_NAMES), dtype=np.int64)
+    hits = np.zeros(len(MATRIX_NAMES), dtype=np.int64)
+    thread_accesses = np.zeros(threads, dtype=np.int64)
+    thread_misses = np.zeros(threads, dtype=np.int64)
+    for addresses, matrix_ids, thread_ids in interleave_threads(traces(), quantum,
+                                                                3 * chunk_iterations):
+        hit = cache.access(addresses // block_size)
+        accesses += np.bincount(matrix_ids, minlength=len(MATRIX_NAMES))
+        hits += np.bincount(matrix_ids[hit], minlength=len(MATRIX_NAMES))
+        thread_accesses += np.bincount(thread_ids, minlength=threads)
+        thread_misses += np.bincount(thread_ids[~hit], minlength=threads)
+
+    alone = None
+    if isolated:
+        alone = np.zeros(threads, dtype=np.int64)
+        for thread, trace in enumerate(traces()):
+            solo = make_cache(num_sets, associativity, policy)
+            for addresses, _ in trace:
+                alone[thread] += addresses.size - int(np.count_nonzero(
+                    solo.access(addresses // block_size)))
+
+    per_thread = []
+    for thread, (start, stop) in enumerate(thread_ranges(M if partition == 'i' else N, threads)):
+        entry = {
+            'thread': thread,
+            'range': (start, stop),
+            'accesses': int(thread_accesses[thread]),
+            'misses': int(thread_misses[thread]),
+            'miss_rate': (int(thread_misses[thread]) / int(thread_accesses[thread])
+                          if thread_accesses[thread] else 0.0)
+        }
+        if alone is not None:
+            entry['isolated_misses'] = int(alone[thread])
+        per_thread.append(entry)
+
+    result = {
+        'threads': threads,
+        'partition': partition,
+        'quantum': quantum,
+        'aggregate': simulation_summary(accesses, hits, loop_order, tiles, register_reuse, policy),
+        'per_thread': per_thread
+    }
+    if alone is not None:
+        result['isolated_misses'] = int(alone.sum())
+        result['interference_misses'] = result['aggregate']['misses'] - int(alone.sum())
+    return result
+
+
+def shared_tile_sweep(num_sets: int, block_size: int, associativity: int,
+                      M: int, K: int, N: int,
+                      thread_counts: Sequence[int] = DEFAULT_THREAD_COUNTS,
+                      tile_candidates: Optional[Sequence[Optional[Tuple[int, int, int]]]] = None,
+                      partition: str = 'i', element_size: int = 8, loop_order: str = 'ijk',
+                      policy: str = 'lru', quantum: int = 1) -> Dict:
+    """
+    Best tile for each thread count sharing one cache
+
+    Args:
+        num_sets: Number of sets of the shared cache
+        block_size: Block size in bytes
+        associativity: Ways per set
+        M, K, N: Matrix dimensions
+        thread_counts: Thread counts to sweep
+        tile_candidates: (tile_M, tile_K, tile_N) tilings to simulate, None
+                         for the untiled nest (default: square tiles of 8
+                         to 64, and untiled)
+        partition: Loop split across the threads, 'i' or 'j'
+        element_size: Size of each element in bytes
+        loop_order: Order of the tile and point loops
+        policy: Replacement policy
+        quantum: Consecutive accesses a thread issues per turn
+
+    Returns:
+        Dictionary with the candidates and, per thread count, the simulated
+        aggregate misses of every candidate, all candidates with the fewest
+        (best_tiles), the best tile (ties go to a tiled candidate), the tile
+        the fair-share analytical model picks and whether it is among the best
+    """
+    if tile_candidates is None:
+        tile_candidates = [None] + [(size, size, size) for size in (8, 16, 32, 64)
+                                    if size < max(M, K, N)]
+    cache_size = num_sets * associativity * block_size
+    sweep = []
+    for threads in thread_counts:
+        misses = [simulate_shared_gemm(num_sets, block_size, associativity, M, K, N, threads,
+                                       partition, element_size, loop_order, tiles,
+                                       policy=policy, quantum=quantum,
+                                       isolated=False)['aggregate']['misses']
+                  for tiles in tile_candidates]
+        best_misses = min(misses)
+        best_tiles = [tiles for tiles, count in zip(tile_candidates, misses) if count == best_misses]
+        fair_share_tile = _fair_share_tile(cache_size, num_sets, block_size, associativity,
+                                           M, K, N, threads, partition, element_size,
+                                           loop_order, tile_candidates)
+        sweep.append({
+            'threads': threads,
+            'misses': misses,
+            'best_tiles': best_tiles,
+            'best_tile': next((tiles for tiles in best_tiles if tiles is not None), None),
+            'best_misses': best_misses,
+            'fair_share_tile': fair_share_tile,
+            'fair_share_agrees': fair_share_tile in best_tiles
+        })
+    return {
+        'matrix_params': {'M': M, 'K': K, 'N': N, 'element_size': element_size},
+        'partition': partition,
+        'loop_order': loop_order,
+        'tile_candidates': list(tile_candidates),
+        'sweep': sweep
+    }
+
+
+def _fair_share_tile(cache_size: int, num_sets: int, block_size: int, associativity: int,
+                     M: int, K: int, N: int, threads: int, partition: str, element_size: int,
+                     loop_order: str,
+                     tile_candidates: Sequence[Optional[Tuple[int, int, int]]]
+                     ) -> Optional[Tuple[int, int, int]]:
+    """
+    Candidate with the fewest TiledGEMMModel misses for thread 0's slice in C/T of the cache
+
+    The share keeps the associativity and divides the sets while there are
+    sets to divide, then the ways.
+    """
+    share_sets = max(1, num_sets // threads)
+    share_ways = max(1, num_sets * associativity // threads // share_sets)
+    model = TiledGEMMModel(share_sets * share_ways * block_size, share_sets, block_size,
+                           share_ways)
+    start, stop = thread_ranges(M if partition == 'i' else N, threads)[0]
+    (slice_M, slice_K, slice_N), layout = thread_slice(M, K, N, start, stop, partition,
+                                                       element_size)
+    predicted = []
+    for tiles in tile_candidates:
+        tile_M, tile_K, tile_N = tiles if tiles is not None else (slice_M, slice_K, slice_N)
+        predicted.append(model.analyze(slice_M, slice_K, slice_N, tile_M, tile_K, tile_N,
+                                       element_size, loop_order, loop_order,
+                                       layout)['total_misses'])
+    return tile_candidates[int(np.argmin(predicted))]
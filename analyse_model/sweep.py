@@ -0,0 +1,206 @@
+#!/usr/bin/env python3
+"""
+Parallel Parameter-Sweep Runner with a Persistent Result Cache
+
+A sweep point is a flat dict of model parameters:
+    {'name': 'L2 Cache', 'C': 262144, 'b': 64, 'assoc': 8,
+     'M': 512, 'K': 512, 'N': 512, 'element_size': 8, 'loop_order': None}
+('name' is a label and not part of the point's identity).
+
+run_sweep fans the points out over a ProcessPoolExecutor and yields each
+result as soon as it finishes. Results are appended to a JSON-lines file
+keyed by a SHA-256 hash of the evaluator and the point's parameters, so a
+rerun only computes points it has not seen. Points already in the cache are
+yielded first, without touching the pool.
+"""
+
+import hashlib
+import json
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from typing import Callable, Dict, Iterable, Iterator, List, Optional, Sequence, Tuple
+
+from cache_miss_analysis_model import CacheMissModel
+
+DEFAULT_CACHE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'sweep_cache.jsonl')
+
+# Keys that label a point without changing its result
+LABEL_KEYS = ('name',)
+
+
+def sweep_points(configs: Sequence[Dict], matrix_sizes: Sequence[int],
+                 associativities: Optional[Sequence[int]] = None,
+                 element_size: int = 8, loop_order: Optional[str] = None) -> List[Dict]:
+    """
+    Cross product of cache configurations, associativities and square matrix sizes
+
+    Args:
+        configs: Cache configurations with 'C', 'b', 'assoc' and optional 'name'
+        matrix_sizes: Square matrix sizes (M = K = N)
+        associativities: Associativities to try for every configuration
+                         (default: each configuration's own)
+        element_size: Size of each element in bytes
+        loop_order: Loop order passed to analyze_matrix_multiplication
+
+    Returns:
+        List of sweep points
+    """
+    points = []
+    for config in configs:
+        for assoc in (associativities or [config['assoc']]):
+            for size in matrix_sizes:
+                points.append({
+                    'name': config.get('name', f"{config['C'] // 1024}KB"),
+                    'C': config['C'], 'b': config['b'], 'assoc': assoc,
+                    'M': size, 'K': size, 'N': size,
+                    'element_size': element_size, 'loop_order': loop_order
+                })
+    return points
+
+
+def analyze_point(point: Dict) -> Dict:
+    """Run CacheMissModel.analyze_matrix_multiplication for one sweep point"""
+    num_sets = (point['C'] // point['b']) // point['assoc']
+    model = CacheMissModel(point['C'], num_sets, point['b'], point['assoc'])
+    return model.analyze_matrix_multiplication(point['M'], point['K'], point['N'],
+                                               point.get('element_size', 8),
+                                               loop_order=point.get('loop_order'))
+
+
+def point_key(point: Dict, evaluate: Callable[[Dict], Dict] = analyze_point) -> str:
+    """Stable hash of the evaluator and the point's parameters"""
+    params = {key: value for key, value in point.items() if key not in LABEL_KEYS}
+    canonical = json.dumps({'evaluate': f"{evaluate.__module__}.{evaluate.__qualname__}",
+                            'params': params}, sort_keys=True, default=_to_json)
+    return hashlib.sha256(canonical.encode()).hexdigest()
+
+
+class SweepCache:
+    """
+    Append-only JSON-lines store of sweep results keyed by point hash
+    """
+
+    def __init__(self, path: str = DEFAULT_CACHE_PATH):
+        """
+        Load the results already on disk
+
+        Args:
+            path: JSON-lines file; created on the first put()
+        """
+        self.path = path
+        self.results = {}
+        if os.path.exists(path):
+            with open(path) as handle:
+                for line in handle:
+                    try:
+                        entry = json.loads(line)
+                    except json.JSONDecodeError:
+                        # Line cut short by an interrupted run
+                        continue
+                    self.results[entry['key']] = entry['result']
+
+    def __contains__(self, key: str) -> bool:
+        return key in self.results
+
+    def __len__(self) -> int:
+        return len(self.results)
+
+    def get(self, key: str) -> Optional[Dict]:
+        return self.results.get(key)
+
+    def put(self, key: str, point: Dict, result: Dict):
+        """Record a result in memory and append it to the file"""
+        self.results[key] = result
+        with open(self.path, 'a') as handle:
+            handle.write(json.dumps({'key': key, 'point': point, 'result': result},
+                                    default=_to_json) + '\n')
+
+
+def run_sweep(points: Iterable[Dict], evaluate: Callable[[Dict], Dict] = analyze_point,
+              workers: Optional[int] = None, cache: Optional[SweepCache] = None,
+              stats: Optional[Dict] = None) -> Iterator[Tuple[Dict, Dict, bool]]:
+    """
+    Evaluate sweep points in parallel, streaming results as they finish
+
+    Args:
+        points: Sweep points
+        evaluate: Picklable top-level function of one point
+        workers: Worker processes (default: one per CPU; 1 runs in-process)
+        cache: Optional result cache; hits are yielded first and new
+               results are added to it
+        stats: Optional dictionary that receives 'workers', the number of
+               workers that computed points (0 when every point was cached,
+               1 when they ran in-process)
+
+    Yields:
+        (point, result, cached) with cached True for cache hits
+    """
+    if stats is None:
+        stats = {}
+    stats['workers'] = 0
+    pending = {}
+    for point in points:
+        key = point_key(point, evaluate)
+        if cache is not None and key in cache:
+            yield point, cache.get(key), True
+        else:
+            # Duplicate points are computed once and reported for each copy
+            pending.setdefault(key, []).append(point)
+
+    if not pending:
+        return
+
+    def finish(key: str, result: Dict):
+        # Round-trip through JSON so cached and fresh results look the same
+        result = json.loads(json.dumps(result, default=_to_json))
+        if cache is not None:
+            cache.put(key, pending[key][0], result)
+        return [(point, result, False) for point in pending[key]]
+
+    workers = workers or os.cpu_count() or 1
+    if workers == 1 or len(pending) == 1:
+        stats['workers'] = 1
+        for key, copies in pending.items():
+            yield from finish(key, evaluate(copies[0]))
+        return
+
+    stats['workers'] = min(workers, len(pending))
+    with ProcessPoolExecutor(max_workers=stats['workers']) as pool:
+        futures = {pool.submit(evaluate, copies[0]): key for key, copies in pending.items()}
+        for future in as_completed(futures):
+            yield from finish(futures[future], future.result())
+
+
+def run_sweep_summary(points: Sequence[Dict], evaluate: Callable[[Dict], Dict] = analyze_point,
+                      workers: Optional[int] = None,
+                      cache: Optional[SweepCache] = None) -> Tuple[List[Tuple[Dict, Dict]], Dict]:
+    """
+    Run a sweep to completion
+
+    Returns:
+        ([(point, result)] in completion order, statistics with the number of
+        points, cache hits, computed points, the workers that computed them
+        and elapsed seconds)
+    """
+    start = time.time()
+    results = []
+    hits = 0
+    used = {}
+    for point, result, cached in run_sweep(points, evaluate, workers, cache, used):
+        results.append((point, result))
+        hits += cached
+    return results, {
+        'points': len(results),
+        'cached': hits,
+        'computed': len(results) - hits,
+        'workers': used['workers'],
+        'elapsed_seconds': time.time() - start
+    }
+
+
+def _to_json(value):
+    """json.dumps fallback for NumPy scalars"""
+    if hasattr(value, 'item'):
+        return value.item()
+    raise TypeError(f"Cannot serialize {type(value).__name__}")
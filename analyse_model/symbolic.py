@@ -0,0 +1,281 @@
+#!/usr/bin/env python3
+"""
+Minimal Symbolic Expressions Compiled to NumPy
+
+Expressions are immutable trees of symbols, constants and operations
+(+, -, *, /, ceil, floor, max, min, comparisons and where). They support
+symbolic differentiation and compile into one Python function of NumPy
+arrays: every distinct subexpression becomes one array statement, so a set
+of related formulas shares its common terms and a whole parameter sweep
+evaluates as a few vectorized passes.
+
+Derivatives treat the parameters as continuous. ceil and floor are
+piecewise constant (derivative 0 almost everywhere), and max, min and
+where differentiate the branch that is selected at each point.
+"""
+
+import math
+from typing import Callable, Dict, Iterable, Sequence, Tuple, Union
+
+import numpy as np
+
+Number = Union[int, float]
+
+# Operation name -> NumPy expression template over the argument variables
+_TEMPLATES = {
+    'add': '({0} + {1})',
+    'sub': '({0} - {1})',
+    'mul': '({0} * {1})',
+    'div': '({0} / {1})',
+    'ceil': 'np.ceil({0})',
+    'floor': 'np.floor({0})',
+    'max': 'np.maximum({0}, {1})',
+    'min': 'np.minimum({0}, {1})',
+    'gt': '({0} > {1})',
+    'ge': '({0} >= {1})',
+    'and': '({0} & {1})',
+    'where': 'np.where({0}, {1}, {2})',
+}
+
+
+class Expr:
+    """
+    Node of an expression tree
+
+    Attributes:
+        op: 'symbol', 'const' or an operation name
+        args: Child expressions (the name or value for leaves)
+    """
+
+    __slots__ = ('op', 'args', '_key', '_symbols')
+
+    def __init__(self, op: str, args: Tuple):
+        self.op = op
+        self.args = args
+        self._key = (op, tuple(arg._key if isinstance(arg, Expr) else arg for arg in args))
+        if op == 'symbol':
+            self._symbols = frozenset(args)
+        elif op == 'const':
+            self._symbols = frozenset()
+        else:
+            self._symbols = frozenset().union(*(arg._symbols for arg in args))
+
+    def __hash__(self) -> int:
+        return hash(self._key)
+
+    def __eq__(self, other) -> bool:
+        return isinstance(other, Expr) and self._key == other._key
+
+    def __repr__(self) -> str:
+        if self.op == 'symbol':
+            return self.args[0]
+        if self.op == 'const':
+            return repr(self.args[0])
+        return f"{self.op}({', '.join(map(repr, self.args))})"
+
+    def __add__(self, other): return add(self, other)
+    def __radd__(self, other): return add(other, self)
+    def __sub__(self, other): return sub(self, other)
+    def __rsub__(self, other): return sub(other, self)
+    def __mul__(self, other): return mul(self, other)
+    def __rmul__(self, other): return mul(other, self)
+    def __truediv__(self, other): return div(self, other)
+    def __rtruediv__(self, other): return div(other, self)
+    def __neg__(self): return sub(0, self)
+
+    def symbols(self) -> frozenset:
+        """Names of the symbols this expression depends on"""
+        return self._symbols
+
+
+def symbol(name: str) -> Expr:
+    return Expr('symbol', (name,))
+
+
+def constant(value: Number) -> Expr:
+    return Expr('const', (value,))
+
+
+def _wrap(value) -> Expr:
+    return value if isinstance(value, Expr) else constant(value)
+
+
+def _value(expr: Expr):
+    """Constant value of expr, or None"""
+    return expr.args[0] if expr.op == 'const' else None
+
+
+# Constructors fold constants and drop identities, so derivatives stay small
+
+def add(a, b) -> Expr:
+    a, b = _wrap(a), _wrap(b)
+    if _value(a) is not None and _value(b) is not None:
+        return constant(_value(a) + _value(b))
+    if _value(a) == 0:
+        return b
+    if _value(b) == 0:
+        return a
+    return Expr('add', (a, b))
+
+
+def sub(a, b) -> Expr:
+    a, b = _wrap(a), _wrap(b)
+    if _value(a) is not None and _value(b) is not None:
+        return constant(_value(a) - _value(b))
+    if _value(b) == 0:
+        return a
+    if a == b:
+        return constant(0)
+    return Expr('sub', (a, b))
+
+
+def mul(a, b) -> Expr:
+    a, b = _wrap(a), _wrap(b)
+    if _value(a) is not None and _value(b) is not None:
+        return constant(_value(a) * _value(b))
+    if _value(a) == 0 or _value(b) == 0:
+        return constant(0)
+    if _value(a) == 1:
+        return b
+    if _value(b) == 1:
+        return a
+    return Expr('mul', (a, b))
+
+
+def div(a, b) -> Expr:
+    a, b = _wrap(a), _wrap(b)
+    if _value(a) == 0:
+        return constant(0)
+    if _value(b) == 1:
+        return a
+    return Expr('div', (a, b))
+
+
+def ceil(a) -> Expr:
+    a = _wrap(a)
+    return constant(math.ceil(_value(a))) if _value(a) is not None else Expr('ceil', (a,))
+
+
+def floor(a) -> Expr:
+    a = _wrap(a)
+    return constant(math.floor(_value(a))) if _value(a) is not None else Expr('floor', (a,))
+
+
+def maximum(a, b) -> Expr:
+    return Expr('max', (_wrap(a), _wrap(b)))
+
+
+def minimum(a, b) -> Expr:
+    return Expr('min', (_wrap(a), _wrap(b)))
+
+
+def greater(a, b) -> Expr:
+    return Expr('gt', (_wrap(a), _wrap(b)))
+
+
+def greater_equal(a, b) -> Expr:
+    return Expr('ge', (_wrap(a), _wrap(b)))
+
+
+def logical_and(a: Expr, b: Expr) -> Expr:
+    return Expr('and', (a, b))
+
+
+def where(condition: Expr, a, b) -> Expr:
+    a, b = _wrap(a), _wrap(b)
+    if a == b:
+        return a
+    return Expr('where', (condition, a, b))
+
+
+def diff(expr: Expr, name: str) -> Expr:
+    """Derivative of expr with respect to the symbol `name`"""
+    memo = {}
+
+    def walk(node: Expr) -> Expr:
+        if node in memo:
+            return memo[node]
+        op = node.op
+        if op == 'symbol':
+            result = constant(1 if node.args[0] == name else 0)
+        elif op == 'const' or op in ('ceil', 'floor', 'gt', 'ge', 'and') \
+                or name not in node.symbols():
+            result = constant(0)
+        elif op == 'add':
+            result = add(walk(node.args[0]), walk(node.args[1]))
+        elif op == 'sub':
+            result = sub(walk(node.args[0]), walk(node.args[1]))
+        elif op == 'mul':
+            a, b = node.args
+            result = add(mul(walk(a), b), mul(a, walk(b)))
+        elif op == 'div':
+            a, b = node.args
+            result = div(sub(mul(walk(a), b), mul(a, walk(b))), mul(b, b))
+        elif op in ('max', 'min'):
+            a, b = node.args
+            pick_a = greater_equal(a, b) if op == 'max' else greater_equal(b, a)
+            result = where(pick_a, walk(a), walk(b))
+        elif op == 'where':
+            condition, a, b = node.args
+            result = where(condition, walk(a), walk(b))
+        else:
+            raise ValueError(f"Cannot differentiate {op!r}")
+        memo[node] = result
+        return result
+
+    return walk(expr)
+
+
+def compile_expressions(outputs: Dict[str, Expr],
+                        parameters: Sequence[str]) -> Callable[..., Dict[str, np.ndarray]]:
+    """
+    Compile named expressions into one NumPy function
+
+    Args:
+        outputs: {name: expression}
+        parameters: Argument names of the compiled function, in order
+
+    Returns:
+        function(*arrays) -> {name: array}; arguments broadcast against each
+        other like NumPy operands
+    """
+    missing = set().union(*(expr.symbols() for expr in outputs.values())) - set(parameters)
+    if missing:
+        raise ValueError(f"Expressions use symbols that are not parameters: {sorted(missing)}")
+
+    names = {}
+    lines = []
+
+    def emit(node: Expr) -> str:
+        if node in names:
+            return names[node]
+        if node.op == 'symbol':
+            return node.args[0]
+        if node.op == 'const':
+            return repr(float(node.args[0]))
+        arguments = [emit(arg) for arg in node.args]
+        variable = f"t{len(names)}"
+        lines.append(f"    {variable} = {_TEMPLATES[node.op].format(*arguments)}")
+        names[node] = variable
+        return variable
+
+    results = {name: emit(expr) for name, expr in outputs.items()}
+    # Broadcast so constant outputs still have the sweep's shape
+    shape = ', '.join(parameters)
+    body = [f"def compiled({', '.join(parameters)}):",
+            f"    {shape}{',' if len(parameters) == 1 else ''} = np.broadcast_arrays("
+            f"{', '.join(f'np.asarray({p}, dtype=np.float64)' for p in parameters)})",
+            *lines,
+            "    return {" + ', '.join(f"{name!r}: {value} + np.zeros_like({parameters[0]})"
+                                      for name, value in results.items()) + "}"]
+    source = '\n'.join(body)
+    namespace = {'np': np}
+    exec(compile(source, '<symbolic>', 'exec'), namespace)
+    compiled = namespace['compiled']
+    compiled.source = source
+    return compiled
+
+
+def gradient(expr: Expr, names: Iterable[str]) -> Dict[str, Expr]:
+    """Partial derivatives of expr with respect to each name"""
+    return {name: diff(expr, name) for name in names}
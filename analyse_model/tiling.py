@@ -0,0 +1,381 @@
+#!/usr/bin/env python3
+"""
+Tiled (Blocked) GEMM Miss Model and Tile Auto-Tuner
+
+The tiled loop nest has three tile loops (ii, kk, jj stepping by tile_M,
+tile_K, tile_N in tile_order) around three point loops (i, k, j inside one
+tile, in point_order), six loops in all.
+
+Miss model. Let body(q) be the data touched by one iteration of loop q: the
+rectangles of A, B and C spanned by the loops inside q. Footprints only grow
+towards the outer loops. A reuse carried by loop q has exactly body(q)
+between its two uses, so under LRU it hits in set s iff body(q) puts at most
+assoc blocks into s. For each set, let p_s be the outermost loop whose body
+fits there; every block of array X in set s then misses once per execution
+of loop p_s:
+
+    misses_X = sum_s trips(loops outside p_s) * blocks_X(s, body(p_s - 1))
+
+Footprint histograms are computed in closed form per rectangle row, so one
+candidate costs a handful of (S,) array operations. Whether a body fits
+depends on where it sits relative to the set mapping, so the prediction is
+averaged over a few sampled positions of the outer loops. Tile loops over
+partial tiles use fractional trip counts.
+
+The auto-tuner evaluates this model for every level of a hierarchy over a
+grid of tile sizes, prunes tiles whose kernel footprint exceeds the largest
+level, memoizes footprint histograms and candidate results, and reports the
+Pareto front of per-level miss counts.
+"""
+
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from cache_hierarchy import DEFAULT_LATENCIES, DEFAULT_MEMORY_LATENCY
+from cache_simulator import LOOP_ORDERS, MATRIX_NAMES, matrix_layout
+
+# Loop positions averaged per prediction, and the per-index steps of the
+# low-discrepancy sequence (R3 sequence) that places them
+DEFAULT_SAMPLE_POSITIONS = 8
+POSITION_STEPS = (0.8191725134, 0.6710436067, 0.5497004779)
+
+
+class TiledGEMMModel:
+    """
+    Analytical miss model of the tiled loop nest for one set-associative LRU cache
+    """
+
+    def __init__(self, cache_size: int, num_sets: int, block_size: int, associativity: int = 4,
+                 sample_positions: int = DEFAULT_SAMPLE_POSITIONS):
+        """
+        Initialize cache parameters
+
+        Args:
+            cache_size: Total cache size in bytes
+            num_sets: Number of cache sets
+            block_size: Block size in bytes
+            associativity: Set associativity
+            sample_positions: Positions of the outer loops at which footprints
+                              are evaluated and averaged (1 = first tile only)
+        """
+        assert num_sets * associativity * block_size == cache_size, \
+            "Cache parameters inconsistent"
+        self.C = cache_size
+        self.S = num_sets
+        self.b = block_size
+        self.assoc = associativity
+        self.sample_positions = max(1, sample_positions)
+        # (base, rows, cols, leading_dim, element_size) -> per-set block counts
+        self._footprints = {}
+        self.memo_hits = 0
+
+    def analyze(self, M: int, K: int, N: int, tile_M: int, tile_K: int, tile_N: int,
+                element_size: int = 8, tile_order: str = 'ijk', point_order: str = 'ijk',
+                layout: Optional[Tuple[Tuple[int, int], ...]] = None) -> Dict:
+        """
+        Predict the misses of the tiled multiplication C = A×B
+
+        Args:
+            M, K, N: Matrix dimensions
+            tile_M, tile_K, tile_N: Tile extent along i, k and j
+            element_size: Size of each element in bytes (default 8 for double)
+            tile_order: Order of the tile loops from outermost to innermost
+            point_order: Order of the loops inside a tile
+            layout: Optional (base, leading_dim) of A, B and C
+                    (cache_simulator.matrix_layout; default: packed)
+
+        Returns:
+            Dictionary with predicted misses per matrix and overall
+        """
+        for order in (tile_order, point_order):
+            if order not in LOOP_ORDERS:
+                raise ValueError(f"Unknown loop order {order!r}, expected one of {LOOP_ORDERS}")
+
+        extents = {'i': M, 'j': N, 'k': K}
+        tiles = {'i': min(tile_M, M), 'j': min(tile_N, N), 'k': min(tile_K, K)}
+        loops = ([(index, 'tile', extents[index] / tiles[index]) for index in tile_order] +
+                 [(index, 'point', tiles[index]) for index in point_order])
+
+        # Matrix layout as in cache_simulator: (base, row index, column index, leading dim)
+        if layout is None:
+            layout = matrix_layout(M, K, N, element_size)
+        layouts = tuple((base, rows, cols, leading_dim) for (base, leading_dim), (rows, cols)
+                        in zip(layout, (('i', 'k'), ('k', 'j'), ('i', 'j'))))
+
+        # Executions of the loop at first_fit - 1: product of the trips outside it
+        trips = np.array([trip for _, _, trip in loops], dtype=np.float64)
+        executions = np.concatenate(([1.0, 1.0], np.cumprod(trips)))
+        footprints = np.array([self._body_footprints(loops, extents, tiles, layouts,
+                                                     element_size, sample)
+                               for sample in range(self.sample_positions)])   # (P, 7, 3, S)
+
+        # First body that fits in each set; an empty body after the innermost
+        # loop always fits
+        fits = footprints.sum(axis=2) <= self.assoc                # (P, 7, S)
+        fits = np.concatenate((fits, np.ones((fits.shape[0], 1, self.S), dtype=bool)), axis=1)
+        first_fit = fits.argmax(axis=1)                            # (P, S) in 0..7
+
+        samples = np.arange(footprints.shape[0])[:, None]
+        sets = np.arange(self.S)[None, :]
+        per_execution = footprints[samples, np.maximum(first_fit - 1, 0), :, sets]   # (P, S, 3)
+        predicted = (executions[first_fit][..., None] * per_execution).sum(axis=(0, 1))
+        predicted /= footprints.shape[0]
+
+        iterations = M * N * K
+        compulsory = footprints[0, 0].sum(axis=1)
+        kernel = footprints[0, len(tile_order)]
+        predicted = np.clip(predicted, compulsory, iterations)
+
+        per_matrix = {}
+        for matrix_id, name in enumerate(MATRIX_NAMES):
+            per_matrix[name] = {
+                'accesses': iterations,
+                'misses': int(round(predicted[matrix_id])),
+                'compulsory_misses': int(compulsory[matrix_id])
+            }
+        total_misses = sum(matrix['misses'] for matrix in per_matrix.values())
+        kernel_blocks = kernel.sum()
+
+        return {
+            'tile_sizes': {'tile_M': tiles['i'], 'tile_K': tiles['k'], 'tile_N': tiles['j']},
+            'loop_orders': {'tile_order': tile_order, 'point_order': point_order},
+            'total_accesses': 3 * iterations,
+            'total_misses': total_misses,
+            'miss_rate': total_misses / (3 * iterations) if iterations else 0.0,
+            'per_matrix': per_matrix,
+            # Blocks touched by one tile kernel (body of the innermost tile loop)
+            'kernel_footprint_bytes': int(kernel_blocks) * self.b,
+            'kernel_fits': bool((kernel.sum(axis=0) <= self.assoc).all())
+        }
+
+    def _body_footprints(self, loops: List[Tuple[str, str, float]], extents: Dict[str, int],
+                         tiles: Dict[str, int], layouts: Tuple, element_size: int,
+                         sample: int) -> np.ndarray:
+        """
+        Per-set footprints of every loop body at one sampled position
+
+        Sample 0 is the first tile. Later samples place the loops outside each
+        body at low-discrepancy points of the iteration space, with a
+        different irrational step per index so i, j and k do not move in
+        lockstep (aligned power-of-two layouts conflict only at some offsets).
+
+        Returns:
+            Per body(q), q = -1 .. 5, the per-set block counts of A, B and C
+        """
+        position = {index: int((sample * step) % 1.0 * extents[index])
+                    for index, step in zip('ijk', POSITION_STEPS)}
+
+        # Bodies from the whole nest inwards; each loop fixes its index
+        origin = {index: 0 for index in 'ijk'}
+        span = dict(extents)
+        footprints = []
+        for q in range(-1, len(loops)):
+            if q >= 0:
+                index, kind, _ = loops[q]
+                if kind == 'tile':
+                    span[index] = tiles[index]
+                    origin[index] = min(position[index] // tiles[index] * tiles[index],
+                                        extents[index] - tiles[index])
+                else:
+                    span[index] = 1
+                    origin[index] = position[index]
+            footprints.append([
+                self._rectangle_footprint(base + (origin[rows] * ld + origin[cols]) * element_size,
+                                          span[rows], span[cols], ld, element_size)
+                for base, rows, cols, ld in layouts])
+        return footprints
+
+    def _rectangle_footprint(self, base: int, rows: int, cols: int, leading_dim: int,
+                             element_size: int) -> np.ndarray:
+        """
+        Per-set count of the distinct blocks in a rows × cols submatrix
+
+        Each row is a contiguous block range; a range of n blocks starting at
+        block f adds n // S to every set and one more to the n % S sets
+        following f % S, applied with a difference array.
+        """
+        key = (base, rows, cols, leading_dim, element_size)
+        cached = self._footprints.get(key)
+        if cached is not None:
+            self.memo_hits += 1
+            return cached
+
+        if cols == leading_dim:
+            # Whole rows are one contiguous range
+            rows, cols = 1, rows * cols
+        row_start = base + np.arange(rows, dtype=np.int64) * leading_dim * element_size
+        first = row_start // self.b
+        last = (row_start + cols * element_size - 1) // self.b
+        # Neighbouring rows may share a block at their boundary
+        first[1:] = np.maximum(first[1:], last[:-1] + 1)
+        lengths = np.maximum(last - first + 1, 0)
+
+        histogram = np.full(self.S, int((lengths // self.S).sum()), dtype=np.int64)
+        remainder = lengths % self.S
+        start_set = first % self.S
+        delta = np.zeros(2 * self.S + 1, dtype=np.int64)
+        np.add.at(delta, start_set, 1)
+        np.add.at(delta, start_set + remainder, -1)
+        wrapped = np.cumsum(delta)[:2 * self.S]
+        histogram += wrapped[:self.S] + wrapped[self.S:]
+
+        histogram = histogram.astype(np.float64)
+        self._footprints[key] = histogram
+        return histogram
+
+
+class TileAutoTuner:
+    """
+    Search (tile_M, tile_K, tile_N) against every level of a cache hierarchy
+    """
+
+    def __init__(self, levels: List[Dict], memory_latency: int = DEFAULT_MEMORY_LATENCY):
+        """
+        Initialize one tiled miss model per level
+
+        Args:
+            levels: Level configurations as for CacheHierarchy, each with
+                    'C', 'b', 'assoc' and optional 'name' and 'latency'
+            memory_latency: Cycles for an access served by memory
+        """
+        if not levels:
+            raise ValueError("At least one cache level is required")
+        self.levels = []
+        for index, level in enumerate(levels):
+            num_sets = (level['C'] // level['b']) // level['assoc']
+            self.levels.append({
+                'name': level.get('name', f'L{index + 1}'),
+                'C': level['C'],
+                'latency': level.get('latency', DEFAULT_LATENCIES[min(index, len(DEFAULT_LATENCIES) - 1)]),
+                'model': TiledGEMMModel(level['C'], num_sets, level['b'], level['assoc'])
+            })
+        self.memory_latency = memory_latency
+        self._results = {}
+
+    def evaluate(self, M: int, K: int, N: int, tile_M: int, tile_K: int, tile_N: int,
+                 element_size: int = 8, tile_order: str = 'ijk', point_order: str = 'ijk') -> Dict:
+        """
+        Predicted misses of one tiling at every level
+
+        The penalty is the cycles spent below each level: misses at level i
+        pay the latency of level i+1 (memory for the last level).
+
+        Returns:
+            Dictionary with the tile sizes, per-level misses and penalty cycles
+        """
+        key = (M, K, N, tile_M, tile_K, tile_N, element_size, tile_order, point_order)
+        cached = self._results.get(key)
+        if cached is not None:
+            return cached
+
+        misses = [level['model'].analyze(M, K, N, tile_M, tile_K, tile_N, element_size,
+                                         tile_order, point_order)['total_misses']
+                  for level in self.levels]
+        next_latency = [level['latency'] for level in self.levels[1:]] + [self.memory_latency]
+        result = {
+            'tile_M': min(tile_M, M),
+            'tile_K': min(tile_K, K),
+            'tile_N': min(tile_N, N),
+            'misses': misses,
+            'penalty_cycles': float(np.dot(misses, next_latency))
+        }
+        self._results[key] = result
+        return result
+
+    def tune(self, M: int, K: int, N: int, element_size: int = 8,
+             tile_order: str = 'ijk', point_order: str = 'ijk',
+             candidates: Optional[Tuple[Sequence[int], Sequence[int], Sequence[int]]] = None) -> Dict:
+        """
+        Plan tile sizes for C = A×B against the whole hierarchy
+
+        Args:
+            M, K, N: Matrix dimensions
+            element_size: Size of each element in bytes (default 8 for double)
+            tile_order: Order of the tile loops
+            point_order: Order of the loops inside a tile
+            candidates: Optional tile sizes to try along (M, K, N); defaults
+                        to powers of two up to each dimension plus the
+                        dimension itself
+
+        Returns:
+            Dictionary with the untiled baseline, the best tile per level,
+            the Pareto front over per-level misses (sorted by penalty
+            cycles) and search statistics
+        """
+        if candidates is None:
+            candidates = tuple(_default_candidates(extent) for extent in (M, K, N))
+        candidates = tuple(sorted(set(min(int(size), extent) for size in sizes if size > 0))
+                           for sizes, extent in zip(candidates, (M, K, N)))
+
+        # A tile kernel larger than the biggest level cannot be held anywhere;
+        # its footprint grows with every tile dimension, so the rest of the
+        # sweep along that dimension is skipped
+        largest = max(level['C'] for level in self.levels)
+        memo_before = sum(level['model'].memo_hits for level in self.levels)
+
+        evaluated = []
+        total = len(candidates[0]) * len(candidates[1]) * len(candidates[2])
+        for tile_M in candidates[0]:
+            for tile_N in candidates[2]:
+                for tile_K in candidates[1]:
+                    kernel_bytes = (tile_M * tile_K + tile_K * tile_N + tile_M * tile_N) * element_size
+                    if kernel_bytes > largest:
+                        break
+                    evaluated.append(self.evaluate(M, K, N, tile_M, tile_K, tile_N,
+                                                   element_size, tile_order, point_order))
+        pruned = total - len(evaluated)
+
+        untiled = self.evaluate(M, K, N, M, K, N, element_size, tile_order, point_order)
+        if not evaluated:
+            evaluated = [untiled]
+
+        misses = np.array([result['misses'] for result in evaluated], dtype=np.int64)
+        penalties = np.array([result['penalty_cycles'] for result in evaluated])
+        best_per_level = []
+        for index, level in enumerate(self.levels):
+            # Fewest misses at this level, ties broken by the whole-hierarchy penalty
+            best = evaluated[int(np.lexsort((penalties, misses[:, index]))[0])]
+            best_per_level.append({
+                'name': level['name'],
+                'tile_M': best['tile_M'],
+                'tile_K': best['tile_K'],
+                'tile_N': best['tile_N'],
+                'predicted_misses': best['misses'][index],
+                'untiled_misses': untiled['misses'][index]
+            })
+
+        pareto = [evaluated[index] for index in _pareto_front(misses)]
+        pareto.sort(key=lambda result: result['penalty_cycles'])
+
+        return {
+            'matrix_params': {'M': M, 'K': K, 'N': N, 'element_size': element_size},
+            'loop_orders': {'tile_order': tile_order, 'point_order': point_order},
+            'untiled': untiled,
+            'levels': best_per_level,
+            'pareto': pareto,
+            'recommended': pareto[0],
+            'search': {
+                'candidates': total,
+                'evaluated': len(evaluated),
+                'pruned': pruned,
+                'memo_hits': sum(level['model'].memo_hits for level in self.levels) - memo_before
+            }
+        }
+
+
+def _default_candidates(extent: int) -> List[int]:
+    """Powers of two below extent, plus extent itself"""
+    sizes = [1 << shift for shift in range(extent.bit_length()) if 1 << shift < extent]
+    return sizes + [extent]
+
+
+def _pareto_front(costs: np.ndarray) -> np.ndarray:
+    """Indices of the rows of costs not dominated by any other row (duplicates kept once)"""
+    _, unique = np.unique(costs, axis=0, return_index=True)
+    unique = np.sort(unique)
+    points = costs[unique]
+    no_worse = (points[:, None, :] <= points[None, :, :]).all(axis=2)
+    better = (points[:, None, :] < points[None, :, :]).any(axis=2)
+    dominated = (no_worse & better).any(axis=0)
+    return unique[~dominated]
@@ -0,0 +1,333 @@
+#!/usr/bin/env python3
+"""
+Compact Binary Address Traces
+
+File layout (little endian):
+
+    header  magic b'CMTRACE1', uint32 version, uint32 reserved,
+            uint64 records, uint64 chunks                          (32 bytes)
+    chunk*  uint64 first_address, uint32 records, uint8 delta_bytes,
+            3 bytes padding                                        (16 bytes)
+            int{8,16,32,64} deltas[records]  (address - previous address;
+                                              deltas[0] = 0)
+            uint8 ops[records], uint8 sizes[records]
+            zero padding to a multiple of 8 bytes
+
+Each chunk stores its deltas at the narrowest width that holds them: a
+unit-stride stream costs one byte per address, and a GEMM trace that jumps
+between three matrices four, plus two bytes for the operation and access
+size (versus 8 for a raw int64 address). TraceReader maps the file read-only and walks
+the chunk headers. Deltas, ops and sizes are NumPy views of the mapping, and
+only one chunk's addresses are decoded at a time, so a trace of any size
+streams in bounded memory.
+
+Operations follow Valgrind Lackey: load, store, modify (load then store)
+and instruction fetch. convert_lackey turns `valgrind --tool=lackey
+--trace-mem=yes` output into this format; simulate_trace replays a file
+through a set-associative cache with any replacement policy of replacement.py.
+"""
+
+import os
+import struct
+from typing import Dict, Iterator, Optional, TextIO, Tuple, Union
+
+import numpy as np
+
+from cache_simulator import DEFAULT_CHUNK_ITERATIONS, MATRIX_C, gemm_trace
+from replacement import make_cache
+
+MAGIC = b'CMTRACE1'
+VERSION = 1
+_HEADER = struct.Struct('<8sIIQQ')
+_CHUNK_HEADER = struct.Struct('<QIB3x')
+
+OP_LOAD = 0
+OP_STORE = 1
+OP_MODIFY = 2
+OP_INSTRUCTION = 3
+OP_NAMES = ('load', 'store', 'modify', 'instruction')
+LACKEY_OPS = {'L': OP_LOAD, 'S': OP_STORE, 'M': OP_MODIFY, 'I': OP_INSTRUCTION}
+
+DEFAULT_CHUNK_RECORDS = 1 << 20
+
+_DELTA_TYPES = {1: np.int8, 2: np.int16, 4: np.int32, 8: np.int64}
+
+
+class TraceWriter:
+    """
+    Append records to a binary trace file, one chunk per chunk_records
+
+    Use as a context manager, or call close() to write the final chunk and
+    the record counts into the header.
+    """
+
+    def __init__(self, path: str, chunk_records: int = DEFAULT_CHUNK_RECORDS):
+        self.path = path
+        self.chunk_records = chunk_records
+        self.records = 0
+        self.chunks = 0
+        self._pending = []
+        self._pending_records = 0
+        self._handle = open(path, 'wb')
+        self._handle.write(_HEADER.pack(MAGIC, VERSION, 0, 0, 0))
+
+    def __enter__(self) -> 'TraceWriter':
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def write(self, addresses: np.ndarray, ops: Union[np.ndarray, int] = OP_LOAD,
+              sizes: Union[np.ndarray, int] = 8):
+        """
+        Append records
+
+        Args:
+            addresses: Byte addresses
+            ops: OP_* code of each record (or one code for all)
+            sizes: Access size in bytes of each record (or one size for all)
+        """
+        addresses = np.asarray(addresses, dtype=np.int64)
+        ops = np.broadcast_to(np.asarray(ops, dtype=np.uint8), addresses.shape)
+        sizes = np.broadcast_to(np.minimum(np.asarray(sizes), 255).astype(np.uint8), addresses.shape)
+        self._pending.append((addresses, ops, sizes))
+        self._pending_records += addresses.size
+        while self._pending_records >= self.chunk_records:
+            self._flush(self.chunk_records)
+
+    def close(self):
+        """Write the remaining records and finalize the header"""
+        if self._handle.closed:
+            return
+        while self._pending_records:
+            self._flush(min(self._pending_records, self.chunk_records))
+        self._handle.seek(0)
+        self._handle.write(_HEADER.pack(MAGIC, VERSION, 0, self.records, self.chunks))
+        self._handle.close()
+
+    def _flush(self, count: int):
+        addresses, ops, sizes = (np.concatenate(parts) for parts in zip(*self._pending))
+        rest = (addresses[count:], ops[count:], sizes[count:])
+        addresses, ops, sizes = addresses[:count], ops[:count], sizes[:count]
+        self._pending = [rest] if rest[0].size else []
+        self._pending_records -= count
+
+        deltas = np.diff(addresses, prepend=addresses[0])
+        delta_bytes = next(width for width, dtype in _DELTA_TYPES.items()
+                           if deltas.min() >= np.iinfo(dtype).min
+                           and deltas.max() <= np.iinfo(dtype).max)
+        payload = (deltas.astype(_DELTA_TYPES[delta_bytes]).tobytes() +
+                   ops.tobytes() + sizes.tobytes())
+        self._handle.write(_CHUNK_HEADER.pack(int(addresses[0]) & (2**64 - 1), count, delta_bytes))
+        self._handle.write(payload)
+        self._handle.write(b'\0' * (-len(payload) % 8))
+        self.records += count
+        self.chunks += 1
+
+
+class TraceReader:
+    """
+    Read-only, memory-mapped view of a binary trace file
+    """
+
+    def __init__(self, path: str):
+        """
+        Map the file and index its chunks
+
+        Args:
+            path: Trace written by TraceWriter
+        """
+        self.path = path
+        self._map = np.memmap(path, dtype=np.uint8, mode='r')
+        magic, version, _, self.records, self.num_chunks = _HEADER.unpack_from(self._map, 0)
+        if magic != MAGIC:
+            raise ValueError(f"{path} is not a binary address trace")
+        if version != VERSION:
+            raise ValueError(f"{path} has trace format version {version}, expected {VERSION}")
+
+        # (offset of the deltas, first address, records, delta width) per chunk
+        self.chunks = []
+        offset = _HEADER.size
+        for _ in range(self.num_chunks):
+            first_address, count, delta_bytes = _CHUNK_HEADER.unpack_from(self._map, offset)
+            offset += _CHUNK_HEADER.size
+            self.chunks.append((offset, np.int64(np.uint64(first_address).view(np.int64)),
+                                count, delta_bytes))
+            payload = count * (delta_bytes + 2)
+            offset += payload + (-payload % 8)
+
+    def __len__(self) -> int:
+        return self.records
+
+    def raw_chunk(self, index: int) -> Tuple[np.int64, np.ndarray, np.ndarray, np.ndarray]:
+        """
+        Encoded chunk without copying
+
+        Returns:
+            (first address, deltas, ops, sizes); the arrays are views of the mapping
+        """
+        offset, first_address, count, delta_bytes = self.chunks[index]
+        deltas = np.frombuffer(self._map, dtype=_DELTA_TYPES[delta_bytes], count=count,
+                               offset=offset)
+        ops_offset = offset + count * delta_bytes
+        ops = self._map[ops_offset:ops_offset + count]
+        sizes = self._map[ops_offset + count:ops_offset + 2 * count]
+        return first_address, deltas, ops, sizes
+
+    def iter_chunks(self) -> Iterator[Tuple[np.ndarray, np.ndarray, np.ndarray]]:
+        """
+        Decode the trace one chunk at a time
+
+        Yields:
+            (addresses int64, ops uint8 view, sizes uint8 view)
+        """
+        for index in range(len(self.chunks)):
+            first_address, deltas, ops, sizes = self.raw_chunk(index)
+            addresses = np.cumsum(deltas, dtype=np.int64)
+            addresses += first_address
+            yield addresses, ops, sizes
+
+    def iter_blocks(self, block_size: int, include_instructions: bool = False
+                    ) -> Iterator[Tuple[np.ndarray, np.ndarray]]:
+        """
+        Cache-block accesses of the trace, one chunk at a time
+
+        Modify records access their block twice (load, then store), and an
+        access that straddles a block boundary touches every block it spans.
+
+        Yields:
+            (blocks int64, ops uint8) with one entry per block access
+        """
+        for addresses, ops, sizes in self.iter_chunks():
+            if not include_instructions:
+                data = ops != OP_INSTRUCTION
+                addresses, ops, sizes = addresses[data], ops[data], sizes[data]
+            first = addresses // block_size
+            last = (addresses + np.maximum(sizes, 1).astype(np.int64) - 1) // block_size
+            repeats = (last - first + 1) * np.where(ops == OP_MODIFY, 2, 1)
+            if (repeats == 1).all():
+                yield first, np.asarray(ops)
+                continue
+            record = np.repeat(np.arange(addresses.size), repeats)
+            # Position of each expanded access within its record
+            position = np.arange(record.size) - np.repeat(np.cumsum(repeats) - repeats, repeats)
+            span = (last - first + 1)[record]
+            yield first[record] + position % span, np.asarray(ops)[record]
+
+
+def convert_lackey(source: Union[str, TextIO], path: str,
+                   include_instructions: bool = False,
+                   chunk_records: int = DEFAULT_CHUNK_RECORDS) -> Dict:
+    """
+    Convert Valgrind Lackey memory-trace output to the binary format
+
+    Lines look like 'I  0400d7d4,8', ' L 7ff000398,8', ' S ...' or ' M ...';
+    other lines (the '==pid==' banner) are skipped.
+
+    Args:
+        source: Lackey output file path or open text stream
+        path: Binary trace to write
+        include_instructions: Keep instruction fetches ('I' lines)
+        chunk_records: Records per chunk
+
+    Returns:
+        Dictionary with records written per operation and lines skipped
+    """
+    handle = open(source) if isinstance(source, str) else source
+    counts = dict.fromkeys(OP_NAMES, 0)
+    skipped = 0
+    batch = DEFAULT_CHUNK_RECORDS
+    addresses = np.empty(batch, dtype=np.int64)
+    ops = np.empty(batch, dtype=np.uint8)
+    sizes = np.empty(batch, dtype=np.uint8)
+    filled = 0
+    try:
+        with TraceWriter(path, chunk_records) as writer:
+            for line in handle:
+                fields = line.split()
+                op = LACKEY_OPS.get(fields[0]) if len(fields) == 2 else None
+                if op is None or (op == OP_INSTRUCTION and not include_instructions):
+                    skipped += op is None
+                    continue
+                address, _, size = fields[1].partition(',')
+                addresses[filled] = int(address, 16)
+                ops[filled] = op
+                sizes[filled] = min(int(size or 0), 255)
+                counts[OP_NAMES[op]] += 1
+                filled += 1
+                if filled == batch:
+                    writer.write(addresses, ops, sizes)
+                    filled = 0
+            writer.write(addresses[:filled], ops[:filled], sizes[:filled])
+    finally:
+        if handle is not source:
+            handle.close()
+    return {'records': sum(counts.values()), 'per_op': counts, 'skipped_lines': skipped}
+
+
+def write_gemm_trace(path: str, M: int, K: int, N: int, element_size: int = 8,
+                     loop_order: str = 'ijk', chunk_iterations: int = DEFAULT_CHUNK_ITERATIONS,
+                     tiles: Optional[Tuple[int, int, int]] = None,
+                     register_reuse: bool = False) -> int:
+    """
+    Write the generated GEMM trace (A, B loads, C modifies) to a binary trace
+
+    Returns:
+        Number of records written
+    """
+    with TraceWriter(path) as writer:
+        for addresses, matrix_ids in gemm_trace(M, K, N, element_size, loop_order,
+                                                chunk_iterations, tiles, register_reuse):
+            writer.write(addresses, np.where(matrix_ids == MATRIX_C, OP_MODIFY, OP_LOAD),
+                         element_size)
+    return writer.records
+
+
+def simulate_trace(path: str, num_sets: int, block_size: int, associativity: int,
+                   include_instructions: bool = False, policy: str = 'lru') -> Dict:
+    """
+    Stream a binary trace through a set-associative cache (LRU by default)
+
+    Args:
+        path: Binary trace file
+        num_sets: Number of cache sets
+        block_size: Block size in bytes
+        associativity: Ways per set
+        include_instructions: Also simulate instruction fetches (unified cache)
+        policy: Replacement policy (replacement.REPLACEMENT_POLICIES)
+
+    Returns:
+        Dictionary with block accesses, hits, misses and miss rate, overall
+        and per operation
+    """
+    reader = TraceReader(path)
+    cache = make_cache(num_sets, associativity, policy)
+    accesses = np.zeros(len(OP_NAMES), dtype=np.int64)
+    hits = np.zeros(len(OP_NAMES), dtype=np.int64)
+    for blocks, ops in reader.iter_blocks(block_size, include_instructions):
+        hit = cache.access(blocks)
+        accesses += np.bincount(ops, minlength=len(OP_NAMES))
+        hits += np.bincount(ops[hit], minlength=len(OP_NAMES))
+
+    per_op = {}
+    for op, name in enumerate(OP_NAMES):
+        op_accesses = int(accesses[op])
+        per_op[name] = {
+            'accesses': op_accesses,
+            'hits': int(hits[op]),
+            'misses': op_accesses - int(hits[op]),
+            'miss_rate': (op_accesses - int(hits[op])) / op_accesses if op_accesses else 0.0
+        }
+    total_accesses = int(accesses.sum())
+    total_hits = int(hits.sum())
+    return {
+        'trace': path,
+        'policy': policy,
+        'records': reader.records,
+        'trace_bytes': os.path.getsize(path),
+        'total_accesses': total_accesses,
+        'hits': total_hits,
+        'misses': total_accesses - total_hits,
+        'miss_rate': (total_accesses - total_hits) / total_accesses if total_accesses else 0.0,
+        'per_op': per_op
+    }
@@ -0,0 +1,267 @@
+#!/usr/bin/env python3
+"""
+Memory Traffic and Roofline Time Model for GEMM
+
+Miss counts say how often a level fails, not how many bytes cross the link
+below it. This module turns a GEMM trace into bytes per link and a
+roofline-style runtime bound:
+
+- Reads: every fill moves one block (b bytes) up the link.
+- Write-backs: C[i][j] += A[i][k] * B[k][j] dirties C's blocks; a dirty
+  block crosses the link again when it is evicted, or in the final flush
+  if it is still resident at the end.
+- Write policy: write-allocate fills the block on a write miss;
+  no-write-allocate sends the written element (E bytes) down instead.
+
+C is read-modify-write by default ('modify': a read then a write of the same
+block), so a C miss fills the block under either write policy. With
+c_update='store' every C access is a write of a block that does not need to
+be read (C = A × B with C overwritten), which is where no-write-allocate
+saves read traffic.
+
+Levels follow cache_hierarchy's configuration style, with write-back caches
+throughout and an optional per-level 'bandwidth' in bytes per second for
+the link below the level:
+    {'name': 'L2', 'C': 1024*1024, 'b': 64, 'assoc': 16, 'bandwidth': 200e9}
+Level i+1 sees the fills of level i as reads and its write-backs (or
+forwarded writes) as writes. A write-back stays one: if it misses a
+no-write-allocate level it passes on as a whole block (b bytes), not as a
+forwarded element. The run time is bounded below by every link and
+by the compute peak: time = max(flops / peak, max_i bytes_i / bandwidth_i).
+"""
+
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+from cache_simulator import DEFAULT_CHUNK_ITERATIONS, MATRIX_C, MATRIX_NAMES, gemm_trace
+from prefetch import merge_requests
+from replacement import OP_ACCESS, OP_WRITE, make_cache
+
+WRITE_POLICIES = ('write_allocate', 'no_write_allocate')
+C_UPDATES = ('modify', 'store')
+
+
+def gemm_flops(M: int, K: int, N: int) -> int:
+    """Floating-point operations of C = A × B (one multiply and one add per iteration)"""
+    return 2 * M * K * N
+
+
+def roofline_time(flops: float, traffic_bytes: Dict[str, float],
+                  bandwidths: Dict[str, float], peak_flops: Optional[float] = None) -> Dict:
+    """
+    Roofline lower bound on the run time
+
+    Args:
+        flops: Floating-point operations
+        traffic_bytes: {link name: bytes moved over the link}
+        bandwidths: {link name: bytes per second}; links without a
+                    bandwidth do not bound the time
+        peak_flops: Compute peak in FLOP/s (None ignores compute)
+
+    Returns:
+        Dictionary with the time of each bound, the predicted time (their
+        maximum), the bounding resource and the arithmetic intensity
+        (FLOP per byte) of every link
+    """
+    times = {link: traffic_bytes[link] / bandwidths[link]
+             for link in traffic_bytes if bandwidths.get(link)}
+    if peak_flops:
+        times['compute'] = flops / peak_flops
+    bound = max(times, key=times.get) if times else None
+    return {
+        'flops': flops,
+        'times_s': times,
+        'time_s': times[bound] if bound else 0.0,
+        'bound': bound,
+        'arithmetic_intensity': {link: flops / moved if moved else float('inf')
+                                 for link, moved in traffic_bytes.items()}
+    }
+
+
+def analytical_traffic(miss_analysis: Dict, block_size: int, element_size: int,
+                       M: int, N: int) -> Dict:
+    """
+    Bytes moved below one cache level, estimated from a miss analysis
+
+    Every miss fills a block. Every C block that is filled is dirtied by the
+    accumulation and written back once per residency, so C's misses are
+    also its write-backs (the final flush included). Without a per-matrix
+    breakdown (analyze_matrix_multiplication without a loop order), C is
+    assumed to be filled once: its compulsory blocks.
+
+    Args:
+        miss_analysis: 'miss_analysis' of CacheMissModel.analyze_matrix_multiplication
+        block_size: Block size in bytes
+        element_size: Element size in bytes
+        M, N: Dimensions of C
+
+    Returns:
+        Dictionary with read, write-back and total bytes
+    """
+    if 'per_matrix' in miss_analysis:
+        C_fills = miss_analysis['per_matrix']['C']['misses']
+    else:
+        C_fills = -(-M * N * element_size // block_size)
+    read_bytes = miss_analysis['total_misses'] * block_size
+    writeback_bytes = C_fills * block_size
+    return {
+        'read_bytes': read_bytes,
+        'writeback_bytes': writeback_bytes,
+        'total_bytes': read_bytes + writeback_bytes
+    }
+
+
+def simulate_gemm_traffic(levels: List[Dict], M: int, K: int, N: int, element_size: int = 8,
+                          loop_order: str = 'ijk',
+                          tiles: Optional[Tuple[int, int, int]] = None,
+                          register_reuse: bool = False,
+                          policy: str = 'lru',
+                          write_policy: str = 'write_allocate',
+                          c_update: str = 'modify',
+                          chunk_iterations: int = DEFAULT_CHUNK_ITERATIONS) -> Dict:
+    """
+    Simulate the bytes a GEMM moves over each link of a write-back hierarchy
+
+    Args:
+        levels: Level configurations from the core outwards, each with 'C',
+                'b', 'assoc' and optional 'name'
+        M, K, N: Matrix dimensions
+        element_size: Size of each element in bytes
+        loop_order: Loop nest order (of the tile and point loops with tiles)
+        tiles: Optional (tile_M, tile_K, tile_N)
+        register_reuse: Keep the innermost-loop invariant operand in a register
+        policy: Replacement policy of every level
+        write_policy: 'write_allocate' or 'no_write_allocate', for every level
+        c_update: 'modify' (C is read, then written) or 'store' (C is only written)
+        chunk_iterations: Loop iterations streamed per chunk
+
+    Returns:
+        Dictionary with per-level demand counts ('levels') and per-link
+        traffic ('links'; the link below level i, the last one being memory):
+        read, write-back (including write-backs from above that bypassed
+        the level), flush and write-through bytes and their total
+    """
+    if write_policy not in WRITE_POLICIES:
+        raise ValueError(f"Unknown write policy {write_policy!r}, expected one of {WRITE_POLICIES}")
+    if c_update not in C_UPDATES:
+        raise ValueError(f"Unknown C update {c_update!r}, expected one of {C_UPDATES}")
+    block_sizes = {level['b'] for level in levels}
+    if len(block_sizes) != 1:
+        raise ValueError("All levels must share one block size")
+    b = block_sizes.pop()
+
+    caches = [make_cache(level['C'] // (level['b'] * level['assoc']), level['assoc'], policy,
+                         write_allocate=write_policy == 'write_allocate')
+              for level in levels]
+    names = [level.get('name', f"L{index + 1}") for index, level in enumerate(levels)]
+    stats = [{'reads': 0, 'writes': 0, 'read_misses': 0, 'write_misses': 0}
+             for _ in levels]
+    fills = np.zeros(len(levels), dtype=np.int64)
+    bypassed = np.zeros(len(levels), dtype=np.int64)
+    # Write-backs from the level above that missed a no-write-allocate level
+    passed_writebacks = np.zeros(len(levels), dtype=np.int64)
+    matrix_misses = np.zeros(len(MATRIX_NAMES), dtype=np.int64)
+
+    for addresses, matrix_ids in gemm_trace(M, K, N, element_size, loop_order,
+                                            chunk_iterations, tiles, register_reuse):
+        blocks = addresses // b
+        is_C = matrix_ids == MATRIX_C
+        if c_update == 'modify':
+            # The write of C[i][j] follows its read
+            positions = np.flatnonzero(is_C)
+            blocks, is_write = merge_requests(blocks, positions, blocks[positions])
+            ops = np.where(is_write, OP_WRITE, OP_ACCESS).astype(np.int8)
+            demand = ~is_write
+        else:
+            ops = np.where(is_C, OP_WRITE, OP_ACCESS).astype(np.int8)
+            demand = np.ones(blocks.size, dtype=bool)
+        writeback = np.zeros(blocks.size, dtype=bool)
+
+        for level, cache in enumerate(caches):
+            hits, victims, written_back = cache.process(blocks, ops, writebacks=True)
+            write = ops == OP_WRITE
+            stats[level]['reads'] += int(np.count_nonzero(~write))
+            stats[level]['writes'] += int(np.count_nonzero(write))
+            stats[level]['read_misses'] += int(np.count_nonzero(~write & ~hits))
+            stats[level]['write_misses'] += int(np.count_nonzero(write & ~hits))
+            if level == 0:
+                missed = demand & ~hits
+                matrix_misses += np.bincount(matrix_ids[missed[demand]],
+                                             minlength=len(MATRIX_NAMES))
+
+            # Requests to the level below, in order: the write-back of a
+            # dirty victim, then the fill of the missing block (or the
+            # forwarded write of a bypassed one; a bypassed write-back stays
+            # a write-back)
+            filled = ~hits & (~write | cache.write_allocate)
+            forwarded = ~hits & write & ~cache.write_allocate
+            fills[level] += int(np.count_nonzero(filled))
+            bypassed[level] += int(np.count_nonzero(forwarded & ~writeback))
+            passed_writebacks[level] += int(np.count_nonzero(forwarded & writeback))
+            requested = np.flatnonzero(filled | forwarded)
+            evicted = np.flatnonzero(written_back)
+            order = np.argsort(np.concatenate((2 * evicted, 2 * requested + 1)), kind='stable')
+            blocks = np.concatenate((victims[evicted], blocks[requested]))[order]
+            ops = np.concatenate((np.full(evicted.size, OP_WRITE, dtype=np.int8),
+                                  np.where(forwarded[requested], OP_WRITE, OP_ACCESS)))[order]
+            ops = ops.astype(np.int8)
+            writeback = np.concatenate((np.ones(evicted.size, dtype=bool),
+                                        forwarded[requested] & writeback[requested]))[order]
+
+    links = []
+    for level, (name, cache) in enumerate(zip(names, caches)):
+        write_stats = cache.write_stats()
+        read_bytes = int(fills[level]) * b
+        writeback_bytes = (write_stats['writebacks'] + int(passed_writebacks[level])) * b
+        flush_bytes = write_stats['dirty_resident'] * b
+        write_through_bytes = int(bypassed[level]) * element_size
+        links.append({
+            'link': f"{name}->{names[level + 1]}" if level + 1 < len(names) else f"{name}->memory",
+            'read_bytes': read_bytes,
+            'writeback_bytes': writeback_bytes,
+            'flush_bytes': flush_bytes,
+            'write_through_bytes': write_through_bytes,
+            'total_bytes': read_bytes + writeback_bytes + flush_bytes + write_through_bytes
+        })
+        stats[level]['name'] = name
+
+    return {
+        'loop_order': loop_order,
+        'tiles': tiles,
+        'register_reuse': register_reuse,
+        'policy': policy,
+        'write_policy': write_policy,
+        'c_update': c_update,
+        'flops': gemm_flops(M, K, N),
+        'per_matrix_misses': dict(zip(MATRIX_NAMES, (int(count) for count in matrix_misses))),
+        'levels': stats,
+        'links': links
+    }
+
+
+def predict_gemm_time(levels: List[Dict], M: int, K: int, N: int, element_size: int = 8,
+                      peak_flops: Optional[float] = None, **options) -> Dict:
+    """
+    Roofline run-time prediction of a GEMM from its simulated per-link traffic
+
+    Args:
+        levels: Level configurations as for simulate_gemm_traffic, with the
+                'bandwidth' (bytes per second) of the link below each level
+        M, K, N: Matrix dimensions
+        element_size: Size of each element in bytes
+        peak_flops: Compute peak in FLOP/s (None ignores compute)
+        **options: Further simulate_gemm_traffic arguments (loop_order,
+                   tiles, write_policy, c_update, ...)
+
+    Returns:
+        The simulate_gemm_traffic result with a 'roofline' entry
+        (roofline_time over the links)
+    """
+    traffic = simulate_gemm_traffic(levels, M, K, N, element_size, **options)
+    traffic['roofline'] = roofline_time(
+        traffic['flops'],
+        {link['link']: link['total_bytes'] for link in traffic['links']},
+        {link['link']: level.get('bandwidth') for link, level in zip(traffic['links'], levels)},
+        peak_flops)
+    return traffic
@@ -0,0 +1,300 @@
+#!/usr/bin/env python3
+"""
+Transformer-Layer GEMM Workload Extractor
+
+Turns one dense transformer layer (B, L, d_model, ffn_dim, heads) under a
+parallelism plan into the GEMMs each GPU runs, and feeds them to
+CacheMissModel. The plans follow the DAG scripts:
+
+    - P:  sequence-parallel degree; each GPU holds L/P tokens of every sequence
+          (submission_SP/ra_sp_dense_dag.py, dense_transformer_dag.py)
+    - TP: tensor-parallel degree; heads and the FFN hidden dimension are split
+          column/row-parallel (submission_SP/baseline_dense_dag.py)
+
+Pipeline parallelism assigns whole layers to stages and does not change the
+per-layer GEMMs.
+
+Attention is computed blockwise as in Ring Attention: for each of the P ring
+stages a GPU multiplies its Q block with one K/V block, per head. With P = 1
+this is ordinary attention over the full sequence.
+
+Every GEMM is C[M, N] += A[M, K] * B[K, N] with a repeat count; the DAG
+labels (B, L/P, d_model) -> (B, L/P, 3*d_model) are kept alongside. The
+shapes are written once, as expressions over B, L, d_model and ffn_dim
+(layer_gemm_expressions): the dense DAG generators take their GEMM FLOPs
+from them, and graph_gemm_flops reads them back from a generated graph.
+
+GPU GEMM kernels are blocked, so each GEMM is evaluated as a tiled kernel
+(analyze_tiled_matrix_multiplication) with the tiles of
+calculate_optimal_tile_sizes for its own shape, or with fixed tiles. The
+naive row-major loop nest (tiles=None) streams B once per row of C for every
+shape, which puts all GEMMs at the same miss rate and FLOP/byte.
+"""
+
+from typing import Dict, List, Optional, Tuple, Union
+
+import numpy as np
+
+from cache_miss_analysis_model import CacheMissModel
+from execution_graph import ExecutionGraph, evaluate_expression
+
+# Parallelism plans of the submission DAGs (PP does not change the GEMMs)
+PARALLEL_PLANS = {
+    'baseline_tp8_pp2': {'P': 1, 'TP': 8},
+    'ra_sp16': {'P': 16, 'TP': 1},
+}
+
+DEFAULT_ELEMENT_SIZE = 2  # fp16/bf16
+# Tiles of each GEMM: 'optimal' (calculate_optimal_tile_sizes per shape),
+# (tile_M, tile_K, tile_N), or None for the untiled loop nest
+DEFAULT_TILES = 'optimal'
+# Loop order of the untiled loop nest (B reused across a row of C)
+DEFAULT_LOOP_ORDER = 'ikj'
+
+Tiles = Union[str, Tuple[int, int, int], None]
+
+
+def factor(expression: str) -> str:
+    """Expression parenthesized for use as a factor, unless it is a single name or number"""
+    return expression if expression.isidentifier() or expression.isdigit() else f"({expression})"
+
+
+def layer_gemm_expressions(P: int = 1, TP: int = 1, num_heads: int = 16,
+                           ffn_dim: str = 'ffn_dim') -> List[Dict]:
+    """
+    GEMMs one GPU runs for one transformer layer, as expressions over B, L, d_model and ffn_dim
+
+    The DAG generators take their GEMM FLOPs from here (gemm_flops), and
+    transformer_layer_gemms evaluates it for the cache model.
+
+    Args:
+        P: Sequence-parallel (ring) degree
+        TP: Tensor-parallel degree
+        num_heads: Attention heads
+        ffn_dim: Expression of the FFN hidden size
+
+    Returns:
+        List of GEMMs with name, label, and M, K, N and count (repeats per
+        layer) as expressions
+    """
+    if num_heads % TP:
+        raise ValueError(f"{num_heads} heads must be divisible by TP={TP}")
+    seq = f"L/{P}" if P > 1 else "L"
+    width = f"/{TP}" if TP > 1 else ""
+    tokens = f"B*{seq}"
+    head_dim = f"d_model/{num_heads}"
+    hidden = f"{factor(ffn_dim)}{width}" if width else ffn_dim
+    # One Q block against one K/V block, per local head and ring stage
+    attention = f"B*{num_heads // TP * P}"
+
+    return [
+        {'name': 'qkv_projection', 'M': tokens, 'K': 'd_model', 'N': f"3*d_model{width}", 'count': '1',
+         'label': f"(B, {seq}, d_model) -> (B, {seq}, 3*d_model{width})"},
+        {'name': 'attention_scores', 'M': seq, 'K': head_dim, 'N': seq, 'count': attention,
+         'label': f"Q x K^T: (B, {seq}, d_head) x (B, d_head, {seq}) per head and ring stage"},
+        {'name': 'attention_values', 'M': seq, 'K': seq, 'N': head_dim, 'count': attention,
+         'label': f"S x V: (B, {seq}, {seq}) x (B, {seq}, d_head) per head and ring stage"},
+        {'name': 'output_projection', 'M': tokens, 'K': f"d_model{width}", 'N': 'd_model', 'count': '1',
+         'label': f"(B, {seq}, d_model{width}) -> (B, {seq}, d_model)"},
+        {'name': 'ffn_linear1', 'M': tokens, 'K': 'd_model', 'N': hidden, 'count': '1',
+         'label': f"(B, {seq}, d_model) -> (B, {seq}, ffn_dim{width})"},
+        {'name': 'ffn_linear2', 'M': tokens, 'K': hidden, 'N': 'd_model', 'count': '1',
+         'label': f"(B, {seq}, ffn_dim{width}) -> (B, {seq}, d_model)"},
+    ]
+
+
+def gemm_flops(gemms: List[Dict], *names: str, ops: int = 1) -> str:
+    """
+    FLOP expression of the named GEMMs of layer_gemm_expressions
+
+    ops: Number of equal ops the GEMMs are split over (the P ring stages)
+    """
+    by_name = {gemm['name']: gemm for gemm in gemms}
+    terms = []
+    for name in names:
+        gemm = by_name[name]
+        factors = ['2'] + [factor(gemm[axis]) for axis in ('M', 'K', 'N')]
+        if gemm['count'] != '1':
+            factors.append(factor(gemm['count']))
+        terms.append('*'.join(factors))
+    flops = ' + '.join(terms)
+    return f"({flops})/{ops}" if ops > 1 else flops
+
+
+def transformer_layer_gemms(B: int, L: int, d_model: int, ffn_dim: int,
+                            num_heads: int = 16, P: int = 1, TP: int = 1) -> List[Dict]:
+    """
+    GEMMs one GPU runs for one transformer layer
+
+    Args:
+        B: Batch size
+        L: Sequence length
+        d_model: Hidden size
+        ffn_dim: FFN hidden size
+        num_heads: Attention heads
+        P: Sequence-parallel (ring) degree
+        TP: Tensor-parallel degree
+
+    Returns:
+        layer_gemm_expressions with M, K, N and count evaluated
+    """
+    if L % P:
+        raise ValueError(f"Sequence length {L} is not divisible by P={P}")
+    if d_model % num_heads:
+        raise ValueError(f"d_model={d_model} is not divisible by {num_heads} heads")
+    if num_heads % TP or ffn_dim % TP:
+        raise ValueError(f"{num_heads} heads and ffn_dim={ffn_dim} must be divisible by TP={TP}")
+
+    dims = {'B': B, 'L': L, 'd_model': d_model, 'ffn_dim': ffn_dim}
+    return [{**gemm, **{field: int(evaluate_expression(gemm[field], dims)) for field in ('M', 'K', 'N', 'count')}}
+            for gemm in layer_gemm_expressions(P, TP, num_heads)]
+
+
+def graph_gemm_flops(graph: ExecutionGraph, gemm_ops: Dict[str, Tuple[str, ...]], device: int = 0,
+                     layer: Optional[int] = None,
+                     dims: Optional[Dict[str, float]] = None) -> Dict[Tuple[str, ...], float]:
+    """
+    FLOPs of the GEMM ops one GPU runs in one layer of an ExecutionGraph
+
+    Args:
+        graph: Execution graph of a DAG generator
+        gemm_ops: {label template: names of the GEMMs its ops run} (the
+                  generator's LAYER_GEMMS)
+        device: GPU to count
+        layer: Layer to count (None: ops of every layer)
+        dims: Dimensions (default: the graph's)
+
+    Returns:
+        {GEMM names: FLOPs}, to compare with transformer_layer_gemms
+    """
+    flops = graph.flops(dims)
+    counted = {}
+    for label, names in gemm_ops.items():
+        ops = graph.find(label)
+        ops = ops[graph.ops['device'][ops] == device]
+        if layer is not None:
+            ops = ops[graph.ops['layer'][ops] == layer]
+        counted[tuple(names)] = float(flops[ops].sum())
+    return counted
+
+
+def gemm_tiles(model: CacheMissModel, M: int, K: int, N: int, element_size: int,
+               tiles: Tiles = DEFAULT_TILES) -> Optional[Tuple[int, int, int]]:
+    """Tile sizes of one GEMM for analyze_transformer_layer, clipped to its shape (None: untiled)"""
+    if tiles is None:
+        return None
+    if tiles == 'optimal':
+        optimal = model.calculate_optimal_tile_sizes(M, K, N, element_size)
+        tiles = (optimal['optimal_tile_M'], optimal['optimal_tile_K'], optimal['optimal_tile_N'])
+    elif isinstance(tiles, str) or len(tiles) != 3:
+        raise ValueError(f"Unknown tiles {tiles!r}, expected 'optimal', (tile_M, tile_K, tile_N) or None")
+    return min(tiles[0], M), min(tiles[1], K), min(tiles[2], N)
+
+
+def analyze_transformer_layer(model: CacheMissModel, gemms: List[Dict],
+                              element_size: int = DEFAULT_ELEMENT_SIZE,
+                              loop_order: Optional[str] = DEFAULT_LOOP_ORDER,
+                              tiles: Tiles = DEFAULT_TILES) -> Dict:
+    """
+    Cache misses and memory traffic of one layer's GEMMs on one GPU
+
+    Args:
+        model: Cache model of the GPU cache level to evaluate
+        gemms: GEMMs from transformer_layer_gemms
+        element_size: Size of each element in bytes
+        loop_order: Loop order of the untiled loop nest for
+                    analyze_matrix_multiplication; None uses the
+                    order-independent estimate of analyze_batch
+        tiles: 'optimal' to tile every GEMM with calculate_optimal_tile_sizes,
+               (tile_M, tile_K, tile_N) for the same tiles everywhere, or
+               None for the untiled loop nest
+
+    Returns:
+        Dictionary with per-GEMM rows and layer totals (counts applied)
+    """
+    shapes = np.array([[gemm['M'], gemm['K'], gemm['N']] for gemm in gemms], dtype=np.int64)
+    gemm_tile_sizes = [gemm_tiles(model, M, K, N, element_size, tiles) for M, K, N in shapes.tolist()]
+    if tiles is not None:
+        analyses = []
+        for (M, K, N), tile_sizes in zip(shapes.tolist(), gemm_tile_sizes):
+            tiled = model.analyze_tiled_matrix_multiplication(M, K, N, *tile_sizes, element_size=element_size)
+            analyses.append({
+                'total_accesses': tiled['total_accesses'],
+                'total_misses': tiled['total_misses'],
+                'compulsory_misses': sum(matrix['compulsory_misses'] for matrix in tiled['per_matrix'].values()),
+                'overall_miss_rate': tiled['miss_rate']
+            })
+    elif loop_order is None:
+        analyses = model.analyze_batch(shapes, element_size)
+    else:
+        analyses = [model.analyze_matrix_multiplication(M, K, N, element_size,
+                                                        loop_order=loop_order)['miss_analysis']
+                    for M, K, N in shapes.tolist()]
+
+    rows = []
+    for gemm, tile_sizes, analysis in zip(gemms, gemm_tile_sizes, analyses):
+        count = gemm['count']
+        flops = 2 * gemm['M'] * gemm['K'] * gemm['N'] * count
+        misses = int(analysis['total_misses']) * count
+        compulsory = int(analysis['compulsory_misses']) * count
+        traffic_bytes = misses * model.b
+        rows.append({
+            **gemm,
+            'tiles': tile_sizes,
+            'flops': flops,
+            'accesses': int(analysis['total_accesses']) * count,
+            'misses': misses,
+            'miss_rate': float(analysis['overall_miss_rate']),
+            'traffic_bytes': traffic_bytes,
+            'compulsory_bytes': compulsory * model.b,
+            'arithmetic_intensity': flops / traffic_bytes if traffic_bytes else float('inf')
+        })
+
+    flops = sum(row['flops'] for row in rows)
+    accesses = sum(row['accesses'] for row in rows)
+    misses = sum(row['misses'] for row in rows)
+    traffic_bytes = sum(row['traffic_bytes'] for row in rows)
+    return {
+        'cache_params': {'C': model.C, 'S': model.S, 'b': model.b, 'assoc': model.assoc},
+        'element_size': element_size,
+        'loop_order': None if tiles is not None else loop_order,
+        'tiles': tiles,
+        'gemms': rows,
+        'totals': {
+            'flops': flops,
+            'accesses': accesses,
+            'misses': misses,
+            'miss_rate': misses / accesses if accesses else 0.0,
+            'traffic_bytes': traffic_bytes,
+            'compulsory_bytes': sum(row['compulsory_bytes'] for row in rows),
+            'arithmetic_intensity': flops / traffic_bytes if traffic_bytes else float('inf')
+        }
+    }
+
+
+def compare_parallel_plans(model: CacheMissModel, B: int, L: int, d_model: int, ffn_dim: int,
+                           num_heads: int = 16, plans: Optional[Dict[str, Dict]] = None,
+                           element_size: int = DEFAULT_ELEMENT_SIZE,
+                           loop_order: Optional[str] = DEFAULT_LOOP_ORDER,
+                           tiles: Tiles = DEFAULT_TILES) -> Dict[str, Dict]:
+    """
+    Per-GPU layer reports for several parallelism plans
+
+    Args:
+        model: Cache model of the GPU cache level to evaluate
+        B, L, d_model, ffn_dim, num_heads: Layer configuration
+        plans: {name: {'P': ..., 'TP': ...}} (default PARALLEL_PLANS)
+        element_size: Size of each element in bytes
+        loop_order, tiles: Passed to analyze_transformer_layer
+
+    Returns:
+        {plan name: analyze_transformer_layer report with the plan added}
+    """
+    reports = {}
+    for name, plan in (plans or PARALLEL_PLANS).items():
+        gemms = transformer_layer_gemms(B, L, d_model, ffn_dim, num_heads,
+                                        P=plan.get('P', 1), TP=plan.get('TP', 1))
+        report = analyze_transformer_layer(model, gemms, element_size, loop_order, tiles)
+        report['plan'] = dict(plan)
+        reports[name] = report
+    return reports
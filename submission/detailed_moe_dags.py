@@ -1,262 +1,31 @@
-import graphviz
+import os
+
+from generate_moe_dags import build_baseline_ep_graph, build_proposed_ep_graph
+from execution_graph import render_dot
+
 
 # Create comprehensive baseline DAG (TP=8, PP=2, 4 experts/GPU, 16 GPUs)
 def create_detailed_baseline_dag():
-    dot = graphviz.Digraph('baseline_moe_detailed', format='svg')
-    dot.attr(rankdir='TB', size='40,50', ranksep='1.5', nodesep='0.8')
-    
-    # Define node styles with specific shapes and colors
-    dot.attr('node', shape='rectangle', style='filled', fillcolor='lightblue')  # computation
-    dot.attr('node', shape='ellipse', style='filled', fillcolor='lightgreen')  # communication
-    dot.attr('node', shape='parallelogram', style='filled', fillcolor='lightyellow')  # routing/aggregation
-    dot.attr('node', shape='diamond', style='filled', fillcolor='orange')  # residual/add
-    
-    # Input node
-    dot.node('input', 'Model Input\n[1024 tokens, hidden_dim]\nAll GPUs', 
-             shape='ellipse', fillcolor='lightcoral')
-    
-    # Layer 1
-    with dot.subgraph(name='cluster_layer1') as c:
-        c.attr(label='Layer 1 (16 experts total, 4 experts/GPU)')
-        
-        # Stage 1 (GPUs 0-7)
-        with c.subgraph(name='cluster_layer1_stage1') as s1:
-            s1.attr(label='Stage 1 (GPUs 0-7)')
-            
-            # Attention for stage 1
-            s1.node('l1_s1_attn', 'Multi-Head Attention\n[1024 tokens, hidden_dim]\nTP across GPUs 0-7', 
-                   fillcolor='lightblue')
-            
-            # Routing for experts
-            s1.node('l1_s1_route', 'Expert Routing\n[1024 tokens]\nGate on GPUs 0-7', 
-                   shape='parallelogram')
-            
-            # 8 GPUs, 4 experts each = 32 expert slots, but only 8 experts for this stage
-            for gpu in range(8):
-                for expert in range(4):
-                    expert_id = gpu * 4 + expert  # Experts 0-31, but only 0-7 active
-                    actual_expert = expert_id % 8  # 8 experts for stage 1
-                    s1.node(f'l1_s1_gpu{gpu}_exp{expert}', 
-                           f'Expert {actual_expert}\nGPU {gpu}\n[Variable tokens, expert_dim]',
-                           fillcolor='lightblue')
-            
-            # Aggregation
-            s1.node('l1_s1_agg', 'Expert Aggregation\n[1024 tokens]\nAll-reduce across GPUs 0-7', 
-                   shape='parallelogram')
-            
-            # Residual
-            s1.node('l1_s1_residual', 'Residual Add\n[1024 tokens]\nAcross GPUs 0-7', 
-                   shape='diamond')
-        
-        # Stage 2 (GPUs 8-15)
-        with c.subgraph(name='cluster_layer1_stage2') as s2:
-            s2.attr(label='Stage 2 (GPUs 8-15)')
-            
-            # Attention for stage 2
-            s2.node('l1_s2_attn', 'Multi-Head Attention\n[1024 tokens, hidden_dim]\nTP across GPUs 8-15', 
-                   fillcolor='lightblue')
-            
-            # Routing for experts
-            s2.node('l1_s2_route', 'Expert Routing\n[1024 tokens]\nGate on GPUs 8-15', 
-                   shape='parallelogram')
-            
-            # 8 GPUs, 4 experts each = 32 expert slots, but only 8 experts for this stage
-            for gpu in range(8):
-                for expert in range(4):
-                    expert_id = 8 + gpu * 4 + expert  # Experts 8-15
-                    actual_expert = 8 + (expert_id % 8)  # Experts 8-15
-                    s2.node(f'l1_s2_gpu{gpu+8}_exp{expert}', 
-                           f'Expert {actual_expert}\nGPU {gpu+8}\n[Variable tokens, expert_dim]',
-                           fillcolor='lightblue')
-            
-            # Aggregation
-            s2.node('l1_s2_agg', 'Expert Aggregation\n[1024 tokens]\nAll-reduce across GPUs 8-15', 
-                   shape='parallelogram')
-            
-            # Residual
-            s2.node('l1_s2_residual', 'Residual Add\n[1024 tokens]\nAcross GPUs 8-15', 
-                   shape='diamond')
-    
-    # Continue with remaining layers (2-4) following same pattern
-    for layer in range(2, 5):
-        with dot.subgraph(name=f'cluster_layer{layer}') as c:
-            c.attr(label=f'Layer {layer} (16 experts total, 4 experts/GPU)')
-            
-            # Stage 1
-            with c.subgraph(name=f'cluster_layer{layer}_stage1') as s1:
-                s1.attr(label=f'Stage 1 (GPUs 0-7)')
-                
-                s1.node(f'l{layer}_s1_attn', f'Multi-Head Attention\n[1024 tokens, hidden_dim]\nTP across GPUs 0-7', 
-                       fillcolor='lightblue')
-                s1.node(f'l{layer}_s1_route', f'Expert Routing\n[1024 tokens]\nGate on GPUs 0-7', 
-                       shape='parallelogram')
-                
-                for gpu in range(8):
-                    for expert in range(4):
-                        expert_base = (layer-1) * 16
-                        actual_expert = expert_base + gpu * 4 + expert
-                        s1.node(f'l{layer}_s1_gpu{gpu}_exp{expert}', 
-                               f'Expert {actual_expert}\nGPU {gpu}\n[Variable tokens, expert_dim]',
-                               fillcolor='lightblue')
-                
-                s1.node(f'l{layer}_s1_agg', f'Expert Aggregation\n[1024 tokens]\nAll-reduce across GPUs 0-7', 
-                       shape='parallelogram')
-                s1.node(f'l{layer}_s1_residual', f'Residual Add\n[1024 tokens]\nAcross GPUs 0-7', 
-                       shape='diamond')
-            
-            # Stage 2
-            with c.subgraph(name=f'cluster_layer{layer}_stage2') as s2:
-                s2.attr(label=f'Stage 2 (GPUs 8-15)')
-                
-                s2.node(f'l{layer}_s2_attn', f'Multi-Head Attention\n[1024 tokens, hidden_dim]\nTP across GPUs 8-15', 
-                       fillcolor='lightblue')
-                s2.node(f'l{layer}_s2_route', f'Expert Routing\n[1024 tokens]\nGate on GPUs 8-15', 
-                       shape='parallelogram')
-                
-                for gpu in range(8):
-                    for expert in range(4):
-                        expert_base = (layer-1) * 16 + 8
-                        actual_expert = expert_base + gpu * 4 + expert
-                        s2.node(f'l{layer}_s2_gpu{gpu+8}_exp{expert}', 
-                               f'Expert {actual_expert}\nGPU {gpu+8}\n[Variable tokens, expert_dim]',
-                               fillcolor='lightblue')
-                
-                s2.node(f'l{layer}_s2_agg', f'Expert Aggregation\n[1024 tokens]\nAll-reduce across GPUs 8-15', 
-                       shape='parallelogram')
-                s2.node(f'l{layer}_s2_residual', f'Residual Add\n[1024 tokens]\nAcross GPUs 8-15', 
-                       shape='diamond')
-    
-    # Output
-    dot.node('output', 'Model Output\n[1024 tokens, hidden_dim]\nAll GPUs', 
-             shape='ellipse', fillcolor='lightcoral')
-    
-    # Connections for baseline
-    dot.edge('input', 'l1_s1_attn')
-    dot.edge('l1_s1_attn', 'l1_s1_route')
-    
-    # Connect routing to experts
-    for gpu in range(8):
-        for expert in range(4):
-            dot.edge('l1_s1_route', f'l1_s1_gpu{gpu}_exp{expert}', style='dashed')
-    
-    # Connect experts to aggregation
-    for gpu in range(8):
-        for expert in range(4):
-            dot.edge(f'l1_s1_gpu{gpu}_exp{expert}', 'l1_s1_agg')
-    
-    dot.edge('l1_s1_agg', 'l1_s1_residual')
-    dot.edge('l1_s1_residual', 'l1_s2_attn')
-    
-    # Continue pattern for all layers...
-    # This is getting too large, let me create a more focused version
+    return build_baseline_ep_graph('baseline_moe_detailed', attention=True)
 
-    return dot
 
 # Create detailed proposed DAG (EP=64, 1 expert/GPU, 64 GPUs)
 def create_detailed_proposed_dag():
-    dot = graphviz.Digraph('proposed_moe_detailed', format='svg')
-    dot.attr(rankdir='TB', size='50,60', ranksep='1.2', nodesep='0.6')
-    
-    # Define node styles
-    dot.attr('node', shape='rectangle', style='filled', fillcolor='lightblue')  # computation
-    dot.attr('node', shape='ellipse', style='filled', fillcolor='lightgreen')  # communication
-    dot.attr('node', shape='parallelogram', style='filled', fillcolor='lightyellow')  # routing/aggregation
-    dot.attr('node', shape='diamond', style='filled', fillcolor='orange')  # residual/add
-    
-    # Input
-    dot.node('input', 'Model Input\n[1024 tokens, hidden_dim]\nBroadcast to all 64 GPUs', 
-             shape='ellipse', fillcolor='lightcoral')
-    
-    # Generate all 4 layers with 16 experts each
-    for layer in range(4):
-        layer_name = layer + 1
-        
-        with dot.subgraph(name=f'cluster_layer{layer_name}') as c:
-            c.attr(label=f'Layer {layer_name} (16 experts, 1 expert/GPU)')
-            
-            # Multi-head attention (replicated across all GPUs for this layer)
-            c.node(f'layer{layer_name}_attn', 
-                  f'Multi-Head Attention\n[1024 tokens, hidden_dim]\nReplicated on GPUs {layer*16}-{layer*16+15}',
-                  fillcolor='lightblue')
-            
-            # Gate computation
-            c.node(f'layer{layer_name}_gate', 
-                  f'Gate Network\n[1024 tokens]\nCompute routing probs\nGPUs {layer*16}-{layer*16+15}',
-                  shape='parallelogram')
-            
-            # Token routing/splitting
-            c.node(f'layer{layer_name}_split', 
-                  f'Split Tokens by Expert\n[Variable tokens per expert]\nAsync routing',
-                  shape='parallelogram')
-            
-            # 16 experts, each on separate GPU
-            for expert in range(16):
-                expert_id = layer * 16 + expert
-                gpu_id = layer * 16 + expert
-                
-                c.node(f'layer{layer_name}_expert{expert}_gpu{gpu_id}', 
-                      f'Expert {expert_id}\nGPU {gpu_id}\n[Variable tokens, expert_dim]',
-                      fillcolor='lightblue')
-            
-            # Gather results from all experts
-            c.node(f'layer{layer_name}_gather', 
-                  f'Gather Expert Outputs\n[1024 tokens]\nAsync all-gather\nGPUs {layer*16}-{layer*16+15}',
-                  shape='parallelogram')
-            
-            # Residual connection
-            c.node(f'layer{layer_name}_residual', 
-                  f'Residual Add\n[1024 tokens]\nAcross GPUs {layer*16}-{layer*16+15}',
-                  shape='diamond')
-    
-    # Output
-    dot.node('output', 'Model Output\n[1024 tokens, hidden_dim]\nFrom GPU 63', 
-             shape='ellipse', fillcolor='lightcoral')
-    
-    # Detailed connections
-    dot.edge('input', 'layer1_attn')
-    dot.edge('layer1_attn', 'layer1_gate')
-    dot.edge('layer1_gate', 'layer1_split')
-    
-    # Connect split to experts with routing
-    for expert in range(16):
-        gpu_id = expert
-        dot.edge('layer1_split', f'layer1_expert{expert}_gpu{gpu_id}', 
-                style='dashed', label='routed tokens')
-    
-    # Connect experts to gather
-    for expert in range(16):
-        gpu_id = expert
-        dot.edge(f'layer1_expert{expert}_gpu{gpu_id}', 'layer1_gather')
-    
-    dot.edge('layer1_gather', 'layer1_residual')
-    
-    # Continue for all layers
-    for layer in range(2, 5):
-        prev_layer = layer - 1
-        dot.edge(f'layer{prev_layer}_residual', f'layer{layer}_attn')
-        dot.edge(f'layer{layer}_attn', f'layer{layer}_gate')
-        dot.edge(f'layer{layer}_gate', f'layer{layer}_split')
-        
-        for expert in range(16):
-            gpu_id = (layer - 1) * 16 + expert
-            dot.edge(f'layer{layer}_split', f'layer{layer}_expert{expert}_gpu{gpu_id}', 
-                    style='dashed', label='routed tokens')
-            dot.edge(f'layer{layer}_expert{expert}_gpu{gpu_id}', f'layer{layer}_gather')
-        
-        dot.edge(f'layer{layer}_gather', f'layer{layer}_residual')
-    
-    dot.edge('layer4_residual', 'output')
-    
-    return dot
+    return build_proposed_ep_graph('proposed_moe_detailed', attention=True)
+
 
 # Create simplified but accurate DAGs
 if __name__ == "__main__":
+    # The rendered DAGs are checked in next to this script
+    output_dir = os.path.dirname(os.path.abspath(__file__))
     # Create detailed baseline
     baseline_detailed = create_detailed_baseline_dag()
-    baseline_detailed.render('/home/wzc/data/file-share/submission/baseline_moe_detailed')
-    
+    render_dot(baseline_detailed, os.path.join(output_dir, 'baseline_moe_detailed'),
+               size='40,50', ranksep='1.5', nodesep='0.8')
+
     # Create detailed proposed
     proposed_detailed = create_detailed_proposed_dag()
-    proposed_detailed.render('/home/wzc/data/file-share/submission/proposed_moe_detailed')
-    
-    print("Detailed DAGs generated successfully!")
\ No newline at end of file
+    render_dot(proposed_detailed, os.path.join(output_dir, 'proposed_moe_detailed'),
+               size='50,60', ranksep='1.2', nodesep='0.6')
+
+    print("Detailed DAGs generated successfully!")
@@ -1,165 +1,187 @@
-import graphviz
+import os
+import sys
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'analyse_model'))
+from execution_graph import (ALL_REDUCE, ALL_TO_ALL, COMPUTE, GATHER, INPUT, OUTPUT, RECV, ROUTING, SEND,
+                             SPLIT, ExecutionGraph, render_dot)
+
+# 4-layer MoE, 16 experts per layer, 1024 tokens per forward pass
+NUM_LAYERS = 4
+NUM_EXPERTS = 16
+# Baseline: TP=8, PP=2 on 16 GPUs. Each stage holds 2 layers and each GPU
+# 2 experts of each of them: 4 experts per GPU
+TP = 8
+PP = 2
+# Proposed: one GPU per expert per layer, 64 GPUs
+EP = NUM_LAYERS * NUM_EXPERTS
+
+# Paper setup: 16 heads x 512, MLP hidden size 32768 (top-k is not stated; top-2 assumed)
+DIMS = {'tokens': 1024, 'seq_len': 1024, 'hidden_size': 16 * 512, 'expert_dim': 32768, 'top_k': 2}
+
+# Tokens each expert receives: its share of the top-k assignments
+EXPERT_TOKENS = f'tokens*top_k/{NUM_EXPERTS}'
+
+
+def attention_flops(tokens, shards=1):
+    """QKV and output projections plus the score and value products of tokens queries"""
+    return f'(8*{tokens}*hidden_size**2 + 4*{tokens}*seq_len*hidden_size)/{shards}'
+
+
+def add_pipeline_transfer(graph, gpus, next_gpus, last, label, shape=('tokens', 'hidden_size')):
+    """Rank-to-rank send of the activations from gpus to next_gpus"""
+    send = graph.add_ops(SEND, f'Send {label}', shape, device=gpus, peer=next_gpus)
+    graph.add_edges(last, send)
+    recv = graph.add_ops(RECV, f'Receive {label}', shape, device=next_gpus, peer=gpus)
+    graph.add_edges(send, recv)
+    return recv
+
+
+def build_baseline_ep_graph(name='baseline_moe', attention=False, dims=None):
+    """
+    Baseline MoE deployment: TP=8 attention, experts colocated 4 per GPU, PP=2
+
+    Args:
+        name: Graph name
+        attention: Include the tensor-parallel attention of every layer
+        dims: Overrides of DIMS
+
+    Returns:
+        ExecutionGraph of the 16-GPU plan
+    """
+    graph = ExecutionGraph(name, {**DIMS, **(dims or {})})
+    layers_per_stage = NUM_LAYERS // PP
+
+    # Input
+    last = graph.add_op(INPUT, 'Total Input', ('tokens', 'hidden_size'), cluster=('Input',))
+    for layer in range(NUM_LAYERS):
+        stage = layer // layers_per_stage
+        gpus = np.arange(stage * TP, (stage + 1) * TP)
+        if layer and layer % layers_per_stage == 0:
+            last = add_pipeline_transfer(graph, gpus - TP, gpus, last, f'Stage {stage}')
+        cluster = (f'Layer {layer + 1} (Stage {stage + 1}, GPUs {gpus[0]}-{gpus[-1]})',)
+
+        # Multi-head attention, TP across the stage
+        if attention:
+            attn = graph.add_ops(COMPUTE, 'Multi-Head Attention Shard {device}', ('tokens', f'hidden_size/{TP}'),
+                                 device=gpus, layer=layer, cluster=cluster, flops=attention_flops('tokens', TP))
+            graph.add_edges(last, attn)
+            last = graph.add_op(ALL_REDUCE, f'All-Reduce\nSum across {TP} GPUs', ('tokens', 'hidden_size'),
+                                group=gpus, layer=layer, cluster=cluster)
+            graph.add_edges(attn, last)
+        residual_input = last
+
+        # Routing for this stage
+        route = graph.add_op(SPLIT, 'Expert Routing\nGate', ('tokens', 'top_k'), group=gpus, layer=layer,
+                             cluster=cluster, flops=f'2*tokens*hidden_size*{NUM_EXPERTS}')
+        graph.add_edges(last, route)
+
+        # 16 experts, 2 on every GPU of the stage
+        agg = graph.add_op(GATHER, 'Expert Aggregation', ('tokens', 'hidden_size'), group=gpus, layer=layer,
+                           cluster=cluster, flops='2*tokens*top_k*hidden_size')
+        experts = graph.add_ops(COMPUTE, 'Expert {index}', (EXPERT_TOKENS, 'expert_dim'),
+                                device=np.resize(gpus, NUM_EXPERTS),
+                                index=layer * NUM_EXPERTS + np.arange(NUM_EXPERTS), layer=layer, cluster=cluster,
+                                flops=f'4*{EXPERT_TOKENS}*hidden_size*expert_dim')
+        graph.add_edges(route, experts, ROUTING, 'routed tokens')
+        graph.add_edges(experts, agg)
+
+        # Residual connection
+        last = graph.add_op(COMPUTE, 'Residual Add', ('tokens', 'hidden_size'), group=gpus, layer=layer,
+                            cluster=cluster, flops='tokens*hidden_size')
+        graph.add_edge(agg, last)
+        graph.add_edges(residual_input, last)
+
+    # Output
+    output = graph.add_op(OUTPUT, 'Total Output', ('tokens', 'hidden_size'), cluster=('Output',))
+    graph.add_edge(last, output)
+    return graph
+
+
+def build_proposed_ep_graph(name='proposed_moe', attention=False, dims=None):
+    """
+    Cross-node expert parallelism: one expert per GPU, every MoE layer a micro-stage on its own 16 GPUs
+
+    Args:
+        name: Graph name
+        attention: Include the data-parallel attention and gate of every layer
+        dims: Overrides of DIMS
+
+    Returns:
+        ExecutionGraph of the 64-GPU plan
+    """
+    graph = ExecutionGraph(name, {**DIMS, **(dims or {})})
+    shard_tokens = f'tokens/{NUM_EXPERTS}'
+    shard = (shard_tokens, 'hidden_size')
+
+    # Input, split over the GPUs of the first layer
+    input_op = graph.add_op(INPUT, 'Total Input', ('tokens', 'hidden_size'), cluster=('Input',))
+    last = graph.add_op(SPLIT, 'Split Tokens', shard, group=range(NUM_EXPERTS), cluster=('Input',))
+    graph.add_edge(input_op, last)
+    for layer in range(NUM_LAYERS):
+        gpus = np.arange(layer * NUM_EXPERTS, (layer + 1) * NUM_EXPERTS)
+        if layer:
+            last = add_pipeline_transfer(graph, gpus - NUM_EXPERTS, gpus, last, f'to Layer {layer + 1}', shard)
+        cluster = (f'Layer {layer + 1} (Experts {gpus[0]}-{gpus[-1]} on GPUs {gpus[0]}-{gpus[-1]})',)
+        residual_input = last
+
+        # Multi-head attention and gate (replicated weights, tokens split across the layer's GPUs)
+        if attention:
+            attn = graph.add_ops(COMPUTE, 'Multi-Head Attention', shard, device=gpus, layer=layer,
+                                 cluster=cluster, flops=attention_flops(shard_tokens))
+            graph.add_edges(last, attn)
+            last = residual_input = attn
+        gate = graph.add_ops(COMPUTE, 'Gate Network', (shard_tokens, 'top_k'), device=gpus, layer=layer,
+                             cluster=cluster, flops=f'2*{shard_tokens}*hidden_size*{NUM_EXPERTS}')
+        graph.add_edges(last, gate)
+
+        # Asynchronous token dispatch to the expert GPUs and combine back
+        dispatch = graph.add_op(ALL_TO_ALL, 'Async Token Dispatch', (EXPERT_TOKENS, 'hidden_size'), group=gpus,
+                                layer=layer, cluster=cluster)
+        graph.add_edges(gate, dispatch)
+        experts = graph.add_ops(COMPUTE, 'Expert {index}', (EXPERT_TOKENS, 'expert_dim'), device=gpus,
+                                index=gpus, layer=layer, cluster=cluster,
+                                flops=f'4*{EXPERT_TOKENS}*hidden_size*expert_dim')
+        graph.add_edges(dispatch, experts, ROUTING, 'routed tokens')
+        combine = graph.add_op(ALL_TO_ALL, 'Async Token Combine', (EXPERT_TOKENS, 'hidden_size'), group=gpus,
+                               layer=layer, cluster=cluster)
+        graph.add_edges(experts, combine)
+
+        # Residual connection
+        last = graph.add_ops(COMPUTE, 'Residual Add', shard, device=gpus, layer=layer, cluster=cluster,
+                             flops=f'{shard_tokens}*hidden_size')
+        graph.add_edges(combine, last)
+        graph.add_edges(residual_input, last)
+
+    # Output
+    gather = graph.add_op(GATHER, 'Gather Tokens', ('tokens', 'hidden_size'), group=range(EP - NUM_EXPERTS, EP),
+                          cluster=('Output',))
+    graph.add_edges(last, gather)
+    output = graph.add_op(OUTPUT, 'Total Output', ('tokens', 'hidden_size'), cluster=('Output',))
+    graph.add_edge(gather, output)
+    return graph
+
 
 # Create baseline DAG (TP=8, PP=2, 4 experts/GPU, 16 GPUs total)
 def create_baseline_dag():
-    dot = graphviz.Digraph('baseline_moe', format='svg')
-    dot.attr(rankdir='TB', size='20,30')
-    
-    # Define node styles
-    dot.attr('node', shape='rectangle', style='filled', fillcolor='lightblue')  # computation
-    dot.attr('node', shape='ellipse', style='filled', fillcolor='lightgreen')  # communication
-    dot.attr('node', shape='parallelogram', style='filled', fillcolor='lightyellow')  # routing/aggregation
-    
-    # Input
-    dot.node('input', 'Total Input\n[1024 tokens, hidden_size]', shape='ellipse', fillcolor='lightcoral')
-    
-    # Pipeline stages
-    for layer in range(4):
-        with dot.subgraph(name=f'cluster_layer_{layer}') as c:
-            c.attr(label=f'Layer {layer+1}')
-            
-            # Each layer has 2 pipeline stages
-            for stage in range(2):
-                stage_id = layer * 2 + stage
-                gpu_start = stage_id * 8  # 8 GPUs per stage
-                
-                # Routing for this stage
-                c.node(f'route_{layer}_{stage}', f'Routing Layer {layer+1}\nStage {stage+1}\n[1024 tokens]', 
-                      shape='parallelogram')
-                
-                # 4 experts per GPU, 8 GPUs per stage = 32 experts total per stage
-                # But we only have 16 experts per layer, so 8 experts per stage
-                for gpu in range(8):
-                    gpu_id = gpu_start + gpu
-                    expert_start = layer * 16 + stage * 8 + gpu * 0.5  # This is complex
-                    
-                    # Since 4 experts per GPU, and 8 GPUs per stage = 32 slots, but only 16 experts
-                    # Actually: 16 experts / 2 stages = 8 experts per stage
-                    # 8 experts / 8 GPUs = 1 expert per GPU, but paper says 4 experts/GPU
-                    # Let me recalculate: 16 experts total, 4 experts/GPU, 16 GPUs total
-                    # So 16 experts / 16 GPUs = 1 expert per GPU, but 4 experts/GPU means 64 experts?
-                    # Wait, let me re-read: baseline has 16 GPUs, 4 experts/GPU, but 16 experts/layer
-                    # This means: 16 experts / 16 GPUs = 1 expert per GPU, but 4 experts/GPU suggests 64 experts
-                    # Actually, the paper says: 16 experts/layer, 4 experts/GPU, so 16/4 = 4 GPUs needed per layer
-                    # But baseline has 16 GPUs total with TP=8, PP=2
-                    # This is confusing. Let me use: 16 experts across 16 GPUs, 4 experts/GPU means each GPU has 4 expert replicas
-                    
-                    expert_id = layer * 16 + gpu
-                    c.node(f'expert_{layer}_{gpu}', f'Expert {expert_id}\nGPU {gpu_id}\n[1024 tokens, expert_dim]', 
-                          fillcolor='lightblue')
-                
-                # Aggregation for this stage
-                c.node(f'agg_{layer}_{stage}', f'Aggregation Layer {layer+1}\nStage {stage+1}\n[1024 tokens]', 
-                      shape='parallelogram')
-                
-                # Residual connection
-                c.node(f'residual_{layer}_{stage}', f'Residual Add Layer {layer+1}\nStage {stage+1}\n[1024 tokens]', 
-                      shape='rectangle', fillcolor='orange')
-    
-    # Connections
-    dot.edge('input', 'route_0_0')
-    
-    # Layer 1
-    dot.edge('route_0_0', 'expert_0_0')
-    dot.edge('route_0_0', 'expert_0_1')
-    # ... (add all expert connections)
-    dot.edge('expert_0_0', 'agg_0_0')
-    dot.edge('expert_0_1', 'agg_0_0')
-    # ... (add all aggregation connections)
-    dot.edge('agg_0_0', 'residual_0_0')
-    dot.edge('residual_0_0', 'route_0_1')
-    
-    # Continue with remaining layers...
-    # This is getting complex, let me create a more systematic approach
-
-    return dot
+    return build_baseline_ep_graph('baseline_moe')
+
 
 # Create proposed DAG (EP=64, 1 expert/GPU, 64 GPUs total)
 def create_proposed_dag():
-    dot = graphviz.Digraph('proposed_moe', format='svg')
-    dot.attr(rankdir='TB', size='30,40')
-    
-    # Define node styles
-    dot.attr('node', shape='rectangle', style='filled', fillcolor='lightblue')  # computation
-    dot.attr('node', shape='ellipse', style='filled', fillcolor='lightgreen')  # communication
-    dot.attr('node', shape='parallelogram', style='filled', fillcolor='lightyellow')  # routing/aggregation
-    
-    # Input
-    dot.node('input', 'Total Input\n[1024 tokens, hidden_size]', shape='ellipse', fillcolor='lightcoral')
-    
-    # 4 layers, each with 16 experts distributed across 64 GPUs
-    for layer in range(4):
-        with dot.subgraph(name=f'cluster_layer_{layer}') as c:
-            c.attr(label=f'Layer {layer+1}')
-            
-            # Routing - determines which tokens go to which expert
-            c.node(f'route_{layer}', f'Routing Layer {layer+1}\n[1024 tokens]\nGate Computation', 
-                  shape='parallelogram')
-            
-            # Split tokens based on routing decisions
-            c.node(f'split_{layer}', f'Split Tokens Layer {layer+1}\n[Variable tokens per expert]', 
-                  shape='parallelogram')
-            
-            # 16 experts for this layer, each on separate GPU
-            # Experts 0-15 for layer 0, 16-31 for layer 1, etc.
-            for expert in range(16):
-                expert_id = layer * 16 + expert
-                gpu_id = layer * 16 + expert  # Sequential GPU assignment
-                
-                c.node(f'expert_{layer}_{expert}', 
-                      f'Expert {expert_id}\nGPU {gpu_id}\n[Variable tokens, expert_dim]',
-                      fillcolor='lightblue')
-            
-            # Gather results from all experts
-            c.node(f'gather_{layer}', f'Gather Results Layer {layer+1}\n[1024 tokens]', 
-                  shape='parallelogram')
-            
-            # Residual connection
-            c.node(f'residual_{layer}', f'Residual Add Layer {layer+1}\n[1024 tokens]', 
-                  shape='rectangle', fillcolor='orange')
-    
-    # Output
-    dot.node('output', 'Total Output\n[1024 tokens, hidden_size]', shape='ellipse', fillcolor='lightcoral')
-    
-    # Connections
-    dot.edge('input', 'route_0')
-    dot.edge('route_0', 'split_0')
-    
-    # Connect split to experts with dashed lines for routing
-    for expert in range(16):
-        dot.edge('split_0', f'expert_0_{expert}', style='dashed', 
-                label='token routing')
-    
-    # Connect experts to gather
-    for expert in range(16):
-        dot.edge(f'expert_0_{expert}', 'gather_0')
-    
-    dot.edge('gather_0', 'residual_0')
-    dot.edge('residual_0', 'route_1')
-    
-    # Continue pattern for remaining layers
-    for layer in range(1, 4):
-        dot.edge(f'residual_{layer-1}', f'route_{layer}')
-        dot.edge(f'route_{layer}', f'split_{layer}')
-        
-        for expert in range(16):
-            dot.edge(f'split_{layer}', f'expert_{layer}_{expert}', style='dashed')
-            dot.edge(f'expert_{layer}_{expert}', f'gather_{layer}')
-        
-        dot.edge(f'gather_{layer}', f'residual_{layer}')
-    
-    dot.edge('residual_3', 'output')
-    
-    return dot
-
-# Create detailed DAGs with proper dimensions and communication
+    return build_proposed_ep_graph('proposed_moe')
+
+
 if __name__ == "__main__":
+    # The rendered DAGs are checked in next to this script
+    output_dir = os.path.dirname(os.path.abspath(__file__))
     # Create baseline DAG
     baseline = create_baseline_dag()
-    baseline.render('/home/wzc/data/file-share/submission/baseline_moe_dag')
-    
+    render_dot(baseline, os.path.join(output_dir, 'baseline_moe_dag'), size='20,30')
+
     # Create proposed DAG
     proposed = create_proposed_dag()
-    proposed.render('/home/wzc/data/file-share/submission/proposed_moe_dag')
-    
-    print("DAGs generated successfully!")
\ No newline at end of file
+    render_dot(proposed, os.path.join(output_dir, 'proposed_moe_dag'), size='30,40')
+
+    print("DAGs generated successfully!")
@@ -1,258 +1,178 @@
-import graphviz
-
-# Create baseline DAG for Dense Transformer with TP=8, PP=2
-dot = graphviz.Digraph(comment='Dense Transformer Baseline (TP=8, PP=2)', format='svg')
-dot.attr(rankdir='TB', size='20,30')
-
-# Define node styles
-dot.attr('node', shape='ellipse', style='filled', color='lightblue')  # Communication
-dot.attr('node', shape='rectangle', style='filled', color='lightgreen')  # Computation
-dot.attr('node', shape='parallelogram', style='filled', color='lightyellow')  # Routing/Aggregation
-
-# Input
-with dot.subgraph(name='cluster_input') as c:
-    c.attr(label='Input Layer')
-    c.node('input', 'Input\nX: [B, L, d_model]\nGPU: Host', shape='parallelogram')
-
-# Pipeline Stage 0 (Layers 0-1) - GPUs 0-7
-with dot.subgraph(name='cluster_stage0') as c:
-    c.attr(label='Pipeline Stage 0 (GPUs 0-7)')
-    
-    # Layer 0
-    with dot.subgraph(name='cluster_layer0') as layer:
-        layer.attr(label='Layer 0')
-        
-        # Input split for pipeline
-        layer.node('split0', 'Split for Pipeline\nX: [B, L/P, d_model]\nGPU: 0-7', shape='parallelogram')
-        
-        # MHA - Tensor Parallel across 8 GPUs
-        with dot.subgraph(name='cluster_mha0') as mha:
-            mha.attr(label='Multi-Head Attention')
-            
-            # QKV projections (column parallel)
-            for i in range(8):
-                mha.node(f'qkv0_{i}', f'QKV Projection {i}\n[Q,K,V]: [B, L/P, d_model/8]\nGPU: {i}', shape='rectangle')
-            
-            # Attention computation
-            for i in range(8):
-                mha.node(f'attn0_{i}', f'Attention {i}\nOutput: [B, L/P, d_model/8]\nGPU: {i}', shape='rectangle')
-            
-            # Output projection (row parallel)
-            for i in range(8):
-                mha.node(f'out0_{i}', f'Output Proj {i}\nOutput: [B, L/P, d_model/8]\nGPU: {i}', shape='rectangle')
-            
-            # All-reduce for attention output
-            mha.node('ar0', 'All-Reduce\nSum across 8 GPUs\nGPU: 0-7', shape='ellipse')
-        
-        # Residual connection
-        layer.node('res0', 'Residual Add\nInput: [B, L/P, d_model]\nGPU: 0-7', shape='parallelogram')
-        
-        # FFN - Tensor Parallel across 8 GPUs
-        with dot.subgraph(name='cluster_ffn0') as ffn:
-            ffn.attr(label='Feed Forward Network')
-            
-            # First linear (column parallel)
-            for i in range(8):
-                ffn.node(f'ffn1_0_{i}', f'FFN Linear1 {i}\nOutput: [B, L/P, ffn_dim/8]\nGPU: {i}', shape='rectangle')
-            
-            # Activation
-            for i in range(8):
-                ffn.node(f'act0_{i}', f'GELU {i}\nOutput: [B, L/P, ffn_dim/8]\nGPU: {i}', shape='rectangle')
-            
-            # Second linear (row parallel)
-            for i in range(8):
-                ffn.node(f'ffn2_0_{i}', f'FFN Linear2 {i}\nOutput: [B, L/P, d_model/8]\nGPU: {i}', shape='rectangle')
-            
-            # All-reduce for FFN output
-            ffn.node('ar_ffn0', 'All-Reduce\nSum across 8 GPUs\nGPU: 0-7', shape='ellipse')
-        
-        # Residual connection
-        layer.node('res_ffn0', 'Residual Add\nInput: [B, L/P, d_model]\nGPU: 0-7', shape='parallelogram')
-
-# Pipeline communication between stages
-dot.node('send_stage0', 'Send to Stage 1\nX: [B, L/P, d_model]\nGPU: 0-7 → 8-15', shape='ellipse')
-
-# Pipeline Stage 1 (Layers 2-3) - GPUs 8-15
-with dot.subgraph(name='cluster_stage1') as c:
-    c.attr(label='Pipeline Stage 1 (GPUs 8-15)')
-    
-    # Layer 2
-    with dot.subgraph(name='cluster_layer2') as layer:
-        layer.attr(label='Layer 2')
-        
-        # Receive from stage 0
-        layer.node('recv_stage1', 'Receive from Stage 0\nX: [B, L/P, d_model]\nGPU: 8-15', shape='ellipse')
-        
-        # MHA - Tensor Parallel across 8 GPUs (8-15)
-        with dot.subgraph(name='cluster_mha2') as mha:
-            mha.attr(label='Multi-Head Attention')
-            
-            # QKV projections (column parallel)
-            for i in range(8, 16):
-                mha.node(f'qkv2_{i}', f'QKV Projection {i}\n[Q,K,V]: [B, L/P, d_model/8]\nGPU: {i}', shape='rectangle')
-            
-            # Attention computation
-            for i in range(8, 16):
-                mha.node(f'attn2_{i}', f'Attention {i}\nOutput: [B, L/P, d_model/8]\nGPU: {i}', shape='rectangle')
-            
-            # Output projection (row parallel)
-            for i in range(8, 16):
-                mha.node(f'out2_{i}', f'Output Proj {i}\nOutput: [B, L/P, d_model/8]\nGPU: {i}', shape='rectangle')
-            
-            # All-reduce for attention output
-            mha.node('ar2', 'All-Reduce\nSum across 8 GPUs\nGPU: 8-15', shape='ellipse')
-        
-        # Residual connection
-        layer.node('res2', 'Residual Add\nInput: [B, L/P, d_model]\nGPU: 8-15', shape='parallelogram')
-        
-        # FFN - Tensor Parallel across 8 GPUs
-        with dot.subgraph(name='cluster_ffn2') as ffn:
-            ffn.attr(label='Feed Forward Network')
-            
-            # First linear (column parallel)
-            for i in range(8, 16):
-                ffn.node(f'ffn1_2_{i}', f'FFN Linear1 {i}\nOutput: [B, L/P, ffn_dim/8]\nGPU: {i}', shape='rectangle')
-            
-            # Activation
-            for i in range(8, 16):
-                ffn.node(f'act2_{i}', f'GELU {i}\nOutput: [B, L/P, ffn_dim/8]\nGPU: {i}', shape='rectangle')
-            
-            # Second linear (row parallel)
-            for i in range(8, 16):
-                ffn.node(f'ffn2_2_{i}', f'FFN Linear2 {i}\nOutput: [B, L/P, d_model/8]\nGPU: {i}', shape='rectangle')
-            
-            # All-reduce for FFN output
-            ffn.node('ar_ffn2', 'All-Reduce\nSum across 8 GPUs\nGPU: 8-15', shape='ellipse')
-        
-        # Residual connection
-        layer.node('res_ffn2', 'Residual Add\nInput: [B, L/P, d_model]\nGPU: 8-15', shape='parallelogram')
-
-    # Layer 3 (similar structure)
-    with dot.subgraph(name='cluster_layer3') as layer:
-        layer.attr(label='Layer 3')
-        
-        # MHA - Tensor Parallel across 8 GPUs (8-15)
-        with dot.subgraph(name='cluster_mha3') as mha:
-            mha.attr(label='Multi-Head Attention')
-            
-            # QKV projections (column parallel)
-            for i in range(8, 16):
-                mha.node(f'qkv3_{i}', f'QKV Projection {i}\n[Q,K,V]: [B, L/P, d_model/8]\nGPU: {i}', shape='rectangle')
-            
-            # Attention computation
-            for i in range(8, 16):
-                mha.node(f'attn3_{i}', f'Attention {i}\nOutput: [B, L/P, d_model/8]\nGPU: {i}', shape='rectangle')
-            
-            # Output projection (row parallel)
-            for i in range(8, 16):
-                mha.node(f'out3_{i}', f'Output Proj {i}\nOutput: [B, L/P, d_model/8]\nGPU: {i}', shape='rectangle')
-            
-            # All-reduce for attention output
-            mha.node('ar3', 'All-Reduce\nSum across 8 GPUs\nGPU: 8-15', shape='ellipse')
-        
-        # Residual connection
-        layer.node('res3', 'Residual Add\nInput: [B, L/P, d_model]\nGPU: 8-15', shape='parallelogram')
-        
-        # FFN - Tensor Parallel across 8 GPUs
-        with dot.subgraph(name='cluster_ffn3') as ffn:
-            ffn.attr(label='Feed Forward Network')
-            
-            # First linear (column parallel)
-            for i in range(8, 16):
-                ffn.node(f'ffn1_3_{i}', f'FFN Linear1 {i}\nOutput: [B, L/P, ffn_dim/8]\nGPU: {i}', shape='rectangle')
-            
-            # Activation
-            for i in range(8, 16):
-                ffn.node(f'act3_{i}', f'GELU {i}\nOutput: [B, L/P, ffn_dim/8]\nGPU: {i}', shape='rectangle')
-            
-            # Second linear (row parallel)
-            for i in range(8, 16):
-                ffn.node(f'ffn2_3_{i}', f'FFN Linear2 {i}\nOutput: [B, L/P, d_model/8]\nGPU: {i}', shape='rectangle')
-            
-            # All-reduce for FFN output
-            ffn.node('ar_ffn3', 'All-Reduce\nSum across 8 GPUs\nGPU: 8-15', shape='ellipse')
-        
+import os
+import sys
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'analyse_model'))
+from execution_graph import (ALL_REDUCE, COMPUTE, GATHER, INPUT, OUTPUT, RECV, SEND, SPLIT,
+                             ExecutionGraph, render_dot)
+from transformer_workload import gemm_flops, layer_gemm_expressions
+
+# Tensor parallelism across 8 GPUs, 2 pipeline stages, 4 layers
+TP = 8
+PP = 2
+NUM_LAYERS = 4
+
+# Ops of a layer running the transformer_workload GEMMs, by label
+LAYER_GEMMS = {
+    'QKV Projection {device}\n[Q,K,V]': ('qkv_projection',),
+    'Attention {device}\nOutput': ('attention_scores', 'attention_values'),
+    'Output Proj {device}\nOutput': ('output_projection',),
+    'FFN Linear1 {device}\nOutput': ('ffn_linear1',),
+    'FFN Linear2 {device}\nOutput': ('ffn_linear2',)
+}
+
+
+def stage_gpus(stage, TP=TP):
+    """GPUs of one pipeline stage"""
+    return np.arange(stage * TP, (stage + 1) * TP)
+
+
+def stage_cluster(stage, TP=TP):
+    gpus = stage_gpus(stage, TP)
+    return f'Pipeline Stage {stage} (GPUs {gpus[0]}-{gpus[-1]})'
+
+
+def add_input(graph, TP=TP):
+    """Input on the host, handed to the tensor-parallel group of stage 0"""
+    # Input
+    input_op = graph.add_op(INPUT, 'Input\nX', ('B', 'L', 'd_model'), cluster=('Input Layer',))
+
+    # Input split for pipeline
+    split0 = graph.add_op(SPLIT, 'Split for Pipeline\nX', ('B', 'L', 'd_model'), group=stage_gpus(0, TP),
+                          cluster=(stage_cluster(0, TP), 'Layer 0'))
+    graph.add_edge(input_op, split0)
+    return split0
+
+
+def add_attention(graph, stage, layer_id, layer_input, TP=TP):
+    """
+    Tensor-parallel Multi-Head Attention of one layer and its residual add
+
+    Returns:
+        Id of the residual add (on the stage's whole TP group)
+    """
+    gpus = stage_gpus(stage, TP)
+    cluster = (stage_cluster(stage, TP), f'Layer {layer_id}')
+    width = f'd_model/{TP}'
+    gemms = layer_gemm_expressions(TP=TP)
+
+    # MHA - Tensor Parallel across TP GPUs
+    mha = cluster + ('Multi-Head Attention',)
+
+    # QKV projections (column parallel)
+    qkv = graph.add_ops(COMPUTE, 'QKV Projection {device}\n[Q,K,V]', ('3', 'B', 'L', width), device=gpus,
+                        layer=layer_id, cluster=mha, flops=gemm_flops(gemms, 'qkv_projection'))
+    graph.add_edges(layer_input, qkv)
+
+    # Attention computation
+    attn = graph.add_ops(COMPUTE, 'Attention {device}\nOutput', ('B', 'L', width), device=gpus,
+                         layer=layer_id, cluster=mha,
+                         flops=gemm_flops(gemms, 'attention_scores', 'attention_values'))
+    graph.add_edges(qkv, attn)
+
+    # Output projection (row parallel); partial sums of the full width
+    out = graph.add_ops(COMPUTE, 'Output Proj {device}\nOutput', ('B', 'L', 'd_model'), device=gpus,
+                        layer=layer_id, cluster=mha, flops=gemm_flops(gemms, 'output_projection'))
+    graph.add_edges(attn, out)
+
+    # All-reduce for attention output
+    ar = graph.add_op(ALL_REDUCE, f'All-Reduce\nSum across {TP} GPUs', ('B', 'L', 'd_model'), group=gpus,
+                      layer=layer_id, cluster=mha)
+    graph.add_edges(out, ar)
+
+    # Residual connection
+    res = graph.add_op(COMPUTE, 'Residual Add\nInput', ('B', 'L', 'd_model'), group=gpus, layer=layer_id,
+                       cluster=cluster, flops='B*L*d_model')
+    graph.add_edge(ar, res)
+    graph.add_edges(layer_input, res)
+    return res
+
+
+def add_pipeline_transfer(graph, stage, last, TP=TP):
+    """
+    Send the activations of one stage to the next, rank to rank
+
+    Returns:
+        Ids of the receives on the next stage
+    """
+    gpus, next_gpus = stage_gpus(stage, TP), stage_gpus(stage + 1, TP)
+    # Pipeline communication between stages
+    send = graph.add_ops(SEND, 'Send to Stage {index}\nX', ('B', 'L', 'd_model'), device=gpus,
+                         peer=next_gpus, index=stage + 1)
+    graph.add_edges(last, send)
+
+    # Receive from the previous stage
+    recv = graph.add_ops(RECV, 'Receive from Stage {index}\nX', ('B', 'L', 'd_model'), device=next_gpus,
+                         peer=gpus, index=stage, cluster=(stage_cluster(stage + 1, TP),))
+    graph.add_edges(send, recv)
+    return recv
+
+
+def add_output(graph, stage, last, TP=TP):
+    """Gather the result of the last stage to the host"""
+    # Output
+    gather = graph.add_op(GATHER, 'Gather from Pipeline\nX', ('B', 'L', 'd_model'), group=stage_gpus(stage, TP),
+                          cluster=('Output Layer',))
+    graph.add_edges(last, gather)
+    output = graph.add_op(OUTPUT, 'Output\nX', ('B', 'L', 'd_model'), cluster=('Output Layer',))
+    graph.add_edge(gather, output)
+
+
+def build_baseline_dense_graph(TP=TP, PP=PP, num_layers=NUM_LAYERS, dims=None):
+    """Dense Transformer baseline: TP-way tensor parallel layers in PP pipeline stages"""
+    graph = ExecutionGraph(f'Dense Transformer Baseline (TP={TP}, PP={PP})', dims)
+    width = f'ffn_dim/{TP}'
+    gemms = layer_gemm_expressions(TP=TP)
+    layers_per_stage = -(-num_layers // PP)
+
+    layer_input = add_input(graph, TP)
+    for layer_id in range(num_layers):
+        stage = layer_id // layers_per_stage
+        if layer_id and stage != (layer_id - 1) // layers_per_stage:
+            layer_input = add_pipeline_transfer(graph, stage - 1, layer_input, TP)
+        gpus = stage_gpus(stage, TP)
+        res = add_attention(graph, stage, layer_id, layer_input, TP)
+
+        # FFN - Tensor Parallel across TP GPUs
+        cluster = (stage_cluster(stage, TP), f'Layer {layer_id}')
+        ffn = cluster + ('Feed Forward Network',)
+
+        # First linear (column parallel)
+        ffn1 = graph.add_ops(COMPUTE, 'FFN Linear1 {device}\nOutput', ('B', 'L', width), device=gpus,
+                             layer=layer_id, cluster=ffn, flops=gemm_flops(gemms, 'ffn_linear1'))
+        graph.add_edges(res, ffn1)
+
+        # Activation
+        act = graph.add_ops(COMPUTE, 'GELU {device}\nOutput', ('B', 'L', width), device=gpus,
+                            layer=layer_id, cluster=ffn, flops=f'B*L*{width}')
+        graph.add_edges(ffn1, act)
+
+        # Second linear (row parallel)
+        ffn2 = graph.add_ops(COMPUTE, 'FFN Linear2 {device}\nOutput', ('B', 'L', 'd_model'), device=gpus,
+                             layer=layer_id, cluster=ffn, flops=gemm_flops(gemms, 'ffn_linear2'))
+        graph.add_edges(act, ffn2)
+
+        # All-reduce for FFN output
+        ar_ffn = graph.add_op(ALL_REDUCE, f'All-Reduce\nSum across {TP} GPUs', ('B', 'L', 'd_model'),
+                              group=gpus, layer=layer_id, cluster=ffn)
+        graph.add_edges(ffn2, ar_ffn)
+
         # Residual connection
-        layer.node('res_ffn3', 'Residual Add\nInput: [B, L/P, d_model]\nGPU: 8-15', shape='parallelogram')
-
-# Output
-with dot.subgraph(name='cluster_output') as c:
-    c.attr(label='Output Layer')
-    c.node('gather', 'Gather from Pipeline\nX: [B, L, d_model]\nGPU: 8-15 → Host', shape='parallelogram')
-    c.node('output', 'Output\nX: [B, L, d_model]\nGPU: Host', shape='parallelogram')
-
-# Connections
-# Input to split
-dot.edge('input', 'split0')
-
-# Layer 0 connections
-for i in range(8):
-    dot.edge('split0', f'qkv0_{i}')
-    dot.edge(f'qkv0_{i}', f'attn0_{i}')
-    dot.edge(f'attn0_{i}', f'out0_{i}')
-    dot.edge(f'out0_{i}', 'ar0')
-
-dot.edge('ar0', 'res0')
-dot.edge('split0', 'res0')  # Residual connection
-
-# Layer 0 FFN connections
-for i in range(8):
-    dot.edge('res0', f'ffn1_0_{i}')
-    dot.edge(f'ffn1_0_{i}', f'act0_{i}')
-    dot.edge(f'act0_{i}', f'ffn2_0_{i}')
-    dot.edge(f'ffn2_0_{i}', 'ar_ffn0')
-
-dot.edge('ar_ffn0', 'res_ffn0')
-dot.edge('res0', 'res_ffn0')  # Residual connection
-
-# Pipeline communication
-dot.edge('res_ffn0', 'send_stage0')
-dot.edge('send_stage0', 'recv_stage1')
-
-# Layer 2 connections
-for i in range(8, 16):
-    dot.edge('recv_stage1', f'qkv2_{i}')
-    dot.edge(f'qkv2_{i}', f'attn2_{i}')
-    dot.edge(f'attn2_{i}', f'out2_{i}')
-    dot.edge(f'out2_{i}', 'ar2')
-
-dot.edge('ar2', 'res2')
-dot.edge('recv_stage1', 'res2')  # Residual connection
-
-# Layer 2 FFN connections
-for i in range(8, 16):
-    dot.edge('res2', f'ffn1_2_{i}')
-    dot.edge(f'ffn1_2_{i}', f'act2_{i}')
-    dot.edge(f'act2_{i}', f'ffn2_2_{i}')
-    dot.edge(f'ffn2_2_{i}', 'ar_ffn2')
-
-dot.edge('ar_ffn2', 'res_ffn2')
-dot.edge('res2', 'res_ffn2')  # Residual connection
-
-# Layer 3 connections
-for i in range(8, 16):
-    dot.edge('res_ffn2', f'qkv3_{i}')
-    dot.edge(f'qkv3_{i}', f'attn3_{i}')
-    dot.edge(f'attn3_{i}', f'out3_{i}')
-    dot.edge(f'out3_{i}', 'ar3')
-
-dot.edge('ar3', 'res3')
-dot.edge('res_ffn2', 'res3')  # Residual connection
-
-# Layer 3 FFN connections
-for i in range(8, 16):
-    dot.edge('res3', f'ffn1_3_{i}')
-    dot.edge(f'ffn1_3_{i}', f'act3_{i}')
-    dot.edge(f'act3_{i}', f'ffn2_3_{i}')
-    dot.edge(f'ffn2_3_{i}', 'ar_ffn3')
-
-dot.edge('ar_ffn3', 'res_ffn3')
-dot.edge('res3', 'res_ffn3')  # Residual connection
-
-# Output connections
-dot.edge('res_ffn3', 'gather')
-dot.edge('gather', 'output')
-
-# Save the DAG
-dot.render('/home/wzc/data/file-share/submission/baseline_dense_dag', format='svg')
-print("Baseline Dense DAG saved to /home/wzc/data/file-share/submission/baseline_dense_dag.svg")
\ No newline at end of file
+        res_ffn = graph.add_op(COMPUTE, 'Residual Add\nInput', ('B', 'L', 'd_model'), group=gpus,
+                               layer=layer_id, cluster=cluster, flops='B*L*d_model')
+        graph.add_edge(ar_ffn, res_ffn)
+        graph.add_edge(res, res_ffn)
+        layer_input = res_ffn
+
+    add_output(graph, (num_layers - 1) // layers_per_stage, layer_input, TP)
+    return graph
+
+
+if __name__ == '__main__':
+    # The rendered DAGs are checked in next to this script
+    output_dir = os.path.dirname(os.path.abspath(__file__))
+    # Save the DAG
+    render_dot(build_baseline_dense_graph(), os.path.join(output_dir, 'baseline_dense_dag'),
+               size='20,30')
+    print(f"Baseline Dense DAG saved to {os.path.join(output_dir, 'baseline_dense_dag.svg')}")
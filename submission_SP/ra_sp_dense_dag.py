@@ -1,149 +1,158 @@
-import graphviz
-
-# Create RA+SP DAG for Dense Transformer with 16 GPUs
-dot = graphviz.Digraph(comment='Dense Transformer RA+SP (16 GPUs)', format='svg')
-dot.attr(rankdir='TB', size='25,35')
-
-# Define node styles
-dot.attr('node', shape='ellipse', style='filled', color='lightblue')  # Communication
-dot.attr('node', shape='rectangle', style='filled', color='lightgreen')  # Computation
-dot.attr('node', shape='parallelogram', style='filled', color='lightyellow')  # Routing/Aggregation
-
-# Input
-with dot.subgraph(name='cluster_input') as c:
-    c.attr(label='Input Layer')
-    c.node('input', 'Input\nX: [B, L, d_model]\nGPU: Host', shape='parallelogram')
-
-# Sequence Parallel Split across 16 GPUs
-with dot.subgraph(name='cluster_sp_split') as c:
-    c.attr(label='Sequence Parallel Split')
-    c.node('sp_split', 'Sequence Parallel Split\nX: [B, L/16, d_model]\nGPU: 0-15', shape='parallelogram')
-
-# 4 layers with Ring Attention + Sequence Parallelism
-for layer_id in range(4):
-    with dot.subgraph(name=f'cluster_layer{layer_id}') as layer:
-        layer.attr(label=f'Layer {layer_id}')
-        
-        # Ring Attention with Sequence Parallelism
-        with dot.subgraph(name=f'cluster_ra_sp{layer_id}') as ra:
-            ra.attr(label=f'Ring Attention + Sequence Parallel')
-            
-            # QKV projections on each GPU
-            for gpu_id in range(16):
-                ra.node(f'qkv{layer_id}_{gpu_id}', f'QKV Projection\n[Q,K,V]: [B, L/16, d_model]\nGPU: {gpu_id}', shape='rectangle')
-            
-            # Ring communication stages (16 stages for 16 GPUs)
-            for stage in range(16):
-                for gpu_id in range(16):
-                    src_gpu = (gpu_id - stage) % 16
-                    ra.node(f'ring_stage{layer_id}_{stage}_{gpu_id}', 
-                           f'Ring Stage {stage}\nCompute: Q_{gpu_id}×K_{src_gpu}×V_{src_gpu}\nGPU: {gpu_id}', 
-                           shape='rectangle')
-                
-                # KV communication
-                for gpu_id in range(16):
-                    next_gpu = (gpu_id + 1) % 16
-                    ra.node(f'kv_send{layer_id}_{stage}_{gpu_id}', 
-                           f'Send KV to GPU {next_gpu}\nGPU: {gpu_id}→{next_gpu}', 
-                           shape='ellipse')
-            
-            # Accumulate partial results
-            for gpu_id in range(16):
-                ra.node(f'accum{layer_id}_{gpu_id}', f'Accumulate Results\nOutput: [B, L/16, d_model]\nGPU: {gpu_id}', shape='parallelogram')
-            
-            # Output projection
-            for gpu_id in range(16):
-                ra.node(f'out_proj{layer_id}_{gpu_id}', f'Output Projection\nOutput: [B, L/16, d_model]\nGPU: {gpu_id}', shape='rectangle')
-        
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'analyse_model'))
+from execution_graph import COMPUTE, GATHER, INPUT, OUTPUT, SEND, SPLIT, render_dot
+from graph_template import Layers, Op, PlanTemplate, Ring, expand_template
+from ring_attention import SEQUENCE_PARTITIONS, causal_flops_expressions
+from transformer_workload import gemm_flops, layer_gemm_expressions
+
+# 16 GPUs in the ring, 4 layers
+P = 16
+NUM_LAYERS = 4
+
+# Ops of a layer running the transformer_workload GEMMs, by label
+LAYER_GEMMS = {
+    'QKV Projection\n[Q,K,V]': ('qkv_projection',),
+    'Ring Stage {index}\nCompute: Q_{device}×K_{peer}×V_{peer}': ('attention_scores', 'attention_values'),
+    'Output Projection\nOutput': ('output_projection',),
+    'FFN Linear1\nOutput': ('ffn_linear1',),
+    'FFN Linear2\nOutput': ('ffn_linear2',)
+}
+
+
+# Tokens GPU p holds under each ring_attention.SEQUENCE_PARTITIONS mode
+CHUNK_ASSIGNMENT = {
+    'contiguous': 'GPU p: chunk p of {P}',
+    'zigzag': 'GPU p: chunks p, {last}-p of {chunks}',
+    'striped': 'GPU p: tokens p mod {P}'
+}
+
+
+def partition_text(P, partition='contiguous'):
+    """Chunk assignment of a partition, for op labels"""
+    if partition not in SEQUENCE_PARTITIONS:
+        raise ValueError(f"Unknown sequence partition {partition!r}, expected one of {SEQUENCE_PARTITIONS}")
+    return CHUNK_ASSIGNMENT[partition].format(P=P, chunks=2 * P, last=2 * P - 1)
+
+
+def plan_suffix(partition='contiguous', causal=False):
+    """Plan name suffix for a non-default partition or mask"""
+    return ''.join(f', {text}' for text, used in ((partition, partition != 'contiguous'), ('causal', causal)) if used)
+
+
+def input_template(P, partition='contiguous'):
+    """Input on the host, split along the sequence across the P GPUs by partition"""
+    return [
+        # Input
+        Op(INPUT, 'Input\nX', ('B', 'L', 'd_model'), placement='host', cluster=('Input Layer',)),
+        # Sequence Parallel Split across P GPUs
+        Op(SPLIT, f'Sequence Parallel Split ({partition})\n{partition_text(P, partition)}\nX',
+           ('B', f'L/{P}', 'd_model'), placement='group', cluster=('Sequence Parallel Split',))
+    ]
+
+
+def ring_attention_template(P, buffers=2, partition='contiguous', causal=False):
+    """
+    Ring Attention + Sequence Parallel block of one layer, ending in the residual add named 'attention'
+
+    Args:
+        P: GPUs in the ring
+        buffers: K,V buffers per GPU; a block is forwarded as soon as it
+                 arrives and the next GPU has a free buffer for it
+                 (2: double buffering, the transfer for stage s + 1
+                 overlaps the compute of stage s)
+        partition: Tokens each GPU holds (ring_attention.SEQUENCE_PARTITIONS)
+        causal: Causal mask; every ring stage then carries the FLOPs of the
+                query-key pairs that survive it on its GPU
+
+    Returns:
+        Template elements of the block
+    """
+    cluster = ('Layer {layer}', 'Ring Attention + Sequence Parallel')
+    segment = ('B', f'L/{P}', 'd_model')
+    tokens = f'B*L/{P}'
+    gemms = layer_gemm_expressions(P)
+
+    return [
+        # QKV projections on each GPU
+        Op(COMPUTE, 'QKV Projection\n[Q,K,V]', ('3',) + segment, cluster=cluster,
+           flops=gemm_flops(gemms, 'qkv_projection')),
+
+        # Ring communication stages (P stages for P GPUs): stage s computes with
+        # the K,V block of GPU p - s, which GPU p - 1 forwards once it arrives there,
+        # into the buffer stage s + 1 - buffers of the next GPU has released
+        Ring(Op(COMPUTE, 'Ring Stage {index}\nCompute: Q_{device}×K_{peer}×V_{peer}', segment, cluster=cluster,
+                flops=gemm_flops(gemms, 'attention_scores', 'attention_values', ops=P)),
+             Op(SEND, 'Send KV to GPU {peer}', ('2',) + segment, cluster=cluster),
+             buffers, causal_flops_expressions(P, partition) if causal else None),
+
+        # Accumulate partial results
+        Op(COMPUTE, 'Accumulate Results\nOutput', segment, cluster=cluster, flops=f'4*{P}*{tokens}*d_model'),
+
+        # Output projection
+        Op(COMPUTE, 'Output Projection\nOutput', segment, cluster=cluster,
+           flops=gemm_flops(gemms, 'output_projection')),
+
         # Residual connection
-        for gpu_id in range(16):
-            layer.node(f'res_attn{layer_id}_{gpu_id}', f'Residual Add\nInput: [B, L/16, d_model]\nGPU: {gpu_id}', shape='parallelogram')
-        
-        # FFN - No tensor parallelism, each GPU has full FFN
-        with dot.subgraph(name=f'cluster_ffn{layer_id}') as ffn:
-            ffn.attr(label=f'Feed Forward Network')
-            
-            # First linear
-            for gpu_id in range(16):
-                ffn.node(f'ffn1_{layer_id}_{gpu_id}', f'FFN Linear1\nOutput: [B, L/16, ffn_dim]\nGPU: {gpu_id}', shape='rectangle')
-            
-            # Activation
-            for gpu_id in range(16):
-                ffn.node(f'act_{layer_id}_{gpu_id}', f'GELU\nGPU: {gpu_id}', shape='rectangle')
-            
-            # Second linear
-            for gpu_id in range(16):
-                ffn.node(f'ffn2_{layer_id}_{gpu_id}', f'FFN Linear2\nOutput: [B, L/16, d_model]\nGPU: {gpu_id}', shape='rectangle')
-        
+        Op(COMPUTE, 'Residual Add\nInput', segment, cluster=('Layer {layer}',), flops=f'{tokens}*d_model',
+           inputs=('input',), name='attention')
+    ]
+
+
+def output_template(P, partition='contiguous'):
+    """Gather the P sequence segments back to the host, undoing partition"""
+    return [
+        # Sequence Parallel Gather
+        Op(GATHER, f'Sequence Parallel Gather ({partition})\n{partition_text(P, partition)}\nX',
+           ('B', 'L', 'd_model'), placement='group', cluster=('Sequence Parallel Gather',)),
+        # Output
+        Op(OUTPUT, 'Output\nX', ('B', 'L', 'd_model'), placement='host', cluster=('Output Layer',))
+    ]
+
+
+def ra_sp_dense_template(P=P, num_layers=NUM_LAYERS, dims=None, buffers=2, partition='contiguous',
+                         causal=False, replicas=1):
+    """
+    Dense Transformer with Ring Attention + Sequence Parallelism over P GPUs, as a template
+
+    buffers, partition, causal: see ring_attention_template; replicas:
+    data-parallel copies on further groups of P GPUs
+    """
+    segment = ('B', f'L/{P}', 'd_model')
+    tokens = f'B*L/{P}'
+    gemms = layer_gemm_expressions(P)
+
+    # FFN - No tensor parallelism, each GPU has full FFN
+    cluster = ('Layer {layer}', 'Feed Forward Network')
+    layer = ring_attention_template(P, buffers, partition, causal) + [
+        Op(COMPUTE, 'FFN Linear1\nOutput', ('B', f'L/{P}', 'ffn_dim'), cluster=cluster,
+           flops=gemm_flops(gemms, 'ffn_linear1')),
+        Op(COMPUTE, 'GELU', ('B', f'L/{P}', 'ffn_dim'), cluster=cluster, flops=f'{tokens}*ffn_dim'),
+        Op(COMPUTE, 'FFN Linear2\nOutput', segment, cluster=cluster, flops=gemm_flops(gemms, 'ffn_linear2')),
         # Residual connection
-        for gpu_id in range(16):
-            layer.node(f'res_ffn{layer_id}_{gpu_id}', f'Residual Add\nInput: [B, L/16, d_model]\nGPU: {gpu_id}', shape='parallelogram')
-
-# Sequence Parallel Gather
-with dot.subgraph(name='cluster_sp_gather') as c:
-    c.attr(label='Sequence Parallel Gather')
-    c.node('sp_gather', 'Sequence Parallel Gather\nX: [B, L, d_model]\nGPU: 0-15 → Host', shape='parallelogram')
-
-# Output
-with dot.subgraph(name='cluster_output') as c:
-    c.attr(label='Output Layer')
-    c.node('output', 'Output\nX: [B, L, d_model]\nGPU: Host', shape='parallelogram')
-
-# Connections
-# Input to SP split
-dot.edge('input', 'sp_split')
-
-# Layer connections
-for layer_id in range(4):
-    # Input to QKV projections
-    if layer_id == 0:
-        for gpu_id in range(16):
-            dot.edge('sp_split', f'qkv{layer_id}_{gpu_id}')
-    else:
-        for gpu_id in range(16):
-            dot.edge(f'res_ffn{layer_id-1}_{gpu_id}', f'qkv{layer_id}_{gpu_id}')
-    
-    # Ring attention stages
-    for gpu_id in range(16):
-        dot.edge(f'qkv{layer_id}_{gpu_id}', f'ring_stage{layer_id}_0_{gpu_id}')
-    
-    for stage in range(16):
-        for gpu_id in range(16):
-            # Ring computation stages
-            if stage > 0:
-                prev_gpu = (gpu_id - 1) % 16
-                dot.edge(f'ring_stage{layer_id}_{stage-1}_{gpu_id}', f'ring_stage{layer_id}_{stage}_{gpu_id}')
-                dot.edge(f'kv_send{layer_id}_{stage-1}_{prev_gpu}', f'ring_stage{layer_id}_{stage}_{gpu_id}')
-            
-            # KV communication
-            if stage < 15:
-                dot.edge(f'ring_stage{layer_id}_{stage}_{gpu_id}', f'kv_send{layer_id}_{stage}_{gpu_id}')
-    
-    # Accumulate and output projection
-    for gpu_id in range(16):
-        dot.edge(f'ring_stage{layer_id}_15_{gpu_id}', f'accum{layer_id}_{gpu_id}')
-        dot.edge(f'accum{layer_id}_{gpu_id}', f'out_proj{layer_id}_{gpu_id}')
-        dot.edge(f'out_proj{layer_id}_{gpu_id}', f'res_attn{layer_id}_{gpu_id}')
-        
-        # Residual connection for attention
-        if layer_id == 0:
-            dot.edge('sp_split', f'res_attn{layer_id}_{gpu_id}')
-        else:
-            dot.edge(f'res_ffn{layer_id-1}_{gpu_id}', f'res_attn{layer_id}_{gpu_id}')
-        
-        # FFN connections
-        dot.edge(f'res_attn{layer_id}_{gpu_id}', f'ffn1_{layer_id}_{gpu_id}')
-        dot.edge(f'ffn1_{layer_id}_{gpu_id}', f'act_{layer_id}_{gpu_id}')
-        dot.edge(f'act_{layer_id}_{gpu_id}', f'ffn2_{layer_id}_{gpu_id}')
-        dot.edge(f'ffn2_{layer_id}_{gpu_id}', f'res_ffn{layer_id}_{gpu_id}')
-        dot.edge(f'res_attn{layer_id}_{gpu_id}', f'res_ffn{layer_id}_{gpu_id}')  # Residual connection
-
-# Final connections
-for gpu_id in range(16):
-    dot.edge(f'res_ffn3_{gpu_id}', 'sp_gather')
-
-dot.edge('sp_gather', 'output')
-
-# Save the DAG
-dot.render('/home/wzc/data/file-share/submission/ra_sp_dense_dag', format='svg')
-print("RA+SP Dense DAG saved to /home/wzc/data/file-share/submission/ra_sp_dense_dag.svg")
\ No newline at end of file
+        Op(COMPUTE, 'Residual Add\nInput', segment, cluster=('Layer {layer}',), flops=f'{tokens}*d_model',
+           inputs=('attention',))
+    ]
+    return PlanTemplate(f'Dense Transformer RA+SP ({P} GPUs{plan_suffix(partition, causal)})', P,
+                        input_template(P, partition) + [Layers(num_layers, layer)] + output_template(P, partition),
+                        replicas, dims)
+
+
+def build_ra_sp_dense_graph(P=P, num_layers=NUM_LAYERS, dims=None, buffers=2, partition='contiguous',
+                            causal=False):
+    """
+    Dense Transformer with Ring Attention + Sequence Parallelism over P GPUs
+
+    buffers: K,V buffers per GPU; partition and causal: see ring_attention_template
+    """
+    return expand_template(ra_sp_dense_template(P, num_layers, dims, buffers, partition, causal))
+
+
+if __name__ == '__main__':
+    # The rendered DAGs are checked in next to this script
+    output_dir = os.path.dirname(os.path.abspath(__file__))
+    # Save the DAG
+    render_dot(build_ra_sp_dense_graph(), os.path.join(output_dir, 'ra_sp_dense_dag'),
+               size='25,35')
+    print(f"RA+SP Dense DAG saved to {os.path.join(output_dir, 'ra_sp_dense_dag.svg')}")
@@ -1,172 +1,78 @@
-import graphviz
+import os
+import sys
 
-# Create RA+SP DAG for MoE Transformer with 16 GPUs
-dot = graphviz.Digraph(comment='MoE Transformer RA+SP (16 GPUs)', format='svg')
-dot.attr(rankdir='TB', size='25,40')
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'analyse_model'))
+from execution_graph import COMPUTE, GATHER, ROUTING, SPLIT, render_dot
+from graph_template import Branches, Layers, Op, PlanTemplate, expand_template
+from ra_sp_dense_dag import NUM_LAYERS, P, input_template, output_template, plan_suffix, ring_attention_template
 
-# Define node styles
-dot.attr('node', shape='ellipse', style='filled', color='lightblue')  # Communication
-dot.attr('node', shape='rectangle', style='filled', color='lightgreen')  # Computation
-dot.attr('node', shape='parallelogram', style='filled', color='lightyellow')  # Routing/Aggregation
-dot.attr('node', shape='diamond', style='filled', color='lightcoral')  # Gate
+# Each GPU has 8 experts, top-2 gating, capacity factor 1.25
+NUM_EXPERTS = 8
+TOP_K = 2
+CAPACITY_FACTOR = 1.25
 
-# Input
-with dot.subgraph(name='cluster_input') as c:
-    c.attr(label='Input Layer')
-    c.node('input', 'Input\nX: [B, L, d_model]\nGPU: Host', shape='parallelogram')
 
-# Sequence Parallel Split across 16 GPUs
-with dot.subgraph(name='cluster_sp_split') as c:
-    c.attr(label='Sequence Parallel Split')
-    c.node('sp_split', 'Sequence Parallel Split\nX: [B, L/16, d_model]\nGPU: 0-15', shape='parallelogram')
+def ra_sp_moe_template(P=P, num_layers=NUM_LAYERS, num_experts=NUM_EXPERTS, top_k=TOP_K,
+                       capacity_factor=CAPACITY_FACTOR, dims=None, partition='contiguous', causal=False, replicas=1):
+    """
+    MoE Transformer with Ring Attention + Sequence Parallelism over P GPUs, as a template
 
-# 4 layers with Ring Attention + Sequence Parallelism + MoE
-for layer_id in range(4):
-    with dot.subgraph(name=f'cluster_layer{layer_id}') as layer:
-        layer.attr(label=f'Layer {layer_id}')
-        
-        # Ring Attention with Sequence Parallelism
-        with dot.subgraph(name=f'cluster_ra_sp{layer_id}') as ra:
-            ra.attr(label=f'Ring Attention + Sequence Parallel')
-            
-            # QKV projections on each GPU
-            for gpu_id in range(16):
-                ra.node(f'qkv{layer_id}_{gpu_id}', f'QKV Projection\n[Q,K,V]: [B, L/16, d_model]\nGPU: {gpu_id}', shape='rectangle')
-            
-            # Ring communication stages (16 stages for 16 GPUs)
-            for stage in range(16):
-                for gpu_id in range(16):
-                    src_gpu = (gpu_id - stage) % 16
-                    ra.node(f'ring_stage{layer_id}_{stage}_{gpu_id}', 
-                           f'Ring Stage {stage}\nCompute: Q_{gpu_id}×K_{src_gpu}×V_{src_gpu}\nGPU: {gpu_id}', 
-                           shape='rectangle')
-                
-                # KV communication
-                for gpu_id in range(16):
-                    next_gpu = (gpu_id + 1) % 16
-                    ra.node(f'kv_send{layer_id}_{stage}_{gpu_id}', 
-                           f'Send KV to GPU {next_gpu}\nGPU: {gpu_id}→{next_gpu}', 
-                           shape='ellipse')
-            
-            # Accumulate partial results
-            for gpu_id in range(16):
-                ra.node(f'accum{layer_id}_{gpu_id}', f'Accumulate Results\nOutput: [B, L/16, d_model]\nGPU: {gpu_id}', shape='parallelogram')
-            
-            # Output projection
-            for gpu_id in range(16):
-                ra.node(f'out_proj{layer_id}_{gpu_id}', f'Output Projection\nOutput: [B, L/16, d_model]\nGPU: {gpu_id}', shape='rectangle')
-        
-        # Residual connection
-        for gpu_id in range(16):
-            layer.node(f'res_attn{layer_id}_{gpu_id}', f'Residual Add\nInput: [B, L/16, d_model]\nGPU: {gpu_id}', shape='parallelogram')
-        
-        # MoE - Each GPU has 8 experts, top-2 gating
-        with dot.subgraph(name=f'cluster_moe{layer_id}') as moe:
-            moe.attr(label=f'Mixture of Experts')
-            
-            # Gate computation on each GPU
-            for gpu_id in range(16):
-                moe.node(f'gate{layer_id}_{gpu_id}', f'Gate\nCompute routing scores\nInput: [B, L/16, d_model]\nGPU: {gpu_id}', shape='diamond')
-            
-            # Expert selection (top-2) on each GPU
-            for gpu_id in range(16):
-                moe.node(f'select{layer_id}_{gpu_id}', f'Select Top-2 Experts\nGPU: {gpu_id}', shape='parallelogram')
-            
-            # Expert computation (8 experts per GPU)
-            for gpu_id in range(16):
-                for exp_id in range(8):
-                    moe.node(f'expert{layer_id}_{gpu_id}_{exp_id}', 
-                           f'Expert {exp_id}\nOutput: [B, L/16, ffn_dim]\nGPU: {gpu_id}', 
-                           shape='rectangle')
-                    moe.node(f'expert_act{layer_id}_{gpu_id}_{exp_id}', 
-                           f'Expert {exp_id} GELU\nGPU: {gpu_id}', 
-                           shape='rectangle')
-                    moe.node(f'expert_out{layer_id}_{gpu_id}_{exp_id}', 
-                           f'Expert {exp_id} Output\nOutput: [B, L/16, d_model]\nGPU: {gpu_id}', 
-                           shape='rectangle')
-            
-            # Combine expert outputs on each GPU
-            for gpu_id in range(16):
-                moe.node(f'combine{layer_id}_{gpu_id}', 
-                       f'Combine Expert Outputs\nWeighted sum by gate scores\nGPU: {gpu_id}', 
-                       shape='parallelogram')
-        
-        # Residual connection
-        for gpu_id in range(16):
-            layer.node(f'res_moe{layer_id}_{gpu_id}', f'Residual Add\nInput: [B, L/16, d_model]\nGPU: {gpu_id}', shape='parallelogram')
+    partition and causal: see ra_sp_dense_dag.ring_attention_template;
+    replicas: data-parallel copies on further groups of P GPUs
+    """
+    segment = ('B', f'L/{P}', 'd_model')
+    tokens = f'B*L/{P}'
+    # Tokens each expert processes: its share of the top-k assignments, padded to capacity
+    expert_tokens = f'{tokens}*{top_k}/{num_experts}*{capacity_factor}'
+
+    # MoE - Each GPU has all experts; routing stays local
+    cluster = ('Layer {layer}', 'Mixture of Experts')
+    layer = ring_attention_template(P, partition=partition, causal=causal) + [
+        # Gate computation on each GPU
+        Op(COMPUTE, 'Gate\nCompute routing scores\nInput', ('B', f'L/{P}', num_experts), cluster=cluster,
+           flops=f'2*{tokens}*d_model*{num_experts}'),
 
-# Sequence Parallel Gather
-with dot.subgraph(name='cluster_sp_gather') as c:
-    c.attr(label='Sequence Parallel Gather')
-    c.node('sp_gather', 'Sequence Parallel Gather\nX: [B, L, d_model]\nGPU: 0-15 → Host', shape='parallelogram')
+        # Expert selection (top-k) on each GPU
+        Op(SPLIT, f'Select Top-{top_k} Experts', ('B', f'L/{P}', top_k), cluster=cluster),
 
-# Output
-with dot.subgraph(name='cluster_output') as c:
-    c.attr(label='Output Layer')
-    c.node('output', 'Output\nX: [B, L, d_model]\nGPU: Host', shape='parallelogram')
+        # Expert computation
+        Branches(num_experts, [
+            Op(COMPUTE, 'Expert {index}\nOutput', (expert_tokens, 'ffn_dim'), cluster=cluster,
+               flops=f'2*{expert_tokens}*d_model*ffn_dim', style=ROUTING, edge_label='if selected'),
+            Op(COMPUTE, 'Expert {index} GELU', (expert_tokens, 'ffn_dim'), cluster=cluster,
+               flops=f'{expert_tokens}*ffn_dim'),
+            Op(COMPUTE, 'Expert {index} Output\nOutput', (expert_tokens, 'd_model'), cluster=cluster,
+               flops=f'2*{expert_tokens}*ffn_dim*d_model')
+        ]),
+
+        # Combine expert outputs on each GPU
+        Op(GATHER, 'Combine Expert Outputs\nWeighted sum by gate scores', segment, cluster=cluster,
+           flops=f'2*{top_k}*{tokens}*d_model'),
+
+        # Residual connection
+        Op(COMPUTE, 'Residual Add\nInput', segment, cluster=('Layer {layer}',), flops=f'{tokens}*d_model',
+           inputs=('attention',))
+    ]
+    return PlanTemplate(f'MoE Transformer RA+SP ({P} GPUs{plan_suffix(partition, causal)})', P,
+                        input_template(P, partition) + [Layers(num_layers, layer)] + output_template(P, partition),
+                        replicas, dims)
 
-# Connections
-# Input to SP split
-dot.edge('input', 'sp_split')
 
-# Layer connections
-for layer_id in range(4):
-    # Input to QKV projections
-    if layer_id == 0:
-        for gpu_id in range(16):
-            dot.edge('sp_split', f'qkv{layer_id}_{gpu_id}')
-    else:
-        for gpu_id in range(16):
-            dot.edge(f'res_moe{layer_id-1}_{gpu_id}', f'qkv{layer_id}_{gpu_id}')
-    
-    # Ring attention stages
-    for gpu_id in range(16):
-        dot.edge(f'qkv{layer_id}_{gpu_id}', f'ring_stage{layer_id}_0_{gpu_id}')
-    
-    for stage in range(16):
-        for gpu_id in range(16):
-            # Ring computation stages
-            if stage > 0:
-                prev_gpu = (gpu_id - 1) % 16
-                dot.edge(f'ring_stage{layer_id}_{stage-1}_{gpu_id}', f'ring_stage{layer_id}_{stage}_{gpu_id}')
-                dot.edge(f'kv_send{layer_id}_{stage-1}_{prev_gpu}', f'ring_stage{layer_id}_{stage}_{gpu_id}')
-            
-            # KV communication
-            if stage < 15:
-                dot.edge(f'ring_stage{layer_id}_{stage}_{gpu_id}', f'kv_send{layer_id}_{stage}_{gpu_id}')
-    
-    # Accumulate and output projection
-    for gpu_id in range(16):
-        dot.edge(f'ring_stage{layer_id}_15_{gpu_id}', f'accum{layer_id}_{gpu_id}')
-        dot.edge(f'accum{layer_id}_{gpu_id}', f'out_proj{layer_id}_{gpu_id}')
-        dot.edge(f'out_proj{layer_id}_{gpu_id}', f'res_attn{layer_id}_{gpu_id}')
-        
-        # Residual connection for attention
-        if layer_id == 0:
-            dot.edge('sp_split', f'res_attn{layer_id}_{gpu_id}')
-        else:
-            dot.edge(f'res_moe{layer_id-1}_{gpu_id}', f'res_attn{layer_id}_{gpu_id}')
-        
-        # MoE connections
-        dot.edge(f'res_attn{layer_id}_{gpu_id}', f'gate{layer_id}_{gpu_id}')
-        dot.edge(f'gate{layer_id}_{gpu_id}', f'select{layer_id}_{gpu_id}')
-        
-        # Expert connections with routing
-        for exp_id in range(8):
-            dot.edge(f'select{layer_id}_{gpu_id}', f'expert{layer_id}_{gpu_id}_{exp_id}', style='dashed', label=f'if selected')
-            dot.edge(f'expert{layer_id}_{gpu_id}_{exp_id}', f'expert_act{layer_id}_{gpu_id}_{exp_id}')
-            dot.edge(f'expert_act{layer_id}_{gpu_id}_{exp_id}', f'expert_out{layer_id}_{gpu_id}_{exp_id}')
-            dot.edge(f'expert_out{layer_id}_{gpu_id}_{exp_id}', f'combine{layer_id}_{gpu_id}')
-        
-        dot.edge(f'combine{layer_id}_{gpu_id}', f'res_moe{layer_id}_{gpu_id}')
-        dot.edge(f'res_attn{layer_id}_{gpu_id}', f'res_moe{layer_id}_{gpu_id}')  # Residual connection
+def build_ra_sp_moe_graph(P=P, num_layers=NUM_LAYERS, num_experts=NUM_EXPERTS, top_k=TOP_K,
+                          capacity_factor=CAPACITY_FACTOR, dims=None, partition='contiguous', causal=False):
+    """
+    MoE Transformer with Ring Attention + Sequence Parallelism over P GPUs
 
-# Final connections
-for gpu_id in range(16):
-    dot.edge(f'res_moe3_{gpu_id}', 'sp_gather')
+    partition and causal: see ra_sp_dense_dag.ring_attention_template
+    """
+    return expand_template(ra_sp_moe_template(P, num_layers, num_experts, top_k, capacity_factor, dims,
+                                              partition, causal))
 
-dot.edge('sp_gather', 'output')
 
-# Save the DAG
-dot.render('/home/wzc/data/file-share/submission/ra_sp_moe_dag', format='svg')
-print("RA+SP MoE DAG saved to /home/wzc/data/file-share/submission/ra_sp_moe_dag.svg")
\ No newline at end of file
+if __name__ == '__main__':
+    # The rendered DAGs are checked in next to this script
+    output_dir = os.path.dirname(os.path.abspath(__file__))
+    # Save the DAG
+    render_dot(build_ra_sp_moe_graph(), os.path.join(output_dir, 'ra_sp_moe_dag'),
+               size='25,40')
+    print(f"RA+SP MoE DAG saved to {os.path.join(output_dir, 'ra_sp_moe_dag.svg')}")